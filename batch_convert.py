@@ -0,0 +1,467 @@
+#!/usr/bin/env python3
+"""
+Memory-aware batch conversion of many IFC files
+Runs convert_ifc_to_glb.py on a directory or manifest of models, admitting
+jobs only while their estimated peak RSS fits a memory budget and their
+iterator threads fit a core budget. Estimates come from file size and the
+peak RSS of earlier runs; progress is kept in a state file so an
+interrupted batch picks up where it stopped
+"""
+
+import os
+import sys
+import json
+import time
+import shlex
+import signal
+import argparse
+import subprocess
+from pathlib import Path
+
+
+REPO_ROOT = Path(__file__).resolve().parent
+CONVERT_SCRIPT = REPO_ROOT / 'convert_ifc_to_glb.py'
+
+# Estimate for a model nothing is known about yet: ifcopenshell keeps the
+# whole entity graph in memory at several times the STEP text size, plus
+# tessellated shapes in flight
+DEFAULT_BASE_MB = 200.0
+DEFAULT_MB_PER_IFC_MB = 4.0
+# Headroom on every estimate, and extra headroom for a job killed by SIGKILL
+# (most likely the OOM killer) on its next attempt
+SAFETY_MARGIN = 1.25
+OOM_GROWTH = 1.5
+HISTORY_LIMIT = 500
+
+
+def _write_json(path, data):
+    """Atomic replace, so a crash never leaves a half-written state file"""
+    path = Path(path)
+    tmp = path.with_name(path.name + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+
+def _read_json(path, default):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _rss_mb(pid):
+    """Current VmRSS of a process in MB, None once it is gone"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def _stop_orphan(job):
+    """Terminate a conversion left behind by a killed batch process"""
+    pid = job.get('pid')
+    try:
+        with open(f'/proc/{pid}/cmdline', 'rb') as f:
+            command = f.read().split(b'\0')
+    except (OSError, TypeError):
+        return
+    # Only if the pid still belongs to that conversion and was not reused
+    if job['output'].encode() not in command:
+        return
+    os.kill(pid, signal.SIGTERM)
+    for _ in range(50):
+        if not _pid_alive(pid):
+            return
+        time.sleep(0.1)
+    os.kill(pid, signal.SIGKILL)
+
+
+def collect_inputs(source):
+    """
+    IFC files to convert, as (job key, path) pairs
+
+    source is a directory (searched recursively for .ifc files), a JSON
+    manifest (a list of paths, or of objects with an 'input' key) or a text
+    file with one path per line. Relative manifest paths are relative to
+    the manifest.
+    """
+    source = Path(source)
+    if source.is_dir():
+        return [(str(path.relative_to(source)), path)
+                for path in sorted(source.rglob('*')) if path.suffix.lower() == '.ifc']
+
+    if source.suffix == '.json':
+        with open(source) as f:
+            entries = [e['input'] if isinstance(e, dict) else e for e in json.load(f)]
+    else:
+        entries = [line.strip() for line in source.read_text().splitlines()
+                   if line.strip() and not line.startswith('#')]
+    paths = [(source.parent / entry) if not Path(entry).is_absolute() else Path(entry) for entry in entries]
+    return [(str(path), path) for path in paths]
+
+
+class MemoryModel:
+    """
+    Peak RSS estimate of a conversion from its input size
+
+    Uses, in order: the last observed peak of the same file at the same
+    size, a least-squares line peak = base + slope x size fitted to earlier
+    runs with the same conversion arguments, or the default per-MB ratio.
+    """
+
+    def __init__(self, history, convert_args):
+        self.history = history
+        self.convert_args = convert_args
+
+    def _runs(self):
+        return [run for run in self.history if run.get('convert_args') == self.convert_args
+                and run.get('peak_rss_mb')]
+
+    def fit(self):
+        """(base MB, MB per IFC MB) from the history, None with too little data"""
+        runs = self._runs()
+        sizes = [run['size_mb'] for run in runs]
+        if len(runs) < 2 or max(sizes) - min(sizes) < 1.0:
+            return None
+        n = len(runs)
+        mean_size = sum(sizes) / n
+        mean_peak = sum(run['peak_rss_mb'] for run in runs) / n
+        slope = (sum((run['size_mb'] - mean_size) * (run['peak_rss_mb'] - mean_peak) for run in runs)
+                 / sum((size - mean_size) ** 2 for size in sizes))
+        if slope <= 0:
+            return None
+        base = mean_peak - slope * mean_size
+        # The line has to cover every observation, not just the average one
+        base += max(run['peak_rss_mb'] - (base + slope * run['size_mb']) for run in runs)
+        return base, slope
+
+    def estimate(self, key, size_mb):
+        """
+        Returns:
+            (estimated peak RSS in MB including the safety margin, source)
+        """
+        for run in reversed(self._runs()):
+            if run['key'] == key and abs(run['size_mb'] - size_mb) <= 0.01 * max(size_mb, 1.0):
+                return run['peak_rss_mb'] * SAFETY_MARGIN, 'previous run'
+        fitted = self.fit()
+        if fitted:
+            base, slope = fitted
+            return (base + slope * size_mb) * SAFETY_MARGIN, f'fit of {len(self._runs())} runs'
+        return (DEFAULT_BASE_MB + DEFAULT_MB_PER_IFC_MB * size_mb) * SAFETY_MARGIN, 'default ratio'
+
+
+class _Running:
+    def __init__(self, key, job, process, log):
+        self.key = key
+        self.job = job
+        self.process = process
+        self.log = log
+        self.start = time.perf_counter()
+        self.observed_rss = 0.0
+
+    def committed_mb(self):
+        """Memory held against the budget: the estimate, or more if already exceeded"""
+        rss = _rss_mb(self.process.pid)
+        if rss is not None:
+            self.observed_rss = max(self.observed_rss, rss)
+        return max(self.job['estimate_mb'], self.observed_rss)
+
+
+def batch_convert(source, output_dir, memory_mb=None, cores=None, max_threads=None, convert_args=None,
+                  history_path=None, max_attempts=2, verbose=True):
+    """
+    Convert every IFC file of a directory or manifest under memory and core budgets
+
+    Jobs are started largest estimate first (first fit), each with
+    --threads set to its share of the free cores. A job whose estimate alone
+    exceeds the memory budget runs only when nothing else does. Completed
+    jobs are skipped on the next run while their input is unchanged;
+    failed ones are requeued (killed ones with a grown estimate) until they
+    have had max_attempts attempts, in this run or the next.
+
+    Args:
+        source: Directory of .ifc files, JSON manifest or text list of paths
+        output_dir: Directory for the GLBs, logs, state and summary
+        memory_mb: RSS budget in MB (default: 80% of physical memory)
+        cores: Core budget (default: CPU count)
+        max_threads: Upper bound on iterator threads per job
+        convert_args: Extra convert_ifc_to_glb.py arguments, e.g. ['--instancing']
+        history_path: Peak RSS history (default: output_dir/batch_history.json);
+            share it between batches so estimates keep improving
+        max_attempts: Attempts per job before it is left as failed
+        verbose: Print progress information
+
+    Returns:
+        summary dict, or None when a job failed
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    (output_dir / 'logs').mkdir(exist_ok=True)
+    state_path = output_dir / 'batch_state.json'
+    history_path = Path(history_path) if history_path else output_dir / 'batch_history.json'
+    summary_path = output_dir / 'batch_summary.json'
+
+    cores = cores or os.cpu_count()
+    max_threads = max_threads or cores
+    if memory_mb is None:
+        memory_mb = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') / (1024**2) * 0.8
+    convert_args = list(convert_args or [])
+
+    state = _read_json(state_path, {})
+    owner = state.get('pid')
+    if owner and owner != os.getpid() and _pid_alive(owner):
+        print(f"Error: {state_path} is in use by running batch (pid {owner})")
+        return None
+    state['pid'] = os.getpid()
+    jobs = state.setdefault('jobs', {})
+    history = _read_json(history_path, [])
+    model = MemoryModel(history, convert_args)
+
+    def set_estimate(key, job):
+        estimate, source_name = model.estimate(key, job['size_mb'])
+        if job.get('killed_peak_mb'):
+            estimate = max(estimate, job['killed_peak_mb'] * OOM_GROWTH)
+            source_name = 'killed on last attempt'
+        job['estimate_mb'], job['estimate_source'] = estimate, source_name
+
+    # Reconcile the inputs with what a previous (possibly killed) run recorded
+    for key, path in collect_inputs(source):
+        stat = path.stat()
+        signature = {'size': stat.st_size, 'mtime': stat.st_mtime, 'convert_args': convert_args}
+        job = jobs.get(key)
+        if job is None or job.get('signature') != signature:
+            job = jobs[key] = {'input': str(path), 'signature': signature, 'status': 'pending', 'attempts': 0}
+            stem = key[:-len(path.suffix)] if key.endswith(path.suffix) else key
+            job['output'] = str(output_dir / (stem.replace('/', '__').replace(os.sep, '__') + '.glb'))
+        elif job['status'] == 'running':
+            # The previous batch process died with this job in flight; its
+            # conversion may still be running as an orphan
+            _stop_orphan(job)
+            job['status'] = 'pending'
+        elif job['status'] == 'done' and not Path(job['output']).exists():
+            job['status'] = 'pending'
+        elif job['status'] == 'failed' and job['attempts'] < max_attempts:
+            job['status'] = 'pending'
+        job['size_mb'] = stat.st_size / (1024**2)
+        if job['status'] == 'pending':
+            set_estimate(key, job)
+    _write_json(state_path, state)
+
+    pending = sorted((key for key, job in jobs.items() if job['status'] == 'pending'),
+                     key=lambda key: -jobs[key]['estimate_mb'])
+    skipped = sum(1 for job in jobs.values() if job['status'] == 'done')
+
+    if verbose:
+        print(f"Source: {source}")
+        print(f"Output: {output_dir}")
+        print(f"Budget: {memory_mb:,.0f} MB RSS, {cores} cores (≤ {max_threads} threads per job)")
+        print(f"Jobs:   {len(pending)} to run, {skipped} already done")
+        print("-" * 60)
+
+    running = []
+    ran = []
+    start_time = time.perf_counter()
+
+    def start_job(key, threads):
+        job = jobs[key]
+        command = [sys.executable, str(CONVERT_SCRIPT), job['input'], '-o', job['output'],
+                   '--threads', str(threads), '-q'] + convert_args
+        log = open(output_dir / 'logs' / (Path(job['output']).stem + '.log'), 'w')
+        process = subprocess.Popen(command, cwd=REPO_ROOT, stdout=log, stderr=subprocess.STDOUT)
+        job.update(status='running', pid=process.pid, threads=threads, attempts=job['attempts'] + 1)
+        running.append(_Running(key, job, process, log))
+        ran.append(key)
+        _write_json(state_path, state)
+        if verbose:
+            print(f"  ▶ {key} ({job['size_mb']:.1f} MB, est. {job['estimate_mb']:,.0f} MB "
+                  f"[{job['estimate_source']}], {threads} threads)", flush=True)
+
+    def finish_job(entry, status, usage):
+        job = entry.job
+        entry.log.close()
+        returncode = os.waitstatus_to_exitcode(status)
+        elapsed = time.perf_counter() - entry.start
+        # wait4 gives this child's own peak; the batch runner it was forked
+        # from stays small, so the inherited part is negligible
+        peak = max(usage.ru_maxrss / 1024, entry.observed_rss)
+        job.update(time_s=elapsed, cpu_time_s=usage.ru_utime + usage.ru_stime, peak_rss_mb=peak,
+                   returncode=returncode, mb_per_s=job['size_mb'] / elapsed if elapsed > 0 else None,
+                   cpu_utilization=(usage.ru_utime + usage.ru_stime) / (elapsed * job['threads'])
+                   if elapsed > 0 else None)
+        if returncode == 0:
+            job['status'] = 'done'
+            job.pop('killed_peak_mb', None)
+            history.append({'key': entry.key, 'size_mb': job['size_mb'], 'peak_rss_mb': peak,
+                            'threads': job['threads'], 'time_s': elapsed, 'convert_args': convert_args})
+            del history[:-HISTORY_LIMIT]
+            _write_json(history_path, history)
+        else:
+            job['status'] = 'failed'
+            if returncode == -signal.SIGKILL:
+                job['killed_peak_mb'] = max(peak, job['estimate_mb'])
+        if verbose:
+            mark = "✓" if returncode == 0 else "❌"
+            print(f"  {mark} {entry.key}: {elapsed:.1f}s, peak {peak:,.0f} MB "
+                  f"(est. {job['estimate_mb']:,.0f} MB){'' if returncode == 0 else f', exit {returncode}'}",
+                  flush=True)
+        if job['status'] == 'failed' and job['attempts'] < max_attempts:
+            # Retry within this batch, with the grown estimate if it was killed
+            job['status'] = 'pending'
+            set_estimate(entry.key, job)
+            pending.append(entry.key)
+            pending.sort(key=lambda key: -jobs[key]['estimate_mb'])
+            if verbose:
+                print(f"  ↻ {entry.key}: retrying (attempt {job['attempts'] + 1}/{max_attempts}, "
+                      f"est. {job['estimate_mb']:,.0f} MB [{job['estimate_source']}])", flush=True)
+        _write_json(state_path, state)
+
+    try:
+        while pending or running:
+            # Reap finished jobs without blocking on any single one
+            for entry in list(running):
+                pid, status, usage = os.wait4(entry.process.pid, os.WNOHANG)
+                if pid:
+                    entry.process.returncode = os.waitstatus_to_exitcode(status)
+                    running.remove(entry)
+                    finish_job(entry, status, usage)
+
+            committed = sum(entry.committed_mb() for entry in running)
+            free_cores = cores - sum(entry.job['threads'] for entry in running)
+            for key in list(pending):
+                if free_cores < 1:
+                    break
+                estimate = jobs[key]['estimate_mb']
+                if committed + estimate > memory_mb and (running or estimate <= memory_mb):
+                    continue
+                share = max(1, cores // max(1, min(len(pending) + len(running), cores)))
+                threads = max(1, min(share, free_cores, max_threads))
+                pending.remove(key)
+                start_job(key, threads)
+                committed += estimate
+                free_cores -= threads
+                if estimate > memory_mb:
+                    if verbose:
+                        print(f"  ⚠️  {key}: estimate exceeds the budget, running it alone")
+                    break
+
+            time.sleep(0.2)
+    except KeyboardInterrupt:
+        for entry in running:
+            entry.process.terminate()
+            entry.process.wait()
+            entry.log.close()
+            entry.job['status'] = 'pending'
+            entry.job['attempts'] -= 1
+        state['pid'] = None
+        _write_json(state_path, state)
+        print("\nInterrupted; rerun the same command to resume")
+        return None
+
+    state['pid'] = None
+    _write_json(state_path, state)
+    total_time = time.perf_counter() - start_time
+
+    ran = {key: jobs[key] for key in dict.fromkeys(ran) if 'time_s' in jobs[key]}
+    failed = [key for key, job in jobs.items() if job['status'] == 'failed']
+    converted_mb = sum(job['size_mb'] for job in ran.values() if job['status'] == 'done')
+    summary = {
+        'generated': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'source': str(source),
+        'memory_budget_mb': memory_mb,
+        'cores': cores,
+        'convert_args': convert_args,
+        'wall_time_s': total_time,
+        'jobs_total': len(jobs),
+        'jobs_done': sum(1 for job in jobs.values() if job['status'] == 'done'),
+        'jobs_failed': len(failed),
+        'jobs_skipped': skipped,
+        'converted_mb': converted_mb,
+        'throughput_mb_per_s': converted_mb / total_time if total_time > 0 else None,
+        'jobs': {key: {name: job.get(name) for name in (
+            'input', 'output', 'status', 'attempts', 'size_mb', 'threads', 'estimate_mb', 'estimate_source',
+            'peak_rss_mb', 'time_s', 'cpu_time_s', 'cpu_utilization', 'mb_per_s', 'returncode'
+        )} for key, job in jobs.items()},
+    }
+    _write_json(summary_path, summary)
+
+    if verbose:
+        print("-" * 60)
+        print("BATCH COMPLETE")
+        print(f"  {'job':32s} {'MB':>8s} {'thr':>4s} {'time':>8s} {'MB/s':>7s} {'est MB':>8s} {'peak MB':>8s}")
+        for key, job in sorted(ran.items(), key=lambda item: -item[1]['time_s']):
+            rate = f"{job['mb_per_s']:7.2f}" if job.get('mb_per_s') else f"{'-':>7s}"
+            print(f"  {key[-32:]:32s} {job['size_mb']:8.1f} {job['threads']:4d} {job['time_s']:7.1f}s {rate} "
+                  f"{job['estimate_mb']:8,.0f} {job['peak_rss_mb']:8,.0f}"
+                  f"{'' if job['status'] == 'done' else '  ❌ ' + job['status']}")
+        print(f"  Done: {summary['jobs_done']}/{len(jobs)} ({skipped} from earlier runs), failed: {len(failed)}")
+        print(f"  Converted: {converted_mb:.1f} MB in {total_time:.1f}s "
+              f"({summary['throughput_mb_per_s'] or 0:.2f} MB/s)")
+        print(f"\n✓ Saved: {summary_path}")
+        if failed:
+            print(f"⚠️  Failed: {', '.join(failed)} (logs in {output_dir / 'logs'})")
+
+    return None if failed else summary
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Convert many IFC files under memory and core budgets',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python batch_convert.py /data/nightly -o /data/glb --memory 48000 --cores 16
+
+  # Manifest (JSON list or one path per line), instanced conversions
+  python batch_convert.py models.txt -o out --convert-args="--instancing"
+
+  # Shared history so estimates improve from night to night
+  python batch_convert.py /data/nightly -o /data/glb --history ~/.bim_batch_history.json
+
+Rerunning the same command after an interruption resumes the batch.
+        """
+    )
+    parser.add_argument('source', help='Directory of .ifc files, JSON manifest or text file of paths')
+    parser.add_argument('-o', '--output-dir', required=True, help='Directory for GLBs, logs, state and summary')
+    parser.add_argument('--memory', type=float, metavar='MB', help='RSS budget in MB (default: 80%% of RAM)')
+    parser.add_argument('--cores', type=int, help='Core budget (default: CPU count)')
+    parser.add_argument('--max-threads', type=int, help='Iterator threads per job at most (default: --cores)')
+    parser.add_argument('--convert-args', default='',
+                        help='Extra convert_ifc_to_glb.py arguments, e.g. --convert-args="--instancing gpu"')
+    parser.add_argument('--history', help='Peak RSS history JSON (default: output_dir/batch_history.json)')
+    parser.add_argument('--max-attempts', type=int, default=2, help='Attempts per job (default: 2)')
+    parser.add_argument('-q', '--quiet', action='store_true', help='Quiet mode')
+
+    args = parser.parse_args()
+
+    summary = batch_convert(
+        args.source,
+        args.output_dir,
+        memory_mb=args.memory,
+        cores=args.cores,
+        max_threads=args.max_threads,
+        convert_args=shlex.split(args.convert_args),
+        history_path=args.history,
+        max_attempts=args.max_attempts,
+        verbose=not args.quiet
+    )
+    sys.exit(0 if summary else 1)
+
+
+if __name__ == "__main__":
+    main()
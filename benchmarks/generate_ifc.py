@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Synthetic IFC models for reproducible pipeline benchmarks
+Builds a project with N storeys of walls (optionally with boolean openings),
+slabs and typed furniture sharing a few representation maps, using
+ifcopenshell.api so the output looks like an authoring-tool export
+"""
+
+import sys
+import time
+import random
+import argparse
+import contextlib
+from pathlib import Path
+
+import numpy as np
+import ifcopenshell
+import ifcopenshell.api
+import ifcopenshell.api.owner.settings
+
+
+# ifcopenshell 0.7 takes a single product where 0.8+ takes a list
+LEGACY_API = ifcopenshell.version.startswith('0.7')
+
+STOREY_HEIGHT = 3.5
+WALL_HEIGHT = 3.0
+WALL_THICKNESS = 0.2
+FURNITURE_TYPES = 8
+# IfcFurniture is IFC4; IFC2X3 types furnishing elements with IfcFurnitureType
+FURNITURE_CLASS = {'IFC2X3': 'IfcFurnishingElement'}
+
+
+def _run(usecase, ifc_file, **kwargs):
+    return ifcopenshell.api.run(usecase, ifc_file, **kwargs)
+
+
+def _assign_container(ifc_file, products, storey):
+    if LEGACY_API:
+        for product in products:
+            _run("spatial.assign_container", ifc_file, product=product, relating_structure=storey)
+    else:
+        _run("spatial.assign_container", ifc_file, products=products, relating_structure=storey)
+
+
+def _aggregate(ifc_file, products, relating_object):
+    if LEGACY_API:
+        for product in products:
+            _run("aggregate.assign_object", ifc_file, product=product, relating_object=relating_object)
+    else:
+        _run("aggregate.assign_object", ifc_file, products=products, relating_object=relating_object)
+
+
+def _assign_type(ifc_file, products, type_obj):
+    if LEGACY_API:
+        for product in products:
+            _run("type.assign_type", ifc_file, related_object=product, relating_type=type_obj)
+    else:
+        _run("type.assign_type", ifc_file, related_objects=products, relating_type=type_obj)
+
+
+def _add_opening(ifc_file, opening, element):
+    if LEGACY_API:
+        _run("void.add_opening", ifc_file, opening=opening, element=element)
+    else:
+        _run("feature.add_feature", ifc_file, feature=opening, element=element)
+
+
+@contextlib.contextmanager
+def _owner(ifc_file):
+    """
+    Author and application for IFC2X3, where every rooted entity needs an
+    IfcOwnerHistory and the api refuses to create one without them
+
+    The api looks them up through ifcopenshell.api.owner.settings, which
+    is process-wide: the lookups are pointed at this file only inside the
+    with block and restored afterwards.
+    """
+    person = _run("owner.add_person", ifc_file)
+    person.FamilyName = "Benchmark"
+    person.GivenName = None
+    organisation = _run("owner.add_organisation", ifc_file)
+    organisation.Name = "IFC to GLB Benchmarks"
+    user = _run("owner.add_person_and_organisation", ifc_file, person=person, organisation=organisation)
+    application = _run("owner.add_application", ifc_file)
+
+    settings = ifcopenshell.api.owner.settings
+    previous = settings.get_user, settings.get_application
+    # 0.7 does not look these up in the file by itself
+    settings.get_user = lambda f: user if f is ifc_file else previous[0](f)
+    settings.get_application = lambda f: application if f is ifc_file else previous[1](f)
+    try:
+        yield
+    finally:
+        settings.get_user, settings.get_application = previous
+
+
+def _placement(x, y, z, angle=0.0):
+    matrix = np.eye(4)
+    c, s = np.cos(angle), np.sin(angle)
+    matrix[:2, :2] = [[c, -s], [s, c]]
+    matrix[:3, 3] = (x, y, z)
+    return matrix
+
+
+def _box(ifc_file, context, length, width, height):
+    """Extruded rectangle, length along local X, width along local Y"""
+    return _run("geometry.add_wall_representation", ifc_file, context=context,
+                length=length, height=height, thickness=width)
+
+
+def _place(ifc_file, product, matrix, representation=None):
+    if representation is not None:
+        _run("geometry.assign_representation", ifc_file, product=product, representation=representation)
+    _run("geometry.edit_object_placement", ifc_file, product=product, matrix=matrix)
+
+
+def generate_ifc(output_path, storeys=3, elements_per_storey=200, repeated_share=0.5, opening_share=0.3,
+                 psets=True, schema="IFC4", seed=0, verbose=True):
+    """
+    Write a synthetic IFC model
+
+    Each storey gets a slab and elements_per_storey elements laid out on a
+    grid: a repeated_share fraction are furniture occurrences of a few types
+    (mapped representations), the rest are unique walls, opening_share of
+    which are cut by a boolean opening.
+
+    Args:
+        output_path: IFC file to write
+        storeys: Number of IfcBuildingStorey
+        elements_per_storey: Walls plus furniture per storey
+        repeated_share: Fraction of elements that are typed, repeated furniture
+        opening_share: Fraction of walls with an IfcOpeningElement
+        psets: Give every element a property set and quantities
+        schema: IFC schema
+        seed: Random seed (same arguments give the same model)
+        verbose: Print progress information
+
+    Returns:
+        dict with model statistics
+    """
+    rng = random.Random(seed)
+    start_time = time.time()
+
+    ifc_file = ifcopenshell.file(schema=schema)
+    with _owner(ifc_file) if schema == "IFC2X3" else contextlib.nullcontext():
+        project = _run("root.create_entity", ifc_file, ifc_class="IfcProject", name="Benchmark Project")
+        # Metres, so the coordinates below need no scaling (assign_unit defaults to millimetres)
+        project.UnitsInContext = ifc_file.createIfcUnitAssignment([
+            ifc_file.createIfcSIUnit(None, "LENGTHUNIT", None, "METRE"),
+            ifc_file.createIfcSIUnit(None, "AREAUNIT", None, "SQUARE_METRE"),
+            ifc_file.createIfcSIUnit(None, "VOLUMEUNIT", None, "CUBIC_METRE"),
+            ifc_file.createIfcSIUnit(None, "PLANEANGLEUNIT", None, "RADIAN"),
+        ])
+        model = _run("context.add_context", ifc_file, context_type="Model")
+        body = _run("context.add_context", ifc_file, context_type="Model", context_identifier="Body",
+                    target_view="MODEL_VIEW", parent=model)
+
+        site = _run("root.create_entity", ifc_file, ifc_class="IfcSite", name="Site")
+        building = _run("root.create_entity", ifc_file, ifc_class="IfcBuilding", name="Building")
+        _aggregate(ifc_file, [site], project)
+        _aggregate(ifc_file, [building], site)
+
+        furniture_types = []
+        for i in range(FURNITURE_TYPES):
+            type_obj = _run("root.create_entity", ifc_file, ifc_class="IfcFurnitureType", name=f"Furniture Type {i}")
+            size = 0.4 + 0.1 * i
+            _run("geometry.assign_representation", ifc_file, product=type_obj,
+                 representation=_box(ifc_file, body, size, size, 0.45 + 0.05 * i))
+            furniture_types.append(type_obj)
+
+        # Square grid with 4 m cells large enough for every element of a storey
+        columns = max(int(np.ceil(np.sqrt(elements_per_storey))), 1)
+        extent = columns * 4.0
+
+        counts = {'walls': 0, 'furniture': 0, 'openings': 0, 'slabs': 0}
+        for s in range(storeys):
+            elevation = s * STOREY_HEIGHT
+            storey = _run("root.create_entity", ifc_file, ifc_class="IfcBuildingStorey", name=f"Level {s}")
+            storey.Elevation = elevation
+            _aggregate(ifc_file, [storey], building)
+            _place(ifc_file, storey, _placement(0, 0, elevation))
+
+            slab = _run("root.create_entity", ifc_file, ifc_class="IfcSlab", name=f"Slab {s}")
+            _place(ifc_file, slab, _placement(0, 0, elevation - 0.2), _box(ifc_file, body, extent, extent, 0.2))
+            contained = [slab]
+            counts['slabs'] += 1
+
+            by_type = {}
+            for e in range(elements_per_storey):
+                x = (e % columns) * 4.0
+                y = (e // columns) * 4.0
+
+                if rng.random() < repeated_share:
+                    type_obj = furniture_types[rng.randrange(FURNITURE_TYPES)]
+                    element = _run("root.create_entity", ifc_file,
+                                   ifc_class=FURNITURE_CLASS.get(schema, "IfcFurniture"),
+                                   name=f"{type_obj.Name} {s}.{e}")
+                    _place(ifc_file, element, _placement(x + 1.5, y + 1.5, elevation, rng.random() * 2 * np.pi))
+                    by_type.setdefault(type_obj, []).append(element)
+                    counts['furniture'] += 1
+                else:
+                    length = rng.uniform(2.0, 3.8)
+                    element = _run("root.create_entity", ifc_file, ifc_class="IfcWall", name=f"Wall {s}.{e}")
+                    _place(ifc_file, element, _placement(x, y, elevation),
+                           _box(ifc_file, body, length, WALL_THICKNESS, WALL_HEIGHT))
+                    counts['walls'] += 1
+
+                    if rng.random() < opening_share:
+                        opening = _run("root.create_entity", ifc_file, ifc_class="IfcOpeningElement",
+                                       name=f"Opening {s}.{e}")
+                        width = min(0.9, length / 2)
+                        _place(ifc_file, opening, _placement(x + (length - width) / 2, y - 0.1, elevation),
+                               _box(ifc_file, body, width, WALL_THICKNESS + 0.2, 2.1))
+                        _add_opening(ifc_file, opening, element)
+                        counts['openings'] += 1
+
+                    if psets:
+                        pset = _run("pset.add_pset", ifc_file, product=element, name="Pset_WallCommon")
+                        _run("pset.edit_pset", ifc_file, pset=pset, properties={
+                            'IsExternal': e % columns in (0, columns - 1), 'LoadBearing': rng.random() < 0.5,
+                        })
+                        qto = _run("pset.add_qto", ifc_file, product=element, name="Qto_WallBaseQuantities")
+                        _run("pset.edit_qto", ifc_file, qto=qto, properties={
+                            'Length': length, 'Height': WALL_HEIGHT, 'Width': WALL_THICKNESS,
+                        })
+                contained.append(element)
+
+            for type_obj, elements in by_type.items():
+                _assign_type(ifc_file, elements, type_obj)
+            _assign_container(ifc_file, contained, storey)
+
+            if verbose:
+                print(f"  [{s + 1}/{storeys}] {storey.Name}: {len(contained)} elements "
+                      f"({time.time() - start_time:.1f}s)", flush=True)
+
+        output_path = Path(output_path)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        ifc_file.write(str(output_path))
+
+    stats = dict(
+        counts,
+        storeys=storeys,
+        elements_per_storey=elements_per_storey,
+        repeated_share=repeated_share,
+        opening_share=opening_share,
+        psets=psets,
+        schema=schema,
+        seed=seed,
+        products=len(ifc_file.by_type("IfcProduct")),
+        entities=len(list(ifc_file)),
+        size_mb=output_path.stat().st_size / (1024**2),
+        generate_time_s=time.time() - start_time,
+    )
+
+    if verbose:
+        print(f"✓ Saved: {output_path} ({stats['size_mb']:.2f} MB, {stats['products']:,} products, "
+              f"{stats['entities']:,} entities, {stats['generate_time_s']:.1f}s)")
+
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Generate a synthetic IFC model for benchmarks',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python benchmarks/generate_ifc.py -o /tmp/bench.ifc --storeys 10 --elements 500
+  python benchmarks/generate_ifc.py -o /tmp/repeated.ifc --repeated-share 0.9 --opening-share 0
+        """
+    )
+    parser.add_argument('-o', '--output', required=True, help='Output IFC file')
+    parser.add_argument('--storeys', type=int, default=3, help='Number of storeys (default: 3)')
+    parser.add_argument('--elements', type=int, default=200, help='Elements per storey (default: 200)')
+    parser.add_argument('--repeated-share', type=float, default=0.5,
+                        help='Fraction of elements that are repeated typed furniture (default: 0.5)')
+    parser.add_argument('--opening-share', type=float, default=0.3,
+                        help='Fraction of walls cut by a boolean opening (default: 0.3)')
+    parser.add_argument('--no-psets', action='store_true', help='Skip property sets and quantities')
+    parser.add_argument('--schema', default='IFC4', choices=['IFC2X3', 'IFC4'], help='IFC schema (default: IFC4)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+    parser.add_argument('-q', '--quiet', action='store_true', help='Quiet mode')
+
+    args = parser.parse_args()
+
+    stats = generate_ifc(
+        args.output,
+        storeys=args.storeys,
+        elements_per_storey=args.elements,
+        repeated_share=args.repeated_share,
+        opening_share=args.opening_share,
+        psets=not args.no_psets,
+        schema=args.schema,
+        seed=args.seed,
+        verbose=not args.quiet
+    )
+    sys.exit(0 if stats else 1)
+
+
+if __name__ == "__main__":
+    main()
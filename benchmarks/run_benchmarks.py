@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""
+Reproducible pipeline benchmarks on synthetic IFC models
+Generates models at one or more scales (benchmarks/generate_ifc.py), runs
+every pipeline script on them as a separate process, records wall time,
+peak RSS and output size per stage, writes machine-readable JSON and
+compares it against a previous run to flag regressions
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+
+from generate_ifc import generate_ifc
+
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# Roughly 1 KB of IFC per product with property sets, so these span 10 MB to 1 GB
+SCALES = {
+    'ci': {'storeys': 2, 'elements_per_storey': 100},
+    'small': {'storeys': 10, 'elements_per_storey': 1000},
+    'medium': {'storeys': 40, 'elements_per_storey': 2500},
+    'large': {'storeys': 100, 'elements_per_storey': 10000},
+}
+
+# (name, script, arguments, output); {ifc}, {glb} and {work} are substituted.
+# GLB tools read {glb}: the plain conversion, or the instanced one when the
+# serializer conversion is unavailable
+STAGES = [
+    ('inspect_ifc', 'inspect_ifc.py', ['{ifc}'], None),
+    ('split_ifc_by_storey', 'split_ifc_by_storey.py', ['{ifc}', '-o', '{work}/split', '-q'], '{work}/split'),
+    ('extract_ifc_properties', 'extract_ifc_properties.py', ['{ifc}', '-o', '{work}/properties.sqlite', '-q'],
+     '{work}/properties.sqlite'),
+    ('convert_ifc_to_glb', 'convert_ifc_to_glb.py', ['{ifc}', '-o', '{work}/model.glb', '-q'], '{work}/model.glb'),
+    ('convert_instanced', 'convert_ifc_to_glb.py', ['{ifc}', '-o', '{work}/instanced.glb', '--instancing', '-q'],
+     '{work}/instanced.glb'),
+    ('inspect_glb', 'inspect_glb.py', ['{glb}', '--limit', '5'], None),
+    ('instance_glb', 'instance_glb.py', ['{glb}', '-o', '{work}/gpu.glb', '-q'], '{work}/gpu.glb'),
+    ('quantize_glb', 'quantize_glb.py', ['{glb}', '-o', '{work}/quantized.glb', '-q'], '{work}/quantized.glb'),
+    ('lod_glb', 'lod_glb.py', ['{glb}', '-o', '{work}/lod.glb', '-q'], '{work}/lod.glb'),
+    ('bvh_index', 'bvh_index.py', ['{glb}', '-o', '{work}/model.bvh', '-q'], '{work}/model.bvh'),
+]
+
+
+def _output_size(path):
+    """Size in MB of a file or directory tree (None if missing)"""
+    path = Path(path)
+    if path.is_dir():
+        return sum(f.stat().st_size for f in path.rglob('*') if f.is_file()) / (1024**2)
+    if path.exists():
+        return path.stat().st_size / (1024**2)
+    return None
+
+
+# Runs a script and, at exit, writes its own peak RSS to BENCH_RSS_FILE.
+# ru_maxrss is no use here: Linux carries it over from the forking parent
+# across exec, while VmHWM belongs to the new address space only.
+_RSS_WRAPPER = """
+import os, sys, runpy, atexit, resource
+
+def _report():
+    peak_kb = None
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    peak_kb = int(line.split()[1])
+    except OSError:
+        peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == 'darwin':
+            peak_kb //= 1024
+    with open(os.environ['BENCH_RSS_FILE'], 'w') as f:
+        f.write(str(peak_kb))
+
+atexit.register(_report)
+sys.argv = sys.argv[1:]
+sys.path.insert(0, os.path.dirname(os.path.abspath(sys.argv[0])))
+runpy.run_path(sys.argv[0], run_name='__main__')
+"""
+
+
+def run_stage(script, arguments):
+    """
+    Run one pipeline script in its own process
+
+    Returns:
+        dict with wall time, peak RSS of the process (MB), CPU time,
+        return code and the tail of stderr on failure
+    """
+    with tempfile.NamedTemporaryFile(suffix='.rss', delete=False) as rss_file:
+        rss_path = Path(rss_file.name)
+    command = [sys.executable, '-c', _RSS_WRAPPER, str(REPO_ROOT / script)] + arguments
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=REPO_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                               env=dict(os.environ, BENCH_RSS_FILE=str(rss_path)))
+    stderr = process.stderr.read()
+    # wait4 gives the CPU time of exactly this child, unlike RUSAGE_CHILDREN
+    _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+
+    try:
+        peak_rss = int(rss_path.read_text()) / 1024
+    except ValueError:
+        peak_rss = None
+    finally:
+        rss_path.unlink()
+
+    result = {
+        'time_s': elapsed,
+        'cpu_time_s': usage.ru_utime + usage.ru_stime,
+        'peak_rss_mb': peak_rss,
+        'returncode': process.returncode,
+    }
+    if process.returncode:
+        result['error'] = stderr.decode('utf-8', 'replace').strip().splitlines()[-5:]
+    return result
+
+
+def benchmark_model(ifc_path, work_dir, stages=None, repeat=1, verbose=True):
+    """
+    Run the selected stages on one model
+
+    With repeat > 1 every stage runs that many times and the fastest run is
+    reported (all wall times are kept in 'runs_s').
+    """
+    work_dir = Path(work_dir)
+    work_dir.mkdir(parents=True, exist_ok=True)
+    results = {}
+
+    for name, script, arguments, output in STAGES:
+        if stages and name not in stages:
+            continue
+
+        glb = work_dir / 'model.glb'
+        if not glb.exists():
+            glb = work_dir / 'instanced.glb'
+        values = {'ifc': str(ifc_path), 'glb': str(glb), 'work': str(work_dir)}
+        if '{glb}' in arguments and not glb.exists():
+            results[name] = {'skipped': 'no GLB from a previous stage'}
+            if verbose:
+                print(f"  {name:24s} skipped (no GLB)")
+            continue
+
+        runs = []
+        for _ in range(repeat):
+            if output:
+                target = Path(output.format(**values))
+                if target.is_dir():
+                    shutil.rmtree(target)
+            runs.append(run_stage(script, [a.format(**values) for a in arguments]))
+            if runs[-1]['returncode']:
+                break
+
+        best = min(runs, key=lambda r: (r['returncode'] != 0, r['time_s']))
+        result = dict(best, runs_s=[r['time_s'] for r in runs])
+        if '{glb}' in arguments:
+            result['input'] = glb.name
+        if output:
+            result['output_mb'] = _output_size(output.format(**values))
+        results[name] = result
+
+        if verbose:
+            if result['returncode']:
+                print(f"  {name:24s} ❌ exit {result['returncode']}: {(result['error'] or ['?'])[-1]}")
+            else:
+                size = f"{result['output_mb']:9.2f} MB" if result.get('output_mb') is not None else ' ' * 12
+                rss = f"{result['peak_rss_mb']:9.1f} MB RSS" if result['peak_rss_mb'] is not None else ' ' * 16
+                print(f"  {name:24s} {result['time_s']:8.2f}s {rss} {size}")
+
+    return results
+
+
+def machine_info():
+    try:
+        import ifcopenshell
+        ifcopenshell_version = ifcopenshell.version
+    except ImportError:
+        ifcopenshell_version = None
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_ROOT, capture_output=True,
+                                text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'cpu_count': os.cpu_count(),
+        'ifcopenshell': ifcopenshell_version,
+        'commit': commit,
+    }
+
+
+def compare_results(current, baseline, threshold=0.25, min_time=0.5, verbose=True):
+    """
+    Stage-by-stage comparison against a previous results file
+
+    A stage regresses when its time or peak RSS grows by more than
+    threshold (relative) on the same scale; stages faster than min_time
+    seconds are too noisy for time comparisons.
+
+    Returns:
+        list of regression dicts
+    """
+    regressions = []
+    baseline_runs = {run['scale']: run for run in baseline.get('runs', [])}
+
+    if verbose:
+        print("-" * 60)
+        print(f"COMPARISON (threshold {threshold:.0%})")
+
+    for run in current['runs']:
+        previous = baseline_runs.get(run['scale'])
+        if previous is None:
+            continue
+        for name, stage in run['stages'].items():
+            before = previous['stages'].get(name)
+            if not before or stage.get('returncode') or before.get('returncode') or 'time_s' not in before:
+                continue
+            for metric, floor in (('time_s', min_time), ('peak_rss_mb', 0.0)):
+                if stage.get(metric) is None or before.get(metric) is None or before[metric] <= floor:
+                    continue
+                ratio = stage[metric] / before[metric]
+                if verbose:
+                    flag = " ⚠️ regression" if ratio > 1 + threshold else ""
+                    print(f"  {run['scale']:8s} {name:24s} {metric:12s} "
+                          f"{before[metric]:9.2f} → {stage[metric]:9.2f} ({ratio:5.2f}x){flag}")
+                if ratio > 1 + threshold:
+                    regressions.append({'scale': run['scale'], 'stage': name, 'metric': metric,
+                                        'baseline': before[metric], 'current': stage[metric], 'ratio': ratio})
+    return regressions
+
+
+def run_benchmarks(scales, output_path, work_dir=None, stages=None, repeat=1, model_dir=None,
+                   baseline_path=None, threshold=0.25, verbose=True):
+    """
+    Generate models, run all stages and write the results JSON
+
+    Args:
+        scales: dict of scale name -> generate_ifc() keyword arguments
+        output_path: Results JSON
+        work_dir: Directory for stage outputs (default: a temporary directory)
+        stages: Stage names to run (default: all)
+        repeat: Runs per stage, the fastest is reported
+        model_dir: Keep generated models here and reuse them on later runs
+        baseline_path: Previous results JSON to compare against
+        threshold: Relative slowdown/growth counted as a regression
+        verbose: Print progress information
+
+    Returns:
+        dict with the results, or None when regressions were found
+    """
+    temporary = None
+    if work_dir is None:
+        temporary = tempfile.TemporaryDirectory(prefix='bim-bench-')
+        work_dir = temporary.name
+    work_dir = Path(work_dir)
+    model_dir = Path(model_dir) if model_dir else work_dir / 'models'
+
+    results = {
+        'generated': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'machine': machine_info(),
+        'runs': [],
+    }
+
+    try:
+        for scale, config in scales.items():
+            if verbose:
+                print("=" * 80)
+                print(f"SCALE: {scale} ({config['storeys']} storeys x {config['elements_per_storey']} elements)")
+                print("=" * 80)
+
+            ifc_path = model_dir / f"bench_{scale}.ifc"
+            stats_path = ifc_path.with_suffix('.json')
+            stats = None
+            if ifc_path.exists() and stats_path.exists():
+                with open(stats_path) as f:
+                    stats = json.load(f)
+                if any(stats.get(key) != value for key, value in config.items()):
+                    stats = None
+            if stats is None:
+                stats = generate_ifc(ifc_path, verbose=verbose, **config)
+                with open(stats_path, 'w') as f:
+                    json.dump(stats, f, indent=2)
+            elif verbose:
+                print(f"Reusing {ifc_path} ({stats['size_mb']:.2f} MB)")
+
+            if verbose:
+                print("-" * 60)
+            stage_dir = work_dir / scale
+            if stage_dir.exists():
+                shutil.rmtree(stage_dir)
+            results['runs'].append({
+                'scale': scale,
+                'model': stats,
+                'stages': benchmark_model(ifc_path, stage_dir, stages=stages, repeat=repeat, verbose=verbose),
+            })
+    finally:
+        if temporary is not None:
+            temporary.cleanup()
+
+    regressions = []
+    if baseline_path:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        regressions = compare_results(results, baseline, threshold=threshold, verbose=verbose)
+        results['baseline'] = {'path': str(baseline_path), 'generated': baseline.get('generated'),
+                               'regressions': regressions}
+
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    if verbose:
+        print(f"\n✓ Saved: {output_path}")
+        if regressions:
+            print(f"⚠️  {len(regressions)} regression(s) against {baseline_path}")
+
+    return None if regressions else results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the pipeline scripts on synthetic IFC models',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=f"""
+Scales: {', '.join(f"{name} ({c['storeys']}x{c['elements_per_storey']})" for name, c in SCALES.items())}
+
+Examples:
+  python benchmarks/run_benchmarks.py --scales ci -o bench_ci.json
+
+  # Scaling curve, models kept for later runs
+  python benchmarks/run_benchmarks.py --scales ci,small,medium --model-dir ~/bench-models -o curve.json
+
+  # Fail on >25% slowdowns against a stored run
+  python benchmarks/run_benchmarks.py --scales ci --compare baseline.json
+        """
+    )
+    parser.add_argument('-o', '--output', default='benchmark_results.json',
+                        help='Results JSON (default: benchmark_results.json)')
+    parser.add_argument('--scales', default='ci', help='Comma-separated scales (default: ci)')
+    parser.add_argument('--storeys', type=int, help='Custom scale: storeys (with --elements)')
+    parser.add_argument('--elements', type=int, help='Custom scale: elements per storey')
+    parser.add_argument('--repeated-share', type=float, default=0.5,
+                        help='Fraction of repeated typed elements (default: 0.5)')
+    parser.add_argument('--opening-share', type=float, default=0.3,
+                        help='Fraction of walls with openings (default: 0.3)')
+    parser.add_argument('--stages', help=f'Comma-separated stages (default: all of {", ".join(s[0] for s in STAGES)})')
+    parser.add_argument('--repeat', type=int, default=1, help='Runs per stage, fastest reported (default: 1)')
+    parser.add_argument('--work-dir', help='Keep stage outputs here (default: temporary directory)')
+    parser.add_argument('--model-dir', help='Keep and reuse generated models here')
+    parser.add_argument('--compare', metavar='BASELINE', help='Previous results JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='Relative growth counted as a regression (default: 0.25)')
+    parser.add_argument('-q', '--quiet', action='store_true', help='Quiet mode')
+
+    args = parser.parse_args()
+
+    if args.storeys or args.elements:
+        scales = {'custom': {'storeys': args.storeys or 1, 'elements_per_storey': args.elements or 100}}
+    else:
+        unknown = [name for name in args.scales.split(',') if name not in SCALES]
+        if unknown:
+            parser.error(f"unknown scale(s): {', '.join(unknown)}")
+        scales = {name: dict(SCALES[name]) for name in args.scales.split(',')}
+    for config in scales.values():
+        config['repeated_share'] = args.repeated_share
+        config['opening_share'] = args.opening_share
+
+    results = run_benchmarks(
+        scales,
+        args.output,
+        work_dir=args.work_dir,
+        stages=args.stages.split(',') if args.stages else None,
+        repeat=args.repeat,
+        model_dir=args.model_dir,
+        baseline_path=args.compare,
+        threshold=args.threshold,
+        verbose=not args.quiet
+    )
+    sys.exit(0 if results else 1)
+
+
+if __name__ == "__main__":
+    main()
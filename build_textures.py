@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""
+Texture build step for the MaterialLibrary PBR sets in public/textures
+Downsamples each map once per quality tier (linear-light colour, normal
+variance folded into roughness), packs ambient occlusion, roughness and
+metalness into one ORM texture and writes a manifest.json the material
+classes pick the tier URLs from
+"""
+
+import re
+import sys
+import json
+import time
+import hashlib
+import argparse
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+
+# ambientCG naming: <Set>_<resolution>-<format>_<Map>.<ext>
+_TEXTURE_FILE = re.compile(r"^(?P<set>.+?)_(?P<resolution>\d+K)-(?:JPG|PNG)_(?P<map>[A-Za-z]+)\.(?:jpe?g|png)$",
+                           re.IGNORECASE)
+
+# ambientCG map name -> (manifest key, kind)
+SOURCE_MAPS = {
+    'Color': ('color', 'srgb'),
+    'NormalGL': ('normal', 'normal'),
+    'Roughness': ('roughness', 'linear'),
+    'Metalness': ('metalness', 'linear'),
+    'AmbientOcclusion': ('ao', 'linear'),
+    'Displacement': ('displacement', 'linear'),
+}
+
+# Built and listed, but left out of the size totals: the materials do not load them by default
+OPTIONAL_MAPS = ('displacement',)
+
+# Value used for an ORM channel whose source map is missing
+ORM_DEFAULTS = {'ao': 1.0, 'roughness': 1.0, 'metalness': 0.0}
+
+DEFAULT_TIERS = {'high': 2048, 'medium': 1024, 'low': 512}
+BUILD_DIR = 'build'
+MANIFEST_VERSION = 2
+
+# PBRMaterial flags for sampling the ORM texture as metallicTexture
+ORM_MATERIAL_FLAGS = {
+    'useAmbientOcclusionFromMetallicTextureRed': True,
+    'useRoughnessFromMetallicTextureGreen': True,
+    'useMetallnessFromMetallicTextureBlue': True,
+    'useRoughnessFromMetallicTextureAlpha': False,
+}
+
+
+def srgb_to_linear(values):
+    return np.where(values <= 0.04045, values / 12.92, ((values + 0.055) / 1.055) ** 2.4)
+
+
+def linear_to_srgb(values):
+    values = np.clip(values, 0.0, 1.0)
+    return np.where(values <= 0.0031308, values * 12.92, 1.055 * values ** (1 / 2.4) - 0.055)
+
+
+def _box_down(array):
+    """Halve an (H, W, C) array with a 2x2 box filter"""
+    h, w, c = array.shape
+    return array[:h - h % 2, :w - w % 2].reshape(h // 2, 2, w // 2, 2, c).mean(axis=(1, 3))
+
+
+def halved_levels(array, kind, min_size=1):
+    """
+    Successive 2x2 reductions of an (H, W, C) float image in [0, 1], largest first
+
+    Colour is averaged in linear light, normals are decoded, averaged and
+    renormalised; for normal maps the length lost by averaging (how much
+    the normals disagree) is returned too, so roughness can absorb it.
+
+    Returns:
+        (levels, variances): lists of arrays; variances is None except for
+        normal maps
+    """
+    if kind == 'srgb':
+        work = srgb_to_linear(array)
+    elif kind == 'normal':
+        work = array * 2.0 - 1.0
+    else:
+        work = array
+
+    levels = [work]
+    variances = [np.zeros(work.shape[:2] + (1,), dtype=np.float32)] if kind == 'normal' else None
+    while min(levels[-1].shape[:2]) > min_size:
+        level = _box_down(levels[-1])
+        if kind == 'normal':
+            length = np.linalg.norm(level, axis=2, keepdims=True)
+            # Toksvig: 1/|n| - 1 approximates the variance of the averaged normals
+            variances.append((1.0 / np.maximum(length, 1e-4) - 1.0).astype(np.float32))
+            level = level / np.maximum(length, 1e-4)
+        levels.append(level)
+
+    if kind == 'srgb':
+        levels = [linear_to_srgb(level) for level in levels]
+    elif kind == 'normal':
+        levels = [level * 0.5 + 0.5 for level in levels]
+    return levels, variances
+
+
+def _load(path, kind, size):
+    image = Image.open(path)
+    image = image.convert('RGB' if kind in ('srgb', 'normal') else 'L')
+    if image.size != (size, size):
+        image = image.resize((size, size), Image.LANCZOS)
+    array = np.asarray(image, dtype=np.float32) / 255.0
+    return array if array.ndim == 3 else array[:, :, None]
+
+
+def _save(array, path, quality):
+    data = np.clip(np.rint(array * 255.0), 0, 255).astype(np.uint8)
+    image = Image.fromarray(data[:, :, 0] if data.shape[2] == 1 else data)
+    # 4:4:4 so packed channels and normal components do not bleed into each other
+    image.save(path, quality=quality, subsampling=0, optimize=True)
+    return path.stat().st_size
+
+
+def gpu_bytes(size, channels=4):
+    """GPU memory of a square RGBA8 texture with the mip chain the engine generates"""
+    total = 0
+    while size:
+        total += size * size * channels
+        size //= 2
+    return total
+
+
+def find_texture_sets(root):
+    """{set directory: {set name: {ambientCG map name: path}}} below root (build output skipped)"""
+    sets = {}
+    for path in sorted(Path(root).rglob('*')):
+        if BUILD_DIR in path.relative_to(root).parts or not path.is_file():
+            continue
+        match = _TEXTURE_FILE.match(path.name)
+        if match and match.group('map') in SOURCE_MAPS:
+            sets.setdefault(path.parent, {}).setdefault(match.group('set'), {})[match.group('map')] = path
+    return sets
+
+
+def _source_signature(sources):
+    # Content hashes rather than mtimes, so a fresh checkout of the committed
+    # manifest and build outputs is recognised as up to date
+    return {name: [path.stat().st_size, hashlib.sha1(path.read_bytes()).hexdigest()]
+            for name, path in sorted(sources.items())}
+
+
+def build_texture_set(name, sources, output_dir, url, tiers, quality=85):
+    """
+    Build one texture set
+
+    Only the levels a tier selects are written; the engine generates the
+    mipmaps of whichever image a material loads.
+
+    Args:
+        name: Set name (e.g. Bricks051)
+        sources: ambientCG map name -> source image path
+        output_dir: Directory for the generated images
+        url: URL of output_dir as the viewer sees it
+        tiers: tier name -> maximum edge length
+        quality: JPEG quality
+
+    Returns:
+        Manifest entry for the set
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    size = max(Image.open(path).size[0] for path in sources.values())
+    size = 1 << (size - 1).bit_length()  # power of two, as WebGL mipmapping needs
+
+    # Edge length of each tier: the largest power-of-two level that fits it
+    tier_sizes = {tier: max(min(size, 1 << (tier_size.bit_length() - 1)), 1) for tier, tier_size in tiers.items()}
+    min_size = min(tier_sizes.values())
+
+    chains = {}
+    normal_variance = None
+    for map_name, path in sources.items():
+        key, kind = SOURCE_MAPS[map_name]
+        chains[key], variances = halved_levels(_load(path, kind, size), kind, min_size)
+        if variances is not None:
+            normal_variance = variances
+
+    # ORM: R = ambient occlusion, G = roughness, B = metalness
+    orm_present = {key: key in chains for key in ORM_DEFAULTS}
+    if any(orm_present.values()):
+        levels = []
+        reference = next(chains[key] for key in ORM_DEFAULTS if key in chains)
+        for level, shape in enumerate(array.shape for array in reference):
+            channels = []
+            for key in ('ao', 'roughness', 'metalness'):
+                if key in chains:
+                    channel = chains[key][level]
+                else:
+                    channel = np.full(shape[:2] + (1,), ORM_DEFAULTS[key], dtype=np.float32)
+                if key == 'roughness' and normal_variance is not None:
+                    # Surface detail averaged away in smaller levels becomes roughness
+                    channel = np.sqrt(np.clip(channel ** 2 + normal_variance[level], 0.0, 1.0))
+                channels.append(channel)
+            levels.append(np.concatenate(channels, axis=2))
+        chains['orm'] = levels
+    for key in ORM_DEFAULTS:
+        chains.pop(key, None)
+
+    # (map, edge length) -> {'url', 'bytes'} for the levels some tier uses
+    written = {}
+    for key, levels in chains.items():
+        for array in levels:
+            level_size = array.shape[0]
+            if level_size in tier_sizes.values():
+                filename = f"{name}_{key}_{level_size}.jpg"
+                written[key, level_size] = {
+                    'url': f"{url}/{filename}",
+                    'bytes': _save(array, output_dir / filename, quality),
+                }
+    # Levels from earlier builds (other tiers, or the full chain)
+    current = {f"{name}_{key}_{level_size}.jpg" for key, level_size in written}
+    for path in output_dir.glob(f"{name}_*.jpg"):
+        if path.name not in current:
+            path.unlink()
+
+    entry = {
+        'size': size,
+        'maps': sorted(chains),
+        'orm': orm_present,
+        'tiers': {},
+    }
+    for tier, tier_size in tier_sizes.items():
+        textures = {}
+        download = 0
+        memory = 0
+        for key in chains:
+            textures[key] = written[key, tier_size]['url']
+            if key not in OPTIONAL_MAPS:
+                download += written[key, tier_size]['bytes']
+                memory += gpu_bytes(tier_size)
+        entry['tiers'][tier] = dict(textures, size=tier_size, bytes=download, gpuBytes=memory)
+
+    # What the material classes load today: every source map at full size
+    loaded = [path for map_name, path in sources.items() if SOURCE_MAPS[map_name][0] not in OPTIONAL_MAPS]
+    entry['source'] = {
+        'textures': len(loaded),
+        'bytes': sum(path.stat().st_size for path in loaded),
+        'gpuBytes': gpu_bytes(size) * len(loaded),
+    }
+    return entry
+
+
+def build_textures(root='public/textures', url_prefix='/textures', tiers=None, quality=85,
+                   force=False, verbose=True):
+    """
+    Build every texture set below root and write root/manifest.json
+
+    Unchanged sets (same source file contents, same options) are kept from
+    the previous manifest unless force is set.
+
+    Returns:
+        dict with per-set metrics, or None if no texture set was found
+    """
+    root = Path(root)
+    tiers = tiers or DEFAULT_TIERS
+    start_time = time.time()
+
+    manifest_path = root / 'manifest.json'
+    previous = {}
+    if manifest_path.exists() and not force:
+        try:
+            previous = json.loads(manifest_path.read_text()).get('sets', {})
+        except (OSError, json.JSONDecodeError):
+            previous = {}
+
+    texture_sets = find_texture_sets(root)
+    if not texture_sets:
+        print(f"Error: no ambientCG texture sets found below {root}")
+        return None
+
+    options = {'tiers': tiers, 'quality': quality}
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'tiers': tiers,
+        'ormChannels': {'r': 'ambientOcclusion', 'g': 'roughness', 'b': 'metalness'},
+        'ormMaterialFlags': ORM_MATERIAL_FLAGS,
+        'sets': {},
+    }
+
+    if verbose:
+        print("=" * 80)
+        print("BUILDING TEXTURES")
+        print("=" * 80)
+
+    built = 0
+    for directory, named in texture_sets.items():
+        relative = directory.relative_to(root).as_posix()
+        for name, sources in named.items():
+            signature = _source_signature(sources)
+            cached = previous.get(name)
+            if cached and cached.get('signature') == signature and cached.get('options') == options \
+                    and (directory / BUILD_DIR).is_dir():
+                manifest['sets'][name] = cached
+                if verbose:
+                    print(f"\n✓ {name}: unchanged, skipped")
+                continue
+
+            set_start = time.time()
+            entry = build_texture_set(name, sources, directory / BUILD_DIR,
+                                      f"{url_prefix.rstrip('/')}/{relative}/{BUILD_DIR}",
+                                      tiers, quality=quality)
+            entry['path'] = relative
+            entry['signature'] = signature
+            entry['options'] = options
+            manifest['sets'][name] = entry
+            built += 1
+
+            if verbose:
+                missing = sorted(set(SOURCE_MAPS) - set(sources))
+                print(f"\n{name} ({relative}, {entry['size']}px, {time.time() - set_start:.1f}s)")
+                print(f"  Maps: {', '.join(entry['maps'])}" + (f"  (missing: {', '.join(missing)})" if missing else ""))
+                source = entry['source']
+                print(f"  Source:   {source['bytes'] / 1024**2:7.2f} MB download, "
+                      f"{source['gpuBytes'] / 1024**2:7.1f} MB GPU ({source['textures']} textures)")
+                for tier, info in entry['tiers'].items():
+                    print(f"  {tier:8s}: {info['bytes'] / 1024**2:7.2f} MB download, "
+                          f"{info['gpuBytes'] / 1024**2:7.1f} MB GPU ({info['size']}px)")
+
+    manifest_path.write_text(json.dumps(manifest, indent=2))
+
+    metrics = {
+        'sets': len(manifest['sets']),
+        'built': built,
+        'total_time_s': time.time() - start_time,
+        'manifest': str(manifest_path),
+    }
+    if verbose:
+        print("-" * 60)
+        print(f"✓ {built} set(s) built, {metrics['sets'] - built} unchanged, {metrics['total_time_s']:.1f}s")
+        print(f"✓ Saved: {manifest_path}")
+    return metrics
+
+
+def _parse_tiers(text):
+    tiers = {}
+    for item in text.split(','):
+        name, _, size = item.partition('=')
+        tiers[name.strip()] = int(size)
+    return tiers
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Build ORM textures and quality tiers for the PBR texture sets',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python build_textures.py
+
+  # Custom tiers
+  python build_textures.py public/textures --tiers high=2048,medium=1024,low=256
+        """
+    )
+    parser.add_argument('root', nargs='?', default='public/textures',
+                        help='Texture root directory (default: public/textures)')
+    parser.add_argument('--url-prefix', default='/textures',
+                        help='URL the root directory is served at (default: /textures)')
+    parser.add_argument('--tiers', type=_parse_tiers, default=DEFAULT_TIERS,
+                        help='Quality tiers as name=max_size pairs (default: high=2048,medium=1024,low=512)')
+    parser.add_argument('--quality', type=int, default=85, help='JPEG quality (default: 85)')
+    parser.add_argument('--force', action='store_true', help='Rebuild sets whose sources did not change')
+    parser.add_argument('-q', '--quiet', action='store_true', help='Quiet mode')
+
+    args = parser.parse_args()
+
+    metrics = build_textures(
+        args.root,
+        url_prefix=args.url_prefix,
+        tiers=args.tiers,
+        quality=args.quality,
+        force=args.force,
+        verbose=not args.quiet
+    )
+    sys.exit(0 if metrics else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,548 @@
+#!/usr/bin/env python3
+"""
+Array-backed BVH over the world AABBs of every element in a GLB
+Builds a binned-SAH bounding volume hierarchy from inspect_glb.world_bounds()
+(one entry per mesh node or GPU instance, keyed by node index and GlobalId),
+writes it as a compact binary sidecar for the viewer's picking and coarse
+culling, and answers ray, box and k-nearest queries in Python
+"""
+
+import sys
+import json
+import time
+import heapq
+import struct
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+from glb_reader import GLBError, GLBReader
+from inspect_glb import world_bounds
+
+
+BVH_MAGIC = b'BVH1'
+BVH_VERSION = 1
+
+# magic, version, element count, node count, JSON length
+_HEADER = struct.Struct('<4sIIII')
+
+MAX_LEAF_SIZE = 4
+SAH_BINS = 16
+
+
+def _area(lo, hi):
+    """Surface area of AABBs given as (..., 3) min/max arrays (0 for empty boxes)"""
+    d = np.maximum(hi - lo, 0.0)
+    return 2.0 * (d[..., 0] * d[..., 1] + d[..., 1] * d[..., 2] + d[..., 2] * d[..., 0])
+
+
+def _split(bounds, centroids):
+    """
+    Binned SAH split of one node's elements
+
+    Returns:
+        boolean mask of the elements going left, or None for a leaf
+    """
+    count = len(bounds)
+    if count <= MAX_LEAF_SIZE:
+        return None
+    c_lo = centroids.min(axis=0)
+    c_hi = centroids.max(axis=0)
+    extent = c_hi - c_lo
+    axis = int(np.argmax(extent))
+    if extent[axis] <= 0:
+        # All centroids coincide: split by order to bound the leaf size
+        mask = np.zeros(count, dtype=bool)
+        mask[:count // 2] = True
+        return mask
+
+    bins = np.minimum(((centroids[:, axis] - c_lo[axis]) / extent[axis] * SAH_BINS).astype(np.int64), SAH_BINS - 1)
+    bin_lo = np.full((SAH_BINS, 3), np.inf)
+    bin_hi = np.full((SAH_BINS, 3), -np.inf)
+    np.minimum.at(bin_lo, bins, bounds[:, 0])
+    np.maximum.at(bin_hi, bins, bounds[:, 1])
+    bin_count = np.bincount(bins, minlength=SAH_BINS)
+
+    # Candidate split after bin i: left = bins[:i+1], right = bins[i+1:]
+    left_area = _area(np.minimum.accumulate(bin_lo)[:-1], np.maximum.accumulate(bin_hi)[:-1])
+    right_area = _area(np.minimum.accumulate(bin_lo[::-1])[::-1][1:], np.maximum.accumulate(bin_hi[::-1])[::-1][1:])
+    left_count = np.cumsum(bin_count)[:-1]
+    right_count = count - left_count
+    cost = left_area * left_count + right_area * right_count
+    cost[(left_count == 0) | (right_count == 0)] = np.inf
+
+    best = int(np.argmin(cost))
+    if not np.isfinite(cost[best]):
+        mask = np.zeros(count, dtype=bool)
+        mask[np.argsort(centroids[:, axis], kind='stable')[:count // 2]] = True
+        return mask
+    return bins <= best
+
+
+class BVH:
+    """
+    Flattened bounding volume hierarchy
+
+    Nodes are stored depth-first: the left child of an internal node i is
+    i + 1, node_offset[i] is its right child. For a leaf node_count[i] > 0
+    and node_offset[i] is its first element in the reordered element arrays.
+
+    Attributes:
+        node_bounds: (M, 2, 3) float32 node AABBs
+        node_offset, node_count: (M,) int32
+        bounds: (N, 2, 3) float32 element AABBs in BVH order
+        node_indices, instance_indices: (N,) int32 glTF node / GPU instance (-1) of each element
+        global_ids: N GlobalIds (None where the node has none)
+    """
+
+    def __init__(self, node_bounds, node_offset, node_count, bounds, node_indices, instance_indices, global_ids):
+        self.node_bounds = node_bounds
+        self.node_offset = node_offset
+        self.node_count = node_count
+        self.bounds = bounds
+        self.node_indices = node_indices
+        self.instance_indices = instance_indices
+        self.global_ids = global_ids
+
+    def __len__(self):
+        return len(self.bounds)
+
+    @classmethod
+    def build(cls, bounds, node_indices, instance_indices, global_ids):
+        """Binned-SAH BVH over (N, 2, 3) element AABBs"""
+        bounds = np.asarray(bounds, dtype=np.float64)
+        centroids = bounds.mean(axis=1)
+        order = np.arange(len(bounds))
+
+        node_lo, node_hi, node_offset, node_count = [], [], [], []
+        # (start, end) ranges of `order`, and the parent whose right child is pending
+        stack = [(0, len(bounds), -1)]
+        while stack:
+            start, end, parent = stack.pop()
+            index = len(node_offset)
+            if parent >= 0:
+                node_offset[parent] = index
+
+            elements = order[start:end]
+            node_lo.append(bounds[elements, 0].min(axis=0) if len(elements) else np.zeros(3))
+            node_hi.append(bounds[elements, 1].max(axis=0) if len(elements) else np.zeros(3))
+
+            mask = _split(bounds[elements], centroids[elements]) if len(elements) > 1 else None
+            if mask is None:
+                node_offset.append(start)
+                node_count.append(end - start)
+                continue
+
+            order[start:end] = np.concatenate([elements[mask], elements[~mask]])
+            middle = start + int(mask.sum())
+            node_offset.append(-1)
+            node_count.append(0)
+            # Left child is visited next so it lands at index + 1
+            stack.append((middle, end, index))
+            stack.append((start, middle, -1))
+
+        # float32 storage, rounded outwards so no box shrinks
+        node_bounds = np.stack([
+            np.nextafter(np.array(node_lo, dtype=np.float32), np.float32(-np.inf)),
+            np.nextafter(np.array(node_hi, dtype=np.float32), np.float32(np.inf)),
+        ], axis=1)
+        element_bounds = np.stack([
+            np.nextafter(bounds[order, 0].astype(np.float32), np.float32(-np.inf)),
+            np.nextafter(bounds[order, 1].astype(np.float32), np.float32(np.inf)),
+        ], axis=1)
+        return cls(
+            node_bounds,
+            np.array(node_offset, dtype=np.int32),
+            np.array(node_count, dtype=np.int32),
+            element_bounds,
+            np.asarray(node_indices, dtype=np.int32)[order],
+            np.asarray(instance_indices, dtype=np.int32)[order],
+            [global_ids[i] for i in order],
+        )
+
+    @classmethod
+    def from_glb(cls, glb):
+        """BVH over every mesh node / GPU instance in the active scene of an open GLBReader"""
+        bounds = world_bounds(glb)
+        nodes = glb.json.get('nodes', [])
+        global_ids = []
+        for node_index, instance in zip(bounds['node_indices'], bounds['instance_indices']):
+            extras = nodes[node_index].get('extras', {})
+            if instance >= 0 and 'globalIds' in extras:
+                global_ids.append(extras['globalIds'][instance])
+            else:
+                global_ids.append(extras.get('globalId'))
+        return cls.build(bounds['nodes'], bounds['node_indices'], bounds['instance_indices'], global_ids)
+
+    # ------------------------------------------------------------------
+    # Sidecar file
+    # ------------------------------------------------------------------
+
+    def save(self, path):
+        """
+        Write the binary sidecar
+
+        Layout (little endian, every section 4-byte aligned):
+            header      'BVH1', version, element count N, node count M, JSON length
+            node_bounds float32 M x 2 x 3
+            node_offset int32 M
+            node_count  int32 M
+            bounds      float32 N x 2 x 3
+            node_index  int32 N
+            instance    int32 N
+            JSON        {"globalIds": [...]} padded with spaces
+
+        Returns:
+            file size in bytes
+        """
+        metadata = json.dumps({'globalIds': self.global_ids}, separators=(',', ':')).encode('utf-8')
+        metadata += b' ' * (-len(metadata) % 4)
+        with open(path, 'wb') as f:
+            f.write(_HEADER.pack(BVH_MAGIC, BVH_VERSION, len(self.bounds), len(self.node_offset), len(metadata)))
+            for array, dtype in ((self.node_bounds, '<f4'), (self.node_offset, '<i4'), (self.node_count, '<i4'),
+                                 (self.bounds, '<f4'), (self.node_indices, '<i4'), (self.instance_indices, '<i4')):
+                f.write(np.ascontiguousarray(array, dtype=dtype).tobytes())
+            f.write(metadata)
+        return Path(path).stat().st_size
+
+    @classmethod
+    def load(cls, path):
+        """Read a sidecar written by save()"""
+        data = Path(path).read_bytes()
+        if len(data) < _HEADER.size:
+            raise ValueError(f"{path}: too small to be a BVH sidecar")
+        magic, version, elements, nodes, json_length = _HEADER.unpack_from(data, 0)
+        if magic != BVH_MAGIC or version != BVH_VERSION:
+            raise ValueError(f"{path}: not a version {BVH_VERSION} BVH sidecar")
+
+        offset = _HEADER.size
+
+        def take(dtype, shape):
+            nonlocal offset
+            array = np.frombuffer(data, dtype=dtype, count=int(np.prod(shape)), offset=offset).reshape(shape)
+            offset += array.nbytes
+            return array
+
+        node_bounds = take('<f4', (nodes, 2, 3))
+        node_offset = take('<i4', (nodes,))
+        node_count = take('<i4', (nodes,))
+        bounds = take('<f4', (elements, 2, 3))
+        node_indices = take('<i4', (elements,))
+        instance_indices = take('<i4', (elements,))
+        metadata = json.loads(data[offset:offset + json_length].decode('utf-8'))
+        return cls(node_bounds, node_offset, node_count, bounds, node_indices, instance_indices,
+                   metadata['globalIds'])
+
+    # ------------------------------------------------------------------
+    # Queries (results are element indices in BVH order)
+    # ------------------------------------------------------------------
+
+    def element(self, index):
+        """(glTF node index, GPU instance or -1, GlobalId) of an element"""
+        return int(self.node_indices[index]), int(self.instance_indices[index]), self.global_ids[index]
+
+    def _leaf(self, node):
+        start = self.node_offset[node]
+        return start, start + self.node_count[node]
+
+    def query_box(self, lo, hi):
+        """Elements whose AABB overlaps the box [lo, hi]"""
+        lo = np.asarray(lo, dtype=np.float32)
+        hi = np.asarray(hi, dtype=np.float32)
+        result = []
+        if not len(self.bounds):
+            return np.array(result, dtype=np.int64)
+
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            box = self.node_bounds[node]
+            if (box[0] > hi).any() or (box[1] < lo).any():
+                continue
+            if self.node_count[node]:
+                start, end = self._leaf(node)
+                leaf = self.bounds[start:end]
+                hits = ((leaf[:, 0] <= hi) & (leaf[:, 1] >= lo)).all(axis=1)
+                result.extend(start + np.flatnonzero(hits))
+            else:
+                stack.append(self.node_offset[node])
+                stack.append(node + 1)
+        return np.array(result, dtype=np.int64)
+
+    @staticmethod
+    def _slab(boxes, origin, inverse, max_distance):
+        """Entry distance of a ray into each (K, 2, 3) box, inf on a miss"""
+        with np.errstate(invalid='ignore'):
+            t0 = (boxes[:, 0] - origin) * inverse
+            t1 = (boxes[:, 1] - origin) * inverse
+        # 0 * inf on axis-parallel rays starting on a slab plane: treat as inside
+        t0 = np.where(np.isnan(t0), -np.inf, t0)
+        t1 = np.where(np.isnan(t1), np.inf, t1)
+        near = np.maximum(np.minimum(t0, t1).max(axis=1), 0.0)
+        far = np.minimum(np.maximum(t0, t1).min(axis=1), max_distance)
+        return np.where(near <= far, near, np.inf)
+
+    def query_ray(self, origin, direction, max_distance=np.inf):
+        """
+        Elements whose AABB the ray hits, nearest entry first
+
+        Returns:
+            (element indices, entry distances in units of |direction|)
+        """
+        origin = np.asarray(origin, dtype=np.float64)
+        with np.errstate(divide='ignore'):
+            inverse = 1.0 / np.asarray(direction, dtype=np.float64)
+        elements, distances = [], []
+        if not len(self.bounds):
+            return np.array(elements, dtype=np.int64), np.array(distances)
+
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            if self.node_count[node]:
+                start, end = self._leaf(node)
+                t = self._slab(self.bounds[start:end], origin, inverse, max_distance)
+                hit = np.flatnonzero(np.isfinite(t))
+                elements.extend(start + hit)
+                distances.extend(t[hit])
+                continue
+            children = (node + 1, self.node_offset[node])
+            t = self._slab(self.node_bounds[list(children)], origin, inverse, max_distance)
+            # Push the farther child first so the nearer one is traversed first
+            for k in np.argsort(-t):
+                if np.isfinite(t[k]):
+                    stack.append(children[k])
+
+        elements = np.array(elements, dtype=np.int64)
+        distances = np.array(distances)
+        order = np.argsort(distances, kind='stable')
+        return elements[order], distances[order]
+
+    def query_nearest(self, point, k=1):
+        """
+        The k elements whose AABB is closest to a point (0 inside the box)
+
+        Returns:
+            (element indices, distances), nearest first
+        """
+        point = np.asarray(point, dtype=np.float64)
+
+        def box_distance(boxes):
+            delta = np.maximum(np.maximum(boxes[:, 0] - point, point - boxes[:, 1]), 0.0)
+            return np.sqrt((delta * delta).sum(axis=1))
+
+        best = []  # max-heap of (-distance, element)
+        if not len(self.bounds) or k <= 0:
+            return np.array([], dtype=np.int64), np.array([])
+
+        queue = [(float(box_distance(self.node_bounds[:1])[0]), 0)]
+        while queue:
+            distance, node = heapq.heappop(queue)
+            if len(best) == k and distance > -best[0][0]:
+                break
+            if self.node_count[node]:
+                start, end = self._leaf(node)
+                for offset, d in enumerate(box_distance(self.bounds[start:end])):
+                    if len(best) < k:
+                        heapq.heappush(best, (-d, start + offset))
+                    elif d < -best[0][0]:
+                        heapq.heapreplace(best, (-d, start + offset))
+                continue
+            children = (node + 1, int(self.node_offset[node]))
+            for child, d in zip(children, box_distance(self.node_bounds[list(children)])):
+                if len(best) < k or d <= -best[0][0]:
+                    heapq.heappush(queue, (float(d), child))
+
+        best.sort(key=lambda item: (-item[0], item[1]))
+        return (np.array([element for _, element in best], dtype=np.int64),
+                np.array([-d for d, _ in best]))
+
+    def depth(self):
+        """Maximum leaf depth"""
+        deepest = 0
+        stack = [(0, 1)]
+        while stack:
+            node, level = stack.pop()
+            deepest = max(deepest, level)
+            if not self.node_count[node]:
+                stack.append((node + 1, level + 1))
+                stack.append((int(self.node_offset[node]), level + 1))
+        return deepest
+
+
+# ----------------------------------------------------------------------
+# Brute-force reference queries (benchmark baseline)
+# ----------------------------------------------------------------------
+
+def brute_box(bounds, lo, hi):
+    return np.flatnonzero(((bounds[:, 0] <= hi) & (bounds[:, 1] >= lo)).all(axis=1))
+
+
+def brute_ray(bounds, origin, direction, max_distance=np.inf):
+    with np.errstate(divide='ignore'):
+        inverse = 1.0 / np.asarray(direction, dtype=np.float64)
+    t = BVH._slab(bounds, np.asarray(origin, dtype=np.float64), inverse, max_distance)
+    hit = np.flatnonzero(np.isfinite(t))
+    order = np.argsort(t[hit], kind='stable')
+    return hit[order], t[hit][order]
+
+
+def brute_nearest(bounds, point, k=1):
+    delta = np.maximum(np.maximum(bounds[:, 0] - point, point - bounds[:, 1]), 0.0)
+    distance = np.sqrt((delta * delta).sum(axis=1))
+    order = np.lexsort((np.arange(len(distance)), distance))[:k]
+    return order, distance[order]
+
+
+def benchmark(bvh, queries=1000, k=8, seed=0, verbose=True):
+    """
+    Time random ray, box and k-nearest queries against brute-force scans and
+    check that both return the same elements
+
+    Returns:
+        dict per query type with bvh/brute-force microseconds per query,
+        speedup and mismatch count
+    """
+    rng = np.random.default_rng(seed)
+    bounds = bvh.bounds.astype(np.float64)
+    scene_lo = bounds[:, 0].min(axis=0)
+    scene_hi = bounds[:, 1].max(axis=0)
+    size = scene_hi - scene_lo
+
+    points = scene_lo + rng.random((queries, 3)) * size
+    directions = rng.normal(size=(queries, 3))
+    directions /= np.linalg.norm(directions, axis=1, keepdims=True)
+    # Boxes of about 1% of the scene extent per axis (a picking/culling region)
+    half = size * 0.01 * rng.random((queries, 1))
+
+    cases = {
+        'ray': (lambda i: bvh.query_ray(points[i], directions[i])[0],
+                lambda i: brute_ray(bounds, points[i], directions[i])[0], False),
+        'box': (lambda i: bvh.query_box(points[i] - half[i], points[i] + half[i]),
+                lambda i: brute_box(bounds, points[i] - half[i], points[i] + half[i]), True),
+        'nearest': (lambda i: bvh.query_nearest(points[i], k)[1],
+                    lambda i: brute_nearest(bounds, points[i], k)[1], False),
+    }
+
+    results = {}
+    for name, (fast, slow, as_set) in cases.items():
+        timings = []
+        outputs = []
+        for function in (fast, slow):
+            start = time.perf_counter()
+            outputs.append([function(i) for i in range(queries)])
+            timings.append((time.perf_counter() - start) / queries * 1e6)
+
+        mismatches = 0
+        for a, b in zip(*outputs):
+            if as_set:
+                same = np.array_equal(np.sort(a), np.sort(b))
+            else:
+                # Rays compare hit sets (ties in distance may reorder), nearest compares distances
+                same = (np.array_equal(np.sort(a), np.sort(b)) if name == 'ray'
+                        else np.allclose(a, b, rtol=1e-5, atol=1e-6))
+            mismatches += not same
+
+        results[name] = {
+            'bvh_us': timings[0],
+            'brute_force_us': timings[1],
+            'speedup': timings[1] / timings[0] if timings[0] else 0.0,
+            'mismatches': mismatches,
+        }
+
+    if verbose:
+        print("-" * 60)
+        print(f"BENCHMARK ({queries:,} random queries each, k={k})")
+        print(f"  {'query':10s} {'BVH':>12s} {'brute force':>14s} {'speedup':>9s}  mismatches")
+        for name, result in results.items():
+            print(f"  {name:10s} {result['bvh_us']:10.1f}µs {result['brute_force_us']:12.1f}µs "
+                  f"{result['speedup']:8.1f}x  {result['mismatches']}")
+
+    return results
+
+
+def build_bvh_index(glb_path, output_path=None, queries=0, verbose=True):
+    """
+    Build the BVH sidecar for a GLB
+
+    Args:
+        glb_path: Input GLB
+        output_path: Sidecar path (default: <input>.bvh)
+        queries: Run a benchmark with this many random queries per type (0 = none)
+        verbose: Print progress information
+
+    Returns:
+        dict with metrics, or None on error
+    """
+    glb_path = Path(glb_path)
+    output_path = Path(output_path) if output_path else glb_path.with_suffix('.bvh')
+
+    if verbose:
+        print("=" * 80)
+        print(f"BVH INDEX: {glb_path}")
+        print("=" * 80)
+
+    start_time = time.time()
+    try:
+        with GLBReader(glb_path) as glb:
+            bvh = BVH.from_glb(glb)
+    except GLBError as e:
+        print(f"❌ {e}")
+        return None
+    build_time = time.time() - start_time
+
+    if not len(bvh):
+        print("❌ No geometry in the active scene")
+        return None
+
+    size = bvh.save(output_path)
+    leaves = int((bvh.node_count > 0).sum())
+    metrics = {
+        'elements': len(bvh),
+        'nodes': len(bvh.node_offset),
+        'leaves': leaves,
+        'depth': bvh.depth(),
+        'with_global_id': sum(1 for g in bvh.global_ids if g),
+        'sidecar_bytes': size,
+        'build_time_s': build_time,
+    }
+
+    if verbose:
+        print(f"  Elements: {metrics['elements']:,} ({metrics['with_global_id']:,} with GlobalId)")
+        print(f"  Nodes: {metrics['nodes']:,} ({leaves:,} leaves, depth {metrics['depth']})")
+        print(f"  Build time: {build_time:.2f}s")
+        print(f"\n✓ Saved: {output_path} ({size / 1024:.1f} KB)")
+
+    if queries:
+        metrics['benchmark'] = benchmark(BVH.load(output_path), queries=queries, verbose=verbose)
+
+    return metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Build a BVH sidecar over the world AABBs of every element in a GLB',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python bvh_index.py bilton_baseline.glb
+
+  # Compare ray/box/k-nearest queries against brute-force scans
+  python bvh_index.py bilton_baseline.glb --benchmark 2000
+        """
+    )
+    parser.add_argument('input', help='Input GLB file')
+    parser.add_argument('-o', '--output', help='Output sidecar (default: input.bvh)')
+    parser.add_argument('--benchmark', type=int, default=0, metavar='N',
+                        help='Time N random queries of each type against brute force')
+    parser.add_argument('-q', '--quiet', action='store_true', help='Quiet mode')
+
+    args = parser.parse_args()
+
+    metrics = build_bvh_index(args.input, output_path=args.output, queries=args.benchmark, verbose=not args.quiet)
+    sys.exit(0 if metrics else 1)
+
+
+if __name__ == "__main__":
+    main()
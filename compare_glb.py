@@ -1,29 +1,35 @@
 #!/usr/bin/env python3
 """
 Compare two GLB files to find differences
+With --diff, match nodes by GlobalId/name and report the elements added,
+removed or modified between two conversions, optionally writing a delta
+GLB with only the changed elements
 """
 
 import sys
 import json
-import struct
+import time
+import hashlib
+import argparse
 from pathlib import Path
 
-def extract_gltf_json(glb_path):
-    """Extract the JSON chunk from a GLB file"""
-    with open(glb_path, 'rb') as f:
-        # Read GLB header
-        magic = f.read(4)
-        version = struct.unpack('<I', f.read(4))[0]
-        length = struct.unpack('<I', f.read(4))[0]
+import numpy as np
+
+from glb_reader import GLBError, GLBReader, read_gltf_json
+from glb_writer import TEXTURE_SLOTS, compact, matrix_to_gltf
+from inspect_glb import instance_matrices, node_world_matrices
+from instance_glb import UNSUPPORTED_EXTENSIONS, AccessorHasher
 
-        # Read JSON chunk
-        chunk_length = struct.unpack('<I', f.read(4))[0]
-        chunk_type = f.read(4)
+# Transforms are compared after rounding to this many decimals (µm in metres)
+TRANSFORM_DECIMALS = 6
 
-        if chunk_type == b'JSON':
-            json_data = f.read(chunk_length).decode('utf-8')
-            return json.loads(json_data)
-    return None
+def extract_gltf_json(glb_path):
+    """Extract the JSON chunk from a GLB file"""
+    try:
+        return read_gltf_json(glb_path)
+    except GLBError as e:
+        print(f"ERROR: {e}")
+        return None
 
 def compare_glbs(file1, file2):
     """Compare two GLB files"""
@@ -152,9 +158,296 @@ def compare_glbs(file1, file2):
     print("COMPARISON COMPLETE")
     print("=" * 80)
 
-if __name__ == "__main__":
-    if len(sys.argv) < 3:
-        print("Usage: python compare_glb.py <file1.glb> <file2.glb>")
-        sys.exit(1)
 
-    compare_glbs(sys.argv[1], sys.argv[2])
+def _digest(*parts):
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else str(part).encode())
+    return h.hexdigest()
+
+
+def node_key(node, index):
+    """Identity of a node across conversions: GlobalId extras, else its name"""
+    extras = node.get('extras') or {}
+    return extras.get('globalId') or extras.get('guid') or node.get('name') or f"#{index}"
+
+
+class NodeSignatures:
+    """
+    Geometry, material and transform hashes of every node that draws a mesh
+
+    Accessor contents are hashed straight from the memory-mapped BIN chunk,
+    once per accessor, so meshes shared by several nodes cost nothing extra
+    and the layout (offsets, strides, interleaving) does not matter.
+    """
+
+    def __init__(self, glb):
+        used = set(glb.json.get('extensionsUsed', [])) & set(UNSUPPORTED_EXTENSIONS)
+        if used:
+            raise GLBError(f"{glb.path}: {', '.join(sorted(used))} buffers cannot be compared, "
+                           f"diff the GLBs before gltfpack")
+        self.glb = glb
+        self.hasher = AccessorHasher(glb)
+        self._meshes = {}
+        self._materials = {}
+        self._images = {}
+
+    def image(self, index):
+        digest = self._images.get(index)
+        if digest is None:
+            image = self.glb.json['images'][index]
+            if 'bufferView' in image:
+                digest = _digest(image.get('mimeType'), self.glb.buffer_view(image['bufferView']).tobytes())
+            else:
+                digest = _digest(image.get('uri'))
+            self._images[index] = digest
+        return digest
+
+    def material(self, index):
+        """Hash of a material with texture references replaced by image content"""
+        if index is None:
+            return None
+        digest = self._materials.get(index)
+        if digest is None:
+            material = json.loads(json.dumps(self.glb.json['materials'][index]))
+            for slots in (material, material.get('pbrMetallicRoughness', {})):
+                for slot in TEXTURE_SLOTS:
+                    if slot in slots:
+                        texture = self.glb.json['textures'][slots[slot]['index']]
+                        sampler = self.glb.json.get('samplers', [])[texture['sampler']] if 'sampler' in texture else None
+                        image = self.image(texture['source']) if 'source' in texture else None
+                        slots[slot]['index'] = [image, sampler]
+            digest = self._materials[index] = _digest(json.dumps(material, sort_keys=True))
+        return digest
+
+    def mesh(self, index):
+        """(geometry hash, material hash) of a mesh"""
+        result = self._meshes.get(index)
+        if result is None:
+            geometry = []
+            materials = []
+            for primitive in self.glb.json['meshes'][index]['primitives']:
+                indices = primitive.get('indices')
+                geometry.append((
+                    primitive.get('mode', 4),
+                    sorted((semantic, self.hasher(i)) for semantic, i in primitive.get('attributes', {}).items()),
+                    None if indices is None else self.hasher(indices),
+                    [sorted((k, self.hasher(i)) for k, i in target.items()) for target in primitive.get('targets', [])],
+                ))
+                materials.append(self.material(primitive.get('material')))
+            result = self._meshes[index] = (_digest(geometry), _digest(materials))
+        return result
+
+    def nodes(self):
+        """
+        Returns:
+            dict key -> (node index, geometry, material, transform hash);
+            repeated keys get a '#n' suffix in node order
+        """
+        gltf = self.glb.json
+        world, _, _ = node_world_matrices(gltf)
+        signatures = {}
+        for index, node in enumerate(gltf.get('nodes', [])):
+            if 'mesh' not in node:
+                continue
+            geometry, material = self.mesh(node['mesh'])
+            transform = np.round(world[index], TRANSFORM_DECIMALS) + 0.0
+            instances = instance_matrices(self.glb, node)
+            if instances is not None:
+                transform = np.concatenate([transform[None], np.round(instances, TRANSFORM_DECIMALS) + 0.0])
+            key = base = node_key(node, index)
+            repeat = 1
+            while key in signatures:
+                repeat += 1
+                key = f"{base}#{repeat}"
+            signatures[key] = (index, geometry, material, _digest(transform.astype(np.float64).tobytes()))
+        return signatures
+
+
+def write_delta_glb(glb, node_indices, output_path, extras):
+    """
+    GLB with only the given nodes of glb, each as a scene root carrying its
+    world transform, and the meshes, materials and textures they use
+    """
+    source = glb.json
+    nodes = source.get('nodes', [])
+    world, _, _ = node_world_matrices(source)
+
+    gltf = {key: value for key, value in source.items()
+            if key not in ('nodes', 'meshes', 'materials', 'textures', 'images', 'samplers', 'scenes', 'scene')}
+    mesh_map = {}
+    material_map = {}
+    texture_map = {}
+    gltf['meshes'] = []
+    gltf['materials'] = []
+    gltf['textures'] = []
+    gltf['images'] = []
+    gltf['samplers'] = []
+
+    def remap_texture(index):
+        if index not in texture_map:
+            texture = dict(source['textures'][index])
+            if 'source' in texture:
+                gltf['images'].append(source['images'][texture['source']])
+                texture['source'] = len(gltf['images']) - 1
+            if 'sampler' in texture:
+                gltf['samplers'].append(source['samplers'][texture['sampler']])
+                texture['sampler'] = len(gltf['samplers']) - 1
+            gltf['textures'].append(texture)
+            texture_map[index] = len(gltf['textures']) - 1
+        return texture_map[index]
+
+    def remap_material(index):
+        if index not in material_map:
+            material = json.loads(json.dumps(source['materials'][index]))
+            for slots in (material, material.get('pbrMetallicRoughness', {})):
+                for slot in TEXTURE_SLOTS:
+                    if slot in slots:
+                        slots[slot]['index'] = remap_texture(slots[slot]['index'])
+            gltf['materials'].append(material)
+            material_map[index] = len(gltf['materials']) - 1
+        return material_map[index]
+
+    gltf['nodes'] = []
+    for index in node_indices:
+        node = {key: value for key, value in nodes[index].items()
+                if key not in ('children', 'matrix', 'translation', 'rotation', 'scale')}
+        mesh_index = node['mesh']
+        if mesh_index not in mesh_map:
+            mesh = json.loads(json.dumps(source['meshes'][mesh_index]))
+            for primitive in mesh['primitives']:
+                if 'material' in primitive:
+                    primitive['material'] = remap_material(primitive['material'])
+            gltf['meshes'].append(mesh)
+            mesh_map[mesh_index] = len(gltf['meshes']) - 1
+        node['mesh'] = mesh_map[mesh_index]
+        matrix = matrix_to_gltf(world[index])
+        if matrix:
+            node['matrix'] = matrix
+        gltf['nodes'].append(node)
+    gltf['scenes'] = [{'nodes': list(range(len(gltf['nodes'])))}]
+    gltf['scene'] = 0
+    gltf['extras'] = dict(source.get('extras') or {}, delta=extras)
+
+    writer = compact(glb, gltf)
+    return writer.write(output_path)
+
+
+def diff_glbs(file1, file2, delta_path=None, json_path=None, verbose=True):
+    """
+    Element-level diff of two conversions of the same model
+
+    Nodes that draw a mesh are matched by GlobalId (node extras) or name and
+    compared by geometry (accessor contents), material and world transform.
+
+    Args:
+        file1: Base (old) GLB
+        file2: Revised (new) GLB
+        delta_path: Optional GLB to write with the added and modified
+            elements of file2; the removed keys are listed in its extras
+        json_path: Optional JSON report path
+        verbose: Print the report
+
+    Returns:
+        dict with the added, removed and modified keys (modified maps each
+        key to the changed aspects), or None on error
+    """
+    start_time = time.time()
+    try:
+        with GLBReader(file1) as glb1, GLBReader(file2) as glb2:
+            old = NodeSignatures(glb1).nodes()
+            new = NodeSignatures(glb2).nodes()
+
+            added = [key for key in new if key not in old]
+            removed = [key for key in old if key not in new]
+            modified = {}
+            for key, (_, *signature) in new.items():
+                if key in old:
+                    changes = [aspect for aspect, a, b in zip(('geometry', 'material', 'transform'),
+                                                              old[key][1:], signature) if a != b]
+                    if changes:
+                        modified[key] = changes
+            diff_time = time.time() - start_time
+
+            result = {
+                'base': str(file1),
+                'revision': str(file2),
+                'added': added,
+                'removed': removed,
+                'modified': modified,
+                'unchanged': len(new) - len(added) - len(modified),
+                'diff_time_s': diff_time,
+            }
+
+            if delta_path:
+                changed = [new[key][0] for key in new if key in modified or key not in old]
+                delta_size = write_delta_glb(glb2, changed, delta_path, {
+                    'base': Path(file1).name,
+                    'added': added,
+                    'modified': list(modified),
+                    'removed': removed,
+                })
+                result['delta'] = str(delta_path)
+                result['delta_size_mb'] = delta_size / (1024**2)
+    except GLBError as e:
+        print(f"ERROR: {e}")
+        return None
+
+    if verbose:
+        print("=" * 80)
+        print("ELEMENT DIFF")
+        print("=" * 80)
+        print(f"\nBase:     {file1} ({len(old):,} elements)")
+        print(f"Revision: {file2} ({len(new):,} elements)")
+        print(f"\n  Added:     {len(added):6d}")
+        print(f"  Removed:   {len(removed):6d}")
+        print(f"  Modified:  {len(modified):6d}")
+        print(f"  Unchanged: {result['unchanged']:6d}")
+        for title, keys in (('Added', added), ('Removed', removed), ('Modified', list(modified))):
+            if keys:
+                print(f"\n{title} (first 10):")
+                for key in keys[:10]:
+                    detail = f" ({', '.join(modified[key])})" if key in modified else ""
+                    print(f"  {key}{detail}")
+        print(f"\nDiff time: {diff_time:.2f}s")
+        if delta_path:
+            print(f"✓ Delta GLB: {delta_path} ({result['delta_size_mb']:.2f} MB, "
+                  f"{len(added) + len(modified)} elements)")
+
+    if json_path:
+        with open(json_path, 'w') as f:
+            json.dump(result, f, indent=2)
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compare two GLB files',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python compare_glb.py old.glb new.glb
+
+  # Which elements changed between two conversions, plus a patch for the viewer
+  python compare_glb.py old.glb new.glb --diff --delta delta.glb --json diff.json
+        """
+    )
+    parser.add_argument('file1', help='First (base) GLB file')
+    parser.add_argument('file2', help='Second (revised) GLB file')
+    parser.add_argument('--diff', action='store_true',
+                        help='Element diff: added/removed/modified nodes matched by GlobalId or name')
+    parser.add_argument('--delta', help='Write a GLB with only the added and modified elements (implies --diff)')
+    parser.add_argument('--json', help='Write the element diff to this JSON file (implies --diff)')
+
+    args = parser.parse_args()
+
+    if args.diff or args.delta or args.json:
+        result = diff_glbs(args.file1, args.file2, delta_path=args.delta, json_path=args.json)
+        sys.exit(0 if result is not None else 1)
+
+    compare_glbs(args.file1, args.file2)
+
+
+if __name__ == "__main__":
+    main()
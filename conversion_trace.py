@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Structured instrumentation for conversion runs
+Records phases (open, iterator init, tessellation, serializer write,
+finalize) with wall time and RSS, per-IFC-class throughput, the slowest
+individual products and progress counters, streamed as Chrome trace events (chrome://tracing, Perfetto) or
+JSONL while the run is going, plus a machine-readable metrics file at the end
+"""
+
+import os
+import sys
+import json
+import time
+import heapq
+import resource
+from pathlib import Path
+from contextlib import contextmanager
+from collections import defaultdict
+
+
+def _status_kb(field):
+    """Value of a /proc/self/status field in KB, None where unavailable"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def current_rss_mb():
+    """Resident set size of this process in MB"""
+    kb = _status_kb('VmRSS')
+    return None if kb is None else kb / 1024
+
+
+def peak_rss_mb():
+    """Peak RSS in MB since start or the last reset_peak_rss()"""
+    kb = _status_kb('VmHWM')
+    if kb is None:
+        kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == 'darwin':
+            kb /= 1024
+    return kb / 1024
+
+
+def reset_peak_rss():
+    """Reset the kernel's peak RSS counter (Linux 4.0+); False if unsupported"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+# What SlowestProducts seconds measure -> report heading
+PRODUCT_MEASURES = {
+    'tessellation': 'Slowest products by tessellation time',
+    # A multi-threaded iterator hands out shapes in completion order, so the
+    # gap before a shape is the consumer's wait, not that product's cost
+    'iterator_wait': 'Longest iterator waits per product, not tessellation cost with several threads',
+}
+
+
+class SlowestProducts:
+    """
+    Top-N products by tessellation time, kept in a bounded min-heap
+
+    add() is cheap for the common case of a product faster than the current
+    N-th slowest: identifying attributes are only read for products that
+    make it into the heap. measure (a PRODUCT_MEASURES key) says what the
+    recorded seconds are.
+    """
+
+    def __init__(self, limit=10, measure='tessellation'):
+        self.limit = limit
+        self.measure = measure
+        self._heap = []
+        self._counter = 0
+
+    def add(self, seconds, product, **extra):
+        """
+        Record one product; product is an iterator shape or an IFC entity
+        (anything with GlobalId/guid, is_a()/type and Name/name)
+        """
+        if self.limit <= 0 or (len(self._heap) >= self.limit and seconds <= self._heap[0][0]):
+            return
+        if hasattr(product, 'GlobalId'):
+            entry = {'globalId': product.GlobalId, 'ifcClass': product.is_a(), 'name': product.Name}
+        else:
+            entry = {'globalId': product.guid, 'ifcClass': product.type, 'name': product.name}
+        entry = dict(entry, seconds=seconds, **extra)
+        self._counter += 1
+        if len(self._heap) < self.limit:
+            heapq.heappush(self._heap, (seconds, self._counter, entry))
+        else:
+            heapq.heapreplace(self._heap, (seconds, self._counter, entry))
+
+    def report(self):
+        """Recorded products, slowest first"""
+        return [entry for _, _, entry in sorted(self._heap, reverse=True)]
+
+
+class ConversionTrace:
+    """
+    Event and metrics recorder for one conversion
+
+    Usage:
+        trace = ConversionTrace(trace_path='run.json', metrics_path='run.metrics.json')
+        with trace.phase('open'):
+            ifc_file = ifcopenshell.open(path)
+        ...
+        trace.close(metrics)
+
+    A trace path ending in .jsonl gets one JSON event per line; anything
+    else the Chrome JSON array format, which trace viewers accept even
+    without the closing bracket, so a crashed run still loads. Work that
+    interleaves per shape (tessellation, serializer write) is folded into
+    one slice per progress interval. With neither path set only the
+    in-memory summary is kept and per-shape accounting is off (enabled is
+    False), so the default conversion path pays nothing for it.
+    """
+
+    def __init__(self, trace_path=None, metrics_path=None, slowest=10):
+        self.trace_path = Path(trace_path) if trace_path else None
+        self.metrics_path = Path(metrics_path) if metrics_path else None
+        self.enabled = bool(self.trace_path or self.metrics_path)
+        self.jsonl = self.trace_path is not None and self.trace_path.suffix == '.jsonl'
+
+        self.start = time.perf_counter()
+        self.pid = os.getpid()
+        self.phases = {}
+        self.process_peak_rss = peak_rss_mb()
+        self.peak_resettable = reset_peak_rss()
+        self.classes = defaultdict(lambda: {'products': 0, 'iterator_s': 0.0, 'write_s': 0.0,
+                                            'vertices': 0, 'triangles': 0})
+        self.slowest = SlowestProducts(slowest)
+
+        # Interleaved time accumulated since the last progress() call
+        self._pending = defaultdict(float)
+        self._interval_start = self.start
+        self._first_event = True
+
+        self._file = None
+        if self.trace_path:
+            self.trace_path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.trace_path, 'w')
+            if not self.jsonl:
+                self._file.write('[\n')
+            self._emit({'name': 'process_name', 'ph': 'M', 'pid': self.pid, 'tid': 0,
+                        'args': {'name': 'convert_ifc_to_glb'}})
+            self._emit({'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': 0, 'args': {'name': 'phases'}})
+            self._emit({'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': 1,
+                        'args': {'name': 'geometry loop'}})
+
+    def _timestamp(self, t=None):
+        """Microseconds since the trace started"""
+        return round(((time.perf_counter() if t is None else t) - self.start) * 1e6, 1)
+
+    def _emit(self, event):
+        if self._file is None:
+            return
+        if self.jsonl:
+            self._file.write(json.dumps(event) + '\n')
+        else:
+            self._file.write(('' if self._first_event else ',\n') + json.dumps(event))
+        self._first_event = False
+        self._file.flush()
+
+    def _peak(self):
+        """Peak RSS since the last reset, folded into the process peak"""
+        peak = peak_rss_mb()
+        self.process_peak_rss = max(self.process_peak_rss, peak)
+        return peak
+
+    def _begin_phase(self, name):
+        if self.peak_resettable:
+            self._peak()
+            reset_peak_rss()
+        self.phases.setdefault(name, {'time_s': 0.0, 'rss_start_mb': current_rss_mb(), 'peak_rss_mb': 0.0})
+
+    def _end_phase(self, name, seconds, t0, args=None, tid=0):
+        phase = self.phases[name]
+        phase['time_s'] += seconds
+        phase['rss_end_mb'] = current_rss_mb()
+        phase['peak_rss_mb'] = max(phase['peak_rss_mb'], self._peak())
+        event_args = {'rss_mb': phase['rss_end_mb'], 'peak_rss_mb': phase['peak_rss_mb']}
+        event_args.update(args or {})
+        self._emit({'name': name, 'ph': 'X', 'pid': self.pid, 'tid': tid, 'ts': self._timestamp(t0),
+                    'dur': round(seconds * 1e6, 1), 'args': event_args})
+
+    @contextmanager
+    def phase(self, name, **args):
+        """Time a phase and record its RSS at start/end and its peak RSS"""
+        self._begin_phase(name)
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._end_phase(name, time.perf_counter() - t0, t0, args)
+
+    def add_time(self, name, seconds):
+        """Account interleaved work to a phase; emitted on the next progress()"""
+        if name not in self.phases:
+            self._begin_phase(name)
+        self._pending[name] += seconds
+
+    def shape(self, ifc_class, iterator_s, write_s, vertices=0, triangles=0):
+        """Per-class accounting of one product (only when enabled)"""
+        entry = self.classes[ifc_class]
+        entry['products'] += 1
+        entry['iterator_s'] += iterator_s
+        entry['write_s'] += write_s
+        entry['vertices'] += vertices
+        entry['triangles'] += triangles
+
+    def iterator_threads(self, threads):
+        """
+        Per-product times are tessellation only when a single thread
+        iterates; with more they are iterator waits
+        """
+        self.slowest.measure = 'tessellation' if threads == 1 else 'iterator_wait'
+
+    def product(self, seconds, product, **extra):
+        """Per-product time for the slowest-products report (always on)"""
+        self.slowest.add(seconds, product, **extra)
+
+    def progress(self, processed, total):
+        """Flush interleaved slices and emit progress/RSS counters"""
+        now = time.perf_counter()
+        t = self._interval_start
+        for name, seconds in self._pending.items():
+            self._end_phase(name, seconds, t, {'products': processed}, tid=1)
+            t += seconds
+        self._pending.clear()
+        self._interval_start = now
+
+        elapsed = now - self.start
+        ts = self._timestamp(now)
+        self._emit({'name': 'products', 'ph': 'C', 'pid': self.pid, 'ts': ts,
+                    'args': {'processed': processed, 'remaining': max(total - processed, 0)}})
+        self._emit({'name': 'rss_mb', 'ph': 'C', 'pid': self.pid, 'ts': ts, 'args': {'rss': current_rss_mb()}})
+        return processed / elapsed if elapsed > 0 else 0.0
+
+    def instant(self, name, **args):
+        self._emit({'name': name, 'ph': 'i', 's': 'p', 'pid': self.pid, 'tid': 0, 'ts': self._timestamp(),
+                    'args': args})
+
+    def summary(self):
+        """Phases, peak RSS and per-class throughput as a JSON-serialisable dict"""
+        self._peak()
+        classes = {}
+        for ifc_class, entry in sorted(self.classes.items(), key=lambda item: -(item[1]['iterator_s']
+                                                                              + item[1]['write_s'])):
+            seconds = entry['iterator_s'] + entry['write_s']
+            classes[ifc_class] = dict(entry, products_per_s=entry['products'] / seconds if seconds > 0 else None)
+        return {
+            'phases': self.phases,
+            'peak_rss_mb': self.process_peak_rss,
+            'per_phase_peak_rss': self.peak_resettable,
+            'classes': classes,
+            'slowest_products': self.slowest.report(),
+            'slowest_products_measure': self.slowest.measure,
+        }
+
+    def close(self, metrics=None, error=None):
+        """
+        Finish the trace file and write the metrics file
+
+        Returns:
+            the metrics dict extended with the summary
+        """
+        result = dict(metrics or {})
+        result.update(self.summary())
+        result['wall_time_s'] = time.perf_counter() - self.start
+        if error:
+            result['error'] = error
+        if self.trace_path:
+            result['trace_file'] = str(self.trace_path)
+
+        if self._file is not None:
+            self.instant('end', error=error)
+            if not self.jsonl:
+                self._file.write('\n]\n')
+            self._file.close()
+            self._file = None
+
+        if self.metrics_path:
+            self.metrics_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.metrics_path, 'w') as f:
+                json.dump(result, f, indent=2)
+        return result
+
+
+def print_class_table(summary, limit=10):
+    """Slowest IFC classes by total iterator + write time"""
+    classes = summary['classes']
+    if not classes:
+        return
+    print(f"\n  Slowest classes (of {len(classes)}):")
+    for ifc_class, entry in list(classes.items())[:limit]:
+        rate = entry['products_per_s']
+        print(f"    {ifc_class:32s} {entry['products']:7,} products "
+              f"{entry['iterator_s'] + entry['write_s']:8.2f}s "
+              f"{(f'{rate:,.0f}' if rate else '-'):>8s}/s {entry['triangles']:>11,} triangles")
+
+
+def print_slowest_products(summary, limit=10):
+    """Slowest individual products by tessellation time (or iterator wait)"""
+    products = summary.get('slowest_products') or []
+    if not products:
+        return
+    heading = PRODUCT_MEASURES[summary.get('slowest_products_measure', 'tessellation')]
+    print(f"\n  {heading} (top {min(limit, len(products))}):")
+    for entry in products[:limit]:
+        status = entry.get('status')
+        line = (f"    {entry['seconds']:8.2f}s {entry['globalId']} {entry['ifcClass']:24s} "
+                f"{(entry['name'] or '')[:32]:32s}")
+        print(f"{line} [{status}]" if status else line.rstrip())
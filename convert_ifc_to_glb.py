@@ -9,11 +9,21 @@ import time
 import argparse
 from pathlib import Path
 import multiprocessing
+import numpy as np
 import ifcopenshell
 import ifcopenshell.geom
 
 
-def convert_ifc_to_glb(ifc_path, output_path=None, verbose=True):
+# Geometry settings used for every conversion (also part of the stage cache key)
+GEOMETRY_SETTINGS = {
+    'use-world-coords': True,
+    'weld-vertices': True,
+    'reorient-shells': True,
+    'generate-uvs': True,
+}
+
+
+def convert_ifc_to_glb(ifc_path, output_path=None, verbose=True, cache=None, trace=None, threads=None):
     """
     Convert IFC file to GLB format
 
@@ -21,10 +31,18 @@ def convert_ifc_to_glb(ifc_path, output_path=None, verbose=True):
         ifc_path: Path to input IFC file
         output_path: Path for output GLB file (optional)
         verbose: Print progress information
+        cache: pipeline_cache.StageCache; an unchanged input converted with
+            the same settings and ifcopenshell version is served from it
+        trace: conversion_trace.ConversionTrace receiving phase events,
+            RSS and per-class throughput (closed here)
+        threads: Geometry iterator threads (default: CPU count)
 
     Returns:
         dict with conversion metrics
     """
+    from conversion_trace import ConversionTrace, print_class_table, print_slowest_products
+    trace = trace or ConversionTrace()
+
     ifc_path = Path(ifc_path)
 
     if not ifc_path.exists():
@@ -37,6 +55,23 @@ def convert_ifc_to_glb(ifc_path, output_path=None, verbose=True):
     else:
         output_path = Path(output_path)
 
+    if cache is not None:
+        start_time = time.time()
+        hit, metrics = cache.run(
+            'convert_ifc_to_glb', [ifc_path], output_path, GEOMETRY_SETTINGS,
+            f"ifcopenshell {ifcopenshell.version}",
+            lambda: convert_ifc_to_glb(ifc_path, output_path, verbose, threads=threads) or False
+        )
+        if metrics is None:
+            trace.close(error='conversion failed')
+            return None
+        metrics = dict(metrics, cache_hit=hit, total_time_s=time.time() - start_time)
+        if verbose:
+            if hit:
+                print(f"\n✓ Served from cache: {output_path}")
+            cache.report()
+        return trace.close(metrics)
+
     if verbose:
         print(f"Input:  {ifc_path}")
         print(f"Output: {output_path}")
@@ -51,7 +86,8 @@ def convert_ifc_to_glb(ifc_path, output_path=None, verbose=True):
         if verbose:
             print("Loading IFC file...")
         load_start = time.time()
-        ifc_file = ifcopenshell.open(str(ifc_path))
+        with trace.phase('open'):
+            ifc_file = ifcopenshell.open(str(ifc_path))
         load_time = time.time() - load_start
 
         if verbose:
@@ -63,10 +99,8 @@ def convert_ifc_to_glb(ifc_path, output_path=None, verbose=True):
             print("Configuring geometry settings...")
 
         settings = ifcopenshell.geom.settings()
-        settings.set('use-world-coords', True)
-        settings.set('weld-vertices', True)
-        settings.set('reorient-shells', True)
-        settings.set('generate-uvs', True)
+        for name, value in GEOMETRY_SETTINGS.items():
+            settings.set(name, value)
 
         if verbose:
             print("  ✓ World coordinates enabled")
@@ -91,11 +125,14 @@ def convert_ifc_to_glb(ifc_path, output_path=None, verbose=True):
         serializer = ifcopenshell.geom.serializers.gltf(str(output_path), settings, serializer_settings)
 
         # Create geometry iterator
-        num_cores = multiprocessing.cpu_count()
+        num_cores = threads or multiprocessing.cpu_count()
         if verbose:
             print(f"Creating geometry iterator (using {num_cores} CPU cores)...")
 
         iterator = ifcopenshell.geom.iterator(settings, ifc_file, num_cores)
+        trace.iterator_threads(num_cores)
+        with trace.phase('iterator_init', threads=num_cores):
+            has_shapes = iterator.initialize()
 
         processed = 0
         last_report_time = time.time()
@@ -103,26 +140,51 @@ def convert_ifc_to_glb(ifc_path, output_path=None, verbose=True):
         if verbose:
             print("\nProcessing geometry:")
 
-        for shape in iterator:
+        # get()/next() rather than iterating so that tessellation (inside the
+        # iterator) and serializer writes can be timed separately
+        shape_start = time.perf_counter()
+        while has_shapes:
+            shape = iterator.get()
+            write_start = time.perf_counter()
             serializer.write(shape)
+            write_end = time.perf_counter()
             processed += 1
 
+            # Iterator time since the previous shape: next() plus get()
+            trace.add_time('tessellation', write_start - shape_start)
+            trace.add_time('serializer_write', write_end - write_start)
+            trace.product(write_start - shape_start, shape)
+            if trace.enabled:
+                geometry = shape.geometry
+                trace.shape(
+                    getattr(shape, 'type', None) or ifc_file.by_id(shape.id).is_a(),
+                    write_start - shape_start, write_end - write_start,
+                    len(geometry.verts) // 3, len(geometry.faces) // 3
+                )
+
             # Progress reporting every 50 items or every 2 seconds
             current_time = time.time()
-            if verbose and (processed % 50 == 0 or current_time - last_report_time >= 2):
-                elapsed = current_time - convert_start
-                progress = processed / len(products) * 100
-                rate = processed / elapsed if elapsed > 0 else 0
-                eta = (len(products) - processed) / rate if rate > 0 else 0
-
-                print(f"  [{processed:5d}/{len(products)}] {progress:5.1f}% | "
-                      f"{rate:.1f} items/s | ETA: {eta:.0f}s", flush=True)
+            if current_time - last_report_time >= 2 or (verbose and processed % 50 == 0):
+                trace.progress(processed, len(products))
+                if verbose:
+                    elapsed = current_time - convert_start
+                    progress = processed / len(products) * 100
+                    rate = processed / elapsed if elapsed > 0 else 0
+                    eta = (len(products) - processed) / rate if rate > 0 else 0
+
+                    print(f"  [{processed:5d}/{len(products)}] {progress:5.1f}% | "
+                          f"{rate:.1f} items/s | ETA: {eta:.0f}s", flush=True)
                 last_report_time = current_time
 
+            shape_start = time.perf_counter()
+            has_shapes = iterator.next()
+        trace.progress(processed, len(products))
+
         if verbose:
             print("\nFinalizing GLB file...")
 
-        serializer.finalize()
+        with trace.phase('finalize'):
+            serializer.finalize()
         convert_time = time.time() - convert_start
 
         if verbose:
@@ -150,6 +212,448 @@ def convert_ifc_to_glb(ifc_path, output_path=None, verbose=True):
             print(f"  Load time: {load_time:.2f}s")
             print(f"  Convert time: {convert_time:.2f}s")
             print(f"  Total time: {total_time:.2f}s")
+
+        metrics = trace.close(metrics)
+
+        if verbose:
+            phases = metrics['phases']
+            print(f"  Peak RSS: {metrics['peak_rss_mb']:.1f} MB")
+            if trace.enabled:
+                print("  Phases: " + ", ".join(f"{name} {phase['time_s']:.2f}s/{phase['peak_rss_mb']:.0f} MB"
+                                               for name, phase in phases.items()))
+                print_class_table(metrics)
+                for path in (trace.trace_path, trace.metrics_path):
+                    if path:
+                        print(f"  ✓ Written: {path}")
+            print_slowest_products(metrics, trace.slowest.limit)
+            print(f"\n✓ Saved: {output_path}")
+
+        return metrics
+
+    except Exception as e:
+        print(f"Error during conversion: {e}")
+        import traceback
+        traceback.print_exc()
+        trace.close(error=f"{type(e).__name__}: {e}")
+        return None
+
+
+def write_product_glb(output_path, products, load_mesh, extras=None):
+    """
+    Write one node per product under a Z-up → Y-up root node
+
+    Args:
+        output_path: GLB file to write
+        products: (GlobalId, IFC class, name) tuples, written in this order,
+            optionally with a fourth item passed to load_mesh instead of the GlobalId
+        load_mesh: Callable returning the ifc_mesh mesh dict of a GlobalId
+        extras: Optional GlobalId -> dict merged into that node's extras
+
+    Returns:
+        (vertices, triangles) written
+    """
+    from glb_writer import GLBWriter, Z_UP_TO_Y_UP
+    from ifc_mesh import add_mesh, mesh_size
+
+    writer = GLBWriter()
+    root = writer.add_node(name='IfcModel', matrix=Z_UP_TO_Y_UP, root=True)
+    vertices = triangles = 0
+
+    for guid, ifc_class, name, *mesh_id in products:
+        mesh = load_mesh(mesh_id[0] if mesh_id else guid)
+        mesh_index = add_mesh(writer, mesh, name=guid)
+        node_extras = {'globalId': guid, 'ifcClass': ifc_class}
+        if name:
+            node_extras['name'] = name
+        node_extras.update((extras or {}).get(guid, {}))
+        writer.add_node(name=guid, mesh=mesh_index, extras=node_extras, parent=root)
+
+        v, t = mesh_size(mesh)
+        vertices += v
+        triangles += t
+
+    writer.write(output_path)
+    return vertices, triangles
+
+
+def convert_incremental(ifc_path, output_path=None, cache_dir=None, verbose=True, threads=None,
+                        checkpoint_interval=None):
+    """
+    Convert IFC to GLB, re-tessellating only products that changed since the
+    last run with the same cache directory
+
+    Products are matched by GlobalId (plus STEP id where a GlobalId is
+    duplicated) and compared by a hash of their
+    representation subgraph, placement, openings and materials (see
+    geometry_cache). Unchanged products reuse their cached triangle buffers.
+
+    With checkpoint_interval, the products tessellated so far are journaled
+    to the cache every that many seconds, so a run that dies (OOM, kill, a
+    crashing product) restarts from its last checkpoint: the next run with
+    the same cache directory only tessellates what is missing, and writes
+    the same GLB a single uninterrupted run would have.
+
+    Args:
+        ifc_path: Path to input IFC file
+        output_path: Path for output GLB file (optional)
+        cache_dir: Geometry cache directory (default: <output>.geomcache)
+        verbose: Print progress information
+        threads: Geometry iterator threads (default: CPU count)
+        checkpoint_interval: Seconds between cache checkpoints (default: only at the end)
+
+    Returns:
+        dict with conversion metrics, including reused/retessellated/deleted counts
+    """
+    from geometry_cache import GeometryHasher, ProductGeometryCache, cache_ids
+    from ifc_mesh import shape_mesh
+
+    ifc_path = Path(ifc_path)
+    if not ifc_path.exists():
+        print(f"Error: File not found: {ifc_path}")
+        return None
+
+    output_path = Path(output_path) if output_path else ifc_path.with_suffix('.glb')
+    cache_dir = Path(cache_dir) if cache_dir else output_path.with_suffix('.geomcache')
+
+    if verbose:
+        print(f"Input:  {ifc_path}")
+        print(f"Output: {output_path}")
+        print(f"Cache:  {cache_dir}")
+        print(f"Size:   {ifc_path.stat().st_size / (1024**2):.2f} MB")
+        print("-" * 60)
+
+    start_time = time.time()
+    cache = None
+
+    try:
+        if verbose:
+            print("Loading IFC file...")
+        load_start = time.time()
+        ifc_file = ifcopenshell.open(str(ifc_path))
+        load_time = time.time() - load_start
+        if verbose:
+            print(f"  Schema: {ifc_file.schema}")
+            print(f"  Load time: {load_time:.2f}s")
+
+        cache = ProductGeometryCache(
+            cache_dir, dict(GEOMETRY_SETTINGS, ifcopenshell=ifcopenshell.version)
+        )
+
+        # Hash every product's geometry inputs and compare with the cache
+        if verbose:
+            print("Hashing product geometry...")
+        hash_start = time.time()
+        hasher = GeometryHasher(ifc_file)
+        candidates = [
+            p for p in ifc_file.by_type("IfcProduct")
+            if p.Representation is not None and not p.is_a("IfcOpeningElement")
+        ]
+        ids = cache_ids(candidates)
+        keys = {}
+        changed = []
+        for product in candidates:
+            cache_id = ids[product.id()]
+            keys[cache_id] = hasher.product_key(product)
+            if cache.lookup(cache_id, keys[cache_id]) is None:
+                changed.append(product)
+        hash_time = time.time() - hash_start
+        duplicated = sum(1 for product in candidates if ids[product.id()] != product.GlobalId)
+
+        deleted = [cache_id for cache_id in cache.products if cache_id not in keys]
+        cache.remove(deleted)
+        reused = len(candidates) - len(changed)
+
+        if verbose:
+            print(f"  {len(candidates)} products with a representation, hashed in {hash_time:.2f}s")
+            print(f"  Reused: {reused}  Changed/new: {len(changed)}  Deleted: {len(deleted)}")
+            if duplicated:
+                print(f"  ⚠️  {duplicated} products share their GlobalId with another product; "
+                      f"cached by GlobalId and STEP id")
+
+        # Tessellate only the changed products
+        convert_start = time.time()
+        retessellated = 0
+        checkpoints = 0
+        if changed:
+            settings = ifcopenshell.geom.settings()
+            for name, value in GEOMETRY_SETTINGS.items():
+                settings.set(name, value)
+
+            num_cores = threads or multiprocessing.cpu_count()
+            if verbose:
+                print(f"\nProcessing geometry of {len(changed)} products ({num_cores} CPU cores):")
+
+            # By STEP id: GlobalIds are not guaranteed to be unique
+            by_id = {product.id(): product for product in changed}
+            iterator = ifcopenshell.geom.iterator(settings, ifc_file, num_cores, include=changed)
+            last_report_time = last_checkpoint_time = time.time()
+
+            for shape in iterator:
+                product = by_id.pop(shape.id, None)
+                if product is None:
+                    continue
+                cache_id = ids[shape.id]
+                cache.store(cache_id, keys[cache_id], product.is_a(), shape_mesh(shape))
+                retessellated += 1
+
+                current_time = time.time()
+                if verbose and (retessellated % 50 == 0 or current_time - last_report_time >= 2):
+                    print(f"  [{retessellated:5d}/{len(changed)}] "
+                          f"{retessellated / len(changed) * 100:5.1f}%", flush=True)
+                    last_report_time = current_time
+
+                if checkpoint_interval and current_time - last_checkpoint_time >= checkpoint_interval:
+                    written = cache.checkpoint()
+                    checkpoints += 1
+                    last_checkpoint_time = current_time
+                    if verbose:
+                        print(f"  ✓ Checkpoint: {written} products ({retessellated}/{len(changed)} done)",
+                              flush=True)
+
+            # Changed products the iterator produced nothing for
+            for product in by_id.values():
+                cache_id = ids[product.id()]
+                cache.store(cache_id, keys[cache_id], product.is_a(), None)
+        convert_time = time.time() - convert_start
+
+        # Assemble the GLB from cached and fresh buffers, in a stable order
+        if verbose:
+            print("\nWriting GLB...")
+        write_start = time.time()
+        products = sorted((
+            (p.GlobalId, p.is_a(), p.Name, ids[p.id()]) for p in candidates
+            if cache.products[ids[p.id()]]['geometry']
+        ), key=lambda item: (item[0], item[3]))
+        vertices, triangles = write_product_glb(
+            output_path, products, lambda cache_id: cache.load(cache.products[cache_id]['key'])
+        )
+        write_time = time.time() - write_start
+
+        cache.save()
+        pruned = cache.prune()
+
+        total_time = time.time() - start_time
+        output_size = output_path.stat().st_size / (1024**2)
+
+        metrics = {
+            'ifc_size_mb': ifc_path.stat().st_size / (1024**2),
+            'glb_size_mb': output_size,
+            'load_time_s': load_time,
+            'hash_time_s': hash_time,
+            'convert_time_s': convert_time,
+            'write_time_s': write_time,
+            'total_time_s': total_time,
+            'products_processed': len(products),
+            'products_reused': reused,
+            'products_retessellated': len(changed),
+            'products_deleted': len(deleted),
+            'checkpoints': checkpoints,
+            'vertices': vertices,
+            'triangles': triangles,
+            'compression_ratio': ifc_path.stat().st_size / output_path.stat().st_size
+        }
+
+        if verbose:
+            print("-" * 60)
+            print("INCREMENTAL CONVERSION COMPLETE")
+            print(f"  Products in GLB: {len(products)}")
+            print(f"  Reused: {reused}")
+            print(f"  Retessellated: {len(changed)}")
+            print(f"  Deleted: {len(deleted)} ({pruned} cached meshes removed)")
+            print(f"  Vertices: {vertices:,}  Triangles: {triangles:,}")
+            print(f"  GLB size: {output_size:.2f} MB")
+            print(f"  Load time: {load_time:.2f}s")
+            print(f"  Hash time: {hash_time:.2f}s")
+            print(f"  Convert time: {convert_time:.2f}s")
+            print(f"  Write time: {write_time:.2f}s")
+            print(f"  Total time: {total_time:.2f}s")
+            print(f"\n✓ Saved: {output_path}")
+
+        return metrics
+
+    except (Exception, KeyboardInterrupt) as e:
+        print(f"Error during conversion: {e!r}")
+        import traceback
+        traceback.print_exc()
+        if checkpoint_interval and cache is not None:
+            print(f"  ✓ Checkpoint: {cache.checkpoint()} products; rerun to resume")
+        return None
+
+
+def convert_budgeted(ifc_path, output_path=None, budget=30.0, slowest=10, processes=None, verbose=True):
+    """
+    Convert IFC to GLB with a wall-time budget per product
+
+    Every product is tessellated on its own in a pool of forked workers
+    (product_pool). A product that exceeds the budget, or crashes its
+    worker, is killed and retried once in a fresh worker with simpler
+    settings (no opening subtractions, no shell healing) under the same
+    budget; if that fails too it is written as a bounding-box placeholder
+    flagged with extras.placeholder. The run always continues, and every
+    product that needed either fallback is reported.
+
+    Args:
+        ifc_path: Path to input IFC file
+        output_path: Path for output GLB file (optional)
+        budget: Seconds allowed per product
+        slowest: Size of the slowest-products report
+        processes: Worker processes (default: CPU count)
+        verbose: Print progress information
+
+    Returns:
+        dict with conversion metrics, including 'over_budget' and 'slowest_products'
+    """
+    import tempfile
+    from conversion_trace import SlowestProducts, print_slowest_products
+    from ifc_mesh import save_mesh, load_mesh
+    from product_pool import ProductPool, SIMPLE_SETTINGS, representation_bounds, box_mesh
+
+    ifc_path = Path(ifc_path)
+    if not ifc_path.exists():
+        print(f"Error: File not found: {ifc_path}")
+        return None
+
+    output_path = Path(output_path) if output_path else ifc_path.with_suffix('.glb')
+    processes = processes or multiprocessing.cpu_count()
+
+    if verbose:
+        print(f"Input:  {ifc_path}")
+        print(f"Output: {output_path}")
+        print(f"Size:   {ifc_path.stat().st_size / (1024**2):.2f} MB")
+        print(f"Budget: {budget:g}s per product ({processes} worker processes)")
+        print("-" * 60)
+
+    start_time = time.time()
+
+    try:
+        if verbose:
+            print("Loading IFC file...")
+        load_start = time.time()
+        ifc_file = ifcopenshell.open(str(ifc_path))
+        load_time = time.time() - load_start
+        if verbose:
+            print(f"  Schema: {ifc_file.schema}")
+            print(f"  Load time: {load_time:.2f}s")
+
+        candidates = [
+            p for p in ifc_file.by_type("IfcProduct")
+            if p.Representation is not None and not p.is_a("IfcOpeningElement")
+        ]
+        if verbose:
+            print(f"\nProcessing geometry of {len(candidates)} products:")
+
+        convert_start = time.time()
+        report = SlowestProducts(slowest)
+        over_budget = {}
+        failed = 0
+        geometry = {}
+
+        with tempfile.TemporaryDirectory(prefix='ifc-budget-') as spool:
+            spool = Path(spool)
+
+            def run_pool(product_ids, settings_values, label):
+                nonlocal failed
+                retry = []
+                pool = ProductPool(ifc_file, settings_values, processes=processes, budget=budget)
+                last_report_time = time.time()
+                for done, (product_id, status, result, seconds) in enumerate(pool.run(product_ids), 1):
+                    product = ifc_file.by_id(product_id)
+                    report.add(seconds, product, status=status if status != 'ok' else None)
+                    if status == 'ok':
+                        if result['groups']:
+                            save_mesh(result, spool / f"{product_id}.npz")
+                            geometry[product.GlobalId] = product_id
+                    elif status == 'error':
+                        failed += 1
+                    else:
+                        retry.append(product_id)
+                        over_budget.setdefault(product.GlobalId, {
+                            'ifcClass': product.is_a(), 'name': product.Name, 'attempts': [],
+                        })['attempts'].append({'settings': label, 'status': status, 'seconds': seconds,
+                                               'message': result})
+                        if verbose:
+                            print(f"  ⚠️  {product.GlobalId} {product.is_a()}: {result} ({label} settings)",
+                                  flush=True)
+
+                    current_time = time.time()
+                    if verbose and (done % 50 == 0 or current_time - last_report_time >= 2):
+                        print(f"  [{done:5d}/{len(product_ids)}] {done / len(product_ids) * 100:5.1f}% "
+                              f"({label} settings)", flush=True)
+                        last_report_time = current_time
+                return retry
+
+            retry = run_pool([p.id() for p in candidates], GEOMETRY_SETTINGS, 'default')
+            if retry:
+                if verbose:
+                    print(f"\nRetrying {len(retry)} product(s) with simpler settings...")
+                retry = run_pool(retry, dict(GEOMETRY_SETTINGS, **SIMPLE_SETTINGS), 'simple')
+
+            extras = {}
+            for product_id in retry:
+                product = ifc_file.by_id(product_id)
+                entry = over_budget[product.GlobalId]
+                bounds = representation_bounds(ifc_file, product)
+                if bounds is None:
+                    entry['outcome'] = 'skipped'
+                    continue
+                save_mesh(box_mesh(*bounds), spool / f"{product_id}.npz")
+                geometry[product.GlobalId] = product_id
+                extras[product.GlobalId] = {'placeholder': 'bbox'}
+                entry['outcome'] = 'placeholder'
+            for entry in over_budget.values():
+                entry.setdefault('outcome', 'simplified')
+            convert_time = time.time() - convert_start
+
+            if verbose:
+                print("\nWriting GLB...")
+            write_start = time.time()
+            products = [(p.GlobalId, p.is_a(), p.Name) for p in candidates if p.GlobalId in geometry]
+            vertices, triangles = write_product_glb(
+                output_path, products, lambda guid: load_mesh(spool / f"{geometry[guid]}.npz"), extras
+            )
+            write_time = time.time() - write_start
+
+        total_time = time.time() - start_time
+        output_size = output_path.stat().st_size / (1024**2)
+        outcomes = [entry['outcome'] for entry in over_budget.values()]
+
+        metrics = {
+            'ifc_size_mb': ifc_path.stat().st_size / (1024**2),
+            'glb_size_mb': output_size,
+            'load_time_s': load_time,
+            'convert_time_s': convert_time,
+            'write_time_s': write_time,
+            'total_time_s': total_time,
+            'budget_s': budget,
+            'products_processed': len(products),
+            'products_failed': failed,
+            'products_simplified': outcomes.count('simplified'),
+            'products_placeholder': outcomes.count('placeholder'),
+            'products_skipped': outcomes.count('skipped'),
+            'vertices': vertices,
+            'triangles': triangles,
+            'compression_ratio': ifc_path.stat().st_size / output_path.stat().st_size,
+            'over_budget': over_budget,
+            'slowest_products': report.report(),
+        }
+
+        if verbose:
+            print("-" * 60)
+            print("BUDGETED CONVERSION COMPLETE")
+            print(f"  Products in GLB: {len(products)}")
+            print(f"  Without geometry (errors): {failed}")
+            print(f"  Over budget: {len(over_budget)} ({metrics['products_simplified']} simplified, "
+                  f"{metrics['products_placeholder']} bounding box, {metrics['products_skipped']} skipped)")
+            for guid, entry in over_budget.items():
+                attempts = ", ".join(f"{a['settings']} {a['status']} {a['seconds']:.2f}s" for a in entry['attempts'])
+                print(f"    {guid} {entry['ifcClass']:24s} {entry['outcome']:11s} ({attempts})")
+            print(f"  Vertices: {vertices:,}  Triangles: {triangles:,}")
+            print(f"  GLB size: {output_size:.2f} MB")
+            print(f"  Load time: {load_time:.2f}s")
+            print(f"  Convert time: {convert_time:.2f}s")
+            print(f"  Write time: {write_time:.2f}s")
+            print(f"  Total time: {total_time:.2f}s")
+            print_slowest_products(metrics, slowest)
             print(f"\n✓ Saved: {output_path}")
 
         return metrics
@@ -161,6 +665,471 @@ def convert_ifc_to_glb(ifc_path, output_path=None, verbose=True):
         return None
 
 
+def _product_iterator(settings, ifc_file, num_cores):
+    """
+    Geometry iterator over every product except IfcOpeningElement voids,
+    which are subtracted from their hosts but never drawn (the incremental
+    and budgeted paths skip them the same way)
+    """
+    openings = ifc_file.by_type("IfcOpeningElement")
+    if openings:
+        return ifcopenshell.geom.iterator(settings, ifc_file, num_cores, exclude=openings)
+    return ifcopenshell.geom.iterator(settings, ifc_file, num_cores)
+
+
+def _storey_lookup(ifc_file):
+    """Element id -> (storey index, storey) with storeys ordered by elevation"""
+    from split_ifc_by_storey import build_relationship_maps
+
+    maps = build_relationship_maps(ifc_file)
+    storeys = sorted(
+        (ifc_file.by_id(storey_id) for storey_id in maps['storey_to_elements']),
+        key=lambda s: (s.Elevation if s.Elevation is not None else 0.0, s.id())
+    )
+    lookup = {}
+    for index, storey in enumerate(storeys):
+        for element in maps['storey_to_elements'][storey.id()]:
+            lookup.setdefault(element.id(), (index, storey))
+    return lookup
+
+
+def _gltf_bounds(lo, hi):
+    """IFC (Z-up) bounds -> glTF (Y-up) bounds as written under the root node"""
+    return [lo[0], lo[2], 0.0 - hi[1]], [hi[0], hi[2], 0.0 - lo[1]]
+
+
+def convert_tiled(ifc_path, output_dir=None, tile_size=20.0, verbose=True, threads=None):
+    """
+    Convert IFC to one GLB per storey x grid tile plus a JSON manifest
+
+    Shapes are sorted into tiles as they come off the iterator: the storey
+    comes from the spatial structure, the grid cell from the centre of the
+    shape's bounding box. Meshes are spooled to disk until every tile is
+    complete, so memory stays bounded.
+
+    Args:
+        ifc_path: Path to input IFC file
+        output_dir: Directory for the tiles and tiles.json (default: <input>_tiles)
+        tile_size: Grid cell size in model units (metres)
+        verbose: Print progress information
+        threads: Geometry iterator threads (default: CPU count)
+
+    Returns:
+        dict with conversion metrics (the manifest is written to output_dir/tiles.json)
+    """
+    import json
+    import tempfile
+    from ifc_mesh import save_mesh, load_mesh, shape_mesh, mesh_size
+
+    ifc_path = Path(ifc_path)
+    if not ifc_path.exists():
+        print(f"Error: File not found: {ifc_path}")
+        return None
+
+    output_dir = Path(output_dir) if output_dir else ifc_path.with_name(f"{ifc_path.stem}_tiles")
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    if verbose:
+        print(f"Input:  {ifc_path}")
+        print(f"Output: {output_dir}/")
+        print(f"Tiles:  storey x {tile_size:g} m grid")
+        print(f"Size:   {ifc_path.stat().st_size / (1024**2):.2f} MB")
+        print("-" * 60)
+
+    start_time = time.time()
+
+    try:
+        if verbose:
+            print("Loading IFC file...")
+        load_start = time.time()
+        ifc_file = ifcopenshell.open(str(ifc_path))
+        load_time = time.time() - load_start
+        if verbose:
+            print(f"  Schema: {ifc_file.schema}")
+            print(f"  Load time: {load_time:.2f}s")
+
+        element_storey = _storey_lookup(ifc_file)
+
+        settings = ifcopenshell.geom.settings()
+        for name, value in GEOMETRY_SETTINGS.items():
+            settings.set(name, value)
+
+        products = ifc_file.by_type("IfcProduct")
+        num_cores = threads or multiprocessing.cpu_count()
+        if verbose:
+            print(f"\nFound {len(products)} products in IFC file")
+            print(f"Creating geometry iterator (using {num_cores} CPU cores)...")
+
+        convert_start = time.time()
+        iterator = _product_iterator(settings, ifc_file, num_cores)
+
+        # (storey index, gx, gy) -> tile record
+        tiles = {}
+        storeys = {}
+        processed = 0
+        last_report_time = time.time()
+
+        with tempfile.TemporaryDirectory(prefix='tiles-', dir=output_dir) as spool:
+            if verbose:
+                print("\nProcessing geometry:")
+
+            for shape in iterator:
+                mesh = shape_mesh(shape)
+                if not len(mesh['positions']):
+                    continue
+                lo = mesh['positions'].min(axis=0)
+                hi = mesh['positions'].max(axis=0)
+                center = (lo + hi) / 2
+
+                element = ifc_file.by_id(shape.id)
+                storey_index, storey = element_storey.get(shape.id, (-1, None))
+                storeys[storey_index] = storey
+                key = (storey_index, int(center[0] // tile_size), int(center[1] // tile_size))
+
+                tile = tiles.get(key)
+                if tile is None:
+                    tile = tiles[key] = {'products': [], 'min': lo, 'max': hi, 'vertices': 0, 'triangles': 0}
+                tile['min'] = np.minimum(tile['min'], lo)
+                tile['max'] = np.maximum(tile['max'], hi)
+                vertices, triangles = mesh_size(mesh)
+                tile['vertices'] += vertices
+                tile['triangles'] += triangles
+
+                mesh_path = Path(spool) / f"{processed}.npz"
+                save_mesh(mesh, mesh_path)
+                tile['products'].append((shape.guid, element.is_a(), element.Name, mesh_path))
+                processed += 1
+
+                current_time = time.time()
+                if verbose and (processed % 50 == 0 or current_time - last_report_time >= 2):
+                    elapsed = current_time - convert_start
+                    progress = processed / len(products) * 100
+                    rate = processed / elapsed if elapsed > 0 else 0
+                    print(f"  [{processed:5d}/{len(products)}] {progress:5.1f}% | "
+                          f"{rate:.1f} items/s | {len(tiles)} tiles", flush=True)
+                    last_report_time = current_time
+
+            convert_time = time.time() - convert_start
+
+            if verbose:
+                print(f"\nWriting {len(tiles)} tiles...")
+            write_start = time.time()
+            manifest_tiles = []
+            for key in sorted(tiles):
+                storey_index, gx, gy = key
+                tile = tiles[key]
+                storey = storeys[storey_index]
+                filename = (f"tile_{'unassigned' if storey is None else f's{storey_index:02d}'}"
+                            f"_x{gx}_y{gy}.glb")
+                paths = {guid: path for guid, _, _, path in tile['products']}
+                write_product_glb(
+                    output_dir / filename,
+                    sorted((guid, ifc_class, name) for guid, ifc_class, name, _ in tile['products']),
+                    lambda guid: load_mesh(paths[guid])
+                )
+
+                bounds_min, bounds_max = _gltf_bounds(tile['min'].tolist(), tile['max'].tolist())
+                manifest_tiles.append({
+                    'file': filename,
+                    'storey': None if storey is None else {
+                        'index': storey_index,
+                        'name': storey.Name,
+                        'globalId': storey.GlobalId,
+                        'elevation': storey.Elevation,
+                    },
+                    'grid': [gx, gy],
+                    'bounds': {'min': bounds_min, 'max': bounds_max},
+                    'products': len(tile['products']),
+                    'vertices': tile['vertices'],
+                    'triangles': tile['triangles'],
+                    'bytes': (output_dir / filename).stat().st_size,
+                })
+            write_time = time.time() - write_start
+
+        manifest = {
+            'source': ifc_path.name,
+            'generator': 'convert_ifc_to_glb.py --tiles',
+            'up_axis': 'Y',
+            'tile_size': tile_size,
+            'bounds': {
+                'min': np.min([t['bounds']['min'] for t in manifest_tiles], axis=0).tolist() if manifest_tiles else None,
+                'max': np.max([t['bounds']['max'] for t in manifest_tiles], axis=0).tolist() if manifest_tiles else None,
+            },
+            'tiles': manifest_tiles,
+        }
+        manifest_path = output_dir / 'tiles.json'
+        with open(manifest_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+        total_time = time.time() - start_time
+        total_bytes = sum(t['bytes'] for t in manifest_tiles)
+
+        metrics = {
+            'ifc_size_mb': ifc_path.stat().st_size / (1024**2),
+            'glb_size_mb': total_bytes / (1024**2),
+            'load_time_s': load_time,
+            'convert_time_s': convert_time,
+            'write_time_s': write_time,
+            'total_time_s': total_time,
+            'products_processed': processed,
+            'tiles': len(manifest_tiles),
+            'largest_tile_mb': max((t['bytes'] for t in manifest_tiles), default=0) / (1024**2),
+        }
+
+        if verbose:
+            print("-" * 60)
+            print("TILED CONVERSION COMPLETE")
+            print(f"  Products processed: {processed}")
+            print(f"  Tiles: {len(manifest_tiles)} (largest {metrics['largest_tile_mb']:.2f} MB)")
+            print(f"  Total GLB size: {metrics['glb_size_mb']:.2f} MB")
+            print(f"  Load time: {load_time:.2f}s")
+            print(f"  Convert time: {convert_time:.2f}s")
+            print(f"  Write time: {write_time:.2f}s")
+            print(f"  Total time: {total_time:.2f}s")
+            print(f"\n✓ Saved: {manifest_path}")
+
+        return metrics
+
+    except Exception as e:
+        print(f"Error during conversion: {e}")
+        import traceback
+        traceback.print_exc()
+        return None
+
+
+def convert_instanced(ifc_path, output_path=None, mode='nodes', verbose=True, trace=None, threads=None):
+    """
+    Convert IFC to GLB tessellating each unique representation once
+
+    Shapes that share shape.geometry.id (same representation or mapped item)
+    are identical meshes in local coordinates. Each is written once and
+    placed per product either by its own node ('nodes': a shared mesh with
+    per-node transforms) or, for geometries used more than once, by
+    EXT_mesh_gpu_instancing ('gpu'). Every product keeps its GlobalId: as the
+    node name in 'nodes' mode, as extras.globalIds[instance] in 'gpu' mode.
+
+    Args:
+        ifc_path: Path to input IFC file
+        output_path: Path for output GLB file (optional)
+        mode: 'nodes' or 'gpu'
+        verbose: Print progress information
+        trace: conversion_trace.ConversionTrace (closed here)
+        threads: Geometry iterator threads (default: CPU count)
+
+    Returns:
+        dict with conversion metrics
+    """
+    from conversion_trace import ConversionTrace, print_class_table, print_slowest_products
+    from glb_writer import GLBWriter, Z_UP_TO_Y_UP, matrices_to_trs
+    from ifc_mesh import add_mesh, mesh_size, shape_matrix, shape_mesh
+
+    trace = trace or ConversionTrace()
+
+    ifc_path = Path(ifc_path)
+    if not ifc_path.exists():
+        print(f"Error: File not found: {ifc_path}")
+        return None
+
+    output_path = Path(output_path) if output_path else ifc_path.with_suffix('.glb')
+
+    if verbose:
+        print(f"Input:  {ifc_path}")
+        print(f"Output: {output_path}")
+        print(f"Instancing: {'EXT_mesh_gpu_instancing' if mode == 'gpu' else 'shared meshes, per-node transforms'}")
+        print(f"Size:   {ifc_path.stat().st_size / (1024**2):.2f} MB")
+        print("-" * 60)
+
+    start_time = time.time()
+
+    try:
+        if verbose:
+            print("Loading IFC file...")
+        load_start = time.time()
+        with trace.phase('open'):
+            ifc_file = ifcopenshell.open(str(ifc_path))
+        load_time = time.time() - load_start
+        if verbose:
+            print(f"  Schema: {ifc_file.schema}")
+            print(f"  Load time: {load_time:.2f}s")
+
+        # Local coordinates: the placement comes with every shape as a matrix
+        settings = ifcopenshell.geom.settings()
+        for name, value in dict(GEOMETRY_SETTINGS, **{'use-world-coords': False}).items():
+            settings.set(name, value)
+
+        products = ifc_file.by_type("IfcProduct")
+        num_cores = threads or multiprocessing.cpu_count()
+        if verbose:
+            print(f"\nFound {len(products)} products in IFC file")
+            print(f"Creating geometry iterator (using {num_cores} CPU cores)...")
+
+        convert_start = time.time()
+        iterator = _product_iterator(settings, ifc_file, num_cores)
+        trace.iterator_threads(num_cores)
+        with trace.phase('iterator_init', threads=num_cores):
+            has_shapes = iterator.initialize()
+
+        # geometry id -> mesh, and -> [(GlobalId, class, name, matrix)]
+        meshes = {}
+        instances = {}
+        processed = 0
+        last_report_time = time.time()
+
+        if verbose:
+            print("\nProcessing geometry:")
+
+        shape_start = time.perf_counter()
+        while has_shapes:
+            shape = iterator.get()
+            extract_start = time.perf_counter()
+            geometry_id = shape.geometry.id
+            new_geometry = geometry_id not in meshes
+            if new_geometry:
+                meshes[geometry_id] = shape_mesh(shape)
+                instances[geometry_id] = []
+            element = ifc_file.by_id(shape.id)
+            instances[geometry_id].append((shape.guid, element.is_a(), element.Name, shape_matrix(shape)))
+            extract_end = time.perf_counter()
+            processed += 1
+
+            trace.add_time('tessellation', extract_start - shape_start)
+            trace.add_time('mesh_extract', extract_end - extract_start)
+            trace.product(extract_start - shape_start, element)
+            if trace.enabled:
+                vertices, triangles = mesh_size(meshes[geometry_id]) if new_geometry else (0, 0)
+                trace.shape(element.is_a(), extract_start - shape_start, extract_end - extract_start,
+                            vertices, triangles)
+
+            current_time = time.time()
+            if current_time - last_report_time >= 2 or (verbose and processed % 50 == 0):
+                trace.progress(processed, len(products))
+                if verbose:
+                    elapsed = current_time - convert_start
+                    progress = processed / len(products) * 100
+                    rate = processed / elapsed if elapsed > 0 else 0
+                    print(f"  [{processed:5d}/{len(products)}] {progress:5.1f}% | "
+                          f"{rate:.1f} items/s | {len(meshes)} unique geometries", flush=True)
+                last_report_time = current_time
+
+            shape_start = time.perf_counter()
+            has_shapes = iterator.next()
+        trace.progress(processed, len(products))
+
+        convert_time = time.time() - convert_start
+
+        if verbose:
+            print("\nWriting GLB...")
+        write_start = time.time()
+        with trace.phase('build_glb'):
+            writer = GLBWriter()
+            root = writer.add_node(name='IfcModel', matrix=Z_UP_TO_Y_UP, root=True)
+            vertices = triangles = draw_calls = instanced_products = 0
+
+            # Deterministic order: geometries by their first GlobalId, instances by GlobalId
+            for geometry_id in sorted(instances, key=lambda g: min(i[0] for i in instances[g])):
+                mesh = meshes[geometry_id]
+                group = sorted(instances[geometry_id], key=lambda i: i[0])
+                mesh_index = add_mesh(writer, mesh, name=geometry_id)
+                v, t = mesh_size(mesh)
+                vertices += v
+                triangles += t
+
+                if mode == 'gpu' and len(group) > 1:
+                    translation, rotation, scale, exact = matrices_to_trs([i[3] for i in group])
+                    instanced = [i for i, ok in zip(group, exact) if ok]
+                    if len(instanced) > 1:
+                        attributes = {
+                            'TRANSLATION': writer.add_accessor(translation[exact]),
+                            'ROTATION': writer.add_accessor(rotation[exact]),
+                            'SCALE': writer.add_accessor(scale[exact]),
+                        }
+                        writer.use_extension('EXT_mesh_gpu_instancing')
+                        writer.add_node(
+                            name=geometry_id, mesh=mesh_index, parent=root,
+                            extensions={'EXT_mesh_gpu_instancing': {'attributes': attributes}},
+                            extras={
+                                'globalIds': [i[0] for i in instanced],
+                                'ifcClasses': [i[1] for i in instanced],
+                                'names': [i[2] for i in instanced],
+                            }
+                        )
+                        draw_calls += len(mesh['groups'])
+                        instanced_products += len(instanced)
+                        # Sheared placements cannot be expressed as TRS: plain nodes
+                        group = [i for i, ok in zip(group, exact) if not ok]
+
+                for guid, ifc_class, name, matrix in group:
+                    extras = {'globalId': guid, 'ifcClass': ifc_class}
+                    if name:
+                        extras['name'] = name
+                    writer.add_node(name=guid, mesh=mesh_index, matrix=matrix, extras=extras, parent=root)
+                    draw_calls += len(mesh['groups'])
+
+        with trace.phase('write'):
+            writer.write(output_path)
+        write_time = time.time() - write_start
+
+        total_time = time.time() - start_time
+        output_size = output_path.stat().st_size / (1024**2)
+        repeated = sum(1 for group in instances.values() if len(group) > 1)
+
+        metrics = {
+            'ifc_size_mb': ifc_path.stat().st_size / (1024**2),
+            'glb_size_mb': output_size,
+            'load_time_s': load_time,
+            'convert_time_s': convert_time,
+            'write_time_s': write_time,
+            'total_time_s': total_time,
+            'products_processed': processed,
+            'unique_geometries': len(meshes),
+            'repeated_geometries': repeated,
+            'gpu_instanced_products': instanced_products,
+            'draw_calls': draw_calls,
+            'vertices': vertices,
+            'triangles': triangles,
+            'compression_ratio': ifc_path.stat().st_size / output_path.stat().st_size
+        }
+
+        if verbose:
+            print("-" * 60)
+            print("INSTANCED CONVERSION COMPLETE")
+            print(f"  Products processed: {processed}")
+            print(f"  Unique geometries: {len(meshes)} ({repeated} used more than once)")
+            if mode == 'gpu':
+                print(f"  GPU-instanced products: {instanced_products}")
+            print(f"  Draw calls (primitives): {draw_calls}")
+            print(f"  Stored vertices: {vertices:,}  Triangles: {triangles:,}")
+            print(f"  GLB size: {output_size:.2f} MB")
+            print(f"  Compression: {metrics['compression_ratio']:.2f}x")
+            print(f"  Load time: {load_time:.2f}s")
+            print(f"  Convert time: {convert_time:.2f}s")
+            print(f"  Write time: {write_time:.2f}s")
+            print(f"  Total time: {total_time:.2f}s")
+
+        metrics = trace.close(metrics)
+
+        if verbose:
+            print(f"  Peak RSS: {metrics['peak_rss_mb']:.1f} MB")
+            if trace.enabled:
+                print("  Phases: " + ", ".join(f"{name} {phase['time_s']:.2f}s/{phase['peak_rss_mb']:.0f} MB"
+                                               for name, phase in metrics['phases'].items()))
+                print_class_table(metrics)
+                for path in (trace.trace_path, trace.metrics_path):
+                    if path:
+                        print(f"  ✓ Written: {path}")
+            print_slowest_products(metrics, trace.slowest.limit)
+            print(f"\n✓ Saved: {output_path}")
+
+        return metrics
+
+    except Exception as e:
+        print(f"Error during conversion: {e}")
+        import traceback
+        traceback.print_exc()
+        trace.close(error=f"{type(e).__name__}: {e}")
+        return None
+
+
 def main():
     parser = argparse.ArgumentParser(
         description='Convert IFC to GLB using ifcopenshell',
@@ -169,14 +1138,104 @@ def main():
 
     parser.add_argument('input', help='Input IFC file')
     parser.add_argument('-o', '--output', help='Output GLB file (default: input.glb)')
+    parser.add_argument('--cache-dir', help='Reuse unchanged conversions from this stage cache')
+    parser.add_argument('--incremental', metavar='CACHE_DIR', nargs='?', const='',
+                        help='Only re-tessellate products changed since the last run '
+                             '(per-product geometry cache, default: output.geomcache)')
+    parser.add_argument('--checkpoint', type=float, metavar='SECONDS',
+                        help='With --incremental: checkpoint tessellated products every SECONDS so a killed '
+                             'run resumes where it stopped')
+    parser.add_argument('--tiles', type=float, metavar='SIZE',
+                        help='Write one GLB per storey x SIZE m grid tile plus tiles.json '
+                             '(-o is then the output directory)')
+    parser.add_argument('--instancing', nargs='?', const='nodes', choices=['nodes', 'gpu'],
+                        help='Tessellate each shared representation once: shared meshes with '
+                             'per-node transforms (nodes, default) or EXT_mesh_gpu_instancing (gpu)')
+    parser.add_argument('--trace', metavar='PATH',
+                        help='Stream phase/progress/RSS events: Chrome trace JSON, or JSONL for a .jsonl path')
+    parser.add_argument('--metrics', metavar='PATH',
+                        help='Write metrics, per-phase RSS and per-class throughput as JSON')
+    parser.add_argument('--slowest', type=int, default=10, metavar='N',
+                        help='Report the N slowest products (default: 10, 0 to disable)')
+    parser.add_argument('--product-budget', type=float, metavar='SECONDS',
+                        help='Tessellate products in worker processes; a product over SECONDS is retried '
+                             'with simpler settings, then replaced by its bounding box')
+    parser.add_argument('--threads', type=int, metavar='N',
+                        help='Geometry iterator threads, or worker processes with --product-budget '
+                             '(default: CPU count)')
     parser.add_argument('-q', '--quiet', action='store_true', help='Quiet mode')
 
     args = parser.parse_args()
 
+    if args.checkpoint and args.incremental is None:
+        # The plain conversion writes through the serializer; resuming needs
+        # the incremental path's own writer, so that has to be asked for
+        parser.error('--checkpoint requires --incremental')
+    if args.checkpoint and (args.tiles or args.instancing or args.product_budget):
+        parser.error('--checkpoint works with the --incremental conversion only')
+
+    if (args.trace or args.metrics) and (args.tiles or args.incremental is not None or args.product_budget):
+        parser.error('--trace/--metrics apply to the plain and --instancing conversions')
+    from conversion_trace import ConversionTrace
+    trace = ConversionTrace(trace_path=args.trace, metrics_path=args.metrics, slowest=args.slowest)
+
+    if args.product_budget:
+        if args.tiles or args.instancing or args.incremental is not None or args.cache_dir:
+            parser.error('--product-budget is its own conversion mode')
+        metrics = convert_budgeted(
+            args.input,
+            output_path=args.output,
+            budget=args.product_budget,
+            slowest=args.slowest,
+            processes=args.threads,
+            verbose=not args.quiet
+        )
+        sys.exit(0 if metrics else 1)
+
+    if args.tiles:
+        metrics = convert_tiled(
+            args.input,
+            output_dir=args.output,
+            tile_size=args.tiles,
+            verbose=not args.quiet,
+            threads=args.threads
+        )
+        sys.exit(0 if metrics else 1)
+
+    if args.instancing:
+        metrics = convert_instanced(
+            args.input,
+            output_path=args.output,
+            mode=args.instancing,
+            verbose=not args.quiet,
+            trace=trace,
+            threads=args.threads
+        )
+        sys.exit(0 if metrics else 1)
+
+    if args.incremental is not None:
+        metrics = convert_incremental(
+            args.input,
+            output_path=args.output,
+            cache_dir=args.incremental or None,
+            verbose=not args.quiet,
+            threads=args.threads,
+            checkpoint_interval=args.checkpoint
+        )
+        sys.exit(0 if metrics else 1)
+
+    cache = None
+    if args.cache_dir:
+        from pipeline_cache import StageCache
+        cache = StageCache(args.cache_dir, verbose=not args.quiet)
+
     metrics = convert_ifc_to_glb(
         args.input,
         output_path=args.output,
-        verbose=not args.quiet
+        verbose=not args.quiet,
+        cache=cache,
+        trace=trace,
+        threads=args.threads
     )
 
     sys.exit(0 if metrics else 1)
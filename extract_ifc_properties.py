@@ -0,0 +1,465 @@
+#!/usr/bin/env python3
+"""
+IFC property extraction into SQLite
+Streams every product's attributes, property sets, quantities, type and
+materials into a database keyed by GlobalId, so GLBs can stay property-free
+and the viewer looks element data up on demand
+"""
+
+import sys
+import time
+import sqlite3
+import argparse
+import multiprocessing
+from pathlib import Path
+
+from split_ifc_by_storey import build_relationship_maps
+
+
+SCHEMA = """
+CREATE TABLE metadata (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE storeys (
+    global_id TEXT PRIMARY KEY,
+    name TEXT,
+    elevation REAL
+);
+CREATE TABLE elements (
+    global_id TEXT PRIMARY KEY,
+    step_id INTEGER,
+    ifc_class TEXT NOT NULL,
+    name TEXT,
+    description TEXT,
+    object_type TEXT,
+    tag TEXT,
+    storey_global_id TEXT,
+    container_global_id TEXT,
+    type_global_id TEXT,
+    type_class TEXT,
+    type_name TEXT
+) WITHOUT ROWID;
+CREATE TABLE properties (
+    global_id TEXT NOT NULL,
+    pset TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value,
+    unit TEXT,
+    kind TEXT NOT NULL,
+    source TEXT NOT NULL
+);
+CREATE TABLE materials (
+    global_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    name TEXT,
+    category TEXT,
+    thickness REAL,
+    usage TEXT NOT NULL,
+    source TEXT NOT NULL
+);
+"""
+
+# Created after the bulk load, which is faster than maintaining them per insert
+INDEXES = """
+CREATE INDEX idx_elements_class ON elements (ifc_class);
+CREATE INDEX idx_elements_storey ON elements (storey_global_id);
+CREATE INDEX idx_elements_type ON elements (type_global_id);
+CREATE INDEX idx_properties_element ON properties (global_id);
+CREATE INDEX idx_properties_name ON properties (name, pset);
+CREATE INDEX idx_materials_element ON materials (global_id);
+CREATE INDEX idx_materials_name ON materials (name);
+"""
+
+DEFAULT_CHUNK_SIZE = 2000
+DEFAULT_BATCH_SIZE = 10000
+
+
+def _value(value):
+    """SQLite-storable Python value of an IFC measure/select (None stays None)"""
+    if value is None:
+        return None
+    value = getattr(value, 'wrappedValue', value)
+    if isinstance(value, (list, tuple)):
+        return '; '.join(str(_value(v)) for v in value)
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (int, float, str)):
+        return value
+    return str(value)
+
+
+def _unit(unit):
+    """Readable name of an IfcUnit (None if absent)"""
+    if unit is None:
+        return None
+    if unit.is_a("IfcSIUnit"):
+        return f"{unit.Prefix or ''}{unit.Name}"
+    return getattr(unit, 'Name', None) or unit.is_a()
+
+
+def property_rows(properties, pset_name, global_id, source, prefix=''):
+    """Rows (global_id, pset, name, value, unit, kind, source) for IfcProperty entities"""
+    rows = []
+    for prop in properties or ():
+        name = prefix + prop.Name
+        if prop.is_a("IfcPropertySingleValue"):
+            rows.append((global_id, pset_name, name, _value(prop.NominalValue), _unit(prop.Unit), 'property', source))
+        elif prop.is_a("IfcPropertyEnumeratedValue"):
+            rows.append((global_id, pset_name, name, _value(prop.EnumerationValues), None, 'property', source))
+        elif prop.is_a("IfcPropertyListValue"):
+            rows.append((global_id, pset_name, name, _value(prop.ListValues), _unit(prop.Unit), 'property', source))
+        elif prop.is_a("IfcPropertyBoundedValue"):
+            bounds = f"{_value(prop.LowerBoundValue)}..{_value(prop.UpperBoundValue)}"
+            rows.append((global_id, pset_name, name, bounds, _unit(prop.Unit), 'property', source))
+        elif prop.is_a("IfcPropertyTableValue"):
+            rows.append((global_id, pset_name, name, _value(prop.DefiningValues), None, 'property', source))
+        elif prop.is_a("IfcPropertyReferenceValue"):
+            reference = prop.PropertyReference
+            rows.append((global_id, pset_name, name, None if reference is None else str(reference.is_a()),
+                         None, 'property', source))
+        elif prop.is_a("IfcComplexProperty"):
+            rows.extend(property_rows(prop.HasProperties, pset_name, global_id, source, prefix=f"{name}."))
+    return rows
+
+
+def definition_rows(definition, global_id, source):
+    """Rows for one property set or element quantity"""
+    if definition.is_a("IfcPropertySet"):
+        return property_rows(definition.HasProperties, definition.Name, global_id, source)
+    if definition.is_a("IfcElementQuantity"):
+        rows = []
+        for quantity in definition.Quantities or ():
+            if quantity.is_a("IfcPhysicalComplexQuantity"):
+                continue
+            # Length/Area/Volume/Count/Weight/TimeValue is always the 4th attribute
+            value = quantity[3] if quantity.is_a("IfcPhysicalSimpleQuantity") else None
+            rows.append((global_id, definition.Name, quantity.Name, _value(value), _unit(quantity.Unit),
+                         'quantity', source))
+        return rows
+    return []
+
+
+def material_rows(material, global_id, source):
+    """Rows (global_id, position, name, category, thickness, usage, source) for a material select"""
+    rows = []
+
+    def add(item, usage, thickness=None):
+        rows.append((global_id, len(rows), getattr(item, 'Name', None), getattr(item, 'Category', None),
+                     thickness, usage, source))
+
+    if material.is_a("IfcMaterialLayerSetUsage"):
+        material = material.ForLayerSet
+    if material.is_a("IfcMaterialProfileSetUsage"):
+        material = material.ForProfileSet
+
+    if material.is_a("IfcMaterial"):
+        add(material, 'material')
+    elif material.is_a("IfcMaterialLayerSet"):
+        for layer in material.MaterialLayers or ():
+            if layer.Material is not None:
+                add(layer.Material, 'layer', _value(layer.LayerThickness))
+    elif material.is_a("IfcMaterialLayer"):
+        if material.Material is not None:
+            add(material.Material, 'layer', _value(material.LayerThickness))
+    elif material.is_a("IfcMaterialList"):
+        for item in material.Materials or ():
+            add(item, 'list')
+    elif material.is_a("IfcMaterialConstituentSet"):
+        for constituent in material.MaterialConstituents or ():
+            if constituent.Material is not None:
+                add(constituent.Material, 'constituent')
+    elif material.is_a("IfcMaterialProfileSet"):
+        for profile in material.MaterialProfiles or ():
+            if profile.Material is not None:
+                add(profile.Material, 'profile')
+    return rows
+
+
+def _global_id(entity):
+    return None if entity is None else entity.GlobalId
+
+
+def extract_product(product, maps, element_to_storey):
+    """
+    All rows for one product
+
+    Returns:
+        (element row, property rows, material rows)
+    """
+    global_id = product.GlobalId
+    product_id = product.id()
+    type_obj = maps['element_to_type'].get(product_id)
+
+    element = (
+        global_id,
+        product_id,
+        product.is_a(),
+        product.Name,
+        product.Description,
+        getattr(product, 'ObjectType', None),
+        getattr(product, 'Tag', None),
+        _global_id(element_to_storey.get(product_id)),
+        _global_id(maps['element_to_container'].get(product_id) or maps['parent'].get(product_id)),
+        _global_id(type_obj),
+        None if type_obj is None else type_obj.is_a(),
+        None if type_obj is None else type_obj.Name,
+    )
+
+    properties = []
+    for definition in maps['element_to_psets'].get(product_id, ()):
+        properties.extend(definition_rows(definition, global_id, 'instance'))
+    if type_obj is not None:
+        for definition in getattr(type_obj, 'HasPropertySets', None) or ():
+            properties.extend(definition_rows(definition, global_id, 'type'))
+
+    materials = []
+    for material in maps['element_to_materials'].get(product_id, ()):
+        materials.extend(material_rows(material, global_id, 'instance'))
+    if not materials and type_obj is not None:
+        for material in maps['element_to_materials'].get(type_obj.id(), ()):
+            materials.extend(material_rows(material, global_id, 'type'))
+    # Positions run across all material associations of the element
+    materials = [row[:1] + (i,) + row[2:] for i, row in enumerate(materials)]
+
+    return element, properties, materials
+
+
+def extract_chunk(ifc_file, maps, element_to_storey, product_ids):
+    """Rows for a chunk of products given by STEP id"""
+    elements, properties, materials = [], [], []
+    for product_id in product_ids:
+        element, product_properties, product_materials = extract_product(
+            ifc_file.by_id(product_id), maps, element_to_storey
+        )
+        elements.append(element)
+        properties.extend(product_properties)
+        materials.extend(product_materials)
+    return elements, properties, materials
+
+
+# Populated by the parent right before the pool forks so every worker
+# inherits the loaded model and lookup tables instead of re-parsing
+_WORKER_STATE = {}
+
+
+def _extract_chunk_worker(product_ids):
+    state = _WORKER_STATE
+    return extract_chunk(state['ifc_file'], state['maps'], state['element_to_storey'], product_ids)
+
+
+def _open_database(db_path):
+    """Fresh database in WAL mode with the table schema"""
+    for suffix in ('', '-wal', '-shm'):
+        path = Path(f"{db_path}{suffix}")
+        if path.exists():
+            path.unlink()
+
+    connection = sqlite3.connect(str(db_path))
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.execute("PRAGMA temp_store=MEMORY")
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def extract_ifc_properties(input_path, db_path=None, jobs=1, chunk_size=DEFAULT_CHUNK_SIZE,
+                           batch_size=DEFAULT_BATCH_SIZE, verbose=True):
+    """
+    Extract the properties of every IfcProduct into an SQLite database
+
+    Args:
+        input_path: IFC file
+        db_path: Output database (default: <input>.properties.sqlite)
+        jobs: Worker processes extracting product chunks (0 = all cores)
+        chunk_size: Products per worker task
+        batch_size: Rows buffered per executemany() before they are written
+        verbose: Print progress information
+
+    Returns:
+        dict with metrics, or None on error
+    """
+    try:
+        import ifcopenshell
+    except ImportError as e:
+        print(f"Error: ifcopenshell not found: {e}")
+        print("Please install: pip install ifcopenshell --break-system-packages")
+        return None
+
+    input_path = Path(input_path)
+    if not input_path.exists():
+        print(f"Error: File not found: {input_path}")
+        return None
+    db_path = Path(db_path) if db_path else input_path.with_suffix('.properties.sqlite')
+
+    if verbose:
+        print("=" * 80)
+        print(f"PROPERTY EXTRACTION: {input_path}")
+        print("=" * 80)
+        print(f"Database: {db_path}")
+
+    start_time = time.time()
+
+    try:
+        ifc_file = ifcopenshell.open(str(input_path))
+    except Exception as e:
+        print(f"Error opening IFC file: {e}")
+        return None
+    load_time = time.time() - start_time
+
+    maps = build_relationship_maps(ifc_file, verbose)
+    storeys = ifc_file.by_type("IfcBuildingStorey")
+    element_to_storey = {}
+    for storey in storeys:
+        element_to_storey[storey.id()] = storey
+        for element in maps['storey_to_elements'].get(storey.id(), ()):
+            element_to_storey.setdefault(element.id(), storey)
+
+    product_ids = [product.id() for product in ifc_file.by_type("IfcProduct") if product.GlobalId]
+    chunks = [product_ids[i:i + chunk_size] for i in range(0, len(product_ids), chunk_size)]
+
+    if jobs is None or jobs < 1:
+        jobs = multiprocessing.cpu_count()
+    jobs = min(jobs, max(len(chunks), 1))
+    if jobs > 1 and "fork" not in multiprocessing.get_all_start_methods():
+        print("Warning: parallel extraction needs the 'fork' start method, falling back to sequential")
+        jobs = 1
+
+    if verbose:
+        print(f"Products: {len(product_ids):,} in {len(chunks):,} chunk(s), {jobs} worker(s)")
+        print("-" * 60)
+
+    connection = _open_database(db_path)
+    counts = {'elements': 0, 'properties': 0, 'materials': 0}
+    pending = {'elements': [], 'properties': [], 'materials': []}
+    statements = {
+        'elements': "INSERT OR REPLACE INTO elements VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        'properties': "INSERT INTO properties VALUES (?, ?, ?, ?, ?, ?, ?)",
+        'materials': "INSERT INTO materials VALUES (?, ?, ?, ?, ?, ?, ?)",
+    }
+
+    def flush(force=False):
+        if not force and sum(len(rows) for rows in pending.values()) < batch_size:
+            return
+        with connection:
+            for table, rows in pending.items():
+                if rows:
+                    connection.executemany(statements[table], rows)
+                    counts[table] += len(rows)
+                    rows.clear()
+
+    def consume(results):
+        for done, (elements, properties, materials) in enumerate(results, start=1):
+            pending['elements'].extend(elements)
+            pending['properties'].extend(properties)
+            pending['materials'].extend(materials)
+            flush()
+            if verbose and (done % 10 == 0 or done == len(chunks)):
+                print(f"  {done:,}/{len(chunks):,} chunks", end='\r')
+
+    extract_start = time.time()
+    try:
+        if jobs > 1:
+            _WORKER_STATE.update({'ifc_file': ifc_file, 'maps': maps, 'element_to_storey': element_to_storey})
+            try:
+                # Workers inherit the loaded model and lookup tables through fork;
+                # only the parent writes to the database
+                with multiprocessing.get_context("fork").Pool(jobs) as pool:
+                    consume(pool.imap(_extract_chunk_worker, chunks))
+            finally:
+                _WORKER_STATE.clear()
+        else:
+            consume(extract_chunk(ifc_file, maps, element_to_storey, chunk) for chunk in chunks)
+        flush(force=True)
+        if verbose and chunks:
+            print()
+
+        with connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO storeys VALUES (?, ?, ?)",
+                [(storey.GlobalId, storey.Name, _value(storey.Elevation)) for storey in storeys]
+            )
+            connection.executemany("INSERT INTO metadata VALUES (?, ?)", [
+                ('source', input_path.name),
+                ('schema', ifc_file.schema),
+                ('ifcopenshell', getattr(ifcopenshell, 'version', 'unknown')),
+                ('extracted', time.strftime("%Y-%m-%dT%H:%M:%S")),
+            ])
+        extract_time = time.time() - extract_start
+
+        index_start = time.time()
+        connection.executescript(INDEXES)
+        connection.execute("PRAGMA optimize")
+        connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        index_time = time.time() - index_start
+    finally:
+        connection.close()
+
+    total_time = time.time() - start_time
+    metrics = {
+        'products': len(product_ids),
+        'elements': counts['elements'],
+        'properties': counts['properties'],
+        'materials': counts['materials'],
+        'storeys': len(storeys),
+        'jobs': jobs,
+        'db_size_mb': db_path.stat().st_size / (1024**2),
+        'load_time_s': load_time,
+        'relationship_time_s': maps['build_time_s'],
+        'extract_time_s': extract_time,
+        'index_time_s': index_time,
+        'total_time_s': total_time,
+    }
+
+    if verbose:
+        print("-" * 60)
+        print("EXTRACTION COMPLETE")
+        print(f"  Elements: {counts['elements']:,}")
+        print(f"  Property/quantity values: {counts['properties']:,}")
+        print(f"  Material rows: {counts['materials']:,}")
+        print(f"  Load: {load_time:.2f}s, extract: {extract_time:.2f}s, indexes: {index_time:.2f}s")
+        if extract_time > 0:
+            print(f"  Throughput: {len(product_ids) / extract_time:,.0f} products/s")
+        print(f"  Total time: {total_time:.2f}s")
+        print(f"\n✓ Saved: {db_path} ({metrics['db_size_mb']:.2f} MB)")
+
+    return metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Extract IFC properties, quantities, types and materials into SQLite',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python extract_ifc_properties.py building.ifc -o building.sqlite -j 0
+
+  # Look an element up
+  sqlite3 building.sqlite "SELECT pset, name, value FROM properties WHERE global_id = '2O2Fr$t4X7Zf8NOew3FLOH'"
+        """
+    )
+    parser.add_argument('input', help='Input IFC file')
+    parser.add_argument('-o', '--output', help='Output database (default: input.properties.sqlite)')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='Worker processes extracting product chunks (0 = all cores, default: 1)')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f'Products per worker task (default: {DEFAULT_CHUNK_SIZE})')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f'Rows per batched insert (default: {DEFAULT_BATCH_SIZE})')
+    parser.add_argument('-q', '--quiet', action='store_true', help='Quiet mode')
+
+    args = parser.parse_args()
+
+    metrics = extract_ifc_properties(
+        args.input,
+        db_path=args.output,
+        jobs=args.jobs,
+        chunk_size=args.chunk_size,
+        batch_size=args.batch_size,
+        verbose=not args.quiet
+    )
+    sys.exit(0 if metrics else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Per-product geometry cache for incremental IFC → GLB conversion
+Products are keyed by GlobalId plus a Merkle hash of everything that shapes
+their tessellation (representation subgraph, placement chain, openings,
+styles and materials), so a new revision of a model only sends new or
+changed products through the geometry iterator
+"""
+
+import os
+import re
+import json
+import hashlib
+from pathlib import Path
+from collections import Counter, defaultdict
+
+from ifc_mesh import load_mesh, save_mesh
+
+
+# Entities shared by many products: their digests are kept for the whole run,
+# everything else only while hashing one product
+SHARED_CLASSES = (
+    "IfcObjectPlacement",
+    "IfcRepresentationMap",
+    "IfcRepresentationContext",
+    "IfcPresentationStyle",
+    "IfcPresentationStyleAssignment",
+    "IfcMaterial",
+    "IfcMaterialLayerSet",
+    "IfcMaterialLayerSetUsage",
+    "IfcMaterialProfileSet",
+    "IfcMaterialProfileSetUsage",
+    "IfcMaterialConstituentSet",
+    "IfcMaterialList",
+)
+
+_REFERENCE = re.compile(r'#(\d+)')
+
+
+def _digest(text):
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+
+class GeometryHasher:
+    """
+    Content hashes of IFC subgraphs that do not depend on STEP ids
+
+    Each entity is hashed as its STEP line with the '#id' references replaced
+    by the digests of the referenced entities, so renumbering between exports
+    does not change the hash while any change to a referenced point, profile,
+    placement or style does.
+    """
+
+    def __init__(self, ifc_file):
+        self.ifc_file = ifc_file
+        self.shared = {}
+        self.attachments = self._collect_attachments()
+
+    def _collect_attachments(self):
+        """
+        Entities that style an item without being referenced by it: styled
+        items point at their item, material representations at their material
+        """
+        attachments = defaultdict(list)
+        for styled in self.ifc_file.by_type("IfcStyledItem"):
+            if styled.Item is not None:
+                attachments[styled.Item.id()].extend(styled.Styles or ())
+        for definition in self.ifc_file.by_type("IfcMaterialDefinitionRepresentation"):
+            if definition.RepresentedMaterial is not None:
+                attachments[definition.RepresentedMaterial.id()].extend(definition.Representations or ())
+        return attachments
+
+    def _children(self, entity):
+        references = [
+            ref for ref in self.ifc_file.traverse(entity, max_levels=1)[1:]
+            if ref.id() and not ref.is_a("IfcRoot")
+        ]
+        return references + [ref for ref in self.attachments.get(entity.id(), ()) if ref.id()]
+
+    def digest(self, entity):
+        """Merkle digest of an entity and everything it references"""
+        if entity is None:
+            return '-'
+        local = {}
+
+        def known(entity_id):
+            return local.get(entity_id) or self.shared.get(entity_id)
+
+        visiting = set()
+        stack = [(entity, False)]
+        while stack:
+            current, expanded = stack.pop()
+            current_id = current.id()
+            if known(current_id):
+                continue
+
+            children = self._children(current)
+            if not expanded:
+                visiting.add(current_id)
+                stack.append((current, True))
+                for child in children:
+                    if not known(child.id()) and child.id() not in visiting:
+                        stack.append((child, False))
+                continue
+
+            child_digests = {child.id(): known(child.id()) or 'cycle' for child in children}
+            body = str(current).split('=', 1)[1]
+            body = _REFERENCE.sub(lambda m: child_digests.get(int(m.group(1)), m.group(0)), body)
+            attached = ','.join(child_digests[ref.id()] for ref in self.attachments.get(current_id, ()) if ref.id())
+            value = _digest(body + '|' + attached)
+
+            if any(current.is_a(cls) for cls in SHARED_CLASSES):
+                self.shared[current_id] = value
+            else:
+                local[current_id] = value
+
+        return known(entity.id())
+
+    def product_key(self, product):
+        """
+        Cache key of a product's geometry: class, representation, placement,
+        openings/projections and associated materials (of the product and its type)
+        """
+        parts = [product.is_a(), self.digest(product.Representation), self.digest(product.ObjectPlacement)]
+
+        features = []
+        for rel in getattr(product, 'HasOpenings', ()) or ():
+            features.append(rel.RelatedOpeningElement)
+        for rel in getattr(product, 'HasProjections', ()) or ():
+            features.append(rel.RelatedFeatureElement)
+        parts.extend(sorted(
+            f"{feature.is_a()}:{self.digest(feature.Representation)}:{self.digest(feature.ObjectPlacement)}"
+            for feature in features
+        ))
+
+        parts.extend(sorted(self.digest(material) for material in self._materials(product)))
+        return _digest('|'.join(parts))
+
+    def _materials(self, product):
+        owners = [product]
+        for rel in (getattr(product, 'IsTypedBy', None) or getattr(product, 'IsDefinedBy', None) or ()):
+            if rel.is_a("IfcRelDefinesByType"):
+                owners.append(rel.RelatingType)
+        return [
+            rel.RelatingMaterial
+            for owner in owners
+            for rel in getattr(owner, 'HasAssociations', ()) or ()
+            if rel.is_a("IfcRelAssociatesMaterial")
+        ]
+
+
+def cache_ids(products):
+    """
+    Cache id of each product, by STEP id
+
+    The GlobalId, except for products whose GlobalId is not unique in the
+    file (authoring tools do write duplicates): those get GlobalId#<step id>
+    so their entries cannot overwrite each other. Such ids do not survive a
+    renumbered export, so these products are simply retessellated then.
+    """
+    counts = Counter(product.GlobalId for product in products)
+    return {
+        product.id(): product.GlobalId if counts[product.GlobalId] == 1 else f"{product.GlobalId}#{product.id()}"
+        for product in products
+    }
+
+
+class ProductGeometryCache:
+    """
+    Triangle buffers of previously converted products
+
+    Layout:
+        <root>/index.json                  settings + {cache id: {key, class, geometry}}
+        <root>/index.journal               products stored since the last save() (JSON lines)
+        <root>/meshes/<key[:2]>/<key>.npz  cached mesh (see ifc_mesh.save_mesh)
+
+    Products are indexed by cache id (see cache_ids). A product whose key
+    is unchanged is reused as-is; products that produced
+    no geometry are remembered too so they are not retried. Changing the
+    geometry settings or the ifcopenshell version invalidates everything.
+
+    checkpoint() appends the products stored since the previous checkpoint
+    to the journal, which is replayed on load, so a run killed halfway
+    keeps everything it had checkpointed without rewriting the whole index
+    each time. save() folds the journal into the index.
+    """
+
+    def __init__(self, root, settings):
+        self.root = Path(root)
+        self.meshes = self.root / 'meshes'
+        self.index_path = self.root / 'index.json'
+        self.journal_path = self.root / 'index.journal'
+        self.settings = settings
+        self.meshes.mkdir(parents=True, exist_ok=True)
+
+        self.products = {}
+        self._unjournaled = {}
+        if self.index_path.exists():
+            try:
+                with open(self.index_path) as f:
+                    index = json.load(f)
+                if index.get('settings') == settings:
+                    self.products = index['products']
+                else:
+                    print("  Geometry settings changed, cached products are not reused")
+            except (OSError, json.JSONDecodeError, KeyError) as e:
+                print(f"Warning: ignoring unreadable geometry cache index {self.index_path}: {e}")
+        if self.journal_path.exists():
+            self._replay_journal()
+
+    def _replay_journal(self):
+        with open(self.journal_path) as f:
+            lines = f.read().splitlines()
+        try:
+            current = json.loads(lines[0]).get('settings') == self.settings
+        except (IndexError, json.JSONDecodeError):
+            current = False
+        if not current:
+            self.journal_path.unlink()
+            return
+
+        replayed = 0
+        for line in lines[1:]:
+            try:
+                guid, entry = json.loads(line)
+            except ValueError:
+                # Torn last line of a run killed mid-write: cut it off so
+                # later checkpoints append after a complete line
+                with open(self.journal_path, 'w') as f:
+                    f.write('\n'.join(lines[:replayed + 1]) + '\n')
+                break
+            self.products[guid] = entry
+            replayed += 1
+        if replayed:
+            print(f"  Resuming from checkpoint: {replayed} products in {self.journal_path.name}")
+
+    def mesh_path(self, key):
+        return self.meshes / key[:2] / f"{key}.npz"
+
+    def lookup(self, guid, key):
+        """Cached entry for a product if its key is unchanged, else None"""
+        entry = self.products.get(guid)
+        if entry is None or entry['key'] != key:
+            return None
+        if entry['geometry'] and not self.mesh_path(key).exists():
+            return None
+        return entry
+
+    def load(self, key):
+        return load_mesh(self.mesh_path(key))
+
+    def store(self, guid, key, ifc_class, mesh):
+        """Record a freshly tessellated product (mesh=None: no geometry)"""
+        if mesh is not None:
+            path = self.mesh_path(key)
+            if not path.exists():
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = path.with_suffix('.tmp')
+                save_mesh(mesh, tmp_path)
+                os.replace(tmp_path, path)
+        self.products[guid] = self._unjournaled[guid] = {'key': key, 'class': ifc_class, 'geometry': mesh is not None}
+
+    def remove(self, guids):
+        for guid in guids:
+            self.products.pop(guid, None)
+
+    def prune(self):
+        """Delete meshes no product refers to any more; returns the number removed"""
+        referenced = {entry['key'] for entry in self.products.values() if entry['geometry']}
+        removed = 0
+        for path in self.meshes.glob('*/*.npz'):
+            if path.stem not in referenced:
+                path.unlink()
+                removed += 1
+        return removed
+
+    def checkpoint(self):
+        """
+        Durably append the products stored since the last checkpoint
+
+        Returns:
+            number of products written to the journal
+        """
+        if not self._unjournaled:
+            return 0
+        new_journal = not self.journal_path.exists()
+        with open(self.journal_path, 'a') as f:
+            if new_journal:
+                f.write(json.dumps({'settings': self.settings}) + '\n')
+            for guid, entry in self._unjournaled.items():
+                f.write(json.dumps([guid, entry]) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        written = len(self._unjournaled)
+        self._unjournaled.clear()
+        return written
+
+    def save(self):
+        """Atomically rewrite the index (and drop the journal it now contains)"""
+        tmp_path = self.index_path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump({'settings': self.settings, 'products': self.products}, f)
+        os.replace(tmp_path, self.index_path)
+        self.journal_path.unlink(missing_ok=True)
+        self._unjournaled.clear()
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Georeferencing probe for IFC files without loading the model
+Memory-maps the STEP file and reads only the records the centering decision
+needs (IfcMapConversion / ePSet_MapConversion, IfcSite, the model context's
+world coordinate system), so a multi-GB file is answered in seconds with
+constant memory and IfcConvert is the only thing that parses it in full
+"""
+
+import re
+import sys
+import json
+import mmap
+import time
+import argparse
+from pathlib import Path
+
+from step_scanner import decode_string, read_record, references, split_arguments
+
+
+# Same thresholds as smart_convert_ifc_to_glb's ifcopenshell-based check
+MAP_OFFSET_THRESHOLD = 1000
+ZERO_ANGLES = ((0, 0, 0), (0, 0, 0, 0))
+
+_SCHEMA = re.compile(rb"FILE_SCHEMA\s*\(\s*\(\s*'([^']*)'")
+_NEXT_RECORD = re.compile(rb";\s*#(\d+)\s*=")
+_TYPED = re.compile(rb"([A-Za-z0-9_]+)\s*\((.*)\)\s*$", re.DOTALL)
+
+# Entity names are searched as 'NAME(' in the raw file: STEP writes them in
+# upper case without a space; every hit is checked by parsing its record
+_COORDINATE_OPERATIONS = (b'IFCMAPCONVERSION', b'IFCMAPCONVERSIONSCALED', b'IFCRIGIDOPERATION')
+_MAP_ATTRIBUTES = ('Eastings', 'Northings', 'OrthogonalHeight', 'XAxisAbscissa', 'XAxisOrdinate', 'Scale')
+
+
+def step_value(raw):
+    """
+    Python value of a raw STEP argument: None for $/*, str for strings and
+    enumerations, bool, int/float, list for aggregates, the wrapped value
+    for typed values like IFCLENGTHMEASURE(1.5), '#id' strings for references
+    """
+    raw = raw.strip()
+    if raw in (b'$', b'*', b''):
+        return None
+    if raw.startswith(b"'"):
+        return decode_string(raw[1:-1])
+    if raw.startswith(b'('):
+        return [step_value(item) for item in split_arguments(raw[1:-1])] if raw[1:-1].strip() else []
+    if raw.startswith(b'#'):
+        return raw.decode('ascii')
+    if raw in (b'.T.', b'.F.'):
+        return raw == b'.T.'
+    if raw.startswith(b'.'):
+        return raw.strip(b'.').decode('ascii')
+    typed = _TYPED.match(raw)
+    if typed:
+        return step_value(typed.group(2))
+    text = raw.decode('ascii')
+    return float(text) if any(c in text for c in '.eE') else int(text)
+
+
+class _RecordReader:
+    """Random access to the records of a memory-mapped STEP file by #id"""
+
+    # Below this many bytes the binary search switches to a linear scan
+    WINDOW = 1 << 16
+    # Bytes searched per step by find_all()
+    CHUNK = 64 << 20
+
+    def __init__(self, mm, data_start):
+        self.mm = mm
+        self.data_start = data_start
+        self.cache = {}
+
+    def _scan(self, entity_id, start, end):
+        pattern = re.compile(rb"(?:^|;)\s*#%d\s*=" % entity_id, re.MULTILINE)
+        match = pattern.search(self.mm, start, end)
+        if match is None:
+            return None
+        offset = match.start() + (self.mm[match.start():match.start() + 1] == b';')
+        return read_record(self.mm, offset)
+
+    def by_id(self, entity_id):
+        """(id, class, [raw arguments], end) of #entity_id, or None"""
+        if entity_id in self.cache:
+            return self.cache[entity_id]
+
+        # Exporters write ids in ascending order, so bisect on byte offsets;
+        # files that are not ordered fall back to one linear scan
+        lo, hi = self.data_start, len(self.mm)
+        while hi - lo > self.WINDOW:
+            mid = (lo + hi) // 2
+            match = _NEXT_RECORD.search(self.mm, mid, hi)
+            if match is None:
+                hi = mid
+            elif int(match.group(1)) < entity_id:
+                lo = match.start()
+            elif int(match.group(1)) > entity_id:
+                hi = mid
+            else:
+                lo = match.start()
+                break
+        record = self._scan(entity_id, max(lo - 1, self.data_start), min(hi + self.WINDOW, len(self.mm)))
+        if record is None or record[0] != entity_id:
+            record = self._scan(entity_id, self.data_start, len(self.mm))
+        self.cache[entity_id] = record
+        return record
+
+    def ref(self, value):
+        """Record referenced by a '#id' value"""
+        if isinstance(value, str) and value.startswith('#'):
+            return self.by_id(int(value[1:]))
+        return None
+
+    def find_all(self, literal):
+        """
+        Start offsets of the records containing a literal
+
+        bytes.find over CHUNK-sized windows; scanned windows are dropped
+        from the process's resident set again (they stay in the page cache),
+        so memory stays flat however large the file is.
+        """
+        starts = []
+        size = len(self.mm)
+        chunk_start = self.data_start
+        while chunk_start < size:
+            chunk_end = min(chunk_start + self.CHUNK, size)
+            position = self.mm.find(literal, chunk_start, min(chunk_end + len(literal) - 1, size))
+            while position >= 0:
+                starts.append(max(self.mm.rfind(b';', self.data_start, position) + 1, self.data_start))
+                position = self.mm.find(literal, position + len(literal), min(chunk_end + len(literal) - 1, size))
+            if hasattr(mmap, 'MADV_DONTNEED'):
+                aligned = chunk_start - chunk_start % mmap.PAGESIZE
+                self.mm.madvise(mmap.MADV_DONTNEED, aligned, chunk_end - aligned)
+            chunk_start = chunk_end
+        return starts
+
+    def records_of_type(self, *names):
+        """Records of the given upper-case classes (exact match, not subtypes), in file order"""
+        found = {}
+        for name in names:
+            for start in self.find_all(name + b'('):
+                record = read_record(self.mm, start)
+                if record is not None and record[1] == name.decode('ascii'):
+                    found[start] = record
+        return [found[start] for start in sorted(found)]
+
+
+def _default_axis(conversion):
+    """No X axis direction means no rotation, as in ifcopenshell.util.geolocation"""
+    if not conversion.get('XAxisAbscissa') and not conversion.get('XAxisOrdinate'):
+        conversion.update(XAxisAbscissa=1.0, XAxisOrdinate=0.0)
+    return conversion
+
+
+def _map_conversion(reader, schema):
+    """Map conversion attributes, or None (IFC2X3: ePSet_MapConversion on the project)"""
+    if schema.upper() == 'IFC2X3':
+        for start in reader.find_all(b"'ePSet_MapConversion'"):
+            record = read_record(reader.mm, start)
+            if record is None or record[1] != 'IFCPROPERTYSET':
+                continue
+            values = {}
+            for ref in references(record[2][4]):
+                prop = reader.by_id(ref)
+                if prop is not None and prop[1] == 'IFCPROPERTYSINGLEVALUE':
+                    values[step_value(prop[2][0])] = step_value(prop[2][2])
+            return _default_axis({
+                'source': 'ePSet_MapConversion',
+                'Eastings': values.get('Eastings') or 0,
+                'Northings': values.get('Northings') or 0,
+                'OrthogonalHeight': values.get('OrthogonalHeight') or 0,
+                'XAxisAbscissa': values.get('XAxisAbscissa'),
+                'XAxisOrdinate': values.get('XAxisOrdinate'),
+                'Scale': values.get('Scale') or 1,
+            })
+        return None
+
+    operations = reader.records_of_type(*_COORDINATE_OPERATIONS)
+    if not operations:
+        return None
+    entity_id, name, arguments, _ = min(operations)
+    values = [step_value(argument) for argument in arguments]
+    if name == 'IFCRIGIDOPERATION':
+        conversion = dict(zip(('Eastings', 'Northings', 'OrthogonalHeight'), values[2:5]))
+        conversion.update(XAxisAbscissa=1.0, XAxisOrdinate=0.0, Scale=1)
+    else:
+        conversion = dict(zip(_MAP_ATTRIBUTES, values[2:8]))
+        for key in ('Eastings', 'Northings', 'OrthogonalHeight'):
+            conversion[key] = conversion.get(key) or 0
+        conversion['Scale'] = conversion.get('Scale') or 1
+    conversion['source'] = f"#{entity_id}={name}"
+    return _default_axis(conversion)
+
+
+def _wcs_origin(reader):
+    """Location of the model context's WorldCoordinateSystem, or None"""
+    contexts = reader.records_of_type(b'IFCGEOMETRICREPRESENTATIONCONTEXT')
+    wcs = None
+    for _, _, arguments, _ in contexts:
+        wcs = step_value(arguments[4])
+        if step_value(arguments[1]) == 'Model':
+            break
+    placement = reader.ref(wcs)
+    if placement is None:
+        return None
+    point = reader.ref(step_value(placement[2][0]))
+    if point is None or point[1] != 'IFCCARTESIANPOINT':
+        return None
+    return [float(c) for c in step_value(point[2][0])]
+
+
+def probe_georeferencing(ifc_path):
+    """
+    Decide whether an IFC file needs IfcConvert's --center-model-geometry,
+    reading only the georeferencing records
+
+    Same decision as the ifcopenshell-based check: map conversion offsets
+    (IfcMapConversion / IfcRigidOperation, or ePSet_MapConversion in
+    IFC2X3) above MAP_OFFSET_THRESHOLD, or an IfcSite with non-zero
+    RefLatitude/RefLongitude, mean map coordinates.
+
+    Args:
+        ifc_path: Path to IFC file
+
+    Returns:
+        dict with schema, map_conversion (or None), sites (name, latitude,
+        longitude), wcs_origin (project units, or None), needs_centering,
+        reason and probe_time_s
+    """
+    start_time = time.time()
+    with open(ifc_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        header_end = mm.find(b'DATA;')
+        if header_end < 0:
+            raise ValueError(f"{ifc_path}: no DATA section, not a STEP file")
+        match = _SCHEMA.search(mm, 0, header_end)
+        schema = match.group(1).decode('ascii') if match else 'UNKNOWN'
+        reader = _RecordReader(mm, header_end + len(b'DATA;'))
+
+        result = {
+            'path': str(ifc_path),
+            'schema': schema,
+            'map_conversion': _map_conversion(reader, schema),
+            'sites': [],
+            'wcs_origin': _wcs_origin(reader),
+            'needs_centering': False,
+            'reason': 'local coordinates',
+        }
+        for _, _, arguments, _ in reader.records_of_type(b'IFCSITE'):
+            result['sites'].append({
+                'name': step_value(arguments[2]),
+                'latitude': step_value(arguments[9]),
+                'longitude': step_value(arguments[10]),
+                'elevation': step_value(arguments[11]),
+            })
+        reader.cache.clear()
+
+    conversion = result['map_conversion']
+    if conversion is not None and (abs(conversion['Eastings']) > MAP_OFFSET_THRESHOLD or
+                                   abs(conversion['Northings']) > MAP_OFFSET_THRESHOLD):
+        result.update(needs_centering=True, reason='map conversion offsets')
+    else:
+        for site in result['sites']:
+            if any(angles and tuple(angles) not in ZERO_ANGLES for angles in (site['latitude'], site['longitude'])):
+                result.update(needs_centering=True, reason='IfcSite latitude/longitude')
+                break
+
+    result['probe_time_s'] = time.time() - start_time
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Read IFC georeferencing without loading the model',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python georef_probe.py bilton.ifc
+  python georef_probe.py a.ifc b.ifc --json georef.json
+        """
+    )
+    parser.add_argument('inputs', nargs='+', help='Input IFC files')
+    parser.add_argument('--json', help='Write the probe results to this JSON file')
+
+    args = parser.parse_args()
+
+    results = []
+    for path in args.inputs:
+        try:
+            result = probe_georeferencing(path)
+        except (OSError, ValueError) as e:
+            print(f"❌ {path}: {e}")
+            continue
+        results.append(result)
+
+        print(f"{Path(path).name} ({result['schema']}, {result['probe_time_s']:.2f}s)")
+        conversion = result['map_conversion']
+        if conversion:
+            print(f"  Map conversion ({conversion['source']}): Eastings={conversion['Eastings']}, "
+                  f"Northings={conversion['Northings']}, OrthogonalHeight={conversion['OrthogonalHeight']}")
+        for site in result['sites']:
+            print(f"  Site {site['name']}: latitude={site['latitude']}, longitude={site['longitude']}")
+        if result['wcs_origin'] is not None:
+            print(f"  WCS origin: {result['wcs_origin']}")
+        mark = '🎯' if result['needs_centering'] else '✓'
+        print(f"  {mark} needs centering: {result['needs_centering']} ({result['reason']})")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    sys.exit(0 if len(results) == len(args.inputs) else 1)
+
+
+if __name__ == "__main__":
+    main()
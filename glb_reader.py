@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Zero-copy GLB reader shared by the GLB tools
+Memory-maps the file, validates the chunk layout and exposes accessors as
+NumPy views into the BIN chunk, so even 600+ MB GLBs can be analysed in
+constant extra memory
+"""
+
+import sys
+import json
+import mmap
+import struct
+from pathlib import Path
+
+import numpy as np
+
+
+GLB_MAGIC = b'glTF'
+CHUNK_JSON = 0x4E4F534A
+CHUNK_BIN = 0x004E4942
+
+# glTF componentType -> little-endian NumPy dtype
+COMPONENT_DTYPES = {
+    5120: np.dtype('<i1'),
+    5121: np.dtype('<u1'),
+    5122: np.dtype('<i2'),
+    5123: np.dtype('<u2'),
+    5125: np.dtype('<u4'),
+    5126: np.dtype('<f4'),
+}
+
+# glTF accessor type -> number of components
+TYPE_COMPONENTS = {
+    'SCALAR': 1,
+    'VEC2': 2,
+    'VEC3': 3,
+    'VEC4': 4,
+    'MAT2': 4,
+    'MAT3': 9,
+    'MAT4': 16,
+}
+
+
+class GLBError(ValueError):
+    """Raised for malformed or unsupported GLB files"""
+
+
+def normalize_components(data):
+    """Convert normalized integer components to float32 as defined by glTF"""
+    if data.dtype.kind == 'f':
+        return data
+    info = np.iinfo(data.dtype)
+    if info.min < 0:
+        return np.maximum(data.astype(np.float32) / info.max, -1.0)
+    return data.astype(np.float32) / info.max
+
+
+class GLBReader:
+    """
+    Memory-mapped GLB file
+
+    Usage:
+        with GLBReader('model.glb') as glb:
+            positions = glb.accessor(glb.json['meshes'][0]['primitives'][0]['attributes']['POSITION'])
+
+    Views returned by accessor() and buffer_view() are read-only and point
+    straight into the mapped BIN chunk; they stay valid while the reader is
+    open (or while any view is still referenced).
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.file_size = self.path.stat().st_size
+
+        if self.file_size < 20:
+            raise GLBError(f"{self.path}: too small to be a GLB file ({self.file_size} bytes)")
+
+        self._file = open(self.path, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._parse()
+        except Exception:
+            self.close()
+            raise
+
+    def _parse(self):
+        magic, self.version, self.length = struct.unpack_from('<4sII', self._mmap, 0)
+
+        if magic != GLB_MAGIC:
+            raise GLBError(f"{self.path}: bad magic {magic!r}, not a GLB file")
+        if self.version != 2:
+            raise GLBError(f"{self.path}: unsupported GLB version {self.version}")
+        if self.length > self.file_size:
+            raise GLBError(f"{self.path}: header length {self.length:,} exceeds file size {self.file_size:,} (truncated?)")
+
+        # (type, offset, length) of every chunk, offsets point at chunk data
+        self.chunks = []
+        offset = 12
+        while offset < self.length:
+            if offset + 8 > self.length:
+                raise GLBError(f"{self.path}: truncated chunk header at byte {offset}")
+            chunk_length, chunk_type = struct.unpack_from('<II', self._mmap, offset)
+            if offset + 8 + chunk_length > self.length:
+                raise GLBError(f"{self.path}: chunk at byte {offset} runs past end of file")
+            if chunk_length % 4:
+                raise GLBError(f"{self.path}: chunk at byte {offset} is not 4-byte aligned")
+            self.chunks.append((chunk_type, offset + 8, chunk_length))
+            offset += 8 + chunk_length
+
+        if not self.chunks or self.chunks[0][0] != CHUNK_JSON:
+            raise GLBError(f"{self.path}: first chunk must be JSON")
+
+        _, json_offset, json_length = self.chunks[0]
+        try:
+            self.json = json.loads(self._mmap[json_offset:json_offset + json_length].decode('utf-8'))
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            raise GLBError(f"{self.path}: invalid JSON chunk: {e}")
+
+        self.bin_offset = None
+        self.bin_length = 0
+        if len(self.chunks) > 1 and self.chunks[1][0] == CHUNK_BIN:
+            _, self.bin_offset, self.bin_length = self.chunks[1]
+
+        buffers = self.json.get('buffers', [])
+        if buffers and 'uri' not in buffers[0]:
+            if self.bin_offset is None:
+                raise GLBError(f"{self.path}: buffer 0 has no uri but there is no BIN chunk")
+            if buffers[0].get('byteLength', 0) > self.bin_length:
+                raise GLBError(f"{self.path}: buffer 0 is larger than the BIN chunk")
+
+    def close(self):
+        mm = getattr(self, '_mmap', None)
+        if mm is not None:
+            try:
+                mm.close()
+            except BufferError:
+                # Views are still alive; the mapping is released with them
+                pass
+        if getattr(self, '_file', None) is not None:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _buffer_view_location(self, index):
+        """Absolute file offset, byte length and stride of a bufferView"""
+        views = self.json.get('bufferViews', [])
+        if not 0 <= index < len(views):
+            raise GLBError(f"bufferView {index} does not exist")
+        view = views[index]
+
+        buffer_index = view.get('buffer', 0)
+        buffers = self.json.get('buffers', [])
+        if not buffers:
+            raise GLBError(f"bufferView {index} refers to buffer {buffer_index} but the file declares no buffers")
+        if buffer_index != 0 or 'uri' in buffers[0]:
+            raise GLBError(f"bufferView {index} refers to an external buffer, only the GLB BIN chunk is supported")
+
+        offset = view.get('byteOffset', 0)
+        length = view['byteLength']
+        if offset + length > self.bin_length:
+            raise GLBError(f"bufferView {index} runs past the end of the BIN chunk")
+
+        return self.bin_offset + offset, length, view.get('byteStride')
+
+    def buffer_view(self, index):
+        """Raw bytes of a bufferView as a read-only uint8 view"""
+        offset, length, _ = self._buffer_view_location(index)
+        return np.frombuffer(self._mmap, dtype=np.uint8, count=length, offset=offset)
+
+    def _strided_view(self, buffer_view, byte_offset, count, dtype, components):
+        """(count, components) view of a bufferView honouring byteStride"""
+        view_offset, view_length, stride = self._buffer_view_location(buffer_view)
+        element_size = dtype.itemsize * components
+        if stride is None:
+            stride = element_size
+        elif not isinstance(stride, int) or isinstance(stride, bool) or stride <= 0:
+            raise GLBError(f"bufferView {buffer_view}: malformed byteStride {stride!r}")
+        elif stride < element_size:
+            raise GLBError(f"bufferView {buffer_view}: byteStride {stride} is smaller than "
+                           f"the {element_size}-byte elements read from it")
+
+        if count and byte_offset + stride * (count - 1) + element_size > view_length:
+            raise GLBError(f"accessor data runs past the end of bufferView {buffer_view}")
+
+        return np.ndarray(
+            (count, components), dtype=dtype, buffer=self._mmap,
+            offset=view_offset + byte_offset, strides=(stride, dtype.itemsize)
+        )
+
+    def accessor(self, index, normalize=False):
+        """
+        Accessor data as a NumPy array
+
+        Returns a zero-copy (count, components) view into the BIN chunk, or
+        (count,) for SCALAR accessors. A copy is only made when the accessor
+        is sparse (substitutions have to be applied) or when normalize=True
+        converts a normalized integer accessor to float32.
+        """
+        accessors = self.json.get('accessors', [])
+        if not 0 <= index < len(accessors):
+            raise GLBError(f"accessor {index} does not exist")
+        accessor = accessors[index]
+
+        try:
+            dtype = COMPONENT_DTYPES[accessor['componentType']]
+            components = TYPE_COMPONENTS[accessor['type']]
+        except KeyError as e:
+            raise GLBError(f"accessor {index}: unsupported component type or type {e}")
+
+        if (accessor['type'] == 'MAT2' and dtype.itemsize == 1) or \
+                (accessor['type'] == 'MAT3' and dtype.itemsize < 4):
+            # Matrix columns that are not a multiple of 4 bytes are padded
+            raise GLBError(f"accessor {index}: padded {accessor['type']} accessors are not supported")
+
+        count = accessor['count']
+
+        if 'bufferView' in accessor:
+            data = self._strided_view(
+                accessor['bufferView'], accessor.get('byteOffset', 0), count, dtype, components
+            )
+        else:
+            data = np.zeros((count, components), dtype=dtype)
+
+        sparse = accessor.get('sparse')
+        if sparse:
+            indices_info = sparse['indices']
+            values_info = sparse['values']
+            indices = self._strided_view(
+                indices_info['bufferView'], indices_info.get('byteOffset', 0),
+                sparse['count'], COMPONENT_DTYPES[indices_info['componentType']], 1
+            )[:, 0]
+            values = self._strided_view(
+                values_info['bufferView'], values_info.get('byteOffset', 0),
+                sparse['count'], dtype, components
+            )
+            data = np.array(data)
+            data[indices] = values
+
+        if normalize and accessor.get('normalized'):
+            data = normalize_components(data)
+
+        if components == 1:
+            return data[:, 0]
+        return data
+
+    def primitive_accessors(self, semantic='POSITION'):
+        """Unique accessor indices used for an attribute semantic by any mesh primitive"""
+        indices = []
+        seen = set()
+        for mesh in self.json.get('meshes', []):
+            for primitive in mesh.get('primitives', []):
+                index = primitive.get('attributes', {}).get(semantic)
+                if index is not None and index not in seen:
+                    seen.add(index)
+                    indices.append(index)
+        return indices
+
+
+def read_gltf_json(glb_path):
+    """Read and validate only the JSON chunk of a GLB file"""
+    with GLBReader(glb_path) as glb:
+        return glb.json
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python glb_reader.py <glb_file>")
+        sys.exit(1)
+
+    with GLBReader(sys.argv[1]) as glb:
+        print(f"GLB version {glb.version}, {glb.length:,} bytes")
+        for chunk_type, offset, length in glb.chunks:
+            name = struct.pack('<I', chunk_type).decode('ascii', 'replace')
+            print(f"  Chunk {name:4s} at {offset:,}: {length:,} bytes")
+        for index, accessor in enumerate(glb.json.get('accessors', [])):
+            data = glb.accessor(index)
+            print(f"  Accessor {index}: {accessor['type']} {data.dtype} x {len(data):,}"
+                  f"{' (sparse)' if 'sparse' in accessor else ''}")
@@ -0,0 +1,521 @@
+#!/usr/bin/env python3
+"""
+Minimal GLB writer shared by the Python conversion and post-processing stages
+Builds glTF 2.0 JSON and a single BIN chunk from NumPy arrays
+"""
+
+import json
+import struct
+
+import numpy as np
+
+from glb_reader import CHUNK_BIN, CHUNK_JSON, COMPONENT_DTYPES, GLB_MAGIC
+
+
+GENERATOR = 'babylon-bim-viewer'
+
+ARRAY_BUFFER = 34962
+ELEMENT_ARRAY_BUFFER = 34963
+
+# NumPy dtype -> glTF componentType
+COMPONENT_TYPES = {dtype: component for component, dtype in COMPONENT_DTYPES.items()}
+
+# Number of components -> glTF accessor type (vectors only)
+VECTOR_TYPES = {1: 'SCALAR', 2: 'VEC2', 3: 'VEC3', 4: 'VEC4', 16: 'MAT4'}
+
+# IFC is Z-up, glTF is Y-up: (x, y, z) -> (x, z, -y), like IfcConvert's root transform
+Z_UP_TO_Y_UP = np.array([
+    [1.0, 0.0, 0.0, 0.0],
+    [0.0, 0.0, 1.0, 0.0],
+    [0.0, -1.0, 0.0, 0.0],
+    [0.0, 0.0, 0.0, 1.0],
+])
+
+
+def matrix_to_gltf(matrix):
+    """Row-major 4x4 NumPy matrix -> glTF column-major list (None for identity)"""
+    matrix = np.asarray(matrix, dtype=np.float64)
+    if np.allclose(matrix, np.eye(4)):
+        return None
+    return [float(v) for v in matrix.T.ravel()]
+
+
+def matrices_to_trs(matrices, tolerance=1e-5):
+    """
+    Decompose row-major 4x4 matrices into glTF translation, rotation
+    (quaternion x, y, z, w) and scale
+
+    Returns:
+        (translation, rotation, scale, exact): float32 arrays and a boolean
+        mask of matrices that TRS reproduces (no shear or projection)
+    """
+    matrices = np.asarray(matrices, dtype=np.float64).reshape(-1, 4, 4)
+    translation = matrices[:, :3, 3]
+    basis = matrices[:, :3, :3]
+
+    scale = np.linalg.norm(basis, axis=1)
+    # Mirroring is folded into the scale so the rotation stays proper
+    scale[:, 0] *= np.where(np.linalg.det(basis) < 0, -1.0, 1.0)
+    rotation_matrix = basis / np.where(scale == 0, 1.0, scale)[:, None, :]
+
+    m = rotation_matrix
+    trace = m[:, 0, 0] + m[:, 1, 1] + m[:, 2, 2]
+    quaternion = np.empty((len(m), 4))
+    quaternion[:, 3] = np.sqrt(np.maximum(1.0 + trace, 0.0)) / 2
+    quaternion[:, 0] = np.sqrt(np.maximum(1.0 + m[:, 0, 0] - m[:, 1, 1] - m[:, 2, 2], 0.0)) / 2
+    quaternion[:, 1] = np.sqrt(np.maximum(1.0 - m[:, 0, 0] + m[:, 1, 1] - m[:, 2, 2], 0.0)) / 2
+    quaternion[:, 2] = np.sqrt(np.maximum(1.0 - m[:, 0, 0] - m[:, 1, 1] + m[:, 2, 2], 0.0)) / 2
+    quaternion[:, 0] = np.copysign(quaternion[:, 0], m[:, 2, 1] - m[:, 1, 2])
+    quaternion[:, 1] = np.copysign(quaternion[:, 1], m[:, 0, 2] - m[:, 2, 0])
+    quaternion[:, 2] = np.copysign(quaternion[:, 2], m[:, 1, 0] - m[:, 0, 1])
+    quaternion /= np.linalg.norm(quaternion, axis=1, keepdims=True)
+
+    exact = (
+        np.allclose(matrices[:, 3], [0.0, 0.0, 0.0, 1.0], atol=tolerance, rtol=0) &
+        np.all(np.abs(np.einsum('nji,njk->nik', m, m) - np.eye(3)) < tolerance, axis=(1, 2))
+    ) if len(matrices) else np.zeros(0, dtype=bool)
+    return translation.astype(np.float32), quaternion.astype(np.float32), scale.astype(np.float32), exact
+
+
+def _align(length, alignment=4):
+    return (length + alignment - 1) // alignment * alignment
+
+
+class GLBWriter:
+    """
+    Accumulates glTF objects and binary data, then writes a GLB
+
+    Usage:
+        writer = GLBWriter()
+        positions = writer.add_accessor(verts, target=ARRAY_BUFFER, bounds=True)
+        indices = writer.add_accessor(faces, target=ELEMENT_ARRAY_BUFFER)
+        material = writer.add_material({'pbrMetallicRoughness': {...}})
+        mesh = writer.add_mesh([{'attributes': {'POSITION': positions}, 'indices': indices, 'material': material}])
+        writer.add_node(mesh=mesh, name='...', root=True)
+        writer.write('out.glb')
+
+    Identical materials are stored once.
+    """
+
+    def __init__(self, generator=GENERATOR):
+        self.gltf = {
+            'asset': {'version': '2.0', 'generator': generator},
+            'scene': 0,
+            'scenes': [{'nodes': []}],
+            'nodes': [],
+            'meshes': [],
+            'materials': [],
+            'accessors': [],
+            'bufferViews': [],
+        }
+        self._parts = []
+        self._length = 0
+        self._material_index = {}
+
+    @property
+    def bin_length(self):
+        return self._length
+
+    def add_buffer_view(self, data, target=None, byte_stride=None):
+        """Append raw bytes (4-byte aligned) as a new bufferView"""
+        data = memoryview(np.ascontiguousarray(data)).cast('B')
+        padding = _align(self._length) - self._length
+        if padding:
+            self._parts.append(b'\0' * padding)
+            self._length += padding
+
+        view = {'buffer': 0, 'byteOffset': self._length, 'byteLength': data.nbytes}
+        if byte_stride:
+            view['byteStride'] = byte_stride
+        if target:
+            view['target'] = target
+
+        self._parts.append(data)
+        self._length += data.nbytes
+        self.gltf['bufferViews'].append(view)
+        return len(self.gltf['bufferViews']) - 1
+
+    def add_accessor(self, array, target=None, normalized=False, bounds=False, accessor_type=None):
+        """
+        Store a (count,) or (count, components) array as a new accessor
+
+        Vertex attributes whose elements are not a multiple of 4 bytes
+        (e.g. int16 VEC3) are padded to a 4-byte stride as glTF requires.
+        """
+        array = np.asarray(array)
+        dtype = array.dtype.newbyteorder('<') if array.dtype.byteorder == '>' else array.dtype
+        if dtype not in COMPONENT_TYPES:
+            raise ValueError(f"dtype {array.dtype} has no glTF component type")
+        array = np.ascontiguousarray(array, dtype=dtype)
+
+        components = 1 if array.ndim == 1 else array.shape[1]
+        count = array.shape[0]
+        element_size = components * dtype.itemsize
+
+        accessor = {
+            'componentType': COMPONENT_TYPES[dtype],
+            'count': count,
+            'type': accessor_type or VECTOR_TYPES[components],
+        }
+        if normalized:
+            accessor['normalized'] = True
+        if bounds and count:
+            values = array.reshape(count, components)
+            cast = float if dtype.kind == 'f' else int
+            accessor['min'] = [cast(v) for v in values.min(axis=0)]
+            accessor['max'] = [cast(v) for v in values.max(axis=0)]
+
+        byte_stride = None
+        if target == ARRAY_BUFFER:
+            byte_stride = _align(element_size)
+            if byte_stride != element_size:
+                padded = np.zeros((count, byte_stride), dtype=np.uint8)
+                padded[:, :element_size] = array.reshape(count, -1).view(np.uint8)
+                array = padded
+
+        accessor['bufferView'] = self.add_buffer_view(array, target=target, byte_stride=byte_stride)
+        self.gltf['accessors'].append(accessor)
+        return len(self.gltf['accessors']) - 1
+
+    def add_material(self, material):
+        """Add a material dict, reusing an identical existing one"""
+        key = json.dumps(material, sort_keys=True)
+        index = self._material_index.get(key)
+        if index is None:
+            self.gltf['materials'].append(material)
+            index = self._material_index[key] = len(self.gltf['materials']) - 1
+        return index
+
+    def add_mesh(self, primitives, name=None, extras=None):
+        mesh = {'primitives': primitives}
+        if name:
+            mesh['name'] = name
+        if extras:
+            mesh['extras'] = extras
+        self.gltf['meshes'].append(mesh)
+        return len(self.gltf['meshes']) - 1
+
+    def add_node(self, name=None, mesh=None, matrix=None, children=None, extras=None,
+                 extensions=None, parent=None, root=False):
+        """
+        Add a node; matrix is a row-major 4x4 array (identity is omitted)
+
+        parent attaches the node as a child of an existing node, root=True
+        adds it to the scene.
+        """
+        node = {}
+        if name:
+            node['name'] = name
+        if mesh is not None:
+            node['mesh'] = mesh
+        if matrix is not None:
+            gltf_matrix = matrix_to_gltf(matrix)
+            if gltf_matrix:
+                node['matrix'] = gltf_matrix
+        if children:
+            node['children'] = list(children)
+        if extras:
+            node['extras'] = extras
+        if extensions:
+            node['extensions'] = extensions
+
+        self.gltf['nodes'].append(node)
+        index = len(self.gltf['nodes']) - 1
+
+        if parent is not None:
+            self.gltf['nodes'][parent].setdefault('children', []).append(index)
+        if root:
+            self.gltf['scenes'][0]['nodes'].append(index)
+        return index
+
+    def use_extension(self, name, required=False):
+        used = self.gltf.setdefault('extensionsUsed', [])
+        if name not in used:
+            used.append(name)
+        if required:
+            required_list = self.gltf.setdefault('extensionsRequired', [])
+            if name not in required_list:
+                required_list.append(name)
+
+    def to_json(self):
+        gltf = {key: value for key, value in self.gltf.items() if value != []}
+        if self._length:
+            gltf['buffers'] = [{'byteLength': _align(self._length)}]
+        return gltf
+
+    def write(self, path):
+        """Write the GLB file and return its size in bytes"""
+        json_bytes = json.dumps(self.to_json(), separators=(',', ':')).encode('utf-8')
+        json_bytes += b' ' * (_align(len(json_bytes)) - len(json_bytes))
+        bin_length = _align(self._length)
+
+        total = 12 + 8 + len(json_bytes)
+        if bin_length:
+            total += 8 + bin_length
+
+        with open(path, 'wb') as f:
+            f.write(struct.pack('<4sII', GLB_MAGIC, 2, total))
+            f.write(struct.pack('<II', len(json_bytes), CHUNK_JSON))
+            f.write(json_bytes)
+            if bin_length:
+                f.write(struct.pack('<II', bin_length, CHUNK_BIN))
+                for part in self._parts:
+                    f.write(part)
+                f.write(b'\0' * (bin_length - self._length))
+
+        return total
+
+
+def compact(glb, gltf):
+    """
+    GLBWriter holding an edited copy of glb's JSON with only the accessors
+    and bufferViews it still uses, their data copied from glb
+
+    Accessor references set to None are left for the caller to fill in
+    with writer.add_accessor(); attribute dicts are updated in place so
+    references to them stay valid.
+    """
+    accessors = glb.json.get('accessors', [])
+    views = glb.json.get('bufferViews', [])
+
+    used_accessors = set()
+    for mesh in gltf.get('meshes', []):
+        for primitive in mesh['primitives']:
+            used_accessors.update(v for v in primitive.get('attributes', {}).values() if v is not None)
+            if 'indices' in primitive:
+                used_accessors.add(primitive['indices'])
+            for target in primitive.get('targets', []):
+                used_accessors.update(target.values())
+    for skin in gltf.get('skins', []):
+        if 'inverseBindMatrices' in skin:
+            used_accessors.add(skin['inverseBindMatrices'])
+    for animation in gltf.get('animations', []):
+        for sampler in animation['samplers']:
+            used_accessors.update((sampler['input'], sampler['output']))
+    for node in gltf.get('nodes', []):
+        instancing = node.get('extensions', {}).get('EXT_mesh_gpu_instancing')
+        if instancing:
+            used_accessors.update(v for v in instancing['attributes'].values() if v is not None)
+
+    used_views = set()
+    for i in used_accessors:
+        accessor = accessors[i]
+        if 'bufferView' in accessor:
+            used_views.add(accessor['bufferView'])
+        if 'sparse' in accessor:
+            used_views.add(accessor['sparse']['indices']['bufferView'])
+            used_views.add(accessor['sparse']['values']['bufferView'])
+    for image in gltf.get('images', []):
+        if 'bufferView' in image:
+            used_views.add(image['bufferView'])
+
+    writer = GLBWriter(generator=gltf.get('asset', {}).get('generator', GENERATOR))
+    writer.gltf = {key: value for key, value in gltf.items() if key not in ('buffers', 'bufferViews', 'accessors')}
+    writer.gltf['bufferViews'] = []
+    writer.gltf['accessors'] = []
+
+    view_map = {}
+    for i in sorted(used_views):
+        view_map[i] = writer.add_buffer_view(
+            glb.buffer_view(i), target=views[i].get('target'), byte_stride=views[i].get('byteStride')
+        )
+
+    accessor_map = {}
+    for i in sorted(used_accessors):
+        accessor = dict(accessors[i])
+        if 'bufferView' in accessor:
+            accessor['bufferView'] = view_map[accessor['bufferView']]
+        if 'sparse' in accessor:
+            sparse = accessor['sparse'] = {key: dict(value) if isinstance(value, dict) else value
+                                           for key, value in accessor['sparse'].items()}
+            sparse['indices']['bufferView'] = view_map[sparse['indices']['bufferView']]
+            sparse['values']['bufferView'] = view_map[sparse['values']['bufferView']]
+        writer.gltf['accessors'].append(accessor)
+        accessor_map[i] = len(writer.gltf['accessors']) - 1
+
+    for mesh in writer.gltf.get('meshes', []):
+        for primitive in mesh['primitives']:
+            attributes = primitive.get('attributes', {})
+            for semantic, index in attributes.items():
+                attributes[semantic] = accessor_map.get(index)
+            if 'indices' in primitive:
+                primitive['indices'] = accessor_map[primitive['indices']]
+            if 'targets' in primitive:
+                primitive['targets'] = [{k: accessor_map[v] for k, v in t.items()} for t in primitive['targets']]
+    for skin in writer.gltf.get('skins', []):
+        if 'inverseBindMatrices' in skin:
+            skin['inverseBindMatrices'] = accessor_map[skin['inverseBindMatrices']]
+    for animation in writer.gltf.get('animations', []):
+        for sampler in animation['samplers']:
+            sampler['input'] = accessor_map[sampler['input']]
+            sampler['output'] = accessor_map[sampler['output']]
+    for node in writer.gltf.get('nodes', []):
+        instancing = node.get('extensions', {}).get('EXT_mesh_gpu_instancing')
+        if instancing:
+            attributes = instancing['attributes']
+            for semantic, index in attributes.items():
+                attributes[semantic] = accessor_map.get(index)
+    for image in writer.gltf.get('images', []):
+        if 'bufferView' in image:
+            image['bufferView'] = view_map[image['bufferView']]
+
+    return writer
+
+
+TEXTURE_SLOTS = ('baseColorTexture', 'metallicRoughnessTexture', 'normalTexture', 'occlusionTexture',
+                  'emissiveTexture')
+
+
+def merge_glbs(paths, output_path, merge_roots=True):
+    """
+    Concatenate several GLBs into one
+
+    Buffers are appended, every index (accessors, bufferViews, meshes,
+    materials, textures, images, samplers, nodes) is offset, identical
+    materials are stored once, and root nodes that only group content
+    (same name and transform, no mesh, e.g. each shard's 'IfcModel'
+    Z-up → Y-up root) are merged into one when merge_roots is set. Skins
+    and animations are not supported.
+
+    Returns:
+        dict with the counts of nodes, meshes and materials written and
+        materials deduplicated
+    """
+    from glb_reader import GLBReader
+
+    writer = GLBWriter()
+    gltf = writer.gltf
+    roots = {}
+    materials_in = 0
+
+    for path in paths:
+        with GLBReader(path) as glb:
+            source = glb.json
+            if source.get('skins') or source.get('animations'):
+                raise ValueError(f"{path}: skins and animations cannot be merged")
+
+            view_offset = len(gltf['bufferViews'])
+            for i, view in enumerate(source.get('bufferViews', [])):
+                writer.add_buffer_view(glb.buffer_view(i), target=view.get('target'),
+                                       byte_stride=view.get('byteStride'))
+
+            accessor_offset = len(gltf['accessors'])
+            for accessor in source.get('accessors', []):
+                accessor = dict(accessor)
+                if 'bufferView' in accessor:
+                    accessor['bufferView'] += view_offset
+                if 'sparse' in accessor:
+                    sparse = accessor['sparse'] = {key: dict(value) if isinstance(value, dict) else value
+                                                   for key, value in accessor['sparse'].items()}
+                    sparse['indices']['bufferView'] += view_offset
+                    sparse['values']['bufferView'] += view_offset
+                gltf['accessors'].append(accessor)
+
+            offsets = {}
+            for key in ('samplers', 'images', 'textures'):
+                offsets[key] = len(gltf.setdefault(key, []))
+            for sampler in source.get('samplers', []):
+                gltf['samplers'].append(sampler)
+            for image in source.get('images', []):
+                image = dict(image)
+                if 'bufferView' in image:
+                    image['bufferView'] += view_offset
+                gltf['images'].append(image)
+            for texture in source.get('textures', []):
+                texture = dict(texture)
+                if 'source' in texture:
+                    texture['source'] += offsets['images']
+                if 'sampler' in texture:
+                    texture['sampler'] += offsets['samplers']
+                gltf['textures'].append(texture)
+
+            material_map = []
+            for material in source.get('materials', []):
+                material = json.loads(json.dumps(material))
+                for slots in (material, material.get('pbrMetallicRoughness', {})):
+                    for slot in TEXTURE_SLOTS:
+                        if slot in slots:
+                            slots[slot]['index'] += offsets['textures']
+                material_map.append(writer.add_material(material))
+            materials_in += len(material_map)
+
+            mesh_offset = len(gltf['meshes'])
+            for mesh in source.get('meshes', []):
+                mesh = dict(mesh)
+                primitives = []
+                for primitive in mesh['primitives']:
+                    primitive = dict(primitive)
+                    primitive['attributes'] = {k: v + accessor_offset for k, v in primitive['attributes'].items()}
+                    if 'indices' in primitive:
+                        primitive['indices'] += accessor_offset
+                    if 'material' in primitive:
+                        primitive['material'] = material_map[primitive['material']]
+                    if 'targets' in primitive:
+                        primitive['targets'] = [{k: v + accessor_offset for k, v in target.items()}
+                                                for target in primitive['targets']]
+                    primitives.append(primitive)
+                mesh['primitives'] = primitives
+                gltf['meshes'].append(mesh)
+
+            # Roots that duplicate an already written grouping root are not
+            # written; their children are appended to that root instead
+            nodes = source.get('nodes', [])
+            scene = source.get('scenes', [{}])[source.get('scene', 0)]
+            merged_into = {}
+            for root in scene.get('nodes', []):
+                node = nodes[root]
+                if merge_roots and 'mesh' not in node:
+                    key = json.dumps({k: v for k, v in node.items() if k != 'children'}, sort_keys=True)
+                    if key in roots:
+                        merged_into[root] = roots[key]
+            node_map = []
+            next_index = len(gltf['nodes'])
+            for i in range(len(nodes)):
+                if i in merged_into:
+                    node_map.append(merged_into[i])
+                else:
+                    node_map.append(next_index)
+                    next_index += 1
+
+            for i, node in enumerate(nodes):
+                node = dict(node)
+                if 'mesh' in node:
+                    node['mesh'] += mesh_offset
+                if 'children' in node:
+                    node['children'] = [node_map[child] for child in node['children']]
+                if i in merged_into:
+                    gltf['nodes'][merged_into[i]].setdefault('children', []).extend(node.get('children', []))
+                    continue
+                extensions = node.get('extensions')
+                if extensions:
+                    extensions = node['extensions'] = json.loads(json.dumps(extensions))
+                    instancing = extensions.get('EXT_mesh_gpu_instancing')
+                    if instancing:
+                        instancing['attributes'] = {k: v + accessor_offset
+                                                    for k, v in instancing['attributes'].items()}
+                    lod = extensions.get('MSFT_lod')
+                    if lod:
+                        lod['ids'] = [node_map[i] for i in lod['ids']]
+                gltf['nodes'].append(node)
+
+            for root in scene.get('nodes', []):
+                if root in merged_into:
+                    continue
+                node = nodes[root]
+                if merge_roots and 'mesh' not in node:
+                    roots.setdefault(json.dumps({k: v for k, v in node.items() if k != 'children'},
+                                                sort_keys=True), node_map[root])
+                gltf['scenes'][0]['nodes'].append(node_map[root])
+
+            for key in ('extensionsUsed', 'extensionsRequired'):
+                for name in source.get(key, []):
+                    if name not in gltf.setdefault(key, []):
+                        gltf[key].append(name)
+
+    writer.write(output_path)
+    return {
+        'nodes': len(gltf['nodes']),
+        'meshes': len(gltf['meshes']),
+        'materials': len(gltf['materials']),
+        'materials_deduplicated': materials_in - len(gltf['materials']),
+    }
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Triangle buffers from ifcopenshell shapes
+Turns iterator output into NumPy arrays that can be cached, merged and
+written with glb_writer, independently of the ifcopenshell serializers
+"""
+
+import json
+import math
+
+import numpy as np
+
+from glb_writer import ARRAY_BUFFER, ELEMENT_ARRAY_BUFFER
+
+
+DEFAULT_COLOR = (0.8, 0.8, 0.8)
+
+DEFAULT_MATERIAL = {
+    'name': 'default',
+    'pbrMetallicRoughness': {
+        'baseColorFactor': list(DEFAULT_COLOR) + [1.0],
+        'metallicFactor': 0.0,
+        'roughnessFactor': 1.0,
+    },
+    'doubleSided': True,
+}
+
+
+def shape_matrix(shape):
+    """
+    Placement of an iterator shape as a row-major 4x4 matrix
+
+    ifcopenshell 0.7 stores 12 values (three axes then the translation),
+    0.8+ a column-major 4x4.
+    """
+    matrix = shape.transformation.matrix
+    values = np.array(list(getattr(matrix, 'data', matrix)), dtype=np.float64)
+    if len(values) == 12:
+        result = np.eye(4)
+        result[:3, :] = values.reshape(4, 3).T
+        return result
+    return values.reshape(4, 4).T
+
+
+def _color(value):
+    """Material colour as an (r, g, b) tuple (tuple in 0.7, colour object in 0.8+)"""
+    if value is None:
+        return None
+    if hasattr(value, 'r'):
+        return (value.r(), value.g(), value.b())
+    value = tuple(value)
+    return value if len(value) >= 3 else None
+
+
+def material_to_gltf(material):
+    """glTF PBR material for an ifcopenshell style"""
+    color = None
+    if getattr(material, 'has_diffuse', True):
+        color = _color(material.diffuse)
+    color = color or DEFAULT_COLOR
+
+    transparency = getattr(material, 'transparency', 0.0)
+    if transparency is None or math.isnan(transparency) or not getattr(material, 'has_transparency', True):
+        transparency = 0.0
+    alpha = min(max(1.0 - transparency, 0.0), 1.0)
+
+    gltf = {
+        'name': material.name,
+        'pbrMetallicRoughness': {
+            'baseColorFactor': [float(c) for c in color[:3]] + [alpha],
+            'metallicFactor': 0.0,
+            'roughnessFactor': 1.0,
+        },
+        'doubleSided': True,
+    }
+    if alpha < 1.0:
+        gltf['alphaMode'] = 'BLEND'
+    return gltf
+
+
+def shape_mesh(shape):
+    """
+    Triangle buffers of an iterator shape
+
+    Returns:
+        dict with 'positions' (float32, n x 3), 'normals' and 'uvs' (or None)
+        and 'groups': a list of (glTF material dict, uint32 triangle indices),
+        one per material used by the shape
+    """
+    geometry = shape.geometry
+    positions = np.array(geometry.verts, dtype=np.float32).reshape(-1, 3)
+    faces = np.array(geometry.faces, dtype=np.uint32).reshape(-1, 3)
+
+    normals = None
+    if len(geometry.normals) == positions.size:
+        normals = np.array(geometry.normals, dtype=np.float32).reshape(-1, 3)
+
+    uvs = None
+    if len(getattr(geometry, 'uvs', ())) == len(positions) * 2:
+        uvs = np.array(geometry.uvs, dtype=np.float32).reshape(-1, 2)
+
+    material_ids = np.array(geometry.material_ids, dtype=np.int64)
+    materials = [material_to_gltf(m) for m in geometry.materials]
+    if len(material_ids) != len(faces):
+        material_ids = np.zeros(len(faces), dtype=np.int64)
+    if not materials or (material_ids < 0).any():
+        # Triangles without a style get the default material
+        material_ids[material_ids < 0] = len(materials)
+        materials.append(DEFAULT_MATERIAL)
+
+    groups = []
+    for material_index, material in enumerate(materials):
+        indices = faces[material_ids == material_index]
+        if len(indices):
+            groups.append((material, indices.ravel()))
+
+    return {'positions': positions, 'normals': normals, 'uvs': uvs, 'groups': groups}
+
+
+def mesh_size(mesh):
+    """(vertices, triangles) of a mesh dict"""
+    return len(mesh['positions']), sum(len(indices) for _, indices in mesh['groups']) // 3
+
+
+def save_mesh(mesh, path):
+    """Store a mesh dict as an uncompressed .npz file"""
+    arrays = {'positions': mesh['positions']}
+    if mesh['normals'] is not None:
+        arrays['normals'] = mesh['normals']
+    if mesh['uvs'] is not None:
+        arrays['uvs'] = mesh['uvs']
+    for i, (_, indices) in enumerate(mesh['groups']):
+        arrays[f'indices_{i}'] = indices
+    arrays['materials'] = np.frombuffer(
+        json.dumps([material for material, _ in mesh['groups']]).encode('utf-8'), dtype=np.uint8
+    )
+    with open(path, 'wb') as f:
+        np.savez(f, **arrays)
+
+
+def load_mesh(path):
+    """Read a mesh dict written by save_mesh()"""
+    with np.load(path) as data:
+        materials = json.loads(data['materials'].tobytes().decode('utf-8'))
+        return {
+            'positions': data['positions'],
+            'normals': data['normals'] if 'normals' in data else None,
+            'uvs': data['uvs'] if 'uvs' in data else None,
+            'groups': [(material, data[f'indices_{i}']) for i, material in enumerate(materials)],
+        }
+
+
+def add_mesh(writer, mesh, name=None, extras=None):
+    """
+    Write a mesh dict into a GLBWriter, one primitive per material
+
+    Returns:
+        glTF mesh index
+    """
+    attributes = {'POSITION': writer.add_accessor(mesh['positions'], target=ARRAY_BUFFER, bounds=True)}
+    if mesh['normals'] is not None:
+        attributes['NORMAL'] = writer.add_accessor(mesh['normals'], target=ARRAY_BUFFER)
+    if mesh['uvs'] is not None:
+        attributes['TEXCOORD_0'] = writer.add_accessor(mesh['uvs'], target=ARRAY_BUFFER)
+
+    primitives = []
+    for material, indices in mesh['groups']:
+        primitives.append({
+            'attributes': attributes,
+            'indices': writer.add_accessor(indices, target=ELEMENT_ARRAY_BUFFER),
+            'material': writer.add_material(material),
+        })
+    return writer.add_mesh(primitives, name=name, extras=extras)
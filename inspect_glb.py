@@ -1,15 +1,317 @@
 #!/usr/bin/env python3
 """
 Quick GLB inspection to check bounding box and mesh count
+Computes exact world-space bounds from the full node hierarchy and the
+POSITION accessor extents
 """
 
-import sys
 import json
-import struct
+import time
+import argparse
 from pathlib import Path
 
-def inspect_glb(glb_path):
-    """Inspect GLB file structure"""
+import numpy as np
+
+from glb_reader import GLBReader
+
+# Corner selection for the 8 corners of an AABB: True picks max, False min
+_BOX_CORNERS = np.array(
+    [[(i >> axis) & 1 for axis in range(3)] for i in range(8)], dtype=bool
+)
+
+
+def trs_matrices(translation, rotation, scale):
+    """(N, 4, 4) matrices from (N, 3) translations, (N, 4) quaternions and (N, 3) scales"""
+    translation = np.asarray(translation, dtype=float)
+    rotation = np.asarray(rotation, dtype=float)
+    scale = np.asarray(scale, dtype=float)
+    count = len(translation)
+
+    # Quaternion (x, y, z, w) -> rotation matrix, columns scaled by S
+    x, y, z, w = rotation.T
+    matrices = np.zeros((count, 4, 4))
+    matrices[:, 0, 0] = 1 - 2 * (y * y + z * z)
+    matrices[:, 0, 1] = 2 * (x * y - z * w)
+    matrices[:, 0, 2] = 2 * (x * z + y * w)
+    matrices[:, 1, 0] = 2 * (x * y + z * w)
+    matrices[:, 1, 1] = 1 - 2 * (x * x + z * z)
+    matrices[:, 1, 2] = 2 * (y * z - x * w)
+    matrices[:, 2, 0] = 2 * (x * z - y * w)
+    matrices[:, 2, 1] = 2 * (y * z + x * w)
+    matrices[:, 2, 2] = 1 - 2 * (x * x + y * y)
+    matrices[:, :3, :3] *= scale[:, None, :]
+    matrices[:, :3, 3] = translation
+    matrices[:, 3, 3] = 1.0
+    return matrices
+
+
+def node_local_matrices(nodes):
+    """(N, 4, 4) local transforms from glTF matrix or TRS properties, in batch"""
+    count = len(nodes)
+    translation = np.zeros((count, 3))
+    rotation = np.tile([0.0, 0.0, 0.0, 1.0], (count, 1))
+    scale = np.ones((count, 3))
+    explicit = []
+
+    for i, node in enumerate(nodes):
+        if 'matrix' in node:
+            explicit.append(i)
+            continue
+        if 'translation' in node:
+            translation[i] = node['translation']
+        if 'rotation' in node:
+            rotation[i] = node['rotation']
+        if 'scale' in node:
+            scale[i] = node['scale']
+
+    matrices = trs_matrices(translation, rotation, scale)
+
+    for i in explicit:
+        # glTF matrices are column-major
+        matrices[i] = np.array(nodes[i]['matrix'], dtype=float).reshape(4, 4).T
+
+    return matrices
+
+
+def instance_matrices(glb, node):
+    """(K, 4, 4) EXT_mesh_gpu_instancing transforms of a node, or None"""
+    extension = node.get('extensions', {}).get('EXT_mesh_gpu_instancing')
+    if not extension:
+        return None
+    attributes = extension.get('attributes', {})
+    data = {
+        semantic: glb.accessor(attributes[semantic], normalize=True)
+        for semantic in ('TRANSLATION', 'ROTATION', 'SCALE') if semantic in attributes
+    }
+    if not data:
+        return None
+    count = len(next(iter(data.values())))
+    return trs_matrices(
+        data.get('TRANSLATION', np.zeros((count, 3))),
+        data.get('ROTATION', np.tile([0.0, 0.0, 0.0, 1.0], (count, 1))),
+        data.get('SCALE', np.ones((count, 3))),
+    )
+
+
+def node_world_matrices(gltf):
+    """
+    World transforms of every node, composed level by level in batch
+
+    Returns (world, parent, root): (N, 4, 4) matrices, the parent index of
+    each node (-1 for roots) and the top-level ancestor of each node.
+    """
+    nodes = gltf.get('nodes', [])
+    count = len(nodes)
+
+    parent = np.full(count, -1, dtype=np.int64)
+    for i, node in enumerate(nodes):
+        for child in node.get('children', []):
+            parent[child] = i
+
+    local = node_local_matrices(nodes)
+    world = local.copy()
+    root = np.arange(count)
+
+    level = np.flatnonzero(parent < 0)
+    done = np.zeros(count, dtype=bool)
+    done[level] = True
+    while len(level):
+        children = np.flatnonzero(np.isin(parent, level) & ~done)
+        if not len(children):
+            break
+        world[children] = world[parent[children]] @ local[children]
+        root[children] = root[parent[children]]
+        done[children] = True
+        level = children
+
+    return world, parent, root
+
+
+def mesh_local_bounds(glb):
+    """(M, 2, 3) object-space AABB of every mesh from its POSITION accessors"""
+    gltf = glb.json
+    accessors = gltf.get('accessors', [])
+    meshes = gltf.get('meshes', [])
+    bounds = np.empty((len(meshes), 2, 3))
+    bounds[:, 0] = np.inf
+    bounds[:, 1] = -np.inf
+
+    for m, mesh in enumerate(meshes):
+        for primitive in mesh.get('primitives', []):
+            index = primitive.get('attributes', {}).get('POSITION')
+            if index is None:
+                continue
+            accessor = accessors[index]
+            if 'min' in accessor and 'max' in accessor and not accessor.get('normalized') \
+                    and 'sparse' not in accessor:
+                lo, hi = np.array(accessor['min'][:3]), np.array(accessor['max'][:3])
+            else:
+                # Missing or non-authoritative min/max: read the vertex data
+                data = glb.accessor(index, normalize=True)
+                if not len(data):
+                    continue
+                lo, hi = data.min(axis=0), data.max(axis=0)
+            bounds[m, 0] = np.minimum(bounds[m, 0], lo)
+            bounds[m, 1] = np.maximum(bounds[m, 1], hi)
+
+    return bounds
+
+
+def transform_bounds(local_bounds, matrices):
+    """World AABBs (K, 2, 3) of local AABBs (K, 2, 3) under (K, 4, 4) transforms"""
+    corners = np.where(_BOX_CORNERS[None], local_bounds[:, 1][:, None, :], local_bounds[:, 0][:, None, :])
+    world = np.einsum('kij,kcj->kci', matrices[:, :3, :3], corners) + matrices[:, None, :3, 3]
+    return np.stack([world.min(axis=1), world.max(axis=1)], axis=1)
+
+
+def _reduce_bounds(keys, bounds, size):
+    """Union of AABBs grouped by integer key -> (size, 2, 3), empty groups are inf/-inf"""
+    out = np.empty((size, 2, 3))
+    out[:, 0] = np.inf
+    out[:, 1] = -np.inf
+    np.minimum.at(out[:, 0], keys, bounds[:, 0])
+    np.maximum.at(out[:, 1], keys, bounds[:, 1])
+    return out
+
+
+def world_bounds(glb):
+    """
+    Exact world-space AABBs for the scene, every mesh node, mesh and top-level node
+
+    Mesh-space POSITION bounds are transformed corner by corner with the
+    composed world matrix of every node instancing the mesh, so rotation,
+    scale, matrix and parent transforms are all honoured. Nodes using
+    EXT_mesh_gpu_instancing contribute one entry per instance.
+
+    Returns a dict of NumPy arrays:
+        node_indices / nodes: mesh nodes reachable from the scene and their AABBs
+        instance_indices: GPU instance of each node entry (-1 if not instanced)
+        mesh_indices / meshes: meshes used in the scene and their world AABBs
+        top_level_indices / top_level: scene root nodes with geometry and their AABBs
+        scene: (2, 3) AABB of the whole scene, or None without geometry
+    """
+    gltf = glb.json
+    nodes = gltf.get('nodes', [])
+    world, parent, root = node_world_matrices(gltf)
+
+    # Only nodes reachable from the active scene count (e.g. not LOD nodes)
+    scenes = gltf.get('scenes', [])
+    if scenes:
+        scene_roots = np.array(scenes[gltf.get('scene', 0)].get('nodes', []), dtype=np.int64)
+    else:
+        scene_roots = np.flatnonzero(parent < 0)
+    in_scene = np.isin(root, scene_roots)
+
+    mesh_of = np.array([node.get('mesh', -1) for node in nodes], dtype=np.int64)
+    node_indices = np.flatnonzero((mesh_of >= 0) & in_scene)
+    matrices = world[node_indices]
+    instance_indices = np.full(len(node_indices), -1, dtype=np.int64)
+
+    # GPU-instanced nodes: one entry per instance, node world @ instance transform
+    instanced = [k for k, i in enumerate(node_indices) if 'EXT_mesh_gpu_instancing' in nodes[i].get('extensions', {})]
+    if instanced:
+        keep = np.ones(len(node_indices), dtype=bool)
+        keep[instanced] = False
+        extra_nodes, extra_instances, extra_matrices = [], [], []
+        for k in instanced:
+            per_instance = instance_matrices(glb, nodes[node_indices[k]])
+            if per_instance is None:
+                keep[k] = True
+                continue
+            extra_nodes.append(np.full(len(per_instance), node_indices[k], dtype=np.int64))
+            extra_instances.append(np.arange(len(per_instance), dtype=np.int64))
+            extra_matrices.append(matrices[k] @ per_instance)
+        node_indices = np.concatenate([node_indices[keep]] + extra_nodes)
+        instance_indices = np.concatenate([instance_indices[keep]] + extra_instances)
+        matrices = np.concatenate([matrices[keep]] + extra_matrices)
+
+    local = mesh_local_bounds(glb)
+    node_bounds = transform_bounds(local[mesh_of[node_indices]], matrices)
+
+    # Meshes without POSITION data leave inf/-inf bounds behind
+    valid = np.isfinite(node_bounds).all(axis=(1, 2))
+    node_indices = node_indices[valid]
+    instance_indices = instance_indices[valid]
+    node_bounds = node_bounds[valid]
+
+    mesh_indices = np.unique(mesh_of[node_indices])
+    meshes = _reduce_bounds(
+        np.searchsorted(mesh_indices, mesh_of[node_indices]), node_bounds, len(mesh_indices)
+    )
+
+    top_level_indices = np.unique(root[node_indices])
+    top_level = _reduce_bounds(
+        np.searchsorted(top_level_indices, root[node_indices]), node_bounds, len(top_level_indices)
+    )
+
+    scene = None
+    if len(node_bounds):
+        scene = np.stack([node_bounds[:, 0].min(axis=0), node_bounds[:, 1].max(axis=0)])
+
+    return {
+        'node_indices': node_indices,
+        'instance_indices': instance_indices,
+        'nodes': node_bounds,
+        'mesh_indices': mesh_indices,
+        'meshes': meshes,
+        'top_level_indices': top_level_indices,
+        'top_level': top_level,
+        'scene': scene,
+    }
+
+
+def print_bounds_table(title, indices, bounds, names, limit):
+    """Print AABBs, farthest from the overall center first"""
+    print(f"\n{title}: {len(indices):,}")
+    if not len(indices):
+        return
+
+    overall_center = (bounds[:, 0].min(axis=0) + bounds[:, 1].max(axis=0)) / 2
+    centers = bounds.mean(axis=1)
+    distance = np.linalg.norm(centers - overall_center, axis=1)
+    order = np.argsort(-distance)
+    if limit:
+        order = order[:limit]
+
+    for k in order:
+        (min_x, min_y, min_z), (max_x, max_y, max_z) = bounds[k]
+        name = names[k][:40]
+        print(f"  [{indices[k]:6d}] {name:40s} "
+              f"min=({min_x:.2f}, {min_y:.2f}, {min_z:.2f}) "
+              f"max=({max_x:.2f}, {max_y:.2f}, {max_z:.2f}) "
+              f"offset={distance[k]:.2f}")
+
+    if limit and len(indices) > limit:
+        print(f"  ... {len(indices) - limit:,} more")
+
+
+def write_bounds_json(bounds, gltf, json_path):
+    """Dump all bounds computed by world_bounds() as JSON"""
+    def entries(indices, boxes, items):
+        return [
+            {'index': int(i), 'name': items[i].get('name'), 'min': box[0].tolist(), 'max': box[1].tolist()}
+            for i, box in zip(indices, boxes)
+        ]
+
+    nodes = gltf.get('nodes', [])
+    data = {
+        'scene': None if bounds['scene'] is None else {
+            'min': bounds['scene'][0].tolist(), 'max': bounds['scene'][1].tolist()
+        },
+        'top_level_nodes': entries(bounds['top_level_indices'], bounds['top_level'], nodes),
+        'meshes': entries(bounds['mesh_indices'], bounds['meshes'], gltf.get('meshes', [])),
+        'nodes': entries(bounds['node_indices'], bounds['nodes'], nodes),
+    }
+    for entry, instance in zip(data['nodes'], bounds['instance_indices']):
+        if instance >= 0:
+            entry['instance'] = int(instance)
+
+    with open(json_path, 'w') as f:
+        json.dump(data, f, indent=2)
+
+
+def inspect_glb(glb_path, show_meshes=False, limit=20, json_path=None):
+    """Inspect GLB file structure and exact world-space bounds"""
 
     print("=" * 80)
     print(f"INSPECTING GLB: {glb_path}")
@@ -18,104 +320,127 @@ def inspect_glb(glb_path):
     file_size = Path(glb_path).stat().st_size
     print(f"\nFile Size: {file_size / (1024**2):.2f} MB")
 
-    with open(glb_path, 'rb') as f:
-        # Read GLB header
-        magic = f.read(4)
-        version = struct.unpack('<I', f.read(4))[0]
-        length = struct.unpack('<I', f.read(4))[0]
-
-        print(f"GLB Version: {version}")
-        print(f"Total Length: {length:,} bytes")
-
-        # Read JSON chunk
-        chunk_length = struct.unpack('<I', f.read(4))[0]
-        chunk_type = f.read(4)
-
-        if chunk_type == b'JSON':
-            json_data = f.read(chunk_length).decode('utf-8')
-            gltf = json.loads(json_data)
-
-            print(f"\n=== GLTF STRUCTURE ===")
-
-            # Meshes
-            if 'meshes' in gltf:
-                print(f"Meshes: {len(gltf['meshes'])}")
-                total_primitives = sum(len(mesh.get('primitives', [])) for mesh in gltf['meshes'])
-                print(f"Total Primitives: {total_primitives}")
-
-            # Materials
-            if 'materials' in gltf:
-                print(f"Materials: {len(gltf['materials'])}")
-
-            # Nodes
-            if 'nodes' in gltf:
-                print(f"Nodes: {len(gltf['nodes'])}")
-
-            # Accessors (vertex data)
-            if 'accessors' in gltf:
-                print(f"Accessors: {len(gltf['accessors'])}")
-
-                # Count total vertices
-                total_vertices = 0
-                for accessor in gltf['accessors']:
-                    if accessor.get('type') == 'VEC3':
-                        total_vertices += accessor.get('count', 0)
-                print(f"Approximate Vertices: {total_vertices:,}")
-
-            # Extensions
-            if 'extensionsUsed' in gltf:
-                print(f"\nExtensions Used:")
-                for ext in gltf['extensionsUsed']:
-                    print(f"  - {ext}")
-
-            # Check for scene bounds in nodes
-            print(f"\n=== CHECKING COORDINATE BOUNDS ===")
-
-            # Sample some mesh translations
-            if 'nodes' in gltf:
-                translations = []
-                for node in gltf['nodes'][:100]:  # Sample first 100
-                    if 'translation' in node:
-                        translations.append(node['translation'])
-
-                if translations:
-                    min_x = min(t[0] for t in translations)
-                    max_x = max(t[0] for t in translations)
-                    min_y = min(t[1] for t in translations)
-                    max_y = max(t[1] for t in translations)
-                    min_z = min(t[2] for t in translations)
-                    max_z = max(t[2] for t in translations)
-
-                    print(f"Translation Bounds (sampled {len(translations)} nodes):")
-                    print(f"  X: {min_x:.2f} to {max_x:.2f}")
-                    print(f"  Y: {min_y:.2f} to {max_y:.2f}")
-                    print(f"  Z: {min_z:.2f} to {max_z:.2f}")
-
-                    center_x = (min_x + max_x) / 2
-                    center_y = (min_y + max_y) / 2
-                    center_z = (min_z + max_z) / 2
-
-                    print(f"\nApproximate Center: ({center_x:.2f}, {center_y:.2f}, {center_z:.2f})")
-
-                    distance = (center_x**2 + center_y**2 + center_z**2) ** 0.5
-                    print(f"Distance from Origin: {distance:.2f} units")
-
-                    if distance < 100:
-                        print("✓ Model is well-centered (close to origin)")
-                    elif distance < 1000:
-                        print("⚠️ Model is moderately far from origin")
-                    else:
-                        print("❌ Model is very far from origin - may have visibility issues")
-                else:
-                    print("No node translations found (meshes may use identity transforms)")
+    with GLBReader(glb_path) as glb:
+        print(f"GLB Version: {glb.version}")
+        print(f"Total Length: {glb.length:,} bytes")
+        print(f"BIN Chunk: {glb.bin_length:,} bytes")
+
+        gltf = glb.json
+
+        print(f"\n=== GLTF STRUCTURE ===")
+
+        # Meshes
+        if 'meshes' in gltf:
+            print(f"Meshes: {len(gltf['meshes'])}")
+            total_primitives = sum(len(mesh.get('primitives', [])) for mesh in gltf['meshes'])
+            print(f"Total Primitives: {total_primitives}")
+
+        # Materials
+        if 'materials' in gltf:
+            print(f"Materials: {len(gltf['materials'])}")
+
+        # Nodes
+        if 'nodes' in gltf:
+            print(f"Nodes: {len(gltf['nodes'])}")
+
+        # Accessors (vertex data)
+        if 'accessors' in gltf:
+            print(f"Accessors: {len(gltf['accessors'])}")
+
+            # Count vertices and triangles from the accessors meshes actually use
+            position_accessors = glb.primitive_accessors('POSITION')
+            total_vertices = sum(gltf['accessors'][i]['count'] for i in position_accessors)
+            total_indices = sum(
+                gltf['accessors'][p['indices']]['count']
+                for mesh in gltf.get('meshes', []) for p in mesh.get('primitives', [])
+                if 'indices' in p and p.get('mode', 4) == 4
+            )
+            print(f"Vertices: {total_vertices:,}")
+            print(f"Triangles: {total_indices // 3:,}")
+
+            # Scan the real vertex data, one zero-copy view at a time
+            non_finite = 0
+            for i in position_accessors:
+                non_finite += int(np.count_nonzero(~np.isfinite(glb.accessor(i)).all(axis=1)))
+            if non_finite:
+                print(f"❌ Non-finite vertex positions: {non_finite:,}")
+            else:
+                print("✓ All vertex positions finite")
+
+        # Extensions
+        if 'extensionsUsed' in gltf:
+            print(f"\nExtensions Used:")
+            for ext in gltf['extensionsUsed']:
+                print(f"  - {ext}")
+
+        # Exact world-space bounds from the full node hierarchy
+        print(f"\n=== WORLD-SPACE BOUNDS ===")
+
+        analysis_start = time.time()
+        bounds = world_bounds(glb)
+        analysis_time = time.time() - analysis_start
+
+        print(f"Mesh instances: {len(bounds['node_indices']):,} "
+              f"(analysed in {analysis_time:.2f}s)")
+
+        scene_bounds = bounds['scene']
+        if scene_bounds is None:
+            print("No mesh geometry reachable from the scene")
+        else:
+            (min_x, min_y, min_z), (max_x, max_y, max_z) = scene_bounds
+            print(f"Scene Bounds:")
+            print(f"  X: {min_x:.2f} to {max_x:.2f}")
+            print(f"  Y: {min_y:.2f} to {max_y:.2f}")
+            print(f"  Z: {min_z:.2f} to {max_z:.2f}")
+            print(f"Size: ({max_x - min_x:.2f}, {max_y - min_y:.2f}, {max_z - min_z:.2f})")
+
+            center = scene_bounds.mean(axis=0)
+            print(f"\nCenter: ({center[0]:.2f}, {center[1]:.2f}, {center[2]:.2f})")
+
+            distance = float(np.linalg.norm(center))
+            print(f"Distance from Origin: {distance:.2f} units")
+
+            if distance < 100:
+                print("✓ Model is well-centered (close to origin)")
+            elif distance < 1000:
+                print("⚠️ Model is moderately far from origin")
+            else:
+                print("❌ Model is very far from origin - may have visibility issues")
+
+            print_bounds_table(
+                "Top-level nodes", bounds['top_level_indices'], bounds['top_level'],
+                [gltf['nodes'][i].get('name', '') for i in bounds['top_level_indices']], limit
+            )
+
+            if show_meshes:
+                print_bounds_table(
+                    "Meshes (world, all instances)", bounds['mesh_indices'], bounds['meshes'],
+                    [gltf['meshes'][i].get('name', '') for i in bounds['mesh_indices']], limit
+                )
+
+        if json_path:
+            write_bounds_json(bounds, gltf, json_path)
+            print(f"\n✓ Bounds written to {json_path}")
 
     print("\n" + "=" * 80)
     print("INSPECTION COMPLETE")
     print("=" * 80)
 
-if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python inspect_glb.py <glb_file>")
-        sys.exit(1)
+def main():
+    parser = argparse.ArgumentParser(
+        description='Inspect GLB structure and exact world-space bounds'
+    )
+
+    parser.add_argument('input', help='Input GLB file')
+    parser.add_argument('--meshes', action='store_true', help='Also list per-mesh world bounds')
+    parser.add_argument('--limit', type=int, default=20,
+                        help='Rows per bounds table, farthest from the scene center first (0 = all)')
+    parser.add_argument('--json', metavar='PATH', help='Write scene, mesh and node bounds as JSON')
 
-    inspect_glb(sys.argv[1])
+    args = parser.parse_args()
+
+    inspect_glb(args.input, show_meshes=args.meshes, limit=args.limit, json_path=args.json)
+
+
+if __name__ == "__main__":
+    main()
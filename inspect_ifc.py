@@ -3,13 +3,244 @@
 Inspect IFC file to understand coordinate system and structure
 """
 
-import sys
+import time
+import argparse
+import multiprocessing
+import numpy as np
 import ifcopenshell
 import ifcopenshell.geom
 from pathlib import Path
 
-def inspect_ifc(ifc_path):
-    """Inspect IFC file and report key information"""
+def _group_bounds(keys, bounds):
+    """Union of AABBs per key -> {key: (min, max)}"""
+    labels, inverse = np.unique(np.asarray(keys, dtype=object).astype(str), return_inverse=True)
+    lo = np.full((len(labels), 3), np.inf)
+    hi = np.full((len(labels), 3), -np.inf)
+    np.minimum.at(lo, inverse, bounds[:, 0])
+    np.maximum.at(hi, inverse, bounds[:, 1])
+    counts = np.bincount(inverse, minlength=len(labels))
+    return {label: (lo[i], hi[i], int(counts[i])) for i, label in enumerate(labels)}
+
+
+def analyze_extents(ifc, num_threads=None, outlier_distance=1000.0, outlier_mads=10.0):
+    """
+    Exact geometry extents of the whole model
+
+    Tessellates every product (except opening voids) with ifcopenshell.geom.iterator on all cores and
+    reduces the real world-space vertex coordinates with NumPy.
+
+    Args:
+        ifc: Loaded IFC file
+        num_threads: Iterator threads (default: all cores)
+        outlier_distance: Minimum distance (model units) from the median
+            element center for an element to be reported as an outlier
+        outlier_mads: ... and minimum distance in median absolute deviations
+
+    Returns:
+        dict with overall 'bounds' (min, max) or None, 'by_class' and
+        'by_storey' ({name: (min, max, count)}), 'outliers' (list of dicts,
+        farthest first), 'elements' and 'time_s'
+    """
+    from split_ifc_by_storey import build_relationship_maps
+
+    start = time.time()
+
+    settings = ifcopenshell.geom.settings()
+    settings.set('use-world-coords', True)
+
+    # Element -> storey name for the per-storey breakdown
+    maps = build_relationship_maps(ifc)
+    element_storey = {}
+    for storey_id, elements in maps['storey_to_elements'].items():
+        storey = ifc.by_id(storey_id)
+        label = f"{storey.Name or 'Unnamed'} (#{storey_id})"
+        for element in elements:
+            element_storey[element.id()] = label
+
+    num_threads = num_threads or multiprocessing.cpu_count()
+    print(f"   Tessellating all products on {num_threads} threads...")
+
+    ids = []
+    classes = []
+    boxes = []
+
+    # Opening voids are cut from their hosts but never drawn, so they must
+    # not widen the extents or count as elements
+    openings = ifc.by_type("IfcOpeningElement")
+    if openings:
+        iterator = ifcopenshell.geom.iterator(settings, ifc, num_threads, exclude=openings)
+    else:
+        iterator = ifcopenshell.geom.iterator(settings, ifc, num_threads)
+    for shape in iterator:
+        verts = np.asarray(shape.geometry.verts, dtype=np.float64)
+        if not len(verts):
+            continue
+        verts = verts.reshape(-1, 3)
+        ids.append(shape.id)
+        classes.append(shape.type)
+        boxes.append((verts.min(axis=0), verts.max(axis=0)))
+
+        if len(ids) % 500 == 0:
+            print(f"   Progress: {len(ids)} elements...", end='\r')
+
+    elapsed = time.time() - start
+
+    if not boxes:
+        return {'bounds': None, 'by_class': {}, 'by_storey': {}, 'outliers': [],
+                'elements': 0, 'time_s': elapsed}
+
+    bounds = np.array(boxes)
+    storeys = [element_storey.get(i, '(not in a storey)') for i in ids]
+
+    # Outliers: element centers far from the median center, measured both
+    # absolutely and relative to the spread of the rest of the model
+    centers = bounds.mean(axis=1)
+    median = np.median(centers, axis=0)
+    distance = np.linalg.norm(centers - median, axis=1)
+    mad = np.median(np.abs(distance - np.median(distance)))
+    threshold = max(outlier_distance, np.median(distance) + outlier_mads * mad)
+
+    outliers = []
+    for k in np.argsort(-distance):
+        if distance[k] <= threshold:
+            break
+        entity = ifc.by_id(ids[k])
+        outliers.append({
+            'id': ids[k],
+            'global_id': getattr(entity, 'GlobalId', None),
+            'class': classes[k],
+            'name': getattr(entity, 'Name', None),
+            'storey': storeys[k],
+            'distance': float(distance[k]),
+            'min': bounds[k, 0],
+            'max': bounds[k, 1],
+        })
+
+    # Overall bounds with and without the outliers
+    keep = distance <= threshold
+    return {
+        'bounds': (bounds[:, 0].min(axis=0), bounds[:, 1].max(axis=0)),
+        'bounds_without_outliers': (bounds[keep, 0].min(axis=0), bounds[keep, 1].max(axis=0)),
+        'by_class': _group_bounds(classes, bounds),
+        'by_storey': _group_bounds(storeys, bounds),
+        'outliers': outliers,
+        'elements': len(ids),
+        'time_s': elapsed,
+    }
+
+
+def print_extents(result):
+    """Print the report produced by analyze_extents()"""
+    def box(lo, hi):
+        return f"({lo[0]:.2f}, {lo[1]:.2f}, {lo[2]:.2f}) → ({hi[0]:.2f}, {hi[1]:.2f}, {hi[2]:.2f})"
+
+    lo, hi = result['bounds']
+    print(f"\n   Bounding Box ({result['elements']} elements, {result['time_s']:.1f}s):")
+    print(f"   Min: ({lo[0]:.2f}, {lo[1]:.2f}, {lo[2]:.2f})")
+    print(f"   Max: ({hi[0]:.2f}, {hi[1]:.2f}, {hi[2]:.2f})")
+    print(f"   Center: ({(lo[0]+hi[0])/2:.2f}, {(lo[1]+hi[1])/2:.2f}, {(lo[2]+hi[2])/2:.2f})")
+    print(f"   Size: ({hi[0]-lo[0]:.2f}, {hi[1]-lo[1]:.2f}, {hi[2]-lo[2]:.2f})")
+
+    print(f"\n   By Class:")
+    for name, (c_lo, c_hi, count) in sorted(result['by_class'].items()):
+        print(f"   {name:28s} {count:6d}  {box(c_lo, c_hi)}")
+
+    print(f"\n   By Storey:")
+    for name, (s_lo, s_hi, count) in sorted(result['by_storey'].items()):
+        print(f"   {name[:28]:28s} {count:6d}  {box(s_lo, s_hi)}")
+
+    outliers = result['outliers']
+    if outliers:
+        print(f"\n   ⚠️  {len(outliers)} outlier element(s) far from the rest of the model:")
+        for outlier in outliers[:20]:
+            print(f"   #{outlier['id']} {outlier['class']} {outlier['global_id']} "
+                  f"'{outlier['name']}' [{outlier['storey']}] "
+                  f"{outlier['distance']:.0f} units away")
+        if len(outliers) > 20:
+            print(f"   ... {len(outliers) - 20} more")
+        k_lo, k_hi = result['bounds_without_outliers']
+        print(f"   Bounding box without outliers: {box(k_lo, k_hi)}")
+    else:
+        print(f"\n   ✓ No outlier elements")
+
+
+def print_coordinate_analysis(bounds_min, bounds_max):
+    """Report how far the model center is from the origin"""
+    # Check if coordinates are far from origin
+    center = [(lo + hi) / 2 for lo, hi in zip(bounds_min, bounds_max)]
+    center_dist = sum(c * c for c in center) ** 0.5
+
+    print(f"\n8. Coordinate System Analysis:")
+    print(f"   Distance from origin: {center_dist:.2f} units")
+
+    if center_dist > 10000:
+        print(f"   ⚠️  WARNING: Model is FAR from origin!")
+        print(f"   ⚠️  This will cause precision issues in WebGL")
+        print(f"   ⚠️  SOLUTION: Use --center-model-geometry flag")
+    elif center_dist > 1000:
+        print(f"   ⚠️  CAUTION: Model is moderately far from origin")
+        print(f"   ⚠️  Recommend: Use --center-model-geometry flag")
+    else:
+        print(f"   ✓ Model is reasonably close to origin")
+        print(f"   ✓ --center-model-geometry optional (but still recommended)")
+
+
+def sampled_extents(ifc, products):
+    """Quick placement-based estimate from the first 100 products"""
+    print("   (This may take a minute...)")
+
+    try:
+        # Configure geometry settings
+        settings = ifcopenshell.geom.settings()
+        settings.set('use-world-coords', True)
+
+        # Sample some elements to get coordinate ranges
+        min_x = min_y = min_z = float('inf')
+        max_x = max_y = max_z = float('-inf')
+
+        sample_size = min(100, len(products))  # Sample first 100 products
+        print(f"   Sampling {sample_size} elements...")
+
+        for i, product in enumerate(products[:sample_size]):
+            if i % 20 == 0:
+                print(f"   Progress: {i}/{sample_size}...", end='\r')
+
+            try:
+                shape = ifcopenshell.geom.create_shape(settings, product)
+
+                # Get transformation matrix
+                m = shape.transformation.matrix.data
+                # Translation is in the last column
+                x, y, z = m[3], m[7], m[11]
+
+                min_x = min(min_x, x)
+                min_y = min(min_y, y)
+                min_z = min(min_z, z)
+                max_x = max(max_x, x)
+                max_y = max(max_y, y)
+                max_z = max(max_z, z)
+            except:
+                continue
+
+        print(f"\n   Bounding Box (sampled):")
+        print(f"   Min: ({min_x:.2f}, {min_y:.2f}, {min_z:.2f})")
+        print(f"   Max: ({max_x:.2f}, {max_y:.2f}, {max_z:.2f})")
+        print(f"   Center: ({(min_x+max_x)/2:.2f}, {(min_y+max_y)/2:.2f}, {(min_z+max_z)/2:.2f})")
+        print(f"   Size: ({max_x-min_x:.2f}, {max_y-min_y:.2f}, {max_z-min_z:.2f})")
+
+        print_coordinate_analysis((min_x, min_y, min_z), (max_x, max_y, max_z))
+
+    except Exception as e:
+        print(f"   Error analyzing geometry: {e}")
+
+
+def inspect_ifc(ifc_path, extents=False, num_threads=None, outlier_distance=1000.0):
+    """
+    Inspect IFC file and report key information
+
+    With extents=True the whole model is tessellated to get exact per-class
+    and per-storey bounds and outliers instead of a 100-product sample.
+    """
 
     print("=" * 80)
     print(f"INSPECTING: {ifc_path}")
@@ -77,75 +308,43 @@ def inspect_ifc(ifc_path):
 
     # Calculate bounding box
     print(f"\n7. Analyzing Geometry Extents...")
-    print("   (This may take a minute...)")
 
-    try:
-        # Configure geometry settings
-        settings = ifcopenshell.geom.settings()
-        settings.set('use-world-coords', True)
-
-        # Sample some elements to get coordinate ranges
-        min_x = min_y = min_z = float('inf')
-        max_x = max_y = max_z = float('-inf')
-
-        sample_size = min(100, len(products))  # Sample first 100 products
-        print(f"   Sampling {sample_size} elements...")
-
-        for i, product in enumerate(products[:sample_size]):
-            if i % 20 == 0:
-                print(f"   Progress: {i}/{sample_size}...", end='\r')
-
-            try:
-                shape = ifcopenshell.geom.create_shape(settings, product)
-
-                # Get transformation matrix
-                m = shape.transformation.matrix.data
-                # Translation is in the last column
-                x, y, z = m[3], m[7], m[11]
-
-                min_x = min(min_x, x)
-                min_y = min(min_y, y)
-                min_z = min(min_z, z)
-                max_x = max(max_x, x)
-                max_y = max(max_y, y)
-                max_z = max(max_z, z)
-            except:
-                continue
+    if extents:
+        try:
+            result = analyze_extents(ifc, num_threads=num_threads, outlier_distance=outlier_distance)
+        except Exception as e:
+            print(f"   Error analyzing geometry: {e}")
+        else:
+            if result['bounds'] is None:
+                print("   No geometry found")
+            else:
+                print_extents(result)
+                print_coordinate_analysis(result['bounds'][0], result['bounds'][1])
+    else:
+        sampled_extents(ifc, products)
 
-        print(f"\n   Bounding Box (sampled):")
-        print(f"   Min: ({min_x:.2f}, {min_y:.2f}, {min_z:.2f})")
-        print(f"   Max: ({max_x:.2f}, {max_y:.2f}, {max_z:.2f})")
-        print(f"   Center: ({(min_x+max_x)/2:.2f}, {(min_y+max_y)/2:.2f}, {(min_z+max_z)/2:.2f})")
-        print(f"   Size: ({max_x-min_x:.2f}, {max_y-min_y:.2f}, {max_z-min_z:.2f})")
+    print("\n" + "=" * 80)
+    print("INSPECTION COMPLETE")
+    print("=" * 80)
 
-        # Check if coordinates are far from origin
-        center_dist = ((min_x+max_x)/2)**2 + ((min_y+max_y)/2)**2 + ((min_z+max_z)/2)**2
-        center_dist = center_dist ** 0.5
+def main():
+    parser = argparse.ArgumentParser(
+        description='Inspect IFC file structure and coordinate system'
+    )
 
-        print(f"\n8. Coordinate System Analysis:")
-        print(f"   Distance from origin: {center_dist:.2f} units")
+    parser.add_argument('input', help='Input IFC file')
+    parser.add_argument('--extents', action='store_true',
+                        help='Tessellate all products for exact per-class/per-storey extents and outliers')
+    parser.add_argument('--threads', type=int, default=None,
+                        help='Geometry iterator threads for --extents (default: all cores)')
+    parser.add_argument('--outlier-distance', type=float, default=1000.0,
+                        help='Minimum distance from the model for outliers (default: 1000)')
 
-        if center_dist > 10000:
-            print(f"   ⚠️  WARNING: Model is FAR from origin!")
-            print(f"   ⚠️  This will cause precision issues in WebGL")
-            print(f"   ⚠️  SOLUTION: Use --center-model-geometry flag")
-        elif center_dist > 1000:
-            print(f"   ⚠️  CAUTION: Model is moderately far from origin")
-            print(f"   ⚠️  Recommend: Use --center-model-geometry flag")
-        else:
-            print(f"   ✓ Model is reasonably close to origin")
-            print(f"   ✓ --center-model-geometry optional (but still recommended)")
+    args = parser.parse_args()
 
-    except Exception as e:
-        print(f"   Error analyzing geometry: {e}")
+    inspect_ifc(args.input, extents=args.extents, num_threads=args.threads,
+                outlier_distance=args.outlier_distance)
 
-    print("\n" + "=" * 80)
-    print("INSPECTION COMPLETE")
-    print("=" * 80)
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python inspect_ifc.py <ifc_file>")
-        sys.exit(1)
-
-    inspect_ifc(sys.argv[1])
+    main()
@@ -0,0 +1,455 @@
+#!/usr/bin/env python3
+"""
+GPU instancing post-processor for existing GLBs
+Pure-Python replacement for glTF-Transform's instance pass: hashes every
+mesh's index and vertex buffers with NumPy (optionally up to a rigid
+transform), groups identical meshes and rewrites the file with
+EXT_mesh_gpu_instancing
+"""
+
+import sys
+import copy
+import time
+import hashlib
+import argparse
+from pathlib import Path
+from collections import defaultdict
+
+import numpy as np
+
+from glb_reader import GLBError, GLBReader
+from glb_writer import compact, matrices_to_trs
+from inspect_glb import node_local_matrices, node_world_matrices
+
+
+# Compressed buffers cannot be hashed or rewritten here: run before gltfpack
+UNSUPPORTED_EXTENSIONS = ('KHR_draco_mesh_compression', 'EXT_meshopt_compression')
+
+# Attributes that move with a rigid transform (compared after alignment)
+RIGID_ATTRIBUTES = ('POSITION', 'NORMAL', 'TANGENT')
+
+
+class AccessorHasher:
+    """Accessor content hashes, computed once per accessor"""
+
+    def __init__(self, glb):
+        self.glb = glb
+        self.cache = {}
+
+    def __call__(self, index):
+        digest = self.cache.get(index)
+        if digest is None:
+            accessor = self.glb.json['accessors'][index]
+            data = np.ascontiguousarray(self.glb.accessor(index))
+            h = hashlib.blake2b(digest_size=16)
+            h.update(f"{accessor['type']}:{data.dtype.str}:{accessor.get('normalized', False)}".encode())
+            h.update(data.tobytes())
+            digest = self.cache[index] = h.hexdigest()
+        return digest
+
+
+def mesh_signature(mesh, hasher, rigid=False):
+    """
+    Hashable description of a mesh's primitives
+
+    With rigid=True, POSITION/NORMAL/TANGENT contents are left out (only
+    their vertex counts are kept); rigid candidates are verified afterwards.
+    """
+    accessors = hasher.glb.json['accessors']
+    signature = []
+    for primitive in mesh['primitives']:
+        attributes = []
+        for semantic, index in sorted(primitive.get('attributes', {}).items()):
+            if rigid and semantic in RIGID_ATTRIBUTES:
+                attributes.append((semantic, accessors[index]['count']))
+            else:
+                attributes.append((semantic, hasher(index)))
+        indices = primitive.get('indices')
+        signature.append((
+            primitive.get('mode', 4),
+            primitive.get('material'),
+            tuple(attributes),
+            None if indices is None else hasher(indices),
+        ))
+    return tuple(signature)
+
+
+def _mesh_points(glb, mesh, semantic):
+    """Concatenated attribute data of all primitives (each accessor once), float64"""
+    seen = []
+    for primitive in mesh['primitives']:
+        index = primitive.get('attributes', {}).get(semantic)
+        if index is not None and index not in seen:
+            seen.append(index)
+    if not seen:
+        return None
+    return np.concatenate([np.asarray(glb.accessor(i, normalize=True), dtype=np.float64)[:, :3] for i in seen])
+
+
+def _shape_moments(points, quantum):
+    """Rotation-invariant key: vertex count and principal extents, rounded to quantum"""
+    centered = points - points.mean(axis=0)
+    eigenvalues = np.linalg.eigvalsh(centered.T @ centered / max(len(points), 1))
+    return tuple(np.round(np.sqrt(np.maximum(eigenvalues, 0.0)) / quantum).astype(np.int64))
+
+
+def rigid_transform(source, target):
+    """
+    Best rotation + translation mapping source points onto target points
+    (Kabsch, corresponding rows)
+
+    Returns:
+        (4x4 matrix, max residual)
+    """
+    source_center = source.mean(axis=0)
+    target_center = target.mean(axis=0)
+    a = source - source_center
+    b = target - target_center
+    u, _, vt = np.linalg.svd(a.T @ b)
+    d = np.sign(np.linalg.det(vt.T @ u.T)) or 1.0
+    rotation = vt.T @ np.diag([1.0, 1.0, d]) @ u.T
+
+    matrix = np.eye(4)
+    matrix[:3, :3] = rotation
+    matrix[:3, 3] = target_center - rotation @ source_center
+    residual = float(np.abs(a @ rotation.T - b).max()) if len(a) else 0.0
+    return matrix, residual
+
+
+def group_meshes(glb, mesh_indices, rigid=False, tolerance=1e-3):
+    """
+    Group identical meshes
+
+    Args:
+        glb: Open GLBReader
+        mesh_indices: Meshes to consider
+        rigid: Also match meshes that differ by a rotation + translation
+        tolerance: Max vertex deviation for rigid matches (model units)
+
+    Returns:
+        dict representative mesh -> {mesh: 4x4 transform from representative to mesh}
+    """
+    meshes = glb.json['meshes']
+    hasher = AccessorHasher(glb)
+    buckets = defaultdict(list)
+
+    for m in mesh_indices:
+        key = mesh_signature(meshes[m], hasher, rigid)
+        if rigid:
+            points = _mesh_points(glb, meshes[m], 'POSITION')
+            if points is None:
+                continue
+            key = (key, _shape_moments(points, tolerance * 10))
+        buckets[key].append(m)
+
+    groups = {}
+    for members in buckets.values():
+        if not rigid:
+            groups[members[0]] = {m: np.eye(4) for m in members}
+            continue
+
+        # Greedy clustering: each mesh joins the first representative it aligns with
+        clusters = []
+        for m in members:
+            points = _mesh_points(glb, meshes[m], 'POSITION')
+            normals = _mesh_points(glb, meshes[m], 'NORMAL')
+            for representative, rep_points, rep_normals, cluster in clusters:
+                matrix, residual = rigid_transform(rep_points, points)
+                if residual > tolerance:
+                    continue
+                if normals is not None and rep_normals is not None and \
+                        np.abs(rep_normals @ matrix[:3, :3].T - normals).max() > 1e-3:
+                    continue
+                cluster[m] = matrix
+                break
+            else:
+                clusters.append((m, points, normals, {m: np.eye(4)}))
+        for representative, _, _, cluster in clusters:
+            groups[representative] = cluster
+
+    return groups
+
+
+def _scene_nodes(gltf):
+    """Indices of nodes reachable from the active scene"""
+    nodes = gltf.get('nodes', [])
+    scenes = gltf.get('scenes', [])
+    if scenes:
+        stack = list(scenes[gltf.get('scene', 0)].get('nodes', []))
+    else:
+        children = {c for node in nodes for c in node.get('children', [])}
+        stack = [i for i in range(len(nodes)) if i not in children]
+    reachable = set()
+    while stack:
+        i = stack.pop()
+        if i not in reachable:
+            reachable.add(i)
+            stack.extend(nodes[i].get('children', []))
+    return reachable
+
+
+def draw_calls(gltf):
+    """Primitives drawn for the active scene (a GPU-instanced batch counts once)"""
+    nodes = gltf.get('nodes', [])
+    meshes = gltf.get('meshes', [])
+    return sum(len(meshes[nodes[i]['mesh']]['primitives']) for i in _scene_nodes(gltf) if 'mesh' in nodes[i])
+
+
+def _remove_nodes(gltf, removed):
+    """Drop nodes and renumber every node reference"""
+    if not removed:
+        return
+    count = len(gltf['nodes'])
+    new_index = {}
+    kept = []
+    for i in range(count):
+        if i not in removed:
+            new_index[i] = len(kept)
+            kept.append(gltf['nodes'][i])
+    gltf['nodes'] = kept
+
+    def remap(indices):
+        return [new_index[i] for i in indices if i in new_index]
+
+    for scene in gltf.get('scenes', []):
+        scene['nodes'] = remap(scene.get('nodes', []))
+    for node in kept:
+        if 'children' in node:
+            node['children'] = remap(node['children'])
+            if not node['children']:
+                del node['children']
+        lod = node.get('extensions', {}).get('MSFT_lod')
+        if lod:
+            lod['ids'] = remap(lod['ids'])
+    for skin in gltf.get('skins', []):
+        skin['joints'] = remap(skin['joints'])
+        if 'skeleton' in skin:
+            skin['skeleton'] = new_index[skin['skeleton']]
+    for animation in gltf.get('animations', []):
+        for channel in animation['channels']:
+            if 'node' in channel['target']:
+                channel['target']['node'] = new_index[channel['target']['node']]
+
+
+def _remove_unused_meshes(gltf):
+    meshes = gltf.get('meshes', [])
+    used = sorted({node['mesh'] for node in gltf.get('nodes', []) if 'mesh' in node})
+    new_index = {old: new for new, old in enumerate(used)}
+    gltf['meshes'] = [meshes[i] for i in used]
+    for node in gltf.get('nodes', []):
+        if 'mesh' in node:
+            node['mesh'] = new_index[node['mesh']]
+
+
+def instance_glb(input_path, output_path=None, rigid=False, tolerance=1e-3, min_instances=2, verbose=True):
+    """
+    Rewrite a GLB with EXT_mesh_gpu_instancing for repeated meshes
+
+    Every scene node showing a mesh that has at least min_instances
+    identical copies becomes one instance of a batch node. Instances keep
+    their identity: the batch node's extras list the original node names
+    (and GlobalIds when the nodes carried them) in instance order.
+
+    Args:
+        input_path: Input GLB (uncompressed; run before gltfpack)
+        output_path: Output GLB (default: <input>_instanced.glb)
+        rigid: Also match meshes with baked-in rotations/translations
+        tolerance: Max vertex deviation for rigid matches (model units)
+        min_instances: Smallest group turned into a batch
+        verbose: Print progress information
+
+    Returns:
+        dict with metrics, or None on error
+    """
+    input_path = Path(input_path)
+    output_path = Path(output_path) if output_path else input_path.with_name(f"{input_path.stem}_instanced.glb")
+
+    if verbose:
+        print("=" * 80)
+        print(f"GPU INSTANCING: {input_path}")
+        print("=" * 80)
+        print(f"Output: {output_path}")
+        print(f"Matching: {'up to a rigid transform' if rigid else 'identical buffers'}"
+              f"{f' (tolerance {tolerance:g})' if rigid else ''}")
+
+    start_time = time.time()
+
+    try:
+        with GLBReader(input_path) as glb:
+            gltf = glb.json
+            compressed = [ext for ext in gltf.get('extensionsUsed', []) if ext in UNSUPPORTED_EXTENSIONS]
+            if compressed:
+                print(f"❌ Compressed geometry ({', '.join(compressed)}): instance before compressing")
+                return None
+
+            nodes = gltf.get('nodes', [])
+            meshes = gltf.get('meshes', [])
+            draw_calls_before = draw_calls(gltf)
+
+            # Nodes that can become instances
+            animated = {c['target'].get('node') for a in gltf.get('animations', []) for c in a['channels']}
+            candidates = [
+                i for i in sorted(_scene_nodes(gltf))
+                if 'mesh' in nodes[i] and 'skin' not in nodes[i] and 'weights' not in nodes[i]
+                and not nodes[i].get('extensions') and i not in animated
+                and not any('targets' in p for p in meshes[nodes[i]['mesh']]['primitives'])
+            ]
+            if verbose:
+                print(f"\nMesh nodes: {len(candidates):,} of {len(nodes):,} nodes, {len(meshes):,} meshes")
+                print(f"Draw calls before: {draw_calls_before:,}")
+
+            hash_start = time.time()
+            groups = group_meshes(glb, sorted({nodes[i]['mesh'] for i in candidates}), rigid, tolerance)
+            hash_time = time.time() - hash_start
+
+            # mesh -> (representative, transform from representative)
+            member_of = {m: (rep, matrix) for rep, members in groups.items() for m, matrix in members.items()}
+            by_group = defaultdict(list)
+            for i in candidates:
+                rep, _ = member_of.get(nodes[i]['mesh'], (None, None))
+                if rep is not None:
+                    by_group[rep].append(i)
+
+            world, parent, _ = node_world_matrices(gltf)
+            local = node_local_matrices(nodes)
+
+            gltf = copy.deepcopy(gltf)
+            nodes = gltf['nodes']
+            removed = set()
+            batches = []
+            instanced_nodes = 0
+
+            for rep in sorted(by_group):
+                members = by_group[rep]
+                if len(members) < min_instances:
+                    continue
+
+                # Under the shared parent if there is one, else in world space
+                parents = {int(parent[i]) for i in members}
+                shared_parent = parents.pop() if len(parents) == 1 else -1
+                base = local if shared_parent >= 0 else world
+                matrices = np.array([base[i] @ member_of[nodes[i]['mesh']][1] for i in members])
+                translation, rotation, scale, exact = matrices_to_trs(matrices)
+                if exact.sum() < min_instances:
+                    continue
+
+                members = [i for i, ok in zip(members, exact) if ok]
+                batches.append((rep, shared_parent, members, translation[exact], rotation[exact], scale[exact]))
+                instanced_nodes += len(members)
+
+                for i in members:
+                    if nodes[i].get('children') or nodes[i].get('camera') is not None:
+                        del nodes[i]['mesh']
+                    else:
+                        removed.add(i)
+
+            # Batch nodes go after the originals, so existing indices stay valid until removal
+            batch_nodes = []
+            for rep, shared_parent, members, translation, rotation, scale in batches:
+                extras = {'nodeNames': [nodes[i].get('name') for i in members]}
+                guids = [nodes[i].get('extras', {}).get('globalId') for i in members]
+                if all(guids):
+                    extras['globalIds'] = guids
+                nodes.append({
+                    'name': f"instances_{meshes[rep].get('name') or rep}",
+                    'mesh': rep,
+                    'extensions': {'EXT_mesh_gpu_instancing': {'attributes': {}}},
+                    'extras': extras,
+                })
+                index = len(nodes) - 1
+                batch_nodes.append((index, translation, rotation, scale))
+                if shared_parent >= 0:
+                    nodes[shared_parent]['children'] = nodes[shared_parent].get('children', []) + [index]
+                else:
+                    scene = gltf['scenes'][gltf.get('scene', 0)]
+                    scene['nodes'] = scene.get('nodes', []) + [index]
+
+            if batches:
+                _remove_nodes(gltf, removed)
+                _remove_unused_meshes(gltf)
+
+            writer = compact(glb, gltf)
+            if batches:
+                # Batch nodes were appended last and keep their order after removal
+                first_batch = len(writer.gltf['nodes']) - len(batch_nodes)
+                for k, (_, translation, rotation, scale) in enumerate(batch_nodes):
+                    writer.gltf['nodes'][first_batch + k]['extensions']['EXT_mesh_gpu_instancing']['attributes'] = {
+                        'TRANSLATION': writer.add_accessor(translation),
+                        'ROTATION': writer.add_accessor(rotation),
+                        'SCALE': writer.add_accessor(scale),
+                    }
+                writer.use_extension('EXT_mesh_gpu_instancing')
+
+            draw_calls_after = draw_calls(writer.gltf)
+            output_size = writer.write(output_path)
+
+        total_time = time.time() - start_time
+        metrics = {
+            'input_size_mb': input_path.stat().st_size / (1024**2),
+            'output_size_mb': output_size / (1024**2),
+            'batches': len(batches),
+            'instanced_nodes': instanced_nodes,
+            'meshes_before': len(meshes),
+            'meshes_after': len(writer.gltf.get('meshes', [])),
+            'draw_calls_before': draw_calls_before,
+            'draw_calls_after': draw_calls_after,
+            'hash_time_s': hash_time,
+            'total_time_s': total_time,
+        }
+
+        if verbose:
+            print("-" * 60)
+            print("INSTANCING COMPLETE")
+            print(f"  Batches: {len(batches):,} with {instanced_nodes:,} instances")
+            print(f"  Meshes: {metrics['meshes_before']:,} → {metrics['meshes_after']:,}")
+            print(f"  Draw calls: {draw_calls_before:,} → {draw_calls_after:,}")
+            print(f"  Size: {metrics['input_size_mb']:.2f} MB → {metrics['output_size_mb']:.2f} MB")
+            print(f"  Hash/match time: {hash_time:.2f}s")
+            print(f"  Total time: {total_time:.2f}s")
+            print(f"\n✓ Saved: {output_path}")
+
+        return metrics
+
+    except GLBError as e:
+        print(f"❌ {e}")
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Rewrite a GLB with EXT_mesh_gpu_instancing for repeated meshes',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # IfcConvert output with world coordinates baked into the vertices
+  python instance_glb.py bilton_baseline.glb -o bilton_instanced.glb --rigid
+
+  # Identical buffers only
+  python instance_glb.py model.glb --min-instances 3
+        """
+    )
+    parser.add_argument('input', help='Input GLB file (uncompressed)')
+    parser.add_argument('-o', '--output', help='Output GLB file (default: input_instanced.glb)')
+    parser.add_argument('--rigid', action='store_true',
+                        help='Also match meshes that differ by a rotation + translation')
+    parser.add_argument('--tolerance', type=float, default=1e-3,
+                        help='Max vertex deviation for rigid matches in model units (default: 0.001)')
+    parser.add_argument('--min-instances', type=int, default=2,
+                        help='Smallest group turned into an instanced batch (default: 2)')
+    parser.add_argument('-q', '--quiet', action='store_true', help='Quiet mode')
+
+    args = parser.parse_args()
+
+    metrics = instance_glb(
+        args.input,
+        output_path=args.output,
+        rigid=args.rigid,
+        tolerance=args.tolerance,
+        min_instances=args.min_instances,
+        verbose=not args.quiet
+    )
+    sys.exit(0 if metrics else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+"""
+LOD chain generation for converted GLBs
+Builds 2-3 simplified levels per mesh by vectorized vertex clustering,
+chooses the levels by screen-space error and writes them as MSFT_lod with
+MSFT_screencoverage and per-level error metrics in the node extras
+"""
+
+import sys
+import copy
+import json
+import math
+import time
+import argparse
+from pathlib import Path
+from collections import defaultdict
+
+import numpy as np
+
+from glb_reader import GLBError, GLBReader
+from glb_writer import ARRAY_BUFFER, ELEMENT_ARRAY_BUFFER, compact
+
+
+EXTENSION = 'MSFT_lod'
+
+UNSUPPORTED_EXTENSIONS = ('KHR_draco_mesh_compression', 'EXT_meshopt_compression')
+
+# Screen coverage (fraction of the viewport covered by the projected bounding
+# sphere, as Babylon.js measures it) below which each level takes over
+DEFAULT_COVERAGES = (0.05, 0.01, 0.002)
+
+
+def error_for_coverage(radius, coverage, pixel_error=1.0, screen_height=1080, aspect=16 / 9):
+    """
+    Largest geometric error that stays below pixel_error pixels while the
+    object covers `coverage` of the screen
+
+    A sphere of radius r at distance d covers π(r/d)² / (aspect · (2 tan(fov/2))²)
+    of the viewport, and an error e projects to e · H / (2 d tan(fov/2)) pixels;
+    eliminating d gives e = r · τ / H · sqrt(π / (aspect · coverage)).
+    """
+    return radius * pixel_error / screen_height * math.sqrt(math.pi / (aspect * coverage))
+
+
+def coverage_for_error(radius, error, pixel_error=1.0, screen_height=1080, aspect=16 / 9):
+    """Screen coverage at which a level with this geometric error reaches pixel_error pixels"""
+    if error <= 0:
+        return 0.0
+    return math.pi / aspect * (radius * pixel_error / (error * screen_height)) ** 2
+
+
+def _cell_keys(positions, origin, cell):
+    """Integer cluster key of every vertex's grid cell"""
+    cells = np.floor((positions - origin) / cell).astype(np.int64)
+    cells -= cells.min(axis=0)
+    dims = cells.max(axis=0) + 1
+    if float(dims[0]) * float(dims[1]) * float(dims[2]) < 2**62:
+        return (cells[:, 0] * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2]
+    return np.unique(cells, axis=0, return_inverse=True)[1].ravel()
+
+
+def cluster_primitive(positions, indices, origin, cell, normals=None, uvs=None):
+    """
+    Vertex clustering of one triangle primitive
+
+    Vertices in the same grid cell merge into their centroid; triangles that
+    collapse or duplicate another are dropped.
+
+    Returns:
+        dict with 'positions', 'normals', 'uvs', 'indices' (uint32) and
+        'error' (max distance of an original vertex from its representative)
+    """
+    keys = _cell_keys(positions, origin, cell)
+    _, cluster, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    cluster = cluster.ravel()
+
+    def average(values):
+        out = np.stack([np.bincount(cluster, weights=values[:, c], minlength=len(counts))
+                        for c in range(values.shape[1])], axis=1)
+        return out / counts[:, None]
+
+    centroids = average(positions)
+    error = float(np.linalg.norm(positions - centroids[cluster], axis=1).max(initial=0.0))
+
+    triangles = cluster[indices.reshape(-1, 3)]
+    keep = (triangles[:, 0] != triangles[:, 1]) & (triangles[:, 1] != triangles[:, 2]) & \
+        (triangles[:, 0] != triangles[:, 2])
+    triangles = triangles[keep]
+    if len(triangles):
+        _, first = np.unique(np.sort(triangles, axis=1), axis=0, return_index=True)
+        triangles = triangles[np.sort(first)]
+
+    used, remapped = np.unique(triangles, return_inverse=True)
+    result = {
+        'positions': centroids[used].astype(np.float32),
+        'indices': remapped.ravel().astype(np.uint32),
+        'normals': None,
+        'uvs': None,
+        'error': error,
+    }
+    if normals is not None:
+        averaged = average(normals)[used]
+        length = np.linalg.norm(averaged, axis=1, keepdims=True)
+        averaged = np.where(length > 1e-6, averaged / np.maximum(length, 1e-12), [0.0, 0.0, 1.0])
+        result['normals'] = averaged.astype(np.float32)
+    if uvs is not None:
+        result['uvs'] = average(uvs)[used].astype(np.float32)
+    return result
+
+
+def build_lods(glb, mesh, coverages, pixel_error=1.0, screen_height=1080, min_reduction=0.2, min_triangles=64):
+    """
+    Simplified levels of one mesh
+
+    Returns:
+        (levels, radius): levels is a list of dicts with 'primitives' (per
+        primitive cluster_primitive() output), 'error', 'triangles' and
+        'coverage' (switch-over screen coverage), coarsest last
+    """
+    accessors = glb.json['accessors']
+    primitives = []
+    for primitive in mesh['primitives']:
+        attributes = primitive.get('attributes', {})
+        if primitive.get('mode', 4) != 4 or 'POSITION' not in attributes:
+            return [], 0.0
+        positions = np.asarray(glb.accessor(attributes['POSITION'], normalize=True), dtype=np.float64)
+        if 'indices' in primitive:
+            indices = np.asarray(glb.accessor(primitive['indices']), dtype=np.int64)
+        else:
+            indices = np.arange(len(positions), dtype=np.int64)
+        if len(indices) % 3:
+            return [], 0.0
+        normals = uvs = None
+        if 'NORMAL' in attributes:
+            normals = np.asarray(glb.accessor(attributes['NORMAL'], normalize=True), dtype=np.float64)
+        if 'TEXCOORD_0' in attributes and accessors[attributes['TEXCOORD_0']]['type'] == 'VEC2':
+            uvs = np.asarray(glb.accessor(attributes['TEXCOORD_0'], normalize=True), dtype=np.float64)
+        primitives.append((positions, indices, normals, uvs))
+
+    triangles = sum(len(p[1]) // 3 for p in primitives)
+    if triangles < min_triangles:
+        return [], 0.0
+
+    lo = np.min([p[0].min(axis=0) for p in primitives if len(p[0])], axis=0)
+    hi = np.max([p[0].max(axis=0) for p in primitives if len(p[0])], axis=0)
+    radius = float(np.linalg.norm(hi - lo)) / 2
+    if radius == 0:
+        return [], 0.0
+
+    levels = []
+    previous = triangles
+    for coverage in coverages:
+        # Cluster error never exceeds the cell diagonal
+        cell = error_for_coverage(radius, coverage, pixel_error, screen_height) / math.sqrt(3)
+        simplified = [cluster_primitive(p, i, lo, cell, n, u) for p, i, n, u in primitives]
+        count = sum(len(s['indices']) // 3 for s in simplified)
+        if count == 0:
+            break
+        if count > previous * (1 - min_reduction):
+            continue
+        error = max(s['error'] for s in simplified)
+        levels.append({
+            'primitives': simplified,
+            'error': error,
+            'triangles': count,
+            'coverage': coverage_for_error(radius, error, pixel_error, screen_height),
+        })
+        previous = count
+
+    return levels, radius
+
+
+def lod_glb(input_path, output_path=None, coverages=DEFAULT_COVERAGES, pixel_error=1.0, screen_height=1080,
+            min_reduction=0.2, min_triangles=64, verbose=True):
+    """
+    Add MSFT_lod chains to every sufficiently detailed mesh node of a GLB
+
+    Each LOD node copies the base node's transform (and GPU instancing);
+    the base node's extras get MSFT_screencoverage (minimum screen coverage
+    of each level, base first, so the coarsest level ends at 0 and is never
+    culled) plus lodErrors/lodTriangles.
+
+    Args:
+        input_path: Input GLB (uncompressed)
+        output_path: Output GLB (default: <input>_lod.glb)
+        coverages: Target screen coverages for the simplified levels, decreasing
+        pixel_error: Allowed screen-space error in pixels
+        screen_height: Reference viewport height in pixels
+        min_reduction: Keep a level only if it removes this fraction of triangles
+        min_triangles: Meshes with fewer triangles get no LODs
+        verbose: Print progress information
+
+    Returns:
+        dict with metrics, or None on error
+    """
+    input_path = Path(input_path)
+    output_path = Path(output_path) if output_path else input_path.with_name(f"{input_path.stem}_lod.glb")
+
+    if verbose:
+        print("=" * 80)
+        print(f"LOD GENERATION: {input_path}")
+        print("=" * 80)
+        print(f"Output: {output_path}")
+        print(f"Target coverages: {', '.join(f'{c:g}' for c in coverages)} "
+              f"({pixel_error:g} px error at {screen_height} px)")
+
+    start_time = time.time()
+
+    try:
+        with GLBReader(input_path) as glb:
+            gltf = copy.deepcopy(glb.json)
+            compressed = [ext for ext in gltf.get('extensionsUsed', []) if ext in UNSUPPORTED_EXTENSIONS]
+            if compressed:
+                print(f"❌ Compressed geometry ({', '.join(compressed)}): generate LODs before compressing")
+                return None
+
+            nodes = gltf.get('nodes', [])
+            meshes = gltf.get('meshes', [])
+            users = defaultdict(list)
+            for i, node in enumerate(nodes):
+                if 'mesh' in node and 'skin' not in node and EXTENSION not in node.get('extensions', {}):
+                    users[node['mesh']].append(i)
+
+            lods = {}
+            for m in sorted(users):
+                if any('targets' in p for p in meshes[m]['primitives']):
+                    continue
+                levels, _ = build_lods(glb, meshes[m], coverages, pixel_error, screen_height,
+                                       min_reduction, min_triangles)
+                if levels:
+                    lods[m] = levels
+
+            writer = compact(glb, gltf)
+            nodes = writer.gltf['nodes']
+            accessors = writer.gltf['accessors']
+            base_triangles = {
+                m: sum(accessors[p.get('indices', p['attributes']['POSITION'])]['count'] // 3
+                       for p in writer.gltf['meshes'][m]['primitives'])
+                for m in lods
+            }
+
+            # One glTF mesh per level
+            level_meshes = {}
+            for m, levels in lods.items():
+                base = writer.gltf['meshes'][m]
+                level_meshes[m] = []
+                for k, level in enumerate(levels, start=1):
+                    primitives = []
+                    for original, simplified in zip(base['primitives'], level['primitives']):
+                        attributes = {'POSITION': writer.add_accessor(simplified['positions'],
+                                                                      target=ARRAY_BUFFER, bounds=True)}
+                        if simplified['normals'] is not None:
+                            attributes['NORMAL'] = writer.add_accessor(simplified['normals'], target=ARRAY_BUFFER)
+                        if simplified['uvs'] is not None:
+                            attributes['TEXCOORD_0'] = writer.add_accessor(simplified['uvs'], target=ARRAY_BUFFER)
+                        primitive = {
+                            'attributes': attributes,
+                            'indices': writer.add_accessor(simplified['indices'], target=ELEMENT_ARRAY_BUFFER),
+                        }
+                        if 'material' in original:
+                            primitive['material'] = original['material']
+                        primitives.append(primitive)
+                    name = f"{base.get('name') or m}_lod{k}"
+                    level_meshes[m].append(writer.add_mesh(primitives, name=name))
+
+            # LOD nodes are not part of the scene: they are only reachable through MSFT_lod
+            lod_nodes = 0
+            for m, levels in lods.items():
+                for i in users[m]:
+                    node = nodes[i]
+                    ids = []
+                    for k, mesh_index in enumerate(level_meshes[m], start=1):
+                        lod_node = {key: copy.deepcopy(node[key])
+                                    for key in ('matrix', 'translation', 'rotation', 'scale') if key in node}
+                        if node.get('name'):
+                            lod_node['name'] = f"{node['name']}_lod{k}"
+                        lod_node['mesh'] = mesh_index
+                        instancing = node.get('extensions', {}).get('EXT_mesh_gpu_instancing')
+                        if instancing:
+                            lod_node['extensions'] = {'EXT_mesh_gpu_instancing': copy.deepcopy(instancing)}
+                        lod_node['extras'] = {'lodLevel': k, 'geometricError': levels[k - 1]['error']}
+                        ids.append(len(nodes))
+                        nodes.append(lod_node)
+                        lod_nodes += 1
+
+                    node.setdefault('extensions', {})[EXTENSION] = {'ids': ids}
+                    extras = node.setdefault('extras', {})
+                    extras['MSFT_screencoverage'] = [level['coverage'] for level in levels] + [0.0]
+                    extras['lodErrors'] = [0.0] + [level['error'] for level in levels]
+                    extras['lodTriangles'] = [base_triangles[m]] + [level['triangles'] for level in levels]
+
+            if lods:
+                writer.use_extension(EXTENSION)
+            output_size = writer.write(output_path)
+
+        level_counts = defaultdict(int)
+        level_triangles = defaultdict(int)
+        for levels in lods.values():
+            for k, level in enumerate(levels, start=1):
+                level_counts[k] += 1
+                level_triangles[k] += level['triangles']
+
+        total_time = time.time() - start_time
+        metrics = {
+            'input_size_mb': input_path.stat().st_size / (1024**2),
+            'output_size_mb': output_size / (1024**2),
+            'meshes': len(meshes),
+            'meshes_with_lods': len(lods),
+            'lod_nodes': lod_nodes,
+            'triangles_base': sum(base_triangles.values()),
+            'levels': {
+                k: {'meshes': level_counts[k], 'triangles': level_triangles[k]}
+                for k in sorted(level_counts)
+            },
+            'total_time_s': total_time,
+        }
+
+        if verbose:
+            print("-" * 60)
+            print("LOD GENERATION COMPLETE")
+            print(f"  Meshes with LODs: {len(lods):,} of {len(meshes):,}")
+            print(f"  Base triangles (those meshes): {metrics['triangles_base']:,}")
+            for k, level in metrics['levels'].items():
+                print(f"  LOD{k}: {level['meshes']:,} meshes, {level['triangles']:,} triangles")
+            print(f"  Size: {metrics['input_size_mb']:.2f} MB → {metrics['output_size_mb']:.2f} MB")
+            print(f"  Total time: {total_time:.2f}s")
+            print(f"\n✓ Saved: {output_path}")
+
+        return metrics
+
+    except GLBError as e:
+        print(f"❌ {e}")
+        return None
+
+
+def lod_tiles(manifest_path, verbose=True, **options):
+    """
+    Generate LODs for every tile of a convert_ifc_to_glb --tiles manifest, so
+    distant storeys can switch to coarse meshes; tiles.json gets a 'lod'
+    entry per tile
+    """
+    manifest_path = Path(manifest_path)
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+
+    for tile in manifest['tiles']:
+        source = manifest_path.parent / tile['file']
+        target = source.with_name(f"{source.stem}_lod.glb")
+        metrics = lod_glb(source, target, verbose=verbose, **options)
+        if metrics is None:
+            return None
+        tile['lod'] = {
+            'file': target.name,
+            'bytes': target.stat().st_size,
+            'levels': metrics['levels'],
+        }
+
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    if verbose:
+        print(f"\n✓ Updated manifest: {manifest_path}")
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Generate MSFT_lod chains by vertex clustering',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python lod_glb.py bilton_baseline.glb -o bilton_lod.glb
+
+  # Coarser levels, 2 px tolerated error
+  python lod_glb.py model.glb --coverages 0.1,0.02 --pixel-error 2
+
+  # Every tile of a tiled conversion (per-storey LODs)
+  python lod_glb.py bilton_tiles/tiles.json
+        """
+    )
+    parser.add_argument('input', help='Input GLB file, or tiles.json from convert_ifc_to_glb.py --tiles')
+    parser.add_argument('-o', '--output', help='Output GLB file (default: input_lod.glb)')
+    parser.add_argument('--coverages', default=','.join(f'{c:g}' for c in DEFAULT_COVERAGES),
+                        help='Screen coverages at which the simplified levels take over '
+                             f'(default: {",".join(f"{c:g}" for c in DEFAULT_COVERAGES)})')
+    parser.add_argument('--pixel-error', type=float, default=1.0, help='Allowed screen-space error in pixels')
+    parser.add_argument('--screen-height', type=int, default=1080, help='Reference viewport height in pixels')
+    parser.add_argument('--min-reduction', type=float, default=0.2,
+                        help='Drop levels removing less than this fraction of triangles (default: 0.2)')
+    parser.add_argument('--min-triangles', type=int, default=64,
+                        help='Meshes with fewer triangles get no LODs (default: 64)')
+    parser.add_argument('-q', '--quiet', action='store_true', help='Quiet mode')
+
+    args = parser.parse_args()
+
+    options = {
+        'coverages': sorted((float(c) for c in args.coverages.split(',')), reverse=True),
+        'pixel_error': args.pixel_error,
+        'screen_height': args.screen_height,
+        'min_reduction': args.min_reduction,
+        'min_triangles': args.min_triangles,
+    }
+
+    if args.input.endswith('.json'):
+        result = lod_tiles(args.input, verbose=not args.quiet, **options)
+    else:
+        result = lod_glb(args.input, output_path=args.output, verbose=not args.quiet, **options)
+    sys.exit(0 if result else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Content-addressed stage cache for the IFC → GLB → compressed → instanced pipeline
+Each stage's output is keyed by the hash of its input file(s), the exact
+settings or CLI flags and the tool version, so unchanged stages are served
+from a local artifact store instead of being recomputed
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import subprocess
+from pathlib import Path
+
+
+DEFAULT_CACHE_DIR = Path(os.environ.get('BIM_PIPELINE_CACHE', Path.home() / '.cache' / 'bim-pipeline'))
+DEFAULT_MAX_SIZE_GB = 50.0
+
+HASH_CHUNK_SIZE = 16 * 1024 * 1024
+
+
+def hash_file(path):
+    """SHA-256 of a file's contents, streamed in 16 MB chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def tool_version(command):
+    """
+    Identify an external tool: its --version output plus the hash of its
+    binary, so a rebuilt IfcConvert/gltfpack invalidates cached stages
+    """
+    executable = shutil.which(str(command)) or str(command)
+    parts = [Path(executable).name]
+
+    try:
+        result = subprocess.run([executable, '--version'], capture_output=True, text=True, timeout=30)
+        output = (result.stdout or result.stderr).strip()
+        if output:
+            parts.append(output.splitlines()[0])
+    except (OSError, subprocess.SubprocessError):
+        pass
+
+    if Path(executable).is_file():
+        parts.append(hash_file(executable)[:16])
+
+    return ' '.join(parts)
+
+
+class StageCache:
+    """
+    Local artifact store with LRU eviction
+
+    Layout:
+        <root>/index.json                 entries, input digests, statistics
+        <root>/objects/<key[:2]>/<key>    cached stage outputs
+
+    The index is rewritten atomically after every change. One pipeline run
+    at a time per cache directory is assumed.
+    """
+
+    def __init__(self, root=None, max_size_gb=DEFAULT_MAX_SIZE_GB, verbose=True):
+        self.root = Path(root) if root else DEFAULT_CACHE_DIR
+        self.objects = self.root / 'objects'
+        self.index_path = self.root / 'index.json'
+        self.max_bytes = int(max_size_gb * 1024**3)
+        self.verbose = verbose
+
+        self.objects.mkdir(parents=True, exist_ok=True)
+        self.index = {'entries': {}, 'digests': {}, 'totals': {'hits': 0, 'misses': 0, 'time_saved_s': 0.0}}
+        if self.index_path.exists():
+            try:
+                with open(self.index_path) as f:
+                    self.index.update(json.load(f))
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"Warning: ignoring unreadable cache index {self.index_path}: {e}")
+
+        # Statistics of this process only
+        self.hits = []
+        self.misses = []
+
+    def save(self):
+        """Atomically rewrite the index"""
+        tmp_path = self.index_path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(self.index, f, indent=1)
+        os.replace(tmp_path, self.index_path)
+
+    def file_digest(self, path):
+        """Content hash of an input, reused while its size and mtime are unchanged"""
+        path = Path(path).resolve()
+        stat = path.stat()
+        known = self.index['digests'].get(str(path))
+        if known and known['size'] == stat.st_size and known['mtime_ns'] == stat.st_mtime_ns:
+            return known['sha256']
+
+        if self.verbose:
+            print(f"  Hashing {path.name} ({stat.st_size / (1024**2):.1f} MB)...")
+        digest = hash_file(path)
+        self.index['digests'][str(path)] = {
+            'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest
+        }
+        return digest
+
+    def stage_key(self, stage, inputs, params, tool):
+        """Cache key of a stage: input contents + exact parameters + tool version"""
+        description = {
+            'stage': stage,
+            'inputs': [self.file_digest(path) for path in inputs],
+            'params': params,
+            'tool': tool,
+        }
+        return hashlib.sha256(json.dumps(description, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _object_path(self, key):
+        return self.objects / key[:2] / key
+
+    def lookup(self, key):
+        """Cache entry for key, or None (entries whose object vanished are dropped)"""
+        entry = self.index['entries'].get(key)
+        if entry is None:
+            return None
+        if not self._object_path(key).exists():
+            del self.index['entries'][key]
+            return None
+        return entry
+
+    def store(self, key, stage, output_path, duration_s, meta=None):
+        """Copy a freshly produced artifact into the store"""
+        object_path = self._object_path(key)
+        object_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = object_path.with_suffix('.tmp')
+        shutil.copyfile(output_path, tmp_path)
+        os.replace(tmp_path, object_path)
+
+        now = time.time()
+        self.index['entries'][key] = {
+            'stage': stage,
+            'size': object_path.stat().st_size,
+            'duration_s': duration_s,
+            'created': now,
+            'last_used': now,
+            'meta': meta or {},
+        }
+        self.evict()
+
+    def fetch(self, key, output_path):
+        """Copy a cached artifact to output_path"""
+        # A copy rather than a hard link: tools that later overwrite the
+        # output in place must not corrupt the stored artifact
+        output_path = Path(output_path)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(self._object_path(key), output_path)
+        self.index['entries'][key]['last_used'] = time.time()
+
+    def evict(self, max_bytes=None):
+        """Drop least recently used artifacts until the store fits max_bytes"""
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = self.index['entries']
+        total = sum(entry['size'] for entry in entries.values())
+        evicted = 0
+
+        for key in sorted(entries, key=lambda k: entries[k]['last_used']):
+            if total <= max_bytes:
+                break
+            total -= entries[key]['size']
+            self._object_path(key).unlink(missing_ok=True)
+            del entries[key]
+            evicted += 1
+
+        if evicted and self.verbose:
+            print(f"  Evicted {evicted} cached artifact(s)")
+        return evicted
+
+    def run(self, stage, inputs, output_path, params, tool, produce):
+        """
+        Serve a stage from the cache or run it and cache the result
+
+        Args:
+            stage: Stage name (e.g. 'ifcconvert', 'gltfpack')
+            inputs: Input file paths the stage reads
+            output_path: File the stage produces
+            params: JSON-serializable settings/flags that affect the output
+            tool: Tool version string (see tool_version())
+            produce: Callable running the stage; may return a dict of metadata
+                stored with the artifact. Returning False marks failure.
+
+        Returns:
+            (hit, meta): whether the cache was used and the stored metadata,
+            or (False, None) when produce() failed
+        """
+        key = self.stage_key(stage, inputs, params, tool)
+        entry = self.lookup(key)
+
+        if entry is not None:
+            self.fetch(key, output_path)
+            self.hits.append((stage, entry['duration_s']))
+            self.index['totals']['hits'] += 1
+            self.index['totals']['time_saved_s'] += entry['duration_s']
+            self.save()
+            if self.verbose:
+                print(f"  ✓ Cache hit for {stage} ({key[:12]}), saved {entry['duration_s']:.1f}s")
+            return True, entry['meta']
+
+        if self.verbose:
+            print(f"  Cache miss for {stage} ({key[:12]})")
+
+        start = time.time()
+        meta = produce()
+        duration = time.time() - start
+
+        if meta is False or not Path(output_path).exists():
+            self.save()
+            return False, None
+
+        meta = meta if isinstance(meta, dict) else {}
+        self.store(key, stage, output_path, duration, meta)
+        self.misses.append((stage, duration))
+        self.index['totals']['misses'] += 1
+        self.save()
+        return False, meta
+
+    def report(self):
+        """Print hits, misses and time saved for this run and overall"""
+        entries = self.index['entries']
+        totals = self.index['totals']
+        saved = sum(duration for _, duration in self.hits)
+
+        print("-" * 60)
+        print("STAGE CACHE")
+        print(f"  This run:  {len(self.hits)} hit(s), {len(self.misses)} miss(es), {saved:.1f}s saved")
+        for stage, duration in self.hits:
+            print(f"    hit   {stage:20s} {duration:8.1f}s saved")
+        for stage, duration in self.misses:
+            print(f"    miss  {stage:20s} {duration:8.1f}s computed")
+        print(f"  All runs:  {totals['hits']} hit(s), {totals['misses']} miss(es), "
+              f"{totals['time_saved_s']:.1f}s saved")
+        print(f"  Store:     {len(entries)} artifact(s), "
+              f"{sum(e['size'] for e in entries.values()) / (1024**2):.1f} MB "
+              f"of {self.max_bytes / (1024**3):.1f} GB ({self.root})")
+
+
+def run_command_stage(cache, stage, inputs, output_path, command):
+    """
+    Run an external tool as a cached stage
+
+    '{input}', '{inputs}' and '{output}' in the command are replaced by the
+    paths; the templated flags and the tool version form the cache key.
+    """
+    def expand(arg):
+        if arg == '{inputs}':
+            return [str(path) for path in inputs]
+        return [arg.replace('{input}', str(inputs[0])).replace('{output}', str(output_path))]
+
+    argv = [part for arg in command for part in expand(arg)]
+
+    def produce():
+        print(f"  Running: {' '.join(argv)}")
+        result = subprocess.run(argv)
+        return {'returncode': result.returncode} if result.returncode == 0 else False
+
+    return cache.run(stage, inputs, output_path, {'argv': command}, tool_version(command[0]), produce)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Content-addressed cache for pipeline stages',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # gltfpack as a cached stage
+  python pipeline_cache.py run --stage gltfpack -i bilton_baseline.glb -o bilton_compressed.glb \\
+      -- gltfpack -i {input} -o {output} -cc
+
+  # Statistics and eviction
+  python pipeline_cache.py report
+  python pipeline_cache.py gc --max-size-gb 20
+        """
+    )
+    parser.add_argument('--cache-dir', default=None, help=f'Cache directory (default: {DEFAULT_CACHE_DIR})')
+    parser.add_argument('--max-size-gb', type=float, default=DEFAULT_MAX_SIZE_GB,
+                        help=f'Store size limit (default: {DEFAULT_MAX_SIZE_GB:g} GB)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='Run a command as a cached stage')
+    run_parser.add_argument('--stage', required=True, help='Stage name')
+    run_parser.add_argument('-i', '--input', action='append', required=True, help='Input file (repeatable)')
+    run_parser.add_argument('-o', '--output', required=True, help='Output file')
+    run_parser.add_argument('tool_command', nargs=argparse.REMAINDER,
+                            help='-- command with {input}/{inputs}/{output} placeholders')
+
+    subparsers.add_parser('report', help='Show cache statistics')
+    subparsers.add_parser('gc', help='Evict least recently used artifacts down to --max-size-gb')
+    subparsers.add_parser('clear', help='Remove every cached artifact')
+
+    args = parser.parse_args()
+    cache = StageCache(args.cache_dir, max_size_gb=args.max_size_gb)
+
+    if args.command == 'run':
+        command = args.tool_command[1:] if args.tool_command[:1] == ['--'] else args.tool_command
+        if not command:
+            parser.error('run needs a command after --')
+        hit, meta = run_command_stage(cache, args.stage, [Path(p) for p in args.input], Path(args.output), command)
+        cache.report()
+        sys.exit(0 if hit or meta is not None else 1)
+
+    elif args.command == 'report':
+        cache.report()
+
+    elif args.command == 'gc':
+        cache.evict()
+        cache.save()
+        cache.report()
+
+    elif args.command == 'clear':
+        cache.evict(max_bytes=0)
+        cache.index['digests'] = {}
+        cache.save()
+        cache.report()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Time-budgeted tessellation of single products in worker processes
+A product that exceeds its budget (or crashes its worker) is killed
+together with that worker instead of stalling the whole conversion; the
+caller can retry it with simpler settings or fall back to a bounding-box
+placeholder
+"""
+
+import time
+import multiprocessing
+import multiprocessing.connection
+
+import numpy as np
+
+from ifc_mesh import shape_mesh
+
+
+# Retry settings for products that blew the budget: no boolean openings and
+# no shell healing, which is where pathological walls and breps spend their time
+SIMPLE_SETTINGS = {
+    'disable-opening-subtractions': True,
+    'weld-vertices': False,
+    'reorient-shells': False,
+}
+
+PLACEHOLDER_MATERIAL = {
+    'name': 'placeholder',
+    'pbrMetallicRoughness': {
+        'baseColorFactor': [1.0, 0.0, 1.0, 0.4],
+        'metallicFactor': 0.0,
+        'roughnessFactor': 1.0,
+    },
+    'alphaMode': 'BLEND',
+    'doubleSided': True,
+}
+
+# Populated by the parent right before forking so every worker inherits
+# the loaded model instead of re-parsing it
+_WORKER_STATE = {}
+
+
+def _worker_main(connection, settings_values):
+    import ifcopenshell.geom
+
+    ifc_file = _WORKER_STATE['ifc_file']
+    settings = ifcopenshell.geom.settings()
+    for name, value in settings_values.items():
+        settings.set(name, value)
+
+    while True:
+        product_id = connection.recv()
+        if product_id is None:
+            return
+        try:
+            shape = ifcopenshell.geom.create_shape(settings, ifc_file.by_id(product_id))
+            connection.send(('ok', shape_mesh(shape)))
+        except Exception as e:
+            connection.send(('error', f"{type(e).__name__}: {e}"))
+
+
+class _Worker:
+    def __init__(self, context, settings_values):
+        self.connection, child = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child, settings_values), daemon=True)
+        self.process.start()
+        child.close()
+        self.task = None
+        self.started = None
+
+    def submit(self, product_id):
+        self.task = product_id
+        self.started = time.perf_counter()
+        self.connection.send(product_id)
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+    def stop(self):
+        try:
+            self.connection.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.connection.close()
+
+
+class ProductPool:
+    """
+    Fork-based workers tessellating one product at a time with create_shape()
+
+    Usage:
+        pool = ProductPool(ifc_file, settings_values, processes=8, budget=30)
+        for product_id, status, result, seconds in pool.run(product_ids):
+            ...
+
+    status is 'ok' (result: ifc_mesh mesh dict), 'error' (result: message),
+    'timeout' (the worker was killed after budget seconds) or 'crashed'
+    (the worker died, e.g. segfault or OOM kill). Killed workers are
+    replaced, so one bad product never costs more than its budget.
+    """
+
+    def __init__(self, ifc_file, settings_values, processes=None, budget=None):
+        if "fork" not in multiprocessing.get_all_start_methods():
+            raise RuntimeError("time-budgeted tessellation needs the 'fork' start method")
+        self.ifc_file = ifc_file
+        self.settings_values = dict(settings_values)
+        self.processes = processes or multiprocessing.cpu_count()
+        self.budget = budget
+        self.context = multiprocessing.get_context("fork")
+
+    def run(self, product_ids):
+        """Yield (product_id, status, result, seconds) in completion order"""
+        pending = list(reversed(product_ids))
+        workers = []
+        _WORKER_STATE['ifc_file'] = self.ifc_file
+        try:
+            for _ in range(min(self.processes, len(pending))):
+                workers.append(_Worker(self.context, self.settings_values))
+
+            while True:
+                for worker in workers:
+                    if worker.task is None and pending:
+                        worker.submit(pending.pop())
+                busy = [worker for worker in workers if worker.task is not None]
+                if not busy:
+                    return
+
+                timeout = None
+                if self.budget:
+                    now = time.perf_counter()
+                    timeout = max(min(worker.started + self.budget - now for worker in busy), 0.0)
+                ready = multiprocessing.connection.wait([worker.connection for worker in busy], timeout)
+
+                for index, worker in enumerate(workers):
+                    if worker.task is None:
+                        continue
+                    seconds = time.perf_counter() - worker.started
+                    if worker.connection in ready:
+                        try:
+                            status, result = worker.connection.recv()
+                        except (EOFError, OSError):
+                            status, result = 'crashed', f"worker exited with code {worker.process.exitcode}"
+                    elif self.budget and seconds >= self.budget:
+                        status, result = 'timeout', f"exceeded {self.budget:g}s budget"
+                    else:
+                        continue
+
+                    product_id = worker.task
+                    worker.task = None
+                    if status in ('timeout', 'crashed'):
+                        worker.kill()
+                        workers[index] = _Worker(self.context, self.settings_values)
+                    yield product_id, status, result, seconds
+        finally:
+            for worker in workers:
+                if worker.task is not None:
+                    worker.kill()
+                else:
+                    worker.stop()
+            _WORKER_STATE.clear()
+
+
+def representation_bounds(ifc_file, product):
+    """
+    Approximate world AABB of a product without tessellating it, in metres
+
+    Collects the coordinates of every point in the representation subgraph,
+    extends them by the largest extrusion depth, and transforms the box by
+    the product placement. Item positions and mapped-item transforms are
+    ignored, so this is only good for a placeholder. Returns None when the
+    representation has no points.
+    """
+    import ifcopenshell.util.placement
+    import ifcopenshell.util.unit
+
+    points = []
+    depth = 0.0
+    for entity in ifc_file.traverse(product.Representation):
+        if entity.is_a("IfcCartesianPoint"):
+            points.append((tuple(entity.Coordinates) + (0.0, 0.0))[:3])
+        elif entity.is_a("IfcCartesianPointList"):
+            points.extend((tuple(c) + (0.0, 0.0))[:3] for c in entity.CoordList)
+        elif entity.is_a("IfcExtrudedAreaSolid"):
+            depth = max(depth, float(entity.Depth))
+    if not points:
+        return None
+
+    points = np.array(points, dtype=np.float64)
+    lo = points.min(axis=0)
+    hi = points.max(axis=0)
+    hi[2] = max(hi[2], lo[2] + depth)
+
+    corners = np.array([[hi[a] if (i >> a) & 1 else lo[a] for a in range(3)] for i in range(8)])
+    if product.ObjectPlacement is not None:
+        matrix = np.asarray(ifcopenshell.util.placement.get_local_placement(product.ObjectPlacement))
+        corners = corners @ matrix[:3, :3].T + matrix[:3, 3]
+    corners *= ifcopenshell.util.unit.calculate_unit_scale(ifc_file)
+    return corners.min(axis=0), corners.max(axis=0)
+
+
+def box_mesh(lo, hi):
+    """ifc_mesh mesh dict of an axis-aligned box with the placeholder material"""
+    lo = np.asarray(lo, dtype=np.float32)
+    hi = np.asarray(hi, dtype=np.float32)
+    positions = np.array([[hi[a] if (i >> a) & 1 else lo[a] for a in range(3)] for i in range(8)],
+                         dtype=np.float32)
+    # Two outward-facing triangles per face of the corner cube (bit 0 = x, 1 = y, 2 = z)
+    indices = np.array([
+        0, 2, 1, 1, 2, 3,  4, 5, 6, 5, 7, 6,  # -z, +z
+        0, 1, 4, 1, 5, 4,  2, 6, 3, 3, 6, 7,  # -y, +y
+        0, 4, 2, 2, 4, 6,  1, 3, 5, 3, 7, 5,  # -x, +x
+    ], dtype=np.uint32)
+    return {'positions': positions, 'normals': None, 'uvs': None, 'groups': [(PLACEHOLDER_MATERIAL, indices)]}
@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+"""
+Vertex attribute quantization (KHR_mesh_quantization) for GLBs
+Vectorized NumPy pass that stores positions as int16 with a per-mesh
+dequantization transform, normals/tangents as normalized int8 and UVs as
+normalized uint16, and writes a per-file error report
+"""
+
+import sys
+import copy
+import json
+import time
+import argparse
+from pathlib import Path
+from collections import defaultdict
+
+import numpy as np
+
+from glb_reader import GLBError, GLBReader
+from glb_writer import ARRAY_BUFFER, compact
+from inspect_glb import trs_matrices
+
+
+EXTENSION = 'KHR_mesh_quantization'
+
+# Already compressed or quantized files are left alone
+UNSUPPORTED_EXTENSIONS = ('KHR_draco_mesh_compression', 'EXT_meshopt_compression', EXTENSION)
+
+
+def quantize_positions(positions, bits):
+    """
+    Positions of one mesh -> int16 grid
+
+    Returns:
+        (quantized arrays, offset, scale): positions ≈ quantized * scale + offset.
+        The scale is uniform so normals stay valid under the dequantization transform.
+    """
+    lo = np.min([p.min(axis=0) for p in positions], axis=0)
+    hi = np.max([p.max(axis=0) for p in positions], axis=0)
+    offset = (lo + hi) / 2
+    levels = (1 << (bits - 1)) - 1
+    scale = float((hi - lo).max()) / 2 / levels or 1.0
+    quantized = [np.round((p - offset) / scale).clip(-levels, levels).astype(np.int16) for p in positions]
+    return quantized, offset, scale
+
+
+def quantize_unit_vectors(vectors, bits):
+    """Unit vectors (normals, tangent xyz + w) -> normalized int8 with `bits` of precision"""
+    levels = (1 << (bits - 1)) - 1
+    length = np.linalg.norm(vectors[:, :3], axis=1, keepdims=True)
+    unit = vectors.copy()
+    unit[:, :3] = vectors[:, :3] / np.where(length == 0, 1.0, length)
+    snapped = np.round(unit * levels) / levels
+    return np.round(snapped * 127).clip(-127, 127).astype(np.int8)
+
+
+def quantize_uvs(uvs, bits):
+    """UVs in [0, 1] -> normalized uint16 with `bits` of precision"""
+    levels = (1 << bits) - 1
+    snapped = np.round(uvs * levels) / levels
+    return np.round(snapped * 65535).clip(0, 65535).astype(np.uint16)
+
+
+def _dequantization(offset, scale):
+    matrix = np.eye(4) * scale
+    matrix[3, 3] = 1.0
+    matrix[:3, 3] = offset
+    return matrix
+
+
+def _float_attribute(glb, index, components):
+    accessor = glb.json['accessors'][index]
+    return accessor['componentType'] == 5126 and accessor['type'] == f"VEC{components}" and 'sparse' not in accessor
+
+
+def quantize_glb(input_path, output_path=None, position_bits=14, normal_bits=8, uv_bits=12,
+                 report_path=None, verbose=True):
+    """
+    Quantize vertex attributes of a GLB
+
+    POSITION becomes int16 (position_bits significant bits); the mesh's
+    dequantization (uniform scale + offset) is folded into every node that
+    shows it, into a new child node when the node has children or is
+    animated, or into the instance transforms of EXT_mesh_gpu_instancing
+    nodes. NORMAL/TANGENT become normalized int8 and TEXCOORD_n normalized
+    uint16 when all coordinates are within [0, 1] (others stay float).
+
+    Args:
+        input_path: Input GLB (uncompressed)
+        output_path: Output GLB (default: <input>_quantized.glb)
+        position_bits: 2-16
+        normal_bits: 2-8
+        uv_bits: 2-16
+        report_path: Error report JSON (default: <output>.quantization.json)
+        verbose: Print progress information
+
+    Returns:
+        The error report dict, or None on error
+    """
+    input_path = Path(input_path)
+    output_path = Path(output_path) if output_path else input_path.with_name(f"{input_path.stem}_quantized.glb")
+    report_path = Path(report_path) if report_path else output_path.with_suffix('.quantization.json')
+
+    if not (2 <= position_bits <= 16 and 2 <= normal_bits <= 8 and 2 <= uv_bits <= 16):
+        print("❌ Bit depths must be 2-16 for positions and UVs, 2-8 for normals")
+        return None
+
+    if verbose:
+        print("=" * 80)
+        print(f"QUANTIZING: {input_path}")
+        print("=" * 80)
+        print(f"Output: {output_path}")
+        print(f"Bits: positions {position_bits}, normals {normal_bits}, UVs {uv_bits}")
+
+    start_time = time.time()
+
+    try:
+        with GLBReader(input_path) as glb:
+            gltf = copy.deepcopy(glb.json)
+            skipped_extensions = [ext for ext in gltf.get('extensionsUsed', []) if ext in UNSUPPORTED_EXTENSIONS]
+            if skipped_extensions:
+                print(f"❌ Already compressed or quantized ({', '.join(skipped_extensions)})")
+                return None
+
+            nodes = gltf.get('nodes', [])
+            meshes = gltf.get('meshes', [])
+            accessors = glb.json.get('accessors', [])
+
+            users = defaultdict(list)
+            for i, node in enumerate(nodes):
+                if 'mesh' in node:
+                    users[node['mesh']].append(i)
+            animated = {c['target'].get('node') for a in gltf.get('animations', []) for c in a['channels']}
+
+            # Quantized arrays waiting for accessors: key -> [array, options, [(dict, attribute name)]]
+            pending = {}
+            stats = {
+                'position': {'accessors': 0, 'max_error': 0.0, 'sum_error': 0.0, 'count': 0},
+                'normal': {'accessors': 0, 'max_error_deg': 0.0, 'sum_error_deg': 0.0, 'count': 0},
+                'uv': {'accessors': 0, 'kept_float': 0, 'max_error': 0.0, 'sum_error': 0.0, 'count': 0},
+            }
+            bytes_before = bytes_after = 0
+            mesh_errors = []
+            skipped_meshes = 0
+            dequantization = {}
+
+            for m, mesh in enumerate(meshes):
+                primitives = mesh['primitives']
+                if not users[m] or any('skin' in nodes[i] for i in users[m]) or \
+                        any('targets' in p for p in primitives):
+                    skipped_meshes += 1
+                    continue
+
+                # Positions: one grid for the whole mesh, each accessor quantized once
+                position_indices = []
+                for primitive in primitives:
+                    index = primitive.get('attributes', {}).get('POSITION')
+                    if index is not None and index not in position_indices and _float_attribute(glb, index, 3):
+                        position_indices.append(index)
+                if len(position_indices) != len({p['attributes'].get('POSITION') for p in primitives}):
+                    skipped_meshes += 1
+                    continue
+
+                new_accessors = {}
+                if position_indices:
+                    original = [np.asarray(glb.accessor(i), dtype=np.float64) for i in position_indices]
+                    quantized, offset, scale = quantize_positions(original, position_bits)
+                    errors = np.concatenate([
+                        np.abs(q * scale + offset - p).max(axis=1) for q, p in zip(quantized, original)
+                    ])
+                    stats['position']['accessors'] += len(quantized)
+                    stats['position']['max_error'] = max(stats['position']['max_error'], float(errors.max(initial=0)))
+                    stats['position']['sum_error'] += float(errors.sum())
+                    stats['position']['count'] += len(errors)
+                    mesh_errors.append((float(errors.max(initial=0)), m, mesh.get('name')))
+                    dequantization[m] = _dequantization(offset, scale)
+                    for index, q in zip(position_indices, quantized):
+                        new_accessors[('POSITION', index)] = (q, {'bounds': True})
+                        bytes_before += len(q) * 12
+                        bytes_after += len(q) * 8
+
+                for primitive in primitives:
+                    attributes = primitive.get('attributes', {})
+                    for semantic, index in attributes.items():
+                        if (semantic, index) in new_accessors:
+                            continue
+                        if semantic in ('NORMAL', 'TANGENT'):
+                            components = 3 if semantic == 'NORMAL' else 4
+                            if not _float_attribute(glb, index, components):
+                                continue
+                            original = np.asarray(glb.accessor(index), dtype=np.float64)
+                            q = quantize_unit_vectors(original, normal_bits)
+                            decoded = q[:, :3] / 127.0
+                            decoded /= np.maximum(np.linalg.norm(decoded, axis=1, keepdims=True), 1e-12)
+                            reference = original[:, :3] / np.maximum(
+                                np.linalg.norm(original[:, :3], axis=1, keepdims=True), 1e-12)
+                            angle = np.degrees(np.arccos(np.clip((decoded * reference).sum(axis=1), -1.0, 1.0)))
+                            stats['normal']['accessors'] += 1
+                            stats['normal']['max_error_deg'] = max(stats['normal']['max_error_deg'],
+                                                                   float(angle.max(initial=0)))
+                            stats['normal']['sum_error_deg'] += float(angle.sum())
+                            stats['normal']['count'] += len(angle)
+                            new_accessors[(semantic, index)] = (q, {'normalized': True})
+                            bytes_before += len(q) * 4 * components
+                            bytes_after += len(q) * 4
+                        elif semantic.startswith('TEXCOORD_'):
+                            if not _float_attribute(glb, index, 2):
+                                continue
+                            original = np.asarray(glb.accessor(index), dtype=np.float64)
+                            if len(original) and (original.min() < 0.0 or original.max() > 1.0):
+                                # Normalized uint16 cannot represent tiling UVs
+                                stats['uv']['kept_float'] += 1
+                                continue
+                            q = quantize_uvs(original, uv_bits)
+                            errors = np.abs(q / 65535.0 - original).max(axis=1) if len(q) else np.zeros(0)
+                            stats['uv']['accessors'] += 1
+                            stats['uv']['max_error'] = max(stats['uv']['max_error'], float(errors.max(initial=0)))
+                            stats['uv']['sum_error'] += float(errors.sum())
+                            stats['uv']['count'] += len(errors)
+                            new_accessors[(semantic, index)] = (q, {'normalized': True})
+                            bytes_before += len(q) * 8
+                            bytes_after += len(q) * 4
+
+                for primitive in primitives:
+                    attributes = primitive.get('attributes', {})
+                    for semantic, index in list(attributes.items()):
+                        if (semantic, index) in new_accessors:
+                            array, options = new_accessors[(semantic, index)]
+                            entry = pending.setdefault((m, semantic, index), [array, options, []])
+                            entry[2].append((attributes, semantic))
+                            attributes[semantic] = None
+
+            # Fold each mesh's dequantization into the nodes that show it
+            instance_updates = []
+            for m, matrix in dequantization.items():
+                for i in users[m]:
+                    node = nodes[i]
+                    instancing = node.get('extensions', {}).get('EXT_mesh_gpu_instancing')
+                    if instancing:
+                        instance_updates.append((i, matrix))
+                    elif node.get('children') or i in animated:
+                        del node['mesh']
+                        nodes.append({'mesh': m, 'matrix': [float(v) for v in matrix.T.ravel()]})
+                        node['children'] = node.get('children', []) + [len(nodes) - 1]
+                    elif 'matrix' in node:
+                        local = np.array(node['matrix'], dtype=float).reshape(4, 4).T
+                        node['matrix'] = [float(v) for v in (local @ matrix).T.ravel()]
+                    else:
+                        # T R S · T_d s_d = T(t + R S t_d) R (S s_d): stays TRS
+                        local = trs_matrices([node.get('translation', [0.0, 0.0, 0.0])],
+                                             [node.get('rotation', [0.0, 0.0, 0.0, 1.0])],
+                                             [node.get('scale', [1.0, 1.0, 1.0])])[0]
+                        node['translation'] = [float(v) for v in (local @ matrix)[:3, 3]]
+                        node['scale'] = [float(v) * matrix[0, 0] for v in node.get('scale', [1.0, 1.0, 1.0])]
+
+            for i, matrix in instance_updates:
+                attributes = nodes[i]['extensions']['EXT_mesh_gpu_instancing']['attributes']
+                count = accessors[next(iter(attributes.values()))]['count']
+                translation = glb.accessor(attributes['TRANSLATION']) if 'TRANSLATION' in attributes \
+                    else np.zeros((count, 3))
+                rotation = glb.accessor(attributes['ROTATION'], normalize=True) if 'ROTATION' in attributes \
+                    else np.tile([0.0, 0.0, 0.0, 1.0], (count, 1))
+                scale = glb.accessor(attributes['SCALE']) if 'SCALE' in attributes else np.ones((count, 3))
+                per_instance = trs_matrices(translation, rotation, scale) @ matrix
+                for semantic, data in (
+                    ('TRANSLATION', per_instance[:, :3, 3]),
+                    ('ROTATION', np.asarray(rotation)),
+                    ('SCALE', np.asarray(scale) * matrix[0, 0]),
+                ):
+                    attributes[semantic] = None
+                    pending[('instances', i, semantic)] = [data.astype(np.float32), {}, [(attributes, semantic)]]
+
+            writer = compact(glb, gltf)
+            for key, (array, options, references) in pending.items():
+                index = writer.add_accessor(
+                    array,
+                    target=None if key[0] == 'instances' else ARRAY_BUFFER,
+                    normalized=options.get('normalized', False),
+                    bounds=options.get('bounds', False),
+                )
+                for attributes, semantic in references:
+                    attributes[semantic] = index
+            if dequantization or stats['normal']['accessors'] or stats['uv']['accessors']:
+                writer.use_extension(EXTENSION, required=True)
+            output_size = writer.write(output_path)
+
+        input_size = input_path.stat().st_size
+        report = {
+            'input': str(input_path),
+            'output': str(output_path),
+            'bits': {'position': position_bits, 'normal': normal_bits, 'uv': uv_bits},
+            'input_size': input_size,
+            'output_size': output_size,
+            'attribute_bytes_before': bytes_before,
+            'attribute_bytes_after': bytes_after,
+            'meshes_quantized': len(dequantization),
+            'meshes_skipped': skipped_meshes,
+            'position': {
+                'accessors': stats['position']['accessors'],
+                'max_error': stats['position']['max_error'],
+                'mean_error': stats['position']['sum_error'] / max(stats['position']['count'], 1),
+            },
+            'normal': {
+                'accessors': stats['normal']['accessors'],
+                'max_error_deg': stats['normal']['max_error_deg'],
+                'mean_error_deg': stats['normal']['sum_error_deg'] / max(stats['normal']['count'], 1),
+            },
+            'uv': {
+                'accessors': stats['uv']['accessors'],
+                'kept_float': stats['uv']['kept_float'],
+                'max_error': stats['uv']['max_error'],
+                'mean_error': stats['uv']['sum_error'] / max(stats['uv']['count'], 1),
+            },
+            'worst_meshes': [
+                {'mesh': m, 'name': name, 'max_position_error': error}
+                for error, m, name in sorted(mesh_errors, key=lambda e: -e[0])[:20]
+            ],
+            'time_s': time.time() - start_time,
+        }
+        with open(report_path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+        if verbose:
+            print("-" * 60)
+            print("QUANTIZATION COMPLETE")
+            print(f"  Meshes quantized: {len(dequantization):,} ({skipped_meshes:,} skipped)")
+            print(f"  Vertex data: {bytes_before / (1024**2):.2f} MB → {bytes_after / (1024**2):.2f} MB")
+            print(f"  File size: {input_size / (1024**2):.2f} MB → {output_size / (1024**2):.2f} MB")
+            print(f"  Position error: max {report['position']['max_error']:.6f}, "
+                  f"mean {report['position']['mean_error']:.6f} (model units)")
+            print(f"  Normal error: max {report['normal']['max_error_deg']:.2f}°, "
+                  f"mean {report['normal']['mean_error_deg']:.2f}°")
+            print(f"  UV error: max {report['uv']['max_error']:.6f} "
+                  f"({report['uv']['kept_float']} accessor(s) outside [0, 1] kept as float)")
+            print(f"  Total time: {report['time_s']:.2f}s")
+            print(f"\n✓ Saved: {output_path}")
+            print(f"✓ Report: {report_path}")
+
+        return report
+
+    except GLBError as e:
+        print(f"❌ {e}")
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Quantize GLB vertex attributes (KHR_mesh_quantization)',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python quantize_glb.py bilton_baseline.glb -o bilton_quantized.glb
+  python quantize_glb.py model.glb --position-bits 16 --normal-bits 8 --uv-bits 14
+        """
+    )
+    parser.add_argument('input', help='Input GLB file (uncompressed)')
+    parser.add_argument('-o', '--output', help='Output GLB file (default: input_quantized.glb)')
+    parser.add_argument('--position-bits', type=int, default=14, help='Position precision, 2-16 (default: 14)')
+    parser.add_argument('--normal-bits', type=int, default=8, help='Normal/tangent precision, 2-8 (default: 8)')
+    parser.add_argument('--uv-bits', type=int, default=12, help='UV precision, 2-16 (default: 12)')
+    parser.add_argument('--report', help='Error report JSON (default: output.quantization.json)')
+    parser.add_argument('-q', '--quiet', action='store_true', help='Quiet mode')
+
+    args = parser.parse_args()
+
+    report = quantize_glb(
+        args.input,
+        output_path=args.output,
+        position_bits=args.position_bits,
+        normal_bits=args.normal_bits,
+        uv_bits=args.uv_bits,
+        report_path=args.report,
+        verbose=not args.quiet
+    )
+    sys.exit(0 if report else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+"""
+Cost-balanced sharded IFC → GLB conversion
+Estimates each product's tessellation cost from its representation,
+partitions the products into N shards of equal estimated cost, tessellates
+every shard in its own process and merges the shard GLBs into one file.
+A scaling run reports the speedup curve over shard counts
+"""
+
+import sys
+import time
+import heapq
+import argparse
+import tempfile
+import multiprocessing
+from pathlib import Path
+
+import ifcopenshell
+import ifcopenshell.geom
+
+from convert_ifc_to_glb import GEOMETRY_SETTINGS, write_product_glb
+
+
+# Relative tessellation cost per entity in a representation subgraph.
+# Booleans and curved/B-spline geometry dominate; extrusions of simple
+# profiles are cheap; every face, loop and point adds a little.
+COST_WEIGHTS = {
+    'IfcBooleanResult': 25.0,
+    'IfcBooleanClippingResult': 25.0,
+    'IfcAdvancedBrep': 40.0,
+    'IfcBSplineSurfaceWithKnots': 30.0,
+    'IfcRationalBSplineSurfaceWithKnots': 30.0,
+    'IfcBSplineCurveWithKnots': 3.0,
+    'IfcSurfaceOfLinearExtrusion': 5.0,
+    'IfcSweptDiskSolid': 12.0,
+    'IfcSweptDiskSolidPolygonal': 12.0,
+    'IfcRevolvedAreaSolid': 8.0,
+    'IfcSurfaceCurveSweptAreaSolid': 10.0,
+    'IfcFixedReferenceSweptAreaSolid': 10.0,
+    'IfcExtrudedAreaSolid': 2.0,
+    'IfcExtrudedAreaSolidTapered': 4.0,
+    'IfcFacetedBrep': 2.0,
+    'IfcFaceBasedSurfaceModel': 2.0,
+    'IfcShellBasedSurfaceModel': 2.0,
+    'IfcTriangulatedFaceSet': 1.0,
+    'IfcPolygonalFaceSet': 2.0,
+    'IfcFace': 0.3,
+    'IfcAdvancedFace': 5.0,
+    'IfcPolyLoop': 0.2,
+    'IfcCartesianPoint': 0.02,
+    'IfcCircle': 1.0,
+    'IfcTrimmedCurve': 0.5,
+}
+# Per point of an IfcCartesianPointList / per face of an indexed face set
+POINT_LIST_WEIGHT = 0.01
+INDEXED_FACE_WEIGHT = 0.005
+# Fixed cost of every product (iterator bookkeeping, placement, styles)
+PRODUCT_COST = 1.0
+# Each opening is one boolean subtraction on top of the opening's own geometry
+OPENING_COST = 20.0
+
+
+class CostModel:
+    """
+    Estimated tessellation cost of products, in arbitrary units
+
+    Representation maps (type geometry) are tessellated once per process
+    and reused for every mapped item, so their cost is spread over the
+    products using them.
+    """
+
+    def __init__(self, ifc_file):
+        self.ifc_file = ifc_file
+        self._map_costs = {}
+
+    def subgraph_cost(self, entity):
+        """
+        Cost of the entities reachable from entity, not descending into
+        representation maps
+
+        Returns:
+            (cost, [IfcRepresentationMap reached])
+        """
+        cost = 0.0
+        maps = []
+        seen = {entity.id()}
+        stack = [entity]
+        while stack:
+            item = stack.pop()
+            cls = item.is_a()
+            if cls == 'IfcRepresentationMap':
+                maps.append(item)
+                continue
+            cost += COST_WEIGHTS.get(cls, 0.0)
+            if cls in ('IfcCartesianPointList3D', 'IfcCartesianPointList2D'):
+                cost += POINT_LIST_WEIGHT * len(item.CoordList)
+            elif cls == 'IfcTriangulatedFaceSet':
+                cost += INDEXED_FACE_WEIGHT * len(item.CoordIndex)
+            elif cls == 'IfcPolygonalFaceSet':
+                cost += INDEXED_FACE_WEIGHT * len(item.Faces)
+            # Representation contexts are shared by everything and cost nothing
+            if cls in ('IfcGeometricRepresentationContext', 'IfcGeometricRepresentationSubContext'):
+                continue
+            for child in self.ifc_file.traverse(item, max_levels=1)[1:]:
+                if child.id() and child.id() not in seen:
+                    seen.add(child.id())
+                    stack.append(child)
+        return cost, maps
+
+    def map_cost(self, representation_map):
+        """Cost of a representation map divided by its number of users"""
+        cost = self._map_costs.get(representation_map.id())
+        if cost is None:
+            own, nested = self.subgraph_cost(representation_map.MappedRepresentation)
+            own += sum(self.map_cost(m) for m in nested if m != representation_map)
+            cost = self._map_costs[representation_map.id()] = own / max(len(representation_map.MapUsage), 1)
+        return cost
+
+    def product_cost(self, product):
+        cost = PRODUCT_COST
+        if product.Representation is not None:
+            own, maps = self.subgraph_cost(product.Representation)
+            cost += own + sum(self.map_cost(m) for m in maps)
+        for rel in getattr(product, 'HasOpenings', None) or ():
+            opening = rel.RelatedOpeningElement
+            cost += OPENING_COST
+            if opening.Representation is not None:
+                cost += self.subgraph_cost(opening.Representation)[0]
+        return cost
+
+
+def partition(costs, shards):
+    """
+    Longest-processing-time-first partition into shards of balanced cost
+
+    Args:
+        costs: list of (cost, item)
+        shards: number of shards
+
+    Returns:
+        list of (total cost, [items]) per shard
+    """
+    heap = [(0.0, i) for i in range(shards)]
+    result = [[0.0, []] for _ in range(shards)]
+    for cost, item in sorted(costs, key=lambda entry: -entry[0]):
+        total, i = heapq.heappop(heap)
+        result[i][0] += cost
+        result[i][1].append(item)
+        heapq.heappush(heap, (total + cost, i))
+    return [tuple(shard) for shard in result]
+
+
+# Populated by the parent right before forking so every shard process
+# inherits the loaded model instead of re-parsing it
+_WORKER_STATE = {}
+
+
+def _convert_shard(task):
+    """Tessellate one shard's products and write them as a GLB"""
+    from ifc_mesh import shape_mesh
+
+    index, product_ids, output_path, threads = task
+    ifc_file = _WORKER_STATE['ifc_file']
+    start = time.perf_counter()
+
+    settings = ifcopenshell.geom.settings()
+    for name, value in GEOMETRY_SETTINGS.items():
+        settings.set(name, value)
+
+    products = [ifc_file.by_id(i) for i in product_ids]
+    meshes = {}
+    if products:
+        iterator = ifcopenshell.geom.iterator(settings, ifc_file, threads, include=products)
+        for shape in iterator:
+            mesh = shape_mesh(shape)
+            if mesh['groups']:
+                meshes[shape.guid] = mesh
+    tessellate_time = time.perf_counter() - start
+
+    ordered = sorted((p.GlobalId, p.is_a(), p.Name) for p in products if p.GlobalId in meshes)
+    vertices, triangles = write_product_glb(output_path, ordered, meshes.__getitem__)
+    return {
+        'shard': index,
+        'products': len(ordered),
+        'vertices': vertices,
+        'triangles': triangles,
+        'tessellate_time_s': tessellate_time,
+        'time_s': time.perf_counter() - start,
+        'output': str(output_path),
+    }
+
+
+def shard_convert(ifc_path, output_path=None, shards=None, threads_per_shard=1, ifc_file=None,
+                  costs=None, verbose=True):
+    """
+    Convert IFC to GLB in cost-balanced shards
+
+    Args:
+        ifc_path: Path to input IFC file
+        output_path: Path for output GLB file (optional)
+        shards: Number of shard processes (default: CPU count)
+        threads_per_shard: Geometry iterator threads inside each shard
+        ifc_file: Already opened model (skips loading, e.g. for scaling runs)
+        costs: Precomputed (cost, product id) list
+        verbose: Print progress information
+
+    Returns:
+        dict with conversion metrics, per-shard estimated cost and times
+    """
+    from glb_writer import merge_glbs
+
+    ifc_path = Path(ifc_path)
+    if not ifc_path.exists():
+        print(f"Error: File not found: {ifc_path}")
+        return None
+    output_path = Path(output_path) if output_path else ifc_path.with_suffix('.glb')
+    shards = shards or multiprocessing.cpu_count()
+    if "fork" not in multiprocessing.get_all_start_methods():
+        print("Error: sharded conversion needs the 'fork' start method")
+        return None
+
+    start_time = time.time()
+    try:
+        load_time = 0.0
+        if ifc_file is None:
+            if verbose:
+                print(f"Loading IFC file: {ifc_path}")
+            load_start = time.time()
+            ifc_file = ifcopenshell.open(str(ifc_path))
+            load_time = time.time() - load_start
+
+        estimate_time = 0.0
+        if costs is None:
+            estimate_start = time.time()
+            costs = estimate_costs(ifc_file)
+            estimate_time = time.time() - estimate_start
+
+        parts = partition(costs, shards)
+        mean_cost = sum(cost for cost, _ in parts) / shards
+        if verbose:
+            print(f"Partitioned {len(costs)} products into {shards} shard(s) "
+                  f"(estimate imbalance {max(cost for cost, _ in parts) / mean_cost if mean_cost else 1:.3f})")
+
+        convert_start = time.time()
+        with tempfile.TemporaryDirectory(prefix='ifc-shards-') as shard_dir:
+            tasks = [(i, ids, Path(shard_dir) / f"shard_{i:03d}.glb", threads_per_shard)
+                     for i, (_, ids) in enumerate(parts)]
+            _WORKER_STATE['ifc_file'] = ifc_file
+            try:
+                if shards > 1:
+                    with multiprocessing.get_context("fork").Pool(shards) as pool:
+                        results = pool.map(_convert_shard, tasks, chunksize=1)
+                else:
+                    results = [_convert_shard(tasks[0])]
+            finally:
+                _WORKER_STATE.clear()
+            convert_time = time.time() - convert_start
+
+            merge_start = time.time()
+            merged = merge_glbs([task[2] for task in tasks], output_path)
+            merge_time = time.time() - merge_start
+
+        for result, (cost, _) in zip(results, parts):
+            result['estimated_cost'] = cost
+        times = [result['time_s'] for result in results]
+        total_time = time.time() - start_time
+
+        metrics = {
+            'ifc_size_mb': ifc_path.stat().st_size / (1024**2),
+            'glb_size_mb': output_path.stat().st_size / (1024**2),
+            'shards': shards,
+            'threads_per_shard': threads_per_shard,
+            'load_time_s': load_time,
+            'estimate_time_s': estimate_time,
+            'convert_time_s': convert_time,
+            'merge_time_s': merge_time,
+            'total_time_s': total_time,
+            'products_processed': sum(result['products'] for result in results),
+            'vertices': sum(result['vertices'] for result in results),
+            'triangles': sum(result['triangles'] for result in results),
+            'materials': merged['materials'],
+            'materials_deduplicated': merged['materials_deduplicated'],
+            'shard_imbalance': max(times) / (sum(times) / len(times)) if sum(times) else 1.0,
+            'shard_results': results,
+        }
+
+        if verbose:
+            print("-" * 60)
+            print("SHARDED CONVERSION COMPLETE")
+            for result in results:
+                print(f"  Shard {result['shard']:3d}: {result['products']:6d} products, "
+                      f"est. cost {result['estimated_cost']:10.0f}, {result['time_s']:7.2f}s")
+            print(f"  Imbalance (slowest / mean shard): {metrics['shard_imbalance']:.2f}")
+            print(f"  Products: {metrics['products_processed']}  Triangles: {metrics['triangles']:,}")
+            print(f"  Materials: {merged['materials']} ({merged['materials_deduplicated']} duplicates merged)")
+            print(f"  GLB size: {metrics['glb_size_mb']:.2f} MB")
+            print(f"  Convert time: {convert_time:.2f}s  Merge time: {merge_time:.2f}s")
+            print(f"  Total time: {total_time:.2f}s")
+            print(f"\n✓ Saved: {output_path}")
+
+        return metrics
+
+    except Exception as e:
+        print(f"Error during conversion: {e}")
+        import traceback
+        traceback.print_exc()
+        return None
+
+
+def estimate_costs(ifc_file):
+    """(estimated cost, product id) of every product with a representation"""
+    model = CostModel(ifc_file)
+    return [
+        (model.product_cost(p), p.id()) for p in ifc_file.by_type("IfcProduct")
+        if p.Representation is not None and not p.is_a("IfcOpeningElement")
+    ]
+
+
+def scaling_curve(ifc_path, output_path, shard_counts, threads_per_shard=1, verbose=True):
+    """
+    Run the sharded conversion for each shard count and report the speedup
+    over the first one (normally 1 shard)
+
+    Returns:
+        dict with one entry per shard count: time, speedup, efficiency
+    """
+    ifc_path = Path(ifc_path)
+    output_path = Path(output_path) if output_path else ifc_path.with_suffix('.glb')
+    ifc_file = ifcopenshell.open(str(ifc_path))
+    estimate_start = time.time()
+    costs = estimate_costs(ifc_file)
+    estimate_time = time.time() - estimate_start
+
+    if verbose:
+        print(f"Input: {ifc_path} ({len(costs)} products, costs estimated in {estimate_time:.2f}s)")
+        print(f"CPU cores: {multiprocessing.cpu_count()}")
+        print("-" * 60)
+
+    curve = []
+    for shards in shard_counts:
+        metrics = shard_convert(ifc_path, output_path, shards=shards, threads_per_shard=threads_per_shard,
+                                ifc_file=ifc_file, costs=costs, verbose=False)
+        if metrics is None:
+            return None
+        seconds = metrics['convert_time_s'] + metrics['merge_time_s']
+        baseline = curve[0] if curve else None
+        speedup = baseline['time_s'] / seconds if baseline else 1.0
+        entry = {
+            'shards': shards,
+            'time_s': seconds,
+            'convert_time_s': metrics['convert_time_s'],
+            'merge_time_s': metrics['merge_time_s'],
+            'speedup': speedup,
+            'efficiency': speedup * (baseline['shards'] if baseline else shards) / shards,
+            'shard_imbalance': metrics['shard_imbalance'],
+        }
+        curve.append(entry)
+        if verbose:
+            print(f"  {shards:3d} shard(s): {seconds:8.2f}s  speedup {speedup:5.2f}x  "
+                  f"efficiency {entry['efficiency']:5.0%}  imbalance {entry['shard_imbalance']:.2f}", flush=True)
+
+    if verbose and max(shard_counts) > multiprocessing.cpu_count():
+        print(f"⚠️  Shard counts above {multiprocessing.cpu_count()} cores cannot scale further on this machine")
+    return {'estimate_time_s': estimate_time, 'cpu_count': multiprocessing.cpu_count(), 'curve': curve}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Convert IFC to GLB in cost-balanced parallel shards',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python shard_convert.py bilton.ifc -o bilton.glb --shards 16
+
+  # Speedup curve against shard count
+  python shard_convert.py bilton.ifc --scaling 1,2,4,8,16 --json scaling.json
+        """
+    )
+    parser.add_argument('input', help='Input IFC file')
+    parser.add_argument('-o', '--output', help='Output GLB file (default: input.glb)')
+    parser.add_argument('--shards', type=int, help='Shard processes (default: CPU count)')
+    parser.add_argument('--threads-per-shard', type=int, default=1,
+                        help='Geometry iterator threads per shard (default: 1)')
+    parser.add_argument('--scaling', help='Comma-separated shard counts to time, e.g. 1,2,4,8')
+    parser.add_argument('--json', help='Write metrics (or the scaling curve) to this JSON file')
+    parser.add_argument('-q', '--quiet', action='store_true', help='Quiet mode')
+
+    args = parser.parse_args()
+
+    if args.scaling:
+        result = scaling_curve(
+            args.input,
+            args.output,
+            [int(n) for n in args.scaling.split(',')],
+            threads_per_shard=args.threads_per_shard,
+            verbose=not args.quiet
+        )
+    else:
+        result = shard_convert(
+            args.input,
+            output_path=args.output,
+            shards=args.shards,
+            threads_per_shard=args.threads_per_shard,
+            verbose=not args.quiet
+        )
+
+    if result and args.json:
+        import json
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
+
+    sys.exit(0 if result else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,30 +6,40 @@ Smart IFC to GLB converter that automatically detects if centering is needed
 import sys
 import subprocess
 import ifcopenshell
-import ifcopenshell.util.geolocation as geolocation
 from pathlib import Path
 
-def check_needs_centering(ifc_path):
+def check_needs_centering(ifc_path, extents_check=False):
     """
     Check if IFC file needs --center-model-geometry flag
-    Uses proper IFC georeferencing detection via IfcMapConversion/IfcProjectedCRS
+    Uses proper IFC georeferencing detection via IfcMapConversion/IfcProjectedCRS,
+    read by georef_probe without loading the model (IfcConvert parses it anyway)
+    With extents_check=True, models without georeferencing are additionally
+    loaded and tessellated to measure where the geometry really is
     Returns True if model uses map coordinates (GPS/georeferencing)
     """
+    # Only needed when no centering was forced, so conversions with
+    # --force-centering/--no-centering never import the STEP scanner
+    from georef_probe import ZERO_ANGLES, probe_georeferencing
+
     print("\n" + "=" * 80)
     print("ANALYZING IFC FILE FOR COORDINATE SYSTEM")
     print("=" * 80)
 
-    ifc = ifcopenshell.open(str(ifc_path))
+    try:
+        probe = probe_georeferencing(ifc_path)
+    except (OSError, ValueError) as e:
+        print(f"\n⚠️  Could not probe georeferencing: {e}")
+        probe = None
 
-    print(f"\nIFC Schema: {ifc.schema}")
-    print(f"IFC File: {Path(ifc_path).name}")
+    if probe is not None:
+        print(f"\nIFC Schema: {probe['schema']}")
+        print(f"IFC File: {Path(ifc_path).name}")
+        print(f"Probe time: {probe['probe_time_s']:.2f}s")
 
-    # Method 1: Check for proper georeferencing (IFC4 IfcMapConversion or IFC2X3 ePSet)
-    print("\n1. Checking for IFC Georeferencing (IfcMapConversion/IfcProjectedCRS)...")
-
-    try:
-        coords = geolocation.get_helmert_transformation_parameters(ifc)
+        # Method 1: Check for proper georeferencing (IFC4 IfcMapConversion or IFC2X3 ePSet)
+        print("\n1. Checking for IFC Georeferencing (IfcMapConversion/IfcProjectedCRS)...")
 
+        coords = probe['map_conversion']
         if coords is not None:
             print("   ✓ Found georeferencing transformation parameters!")
             print(f"   Eastings:  {coords.get('Eastings', 'N/A')}")
@@ -37,68 +47,60 @@ def check_needs_centering(ifc_path):
             print(f"   OrthogonalHeight: {coords.get('OrthogonalHeight', 'N/A')}")
             print(f"   Scale: {coords.get('Scale', 'N/A')}")
 
-            # Check if offsets are significant
-            eastings = coords.get('Eastings', 0)
-            northings = coords.get('Northings', 0)
-
-            if abs(eastings) > 1000 or abs(northings) > 1000:
+            eastings = coords['Eastings']
+            northings = coords['Northings']
+            if probe['reason'] == 'map conversion offsets':
                 print(f"\n   ⚠️  Large coordinate offsets detected:")
                 print(f"   Eastings={eastings:.2f}, Northings={northings:.2f}")
                 print("\n   🎯 DECISION: Model uses MAP COORDINATES (georeferenced)")
                 print("   🎯 Will use --center-model-geometry flag")
                 return True
-            else:
-                print(f"\n   ℹ️  Small offsets: Eastings={eastings:.2f}, Northings={northings:.2f}")
-                print("   May not need centering, checking IfcSite...")
+            print(f"\n   ℹ️  Small offsets: Eastings={eastings:.2f}, Northings={northings:.2f}")
+            print("   May not need centering, checking IfcSite...")
         else:
             print("   ℹ️  No IfcMapConversion/ePSet_MapConversion found")
 
-    except Exception as e:
-        print(f"   ⚠️  Could not read georeferencing: {e}")
-
-    # Method 2: Check IfcSite Latitude/Longitude (fallback)
-    print("\n2. Checking IfcSite Latitude/Longitude...")
-
-    sites = ifc.by_type("IfcSite")
-    if sites:
-        for site in sites:
-            site_name = site.Name if hasattr(site, 'Name') else "Unnamed"
-            print(f"   Site: {site_name}")
-
-            has_coords = False
-            if hasattr(site, 'RefLatitude') and site.RefLatitude:
-                lat = site.RefLatitude
-                if lat != (0, 0, 0) and lat != (0, 0, 0, 0):
-                    print(f"   ✓ Latitude: {lat}")
-                    has_coords = True
-
-            if hasattr(site, 'RefLongitude') and site.RefLongitude:
-                lon = site.RefLongitude
-                if lon != (0, 0, 0) and lon != (0, 0, 0, 0):
-                    print(f"   ✓ Longitude: {lon}")
-                    has_coords = True
-
-            if has_coords:
+        # Method 2: Check IfcSite Latitude/Longitude (fallback)
+        print("\n2. Checking IfcSite Latitude/Longitude...")
+
+        if probe['sites']:
+            for site in probe['sites']:
+                print(f"   Site: {site['name'] or 'Unnamed'}")
+                for label, angles in (('Latitude', site['latitude']), ('Longitude', site['longitude'])):
+                    if angles and tuple(angles) not in ZERO_ANGLES:
+                        print(f"   ✓ {label}: {tuple(angles)}")
+            if probe['reason'] == 'IfcSite latitude/longitude':
                 print("\n   🎯 DECISION: GPS coordinates found in IfcSite")
                 print("   🎯 Will use --center-model-geometry flag")
                 return True
-            else:
-                print(f"   ℹ️  No GPS coordinates (Lat/Lon are zero or not set)")
-    else:
-        print("   ℹ️  No IfcSite found in model")
+            print(f"   ℹ️  No GPS coordinates (Lat/Lon are zero or not set)")
+        else:
+            print("   ℹ️  No IfcSite found in model")
 
-    # Method 3: Check world coordinate system
-    print("\n3. Checking World Coordinate System...")
-    try:
-        wcs = geolocation.get_wcs(ifc)
-        if wcs is not None:
-            print("   ✓ World Coordinate System found")
+        # Method 3: Check world coordinate system
+        print("\n3. Checking World Coordinate System...")
+        if probe['wcs_origin'] is not None:
+            print(f"   ✓ World Coordinate System found, origin {tuple(probe['wcs_origin'])}")
             # WCS being present doesn't necessarily mean large offsets
             print("   ℹ️  WCS present but doesn't indicate large offsets alone")
         else:
             print("   ℹ️  No explicit WCS found")
-    except Exception as e:
-        print(f"   ℹ️  Could not check WCS: {e}")
+
+    # Method 4: Measure the real geometry extents (optional, tessellates everything)
+    if extents_check:
+        print("\n4. Measuring geometry extents...")
+        from inspect_ifc import analyze_extents, print_extents
+
+        result = analyze_extents(ifcopenshell.open(str(ifc_path)))
+        if result['bounds'] is not None:
+            print_extents(result)
+            lo, hi = result['bounds']
+            distance = float(((lo + hi) / 2) @ ((lo + hi) / 2)) ** 0.5
+            if distance > 1000:
+                print(f"\n   🎯 DECISION: Geometry center is {distance:.0f} units from the origin")
+                print("   🎯 Will use --center-model-geometry flag")
+                return True
+            print(f"   ✓ Geometry center is {distance:.2f} units from the origin")
 
     # Final decision
     print("\n" + "=" * 80)
@@ -107,7 +109,8 @@ def check_needs_centering(ifc_path):
     print("=" * 80)
     return False
 
-def convert_ifc_to_glb(ifc_path, output_path=None, force_centering=None):
+def convert_ifc_to_glb(ifc_path, output_path=None, force_centering=None, extents_check=False,
+                       cache=None):
     """
     Convert IFC to GLB with smart centering detection
 
@@ -115,6 +118,9 @@ def convert_ifc_to_glb(ifc_path, output_path=None, force_centering=None):
         ifc_path: Path to IFC file
         output_path: Output GLB path (optional)
         force_centering: Override auto-detection (True/False/None)
+        extents_check: Also measure real geometry extents during detection
+        cache: pipeline_cache.StageCache; IfcConvert is skipped when the same
+            input was converted with the same flags and IfcConvert binary
     """
     ifc_path = Path(ifc_path)
 
@@ -136,7 +142,7 @@ def convert_ifc_to_glb(ifc_path, output_path=None, force_centering=None):
 
     # Determine if centering is needed
     if force_centering is None:
-        needs_centering = check_needs_centering(ifc_path)
+        needs_centering = check_needs_centering(ifc_path, extents_check=extents_check)
     else:
         needs_centering = force_centering
         print(f"\n⚠️  Centering FORCED to: {needs_centering}")
@@ -166,9 +172,22 @@ def convert_ifc_to_glb(ifc_path, output_path=None, force_centering=None):
     print()
 
     try:
-        result = subprocess.run(cmd, capture_output=False, text=True)
+        if cache is not None:
+            from pipeline_cache import tool_version
+
+            # Flags without the input/output paths form the cache key
+            hit, meta = cache.run(
+                'ifcconvert', [ifc_path], output_path, {'flags': cmd[1:-2]},
+                tool_version(cmd[0]),
+                lambda: {} if subprocess.run(cmd).returncode == 0 else False
+            )
+            cache.report()
+            returncode = 0 if meta is not None else 1
+        else:
+            result = subprocess.run(cmd, capture_output=False, text=True)
+            returncode = result.returncode
 
-        if result.returncode == 0:
+        if returncode == 0:
             output_size = output_path.stat().st_size / (1024**2)
             print("\n" + "=" * 80)
             print("CONVERSION COMPLETE")
@@ -204,6 +223,9 @@ Examples:
 
   # Force centering OFF
   python smart_convert_ifc_to_glb.py input.ifc --no-centering
+
+  # Also check the real geometry extents
+  python smart_convert_ifc_to_glb.py input.ifc --extents-check
         """
     )
 
@@ -213,6 +235,10 @@ Examples:
                        help='Force use of --center-model-geometry')
     parser.add_argument('--no-centering', action='store_true',
                        help='Force NOT using --center-model-geometry')
+    parser.add_argument('--extents-check', action='store_true',
+                       help='Also tessellate the model to measure its real extents (slow)')
+    parser.add_argument('--cache-dir',
+                       help='Reuse IfcConvert output from this stage cache when nothing changed')
 
     args = parser.parse_args()
 
@@ -226,7 +252,12 @@ Examples:
     elif args.no_centering:
         force_centering = False
 
-    success = convert_ifc_to_glb(args.input, args.output, force_centering)
+    cache = None
+    if args.cache_dir:
+        from pipeline_cache import StageCache
+        cache = StageCache(args.cache_dir)
+
+    success = convert_ifc_to_glb(args.input, args.output, force_centering, args.extents_check, cache)
     sys.exit(0 if success else 1)
 
 if __name__ == "__main__":
@@ -5,88 +5,403 @@ Pre-builds lookup dictionaries for instant relationship queries
 """
 
 import sys
+import time
 import argparse
+import multiprocessing
 from pathlib import Path
 from collections import defaultdict
 
 
 def build_relationship_maps(ifc_file, verbose=False):
-    """Build fast lookup dictionaries for all relationships"""
+    """
+    Build fast lookup dictionaries for all relationships in a single pass
+    
+    Every IfcRelationship is visited once and dispatched on its class. All
+    maps are keyed by entity id:
+        element_to_type / element_to_materials / element_to_psets
+        element_to_container: element -> spatial structure containing it
+        container_to_elements: spatial structure -> directly contained elements
+        parent: object -> aggregating object (spatial tree, assemblies)
+        children: object -> aggregated objects
+        storey_to_elements: storey -> every element below it, including
+            spaces and their contents and assembly parts
+    """
     
     if verbose:
         print("Building relationship lookup tables...")
     
-    # Element -> Type
-    element_to_type = {}
-    for rel in ifc_file.by_type("IfcRelDefinesByType"):
-        for element in rel.RelatedObjects:
-            element_to_type[element.id()] = rel.RelatingType
+    start = time.perf_counter()
     
-    # Element -> Materials
+    element_to_type = {}
     element_to_materials = defaultdict(list)
-    for rel in ifc_file.by_type("IfcRelAssociatesMaterial"):
-        for element in rel.RelatedObjects:
-            element_to_materials[element.id()].append(rel.RelatingMaterial)
-    
-    # Element -> Property Sets
     element_to_psets = defaultdict(list)
-    for rel in ifc_file.by_type("IfcRelDefinesByProperties"):
-        for element in rel.RelatedObjects:
-            element_to_psets[element.id()].append(rel.RelatingPropertyDefinition)
-    
-    # Storey -> Elements (spatial containment)
-    storey_to_elements = defaultdict(set)
-    for rel in ifc_file.by_type("IfcRelContainedInSpatialStructure"):
-        storey_to_elements[rel.RelatingStructure.id()].update(rel.RelatedElements)
+    element_to_container = {}
+    container_to_elements = defaultdict(set)
+    parent = {}
+    children = defaultdict(list)
     
-    # Storey -> Aggregated elements
-    for rel in ifc_file.by_type("IfcRelAggregates"):
-        if rel.RelatingObject.is_a("IfcBuildingStorey"):
-            storey_to_elements[rel.RelatingObject.id()].update(rel.RelatedObjects)
+    for rel in ifc_file.by_type("IfcRelationship"):
+        rel_type = rel.is_a()
+        
+        if rel_type == "IfcRelDefinesByProperties":
+            definitions = rel.RelatingPropertyDefinition
+            # IFC4 allows an IfcPropertySetDefinitionSet here
+            if not isinstance(definitions, (list, tuple)):
+                definitions = (definitions,)
+            for element in rel.RelatedObjects:
+                element_to_psets[element.id()].extend(definitions)
+        
+        elif rel_type == "IfcRelAssociatesMaterial":
+            for element in rel.RelatedObjects:
+                element_to_materials[element.id()].append(rel.RelatingMaterial)
+        
+        elif rel_type == "IfcRelDefinesByType":
+            for element in rel.RelatedObjects:
+                element_to_type[element.id()] = rel.RelatingType
+        
+        elif rel_type == "IfcRelContainedInSpatialStructure":
+            structure = rel.RelatingStructure
+            container_to_elements[structure.id()].update(rel.RelatedElements)
+            for element in rel.RelatedElements:
+                element_to_container[element.id()] = structure
+        
+        elif rel_type == "IfcRelAggregates":
+            relating = rel.RelatingObject
+            children[relating.id()].extend(rel.RelatedObjects)
+            for obj in rel.RelatedObjects:
+                parent[obj.id()] = relating
+    
+    # Storey -> everything below it: contained elements plus the aggregation
+    # subtree (spaces and their contents, assembly parts, ...)
+    storey_to_elements = {}
+    for storey in ifc_file.by_type("IfcBuildingStorey"):
+        elements = set()
+        stack = [storey]
+        while stack:
+            obj = stack.pop()
+            for child in container_to_elements.get(obj.id(), ()):
+                if child not in elements:
+                    elements.add(child)
+                    stack.append(child)
+            for child in children.get(obj.id(), ()):
+                if child not in elements:
+                    elements.add(child)
+                    stack.append(child)
+        storey_to_elements[storey.id()] = elements
+    
+    build_time = time.perf_counter() - start
     
     if verbose:
         print(f"  Indexed {len(element_to_type)} type relationships")
         print(f"  Indexed {len(element_to_materials)} material relationships")
         print(f"  Indexed {len(element_to_psets)} property set relationships")
+        print(f"  Indexed {len(element_to_container)} spatial containments")
+        print(f"  Indexed {len(parent)} aggregations")
+        print(f"  Built in {build_time:.2f}s")
     
     return {
         'element_to_type': element_to_type,
         'element_to_materials': element_to_materials,
         'element_to_psets': element_to_psets,
-        'storey_to_elements': storey_to_elements
+        'element_to_container': element_to_container,
+        'container_to_elements': container_to_elements,
+        'parent': parent,
+        'children': children,
+        'storey_to_elements': storey_to_elements,
+        'build_time_s': build_time
     }
 
 
-def collect_dependencies(entity, visited, ifc_file):
-    """Recursively collect entity dependencies (non-root entities only)"""
-    if entity is None or not hasattr(entity, 'id'):
-        return
+def spatial_ancestors(maps, entity):
+    """Aggregation/containment chain above entity, nearest first (e.g. building, site, project)"""
+    ancestors = []
+    seen = {entity.id()}
+    current = entity
+    while True:
+        current = maps['parent'].get(current.id()) or maps['element_to_container'].get(current.id())
+        if current is None or current.id() in seen:
+            return ancestors
+        seen.add(current.id())
+        ancestors.append(current)
+
+
+# Entity classes whose subgraphs are shared by many elements and storeys
+# (type geometry, contexts, units, styles, materials). Their closures are
+# expanded once and reused from the dependency cache.
+SHARED_CLASSES = (
+    "IfcRepresentationMap",
+    "IfcRepresentationContext",
+    "IfcUnitAssignment",
+    "IfcNamedUnit",
+    "IfcPresentationStyle",
+    "IfcOwnerHistory",
+    "IfcMaterial",
+    "IfcMaterialLayerSet",
+    "IfcMaterialProfileSet",
+    "IfcMaterialConstituentSet",
+)
+
+
+def _references(entity, ifc_file):
+    """Directly referenced non-root entity instances (no attribute dict)"""
+    # traverse() also yields the entity itself and inline typed values
+    # such as IfcLabel, which have no instance id and are copied by value
+    return [
+        ref for ref in ifc_file.traverse(entity, max_levels=1)[1:]
+        if ref.id() and not ref.is_a("IfcRoot")
+    ]
+
+
+# IFC class name -> whether it is (a subtype of) one of SHARED_CLASSES
+_SHARED_BY_CLASS = {}
+
+
+def _is_shared(entity):
+    cls = entity.is_a()
+    shared = _SHARED_BY_CLASS.get(cls)
+    if shared is None:
+        shared = _SHARED_BY_CLASS[cls] = any(entity.is_a(c) for c in SHARED_CLASSES)
+    return shared
+
+
+def _expand(entity, visited, ifc_file, cache):
+    """Explicit-stack walk adding entity and its non-root references to visited"""
+    stack = [entity]
+    while stack:
+        current = stack.pop()
+        entity_id = current.id()
+        if entity_id in visited:
+            continue
+        
+        if cache is not None and current is not entity and _is_shared(current):
+            visited |= shared_closure(current, ifc_file, cache)
+            continue
+        
+        visited.add(entity_id)
+        stack.extend(_references(current, ifc_file))
+
+
+def shared_closure(entity, ifc_file, cache):
+    """
+    Closure of a shared entity, expanded on first use and then cached
     
-    entity_id = entity.id()
-    if entity_id in visited:
+    Shared entities met inside the walk (e.g. a sub-context's parent
+    context) get a frame of their own on the same explicit stack; the
+    outer walk resumes once their closure is cached, so nesting depth
+    never turns into Python recursion.
+    """
+    closure = cache.get(entity.id())
+    if closure is not None:
+        return closure
+    
+    # (shared entity, its closure so far, its pending walk)
+    frames = [(entity, set(), [entity])]
+    expanding = {entity.id()}
+    while frames:
+        root, closure, stack = frames[-1]
+        while stack:
+            current = stack.pop()
+            entity_id = current.id()
+            if entity_id in closure:
+                continue
+            
+            # A shared entity already being expanded (a reference cycle)
+            # is walked inline instead
+            if current is not root and _is_shared(current) and entity_id not in expanding:
+                nested = cache.get(entity_id)
+                if nested is None:
+                    stack.append(current)
+                    frames.append((current, set(), [current]))
+                    expanding.add(entity_id)
+                    break
+                closure |= nested
+                continue
+            
+            closure.add(entity_id)
+            stack.extend(_references(current, ifc_file))
+        else:
+            frames.pop()
+            expanding.discard(root.id())
+            cache[root.id()] = frozenset(closure)
+    return cache[entity.id()]
+
+
+def warm_dependency_cache(ifc_file, cache):
+    """Expand every shared subgraph up front (e.g. before forking workers)"""
+    for cls in SHARED_CLASSES:
+        try:
+            entities = ifc_file.by_type(cls)
+        except RuntimeError:
+            # Class not part of this schema (e.g. IfcMaterialProfileSet in IFC2X3)
+            continue
+        for entity in entities:
+            shared_closure(entity, ifc_file, cache)
+    return cache
+
+
+def collect_dependencies(entity, visited, ifc_file, cache=None):
+    """
+    Collect entity dependencies (non-root entities only)
+    
+    Iterative, so deep CSG/boolean trees cannot hit the recursion limit.
+    When a cache dict is given, closures of shared subgraphs (see
+    SHARED_CLASSES) are computed once and reused across calls and storeys.
+    """
+    if entity is None or not hasattr(entity, 'id') or not entity.id():
         return
     
-    visited.add(entity_id)
+    if cache is not None and _is_shared(entity):
+        visited |= shared_closure(entity, ifc_file, cache)
+    else:
+        _expand(entity, visited, ifc_file, cache)
+
+
+def _quiet(*args, **kwargs):
+    pass
+
+
+def split_storey(ifc_file, maps, storeys, idx, project, output_path,
+                 original_size, timestamp, log=print, cache=None):
+    """
+    Write a single storey and everything it depends on to its own IFC file
+    
+    Args:
+        ifc_file: Loaded source model
+        maps: Lookup tables from build_relationship_maps
+        storeys: All IfcBuildingStorey entities of the model
+        idx: Index of the storey to write
+        project: IfcProject copied into every storey file (may be None)
+        output_path: Path of the storey IFC file
+        original_size: Size of the source file in MB
+        timestamp: FILE_NAME time stamp written to the header
+        log: Callable receiving progress lines
+        cache: Shared-subgraph closure cache reused across storeys
+    
+    Returns:
+        dict with per-storey results
+    """
+    import ifcopenshell
+    
+    storey = storeys[idx]
+    storey_name = storey.Name or f"Storey_{idx}"
+    output_filename = output_path.name
+    
+    log(f"\n[{idx + 1}/{len(storeys)}] {storey_name}")
+    
+    # Get elements using fast lookup
+    elements = maps['storey_to_elements'].get(storey.id(), set())
+    
+    log(f"  Elements: {len(elements)}")
+    
+    # Collect what we need using fast lookups
+    entities_to_copy = set()
+    
+    # Core structure: the storey's own spatial ancestors (building, site,
+    # project), so multi-site and multi-building projects split correctly
+    if project:
+        entities_to_copy.add(project.id())
+    for entity in spatial_ancestors(maps, storey):
+        entities_to_copy.add(entity.id())
+    entities_to_copy.add(storey.id())
+    
+    # Elements
+    for element in elements:
+        entities_to_copy.add(element.id())
+        
+        # Type (fast lookup)
+        if element.id() in maps['element_to_type']:
+            type_obj = maps['element_to_type'][element.id()]
+            entities_to_copy.add(type_obj.id())
+        
+        # Materials (fast lookup)
+        if element.id() in maps['element_to_materials']:
+            for material in maps['element_to_materials'][element.id()]:
+                entities_to_copy.add(material.id())
+        
+        # Property sets (fast lookup)
+        if element.id() in maps['element_to_psets']:
+            for pset in maps['element_to_psets'][element.id()]:
+                entities_to_copy.add(pset.id())
+    
+    log(f"  Root entities to copy: {len(entities_to_copy)}")
+    log(f"  Collecting geometry dependencies...")
+    
+    # Collect non-root dependencies (geometry, etc.)
+    non_root_deps = set()
+    for entity_id in entities_to_copy:
+        entity = ifc_file.by_id(entity_id)
+        collect_dependencies(entity, non_root_deps, ifc_file, cache)
+    
+    log(f"  Non-root dependencies: {len(non_root_deps)}")
+    log(f"  Total entities: {len(entities_to_copy) + len(non_root_deps)}")
+    log(f"  Creating new file...")
+    
+    # Create new file
+    new_file = ifcopenshell.file(schema=ifc_file.schema)
+    new_file.header.file_name.time_stamp = timestamp
+    
+    # Combine all entity IDs
+    all_entity_ids = entities_to_copy | non_root_deps
+    
+    # Copy all entities in order (sorted by ID to maintain references)
+    for entity_id in sorted(all_entity_ids):
+        try:
+            entity = ifc_file.by_id(entity_id)
+            new_file.add(entity)
+        except Exception as e:
+            log(f"    Warning: Could not copy entity #{entity_id}: {e}")
+    
+    log(f"  Writing: {output_filename}")
+    
+    new_file.write(str(output_path))
+    
+    file_size = output_path.stat().st_size / (1024 * 1024)
+    reduction = ((original_size - file_size) / original_size) * 100
+    
+    log(f"  ✓ {file_size:.2f} MB ({reduction:.1f}% smaller than original)")
+    
+    return {
+        'index': idx,
+        'output': output_path,
+        'elements': len(elements),
+        'entities': len(all_entity_ids),
+        'size_mb': file_size,
+        'error': None
+    }
+
+
+# Populated by the parent right before the pool forks so every worker
+# inherits the loaded model and lookup tables instead of re-parsing
+_WORKER_STATE = {}
+
+
+def _split_storey_worker(task):
+    """Pool entry point: split one storey, capturing its log and errors"""
+    idx, output_path = task
+    state = _WORKER_STATE
+    lines = []
     
-    # Get attributes
     try:
-        info = entity.get_info()
-        for value in info.values():
-            if hasattr(value, 'id'):
-                # Don't follow root entities (products, types, etc) - only geometry/materials
-                if not value.is_a("IfcRoot"):
-                    collect_dependencies(value, visited, ifc_file)
-            elif isinstance(value, (list, tuple)):
-                for item in value:
-                    if hasattr(item, 'id') and not item.is_a("IfcRoot"):
-                        collect_dependencies(item, visited, ifc_file)
-    except:
-        pass
-
-
-def split_ifc_ultrafast(input_path, output_dir=None, verbose=True):
+        result = split_storey(
+            state['ifc_file'], state['maps'], state['storeys'], idx,
+            state['project'], output_path, state['original_size'],
+            state['timestamp'], log=lines.append if state['verbose'] else _quiet,
+            cache=state['cache']
+        )
+    except Exception:
+        import traceback
+        result = {'index': idx, 'output': output_path, 'error': traceback.format_exc()}
+    
+    result['log'] = lines
+    return result
+
+
+def split_ifc_ultrafast(input_path, output_dir=None, verbose=True, jobs=1):
     """
     Ultra-fast split with pre-built lookup tables
+    
+    With jobs > 1 storeys are written by a fork-based process pool; jobs=None
+    or 0 uses every CPU core. Output is identical to the sequential path.
     """
     
     try:
@@ -138,121 +453,83 @@ def split_ifc_ultrafast(input_path, output_dir=None, verbose=True):
     
     original_size = input_path.stat().st_size / (1024 * 1024)
     
-    # Get spatial hierarchy once
-    site = None
-    building = None
+    # Every output file gets the same header timestamp so sequential and
+    # parallel runs write byte-identical files
+    timestamp = time.strftime("%Y-%m-%dT%H:%M:%S")
     
-    if project:
-        for rel in ifc_file.by_type("IfcRelAggregates"):
-            if rel.RelatingObject == project:
-                for obj in rel.RelatedObjects:
-                    if obj.is_a("IfcSite"):
-                        site = obj
-                        break
-    
-    if site:
-        for rel in ifc_file.by_type("IfcRelAggregates"):
-            if rel.RelatingObject == site:
-                for obj in rel.RelatedObjects:
-                    if obj.is_a("IfcBuilding"):
-                        building = obj
-                        break
-    
-    # Process each storey
+    # Resolve output paths up front; duplicate storey names get the storey
+    # index appended instead of silently overwriting each other
+    tasks = []
+    used_names = set()
     for idx, storey in enumerate(storeys):
         storey_name = storey.Name or f"Storey_{idx}"
         safe_name = "".join(c for c in storey_name if c.isalnum() or c in (' ', '-', '_')).strip().replace(' ', '_')
-        
-        output_filename = f"{base_name}_{safe_name}.ifc"
-        output_path = output_dir / output_filename
-        
+        if safe_name in used_names:
+            safe_name = f"{safe_name}_{idx + 1}"
+        used_names.add(safe_name)
+        tasks.append((idx, output_dir / f"{base_name}_{safe_name}.ifc"))
+    
+    if jobs is None or jobs < 1:
+        jobs = multiprocessing.cpu_count()
+    jobs = min(jobs, len(tasks))
+    
+    if jobs > 1 and "fork" not in multiprocessing.get_all_start_methods():
+        print("Warning: parallel split needs the 'fork' start method, falling back to sequential")
+        jobs = 1
+    
+    # Closures of shared subgraphs (type geometry, contexts, styles, ...)
+    # are expanded once and reused by every storey
+    dependency_cache = {}
+    if jobs > 1:
+        # Expand them before forking so workers don't each redo the work
+        warm_dependency_cache(ifc_file, dependency_cache)
         if verbose:
-            print(f"\n[{idx + 1}/{len(storeys)}] {storey_name}")
-        
-        try:
-            # Get elements using fast lookup
-            elements = maps['storey_to_elements'].get(storey.id(), set())
-            
-            if verbose:
-                print(f"  Elements: {len(elements)}")
-            
-            # Collect what we need using fast lookups
-            entities_to_copy = set()
-            
-            # Core structure
-            if project:
-                entities_to_copy.add(project.id())
-            if site:
-                entities_to_copy.add(site.id())
-            if building:
-                entities_to_copy.add(building.id())
-            entities_to_copy.add(storey.id())
-            
-            # Elements
-            for element in elements:
-                entities_to_copy.add(element.id())
-                
-                # Type (fast lookup)
-                if element.id() in maps['element_to_type']:
-                    type_obj = maps['element_to_type'][element.id()]
-                    entities_to_copy.add(type_obj.id())
-                
-                # Materials (fast lookup)
-                if element.id() in maps['element_to_materials']:
-                    for material in maps['element_to_materials'][element.id()]:
-                        entities_to_copy.add(material.id())
-                
-                # Property sets (fast lookup)
-                if element.id() in maps['element_to_psets']:
-                    for pset in maps['element_to_psets'][element.id()]:
-                        entities_to_copy.add(pset.id())
-            
-            if verbose:
-                print(f"  Root entities to copy: {len(entities_to_copy)}")
-                print(f"  Collecting geometry dependencies...")
-            
-            # Collect non-root dependencies (geometry, etc.)
-            non_root_deps = set()
-            for entity_id in entities_to_copy:
-                entity = ifc_file.by_id(entity_id)
-                collect_dependencies(entity, non_root_deps, ifc_file)
-            
+            print(f"Cached closures of {len(dependency_cache)} shared entities")
+    
+    _WORKER_STATE.update({
+        'ifc_file': ifc_file,
+        'maps': maps,
+        'storeys': storeys,
+        'project': project,
+        'original_size': original_size,
+        'timestamp': timestamp,
+        'verbose': verbose,
+        'cache': dependency_cache,
+    })
+    
+    results = []
+    try:
+        if jobs > 1:
             if verbose:
-                print(f"  Non-root dependencies: {len(non_root_deps)}")
-                print(f"  Total entities: {len(entities_to_copy) + len(non_root_deps)}")
-                print(f"  Creating new file...")
+                print(f"Splitting with {jobs} worker processes")
             
-            # Create new file
-            new_file = ifcopenshell.file(schema=ifc_file.schema)
-            
-            # Combine all entity IDs
-            all_entity_ids = entities_to_copy | non_root_deps
-            
-            # Copy all entities in order (sorted by ID to maintain references)
-            for entity_id in sorted(all_entity_ids):
+            # Workers inherit the loaded model and lookup tables through fork
+            with multiprocessing.get_context("fork").Pool(jobs) as pool:
+                for result in pool.imap(_split_storey_worker, tasks):
+                    for line in result['log']:
+                        print(line)
+                    if result['error']:
+                        print(f"  ✗ Error: {result['error'].strip().splitlines()[-1]}")
+                        print(result['error'], end='')
+                    results.append(result)
+        else:
+            for idx, output_path in tasks:
                 try:
-                    entity = ifc_file.by_id(entity_id)
-                    new_file.add(entity)
+                    result = split_storey(
+                        ifc_file, maps, storeys, idx, project, output_path,
+                        original_size, timestamp, log=print if verbose else _quiet,
+                        cache=dependency_cache
+                    )
                 except Exception as e:
-                    if verbose:
-                        print(f"    Warning: Could not copy entity #{entity_id}: {e}")
-            
-            if verbose:
-                print(f"  Writing: {output_filename}")
-            
-            new_file.write(str(output_path))
-            
-            file_size = output_path.stat().st_size / (1024 * 1024)
-            reduction = ((original_size - file_size) / original_size) * 100
-            
-            if verbose:
-                print(f"  ✓ {file_size:.2f} MB ({reduction:.1f}% smaller than original)")
-        
-        except Exception as e:
-            print(f"  ✗ Error: {e}")
-            import traceback
-            traceback.print_exc()
-            continue
+                    print(f"  ✗ Error: {e}")
+                    import traceback
+                    traceback.print_exc()
+                    result = {'index': idx, 'output': output_path, 'error': traceback.format_exc()}
+                results.append(result)
+    finally:
+        _WORKER_STATE.clear()
+    
+    failed = [r for r in results if r['error']]
     
     if verbose:
         print("\n" + "=" * 60)
@@ -268,8 +545,309 @@ def split_ifc_ultrafast(input_path, output_dir=None, verbose=True):
             if total_size < original_size:
                 savings = ((original_size - total_size) / original_size) * 100
                 print(f"✓ Saved {savings:.1f}% in total size")
+        
+        if failed:
+            print(f"\n✗ {len(failed)} storey(s) failed:")
+            for result in failed:
+                print(f"  {result['output'].name}")
+    
+    return not failed
+
+
+# Relationship attributes after the four IfcRoot attributes, by class:
+# (attribute of the related objects, attribute of the relating object)
+_RAW_RELATIONSHIPS = {
+    'IFCRELDEFINESBYPROPERTIES': (4, 5),
+    'IFCRELASSOCIATESMATERIAL': (4, 5),
+    'IFCRELDEFINESBYTYPE': (4, 5),
+    'IFCRELCONTAINEDINSPATIALSTRUCTURE': (4, 5),
+    'IFCRELAGGREGATES': (5, 4),
+}
+
+
+def build_raw_relationship_maps(index, verbose=False):
+    """
+    build_relationship_maps() on a step_scanner.StepIndex
     
-    return True
+    Only the relationship records are parsed; every map is keyed by and
+    holds index rows instead of entity instances.
+    """
+    from step_scanner import references
+    
+    if verbose:
+        print("Building relationship lookup tables from raw records...")
+    
+    start = time.perf_counter()
+    
+    element_to_type = {}
+    element_to_materials = defaultdict(list)
+    element_to_psets = defaultdict(list)
+    element_to_container = {}
+    container_to_elements = defaultdict(set)
+    parent = {}
+    children = defaultdict(list)
+    
+    for rel_type, (related_attribute, relating_attribute) in _RAW_RELATIONSHIPS.items():
+        for rel in index.rows_of_type(rel_type):
+            arguments = index.arguments(rel)
+            related = [r for r in index.rows(references(arguments[related_attribute])).tolist() if r >= 0]
+            # IFC4 allows an IfcPropertySetDefinitionSet as the relating side
+            relating = [r for r in index.rows(references(arguments[relating_attribute])).tolist() if r >= 0]
+            if not relating:
+                continue
+            
+            if rel_type == "IFCRELDEFINESBYPROPERTIES":
+                for element in related:
+                    element_to_psets[element].extend(relating)
+            elif rel_type == "IFCRELASSOCIATESMATERIAL":
+                for element in related:
+                    element_to_materials[element].append(relating[0])
+            elif rel_type == "IFCRELDEFINESBYTYPE":
+                for element in related:
+                    element_to_type[element] = relating[0]
+            elif rel_type == "IFCRELCONTAINEDINSPATIALSTRUCTURE":
+                container_to_elements[relating[0]].update(related)
+                for element in related:
+                    element_to_container[element] = relating[0]
+            else:
+                children[relating[0]].extend(related)
+                for obj in related:
+                    parent[obj] = relating[0]
+    
+    storey_to_elements = {}
+    for storey in index.rows_of_type("IFCBUILDINGSTOREY").tolist():
+        elements = set()
+        stack = [storey]
+        while stack:
+            obj = stack.pop()
+            for child in list(container_to_elements.get(obj, ())) + children.get(obj, []):
+                if child not in elements:
+                    elements.add(child)
+                    stack.append(child)
+        storey_to_elements[storey] = elements
+    
+    build_time = time.perf_counter() - start
+    
+    if verbose:
+        print(f"  Indexed {len(element_to_type)} type relationships")
+        print(f"  Indexed {len(element_to_materials)} material relationships")
+        print(f"  Indexed {len(element_to_psets)} property set relationships")
+        print(f"  Indexed {len(element_to_container)} spatial containments")
+        print(f"  Indexed {len(parent)} aggregations")
+        print(f"  Built in {build_time:.2f}s")
+    
+    return {
+        'element_to_type': element_to_type,
+        'element_to_materials': element_to_materials,
+        'element_to_psets': element_to_psets,
+        'element_to_container': element_to_container,
+        'container_to_elements': container_to_elements,
+        'parent': parent,
+        'children': children,
+        'storey_to_elements': storey_to_elements,
+        'build_time_s': build_time
+    }
+
+
+def split_storey_raw(index, maps, storeys, idx, project, output_path, original_size, log=print):
+    """
+    split_storey() on a step_scanner.StepIndex: the same root entities, their
+    forward closure (what ifcopenshell's file.add() would copy) computed on
+    the integer reference graph, written by copying the raw records
+    """
+    storey = storeys[idx]
+    
+    log(f"\n[{idx + 1}/{len(storeys)}] {_raw_name(index, storey) or f'Storey_{idx}'}")
+    
+    elements = maps['storey_to_elements'].get(storey, set())
+    log(f"  Elements: {len(elements)}")
+    
+    roots = set(elements)
+    if project is not None:
+        roots.add(project)
+    current = storey
+    while current is not None and current not in roots:
+        roots.add(current)
+        current = maps['parent'].get(current, maps['element_to_container'].get(current))
+    
+    for element in elements:
+        if element in maps['element_to_type']:
+            roots.add(maps['element_to_type'][element])
+        roots.update(maps['element_to_materials'].get(element, ()))
+        roots.update(maps['element_to_psets'].get(element, ()))
+    
+    log(f"  Root entities to copy: {len(roots)}")
+    
+    mask = index.closure(sorted(roots))
+    entities = int(mask.sum())
+    log(f"  Total entities: {entities}")
+    log(f"  Writing: {output_path.name}")
+    
+    index.write_subset(mask, output_path)
+    
+    file_size = output_path.stat().st_size / (1024 * 1024)
+    reduction = ((original_size - file_size) / original_size) * 100
+    
+    log(f"  ✓ {file_size:.2f} MB ({reduction:.1f}% smaller than original)")
+    
+    return {
+        'index': idx,
+        'output': output_path,
+        'elements': len(elements),
+        'entities': entities,
+        'size_mb': file_size,
+        'error': None
+    }
+
+
+def _raw_name(index, row):
+    """Decoded Name attribute (third IfcRoot attribute) of a row, or None"""
+    from step_scanner import decode_string
+    
+    name = index.arguments(row)[2]
+    if not name.startswith(b"'"):
+        return None
+    return decode_string(name[1:-1])
+
+
+def _split_storey_raw_worker(task):
+    """Pool entry point for raw splitting"""
+    idx, output_path = task
+    state = _WORKER_STATE
+    lines = []
+    
+    try:
+        result = split_storey_raw(
+            state['index'], state['maps'], state['storeys'], idx, state['project'],
+            output_path, state['original_size'], log=lines.append if state['verbose'] else _quiet
+        )
+    except Exception:
+        import traceback
+        result = {'index': idx, 'output': output_path, 'error': traceback.format_exc()}
+    
+    result['log'] = lines
+    return result
+
+
+def split_ifc_raw(input_path, output_dir=None, verbose=True, jobs=1):
+    """
+    Split by storey without ifcopenshell: out-of-core variant of split_ifc_ultrafast
+    
+    The file is memory-mapped and indexed by step_scanner (ids, byte ranges
+    and references in flat arrays), relationship records are parsed from
+    the raw text, and each storey's records are copied byte for byte. Peak
+    memory is the index plus one boolean per entity per storey, so files
+    larger than RAM can be split. Outputs contain the same entities as the
+    ifcopenshell path but keep their original #ids, formatting and header.
+    """
+    from step_scanner import StepIndex
+    
+    input_path = Path(input_path)
+    if not input_path.exists():
+        print(f"Error: File not found: {input_path}")
+        return False
+    
+    if output_dir:
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+    else:
+        output_dir = input_path.parent
+    
+    base_name = input_path.stem
+    
+    if verbose:
+        print(f"Scanning IFC file: {input_path}")
+    
+    try:
+        index = StepIndex.build(input_path, verbose=verbose)
+    except (OSError, ValueError) as e:
+        print(f"Error scanning IFC file: {e}")
+        return False
+    
+    if verbose:
+        print(f"IFC Schema: {index.schema}")
+    
+    maps = build_raw_relationship_maps(index, verbose)
+    
+    projects = index.rows_of_type("IFCPROJECT").tolist()
+    project = projects[0] if projects else None
+    storeys = index.rows_of_type("IFCBUILDINGSTOREY").tolist()
+    
+    if not storeys:
+        print("Warning: No building storeys found")
+        return False
+    
+    if verbose:
+        print(f"Found {len(storeys)} storey(s)")
+        print("-" * 60)
+    
+    original_size = input_path.stat().st_size / (1024 * 1024)
+    
+    tasks = []
+    used_names = set()
+    for idx, storey in enumerate(storeys):
+        storey_name = _raw_name(index, storey) or f"Storey_{idx}"
+        safe_name = "".join(c for c in storey_name if c.isalnum() or c in (' ', '-', '_')).strip().replace(' ', '_')
+        if safe_name in used_names:
+            safe_name = f"{safe_name}_{idx + 1}"
+        used_names.add(safe_name)
+        tasks.append((idx, output_dir / f"{base_name}_{safe_name}.ifc"))
+    
+    if jobs is None or jobs < 1:
+        jobs = multiprocessing.cpu_count()
+    jobs = min(jobs, len(tasks))
+    if jobs > 1 and "fork" not in multiprocessing.get_all_start_methods():
+        print("Warning: parallel split needs the 'fork' start method, falling back to sequential")
+        jobs = 1
+    
+    _WORKER_STATE.update({
+        'index': index,
+        'maps': maps,
+        'storeys': storeys,
+        'project': project,
+        'original_size': original_size,
+        'verbose': verbose,
+    })
+    
+    results = []
+    try:
+        pool = None
+        if jobs > 1:
+            if verbose:
+                print(f"Splitting with {jobs} worker processes")
+            pool = multiprocessing.get_context("fork").Pool(jobs)
+            outcomes = pool.imap(_split_storey_raw_worker, tasks)
+        else:
+            outcomes = map(_split_storey_raw_worker, tasks)
+        
+        for result in outcomes:
+            for line in result['log']:
+                print(line)
+            if result['error']:
+                print(f"  ✗ Error: {result['error'].strip().splitlines()[-1]}")
+                print(result['error'], end='')
+            results.append(result)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        _WORKER_STATE.clear()
+        index.close()
+    
+    failed = [r for r in results if r['error']]
+    
+    if verbose:
+        print("\n" + "=" * 60)
+        print("Complete!")
+        total_size = sum(r['size_mb'] for r in results if not r['error'])
+        print(f"\nOriginal: {original_size:.2f} MB")
+        print(f"Total output: {total_size:.2f} MB")
+        if failed:
+            print(f"\n✗ {len(failed)} storey(s) failed:")
+            for result in failed:
+                print(f"  {result['output'].name}")
+    
+    return not failed
 
 
 def main():
@@ -280,14 +858,21 @@ def main():
     
     parser.add_argument('input', help='Input IFC file')
     parser.add_argument('-o', '--output-dir', help='Output directory')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='Worker processes for splitting storeys (0 = all cores, default: 1)')
+    parser.add_argument('--raw', action='store_true',
+                        help='Split from a memory-mapped STEP index by copying raw records '
+                             '(no ifcopenshell; for files larger than RAM)')
     parser.add_argument('-q', '--quiet', action='store_true', help='Quiet mode')
     
     args = parser.parse_args()
     
-    success = split_ifc_ultrafast(
+    split = split_ifc_raw if args.raw else split_ifc_ultrafast
+    success = split(
         args.input,
         output_dir=args.output_dir,
-        verbose=not args.quiet
+        verbose=not args.quiet,
+        jobs=args.jobs
     )
     
     sys.exit(0 if success else 1)
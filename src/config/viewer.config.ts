@@ -564,6 +564,27 @@ export const VIEWER_CONFIG = {
       roughness: 0.5,
       albedoColor: new Color3(0.9, 0.9, 0.9),
     },
+
+    /**
+     * Texture manifest written by build_textures.py
+     *
+     * What: Lists the prebuilt colour, normal and packed ORM textures per set and quality tier
+     * Why: One ORM texture replaces separate AO/roughness/metalness maps
+     * Default: '/textures/manifest.json'
+     * Note: Regenerate with `npm run textures`; materials fall back to the source maps without it
+     */
+    textureManifestUrl: '/textures/manifest.json',
+
+    /**
+     * Texture quality tier
+     *
+     * What: Which manifest tier the realistic materials load
+     * Why: Lower tiers cut download size and GPU memory on weaker devices
+     * Default: 'high' (2048 px, the source resolution)
+     * Range: 'high' | 'medium' (1024 px) | 'low' (512 px)
+     * Impact: Each step down needs ~1/4 of the texture memory
+     */
+    textureTier: 'high',
   },
 
   // ═══════════════════════════════════════════════════════════════════════════
@@ -1,8 +1,13 @@
 import { Scene, PBRMaterial, Texture } from '@babylonjs/core';
+import { applyOrmTexture, createMaterialTexture, withTextureSet } from './TextureManifest';
 
 /**
  * Creates a realistic brick PBR material using the ambientCG Bricks051 texture set
  *
+ * Textures come from the configured tier of the texture manifest
+ * (build_textures.py), with the 2K source maps as fallback. They are
+ * assigned once the manifest has been fetched.
+ *
  * @param scene - The Babylon scene
  * @param uvScale - UV tiling scale (default: 1.0, larger = more repetition)
  * @returns Configured PBRMaterial for bricks
@@ -12,42 +17,47 @@ export function createBricks051Material(scene: Scene, uvScale: number = 1.0): PB
 
   const basePath = '/textures/bricks/ambientcg-bricks-051';
 
-  // Albedo/Base Color - the actual brick color and appearance
-  material.albedoTexture = new Texture(
-    `${basePath}/Bricks051_2K-JPG_Color.jpg`,
-    scene,
-    false, // noMipmap
-    true,  // invertY
-    Texture.TRILINEAR_SAMPLINGMODE,
-    () => console.log('✓ Albedo texture loaded'),
-    (message) => console.error('✗ Albedo texture failed:', message)
-  );
+  withTextureSet(material, 'Bricks051', (set) => {
+    // Albedo/Base Color - the actual brick color and appearance
+    material.albedoTexture = createMaterialTexture(
+      set?.color ?? `${basePath}/Bricks051_2K-JPG_Color.jpg`, scene, 'Albedo'
+    );
 
-  // Normal Map - creates 3D surface detail and depth
-  // Note: Using NormalGL (OpenGL format) - BabylonJS uses OpenGL convention
-  material.bumpTexture = new Texture(
-    `${basePath}/Bricks051_2K-JPG_NormalGL.jpg`,
-    scene,
-    false,
-    true,
-    Texture.TRILINEAR_SAMPLINGMODE,
-    () => console.log('✓ Normal texture loaded'),
-    (message) => console.error('✗ Normal texture failed:', message)
-  );
+    // Normal Map - creates 3D surface detail and depth
+    // Note: Using NormalGL (OpenGL format) - BabylonJS uses OpenGL convention
+    material.bumpTexture = createMaterialTexture(
+      set?.normal ?? `${basePath}/Bricks051_2K-JPG_NormalGL.jpg`, scene, 'Normal'
+    );
 
-  // Roughness Map - controls how rough/smooth the surface appears
-  // stored in the metallic texture's green channel
-  material.metallicTexture = new Texture(
-    `${basePath}/Bricks051_2K-JPG_Roughness.jpg`,
-    scene,
-    false,
-    true,
-    Texture.TRILINEAR_SAMPLINGMODE,
-    () => console.log('✓ Roughness texture loaded'),
-    (message) => console.error('✗ Roughness texture failed:', message)
-  );
-  material.useRoughnessFromMetallicTextureAlpha = false;
-  material.useRoughnessFromMetallicTextureGreen = true;
+    if (set?.orm) {
+      // Packed AO/roughness/metalness, channels as listed in the manifest
+      applyOrmTexture(material, createMaterialTexture(set.orm, scene, 'ORM'), set.ormMaterialFlags);
+    } else {
+      // Roughness Map - controls how rough/smooth the surface appears
+      // stored in the metallic texture's green channel
+      material.metallicTexture = createMaterialTexture(
+        `${basePath}/Bricks051_2K-JPG_Roughness.jpg`, scene, 'Roughness'
+      );
+      material.useRoughnessFromMetallicTextureAlpha = false;
+      material.useRoughnessFromMetallicTextureGreen = true;
+    }
+
+    // Apply UV scaling to all texture maps
+    // Smaller values = larger brick pattern (less repetition)
+    // Larger values = smaller brick pattern (more repetition)
+    const textures = [
+      material.albedoTexture,
+      material.bumpTexture,
+      material.metallicTexture
+    ];
+
+    textures.forEach(texture => {
+      if (texture && texture instanceof Texture) {
+        texture.uScale = uvScale;
+        texture.vScale = uvScale;
+      }
+    });
+  });
 
   // Optional: Displacement/Height map for parallax effect
   // Uncomment for extra depth (slight performance cost)
@@ -62,26 +72,10 @@ export function createBricks051Material(scene: Scene, uvScale: number = 1.0): PB
   material.parallaxScaleBias = 0.05;
   */
 
-  // Material physical properties
+  // Material physical properties (scaled by the texture channels)
   material.metallic = 0.0;  // Bricks are not metallic
   material.roughness = 0.9; // Bricks are rough (adjust 0.0-1.0 for more/less shininess)
 
-  // Apply UV scaling to all texture maps
-  // Smaller values = larger brick pattern (less repetition)
-  // Larger values = smaller brick pattern (more repetition)
-  const textures = [
-    material.albedoTexture,
-    material.bumpTexture,
-    material.metallicTexture
-  ];
-
-  textures.forEach(texture => {
-    if (texture && texture instanceof Texture) {
-      texture.uScale = uvScale;
-      texture.vScale = uvScale;
-    }
-  });
-
   console.log(`Created Bricks051 PBR material with UV scale: ${uvScale}`);
 
   return material;
@@ -1,8 +1,13 @@
 import { Scene, PBRMaterial, Texture } from '@babylonjs/core';
+import { applyOrmTexture, createMaterialTexture, withTextureSet } from './TextureManifest';
 
 /**
  * Creates a realistic corrugated steel PBR material using the ambientCG CorrugatedSteel007A texture set
  *
+ * Textures come from the configured tier of the texture manifest
+ * (build_textures.py), with the 2K source maps as fallback. They are
+ * assigned once the manifest has been fetched.
+ *
  * @param scene - The Babylon scene
  * @param uvScale - UV tiling scale (default: 1.0, larger = more repetition)
  * @returns Configured PBRMaterial for corrugated steel
@@ -12,84 +17,56 @@ export function createCorrugatedSteel007Material(scene: Scene, uvScale: number =
 
   const basePath = '/textures/metal/ambientcg-corrugated-steel-007-a';
 
-  // Albedo/Base Color - the actual metal color
-  material.albedoTexture = new Texture(
-    `${basePath}/CorrugatedSteel007A_2K-JPG_Color.jpg`,
-    scene,
-    false, // noMipmap
-    true,  // invertY
-    Texture.TRILINEAR_SAMPLINGMODE,
-    () => console.log('✓ Metal Color texture loaded'),
-    (message) => console.error('✗ Metal Color texture failed:', message)
-  );
+  withTextureSet(material, 'CorrugatedSteel007A', (set) => {
+    // Albedo/Base Color - the actual metal color
+    material.albedoTexture = createMaterialTexture(
+      set?.color ?? `${basePath}/CorrugatedSteel007A_2K-JPG_Color.jpg`, scene, 'Metal Color'
+    );
+
+    // Normal Map - creates 3D surface detail (corrugation)
+    material.bumpTexture = createMaterialTexture(
+      set?.normal ?? `${basePath}/CorrugatedSteel007A_2K-JPG_NormalGL.jpg`, scene, 'Metal Normal'
+    );
 
-  // Normal Map - creates 3D surface detail (corrugation)
-  material.bumpTexture = new Texture(
-    `${basePath}/CorrugatedSteel007A_2K-JPG_NormalGL.jpg`,
-    scene,
-    false,
-    true,
-    Texture.TRILINEAR_SAMPLINGMODE,
-    () => console.log('✓ Metal Normal texture loaded'),
-    (message) => console.error('✗ Metal Normal texture failed:', message)
-  );
+    if (set?.orm) {
+      // AO, roughness and metalness packed into one texture
+      applyOrmTexture(material, createMaterialTexture(set.orm, scene, 'Metal ORM'), set.ormMaterialFlags);
+    } else {
+      // Separate source maps: metallicTexture holds only one of them, so
+      // roughness is sampled from it and metalness comes from material.metallic
+      material.metallicTexture = createMaterialTexture(
+        `${basePath}/CorrugatedSteel007A_2K-JPG_Roughness.jpg`, scene, 'Metal Roughness'
+      );
+      material.useRoughnessFromMetallicTextureAlpha = false;
+      material.useRoughnessFromMetallicTextureGreen = true;
 
-  // Metalness Map - defines which parts are metallic
-  // For metal, we use the metalness texture directly
-  material.metallicTexture = new Texture(
-    `${basePath}/CorrugatedSteel007A_2K-JPG_Metalness.jpg`,
-    scene,
-    false,
-    true,
-    Texture.TRILINEAR_SAMPLINGMODE,
-    () => console.log('✓ Metal Metalness texture loaded'),
-    (message) => console.error('✗ Metal Metalness texture failed:', message)
-  );
+      // Ambient Occlusion - adds depth to corrugation grooves
+      material.ambientTexture = createMaterialTexture(
+        `${basePath}/CorrugatedSteel007A_2K-JPG_AmbientOcclusion.jpg`, scene, 'Metal AO'
+      );
+      material.useAmbientInGrayScale = true;
+    }
 
-  // Roughness texture - separate from metalness for this material
-  material.metallicTexture = new Texture(
-    `${basePath}/CorrugatedSteel007A_2K-JPG_Roughness.jpg`,
-    scene,
-    false,
-    true,
-    Texture.TRILINEAR_SAMPLINGMODE,
-    () => console.log('✓ Metal Roughness texture loaded'),
-    (message) => console.error('✗ Metal Roughness texture failed:', message)
-  );
-  material.useRoughnessFromMetallicTextureAlpha = false;
-  material.useRoughnessFromMetallicTextureGreen = true;
+    // Apply UV scaling to all texture maps
+    const textures = [
+      material.albedoTexture,
+      material.bumpTexture,
+      material.metallicTexture,
+      material.ambientTexture
+    ];
 
-  // Ambient Occlusion - adds depth to corrugation grooves
-  material.ambientTexture = new Texture(
-    `${basePath}/CorrugatedSteel007A_2K-JPG_AmbientOcclusion.jpg`,
-    scene,
-    false,
-    true,
-    Texture.TRILINEAR_SAMPLINGMODE,
-    () => console.log('✓ Metal AO texture loaded'),
-    (message) => console.error('✗ Metal AO texture failed:', message)
-  );
-  material.useAmbientInGrayScale = true;
+    textures.forEach(texture => {
+      if (texture && texture instanceof Texture) {
+        texture.uScale = uvScale;
+        texture.vScale = uvScale;
+      }
+    });
+  });
 
-  // Material physical properties for metal
+  // Material physical properties for metal (scaled by the texture channels)
   material.metallic = 1.0;   // Fully metallic
   material.roughness = 0.5;  // Semi-rough metal (adjust 0.0-1.0 for shinier/rougher)
 
-  // Apply UV scaling to all texture maps
-  const textures = [
-    material.albedoTexture,
-    material.bumpTexture,
-    material.metallicTexture,
-    material.ambientTexture
-  ];
-
-  textures.forEach(texture => {
-    if (texture && texture instanceof Texture) {
-      texture.uScale = uvScale;
-      texture.vScale = uvScale;
-    }
-  });
-
   console.log(`Created CorrugatedSteel007 PBR material with UV scale: ${uvScale}`);
 
   return material;
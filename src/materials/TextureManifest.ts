@@ -0,0 +1,154 @@
+import { Scene, PBRMaterial, Texture } from '@babylonjs/core';
+import { VIEWER_CONFIG } from '../config/viewer.config';
+
+/**
+ * Reader for public/textures/manifest.json, written by build_textures.py
+ *
+ * The manifest lists per texture set and quality tier the URLs of the
+ * prebuilt colour, normal and packed ORM (R = AO, G = roughness,
+ * B = metalness) textures, plus the PBRMaterial flags that read the ORM
+ * channels. Materials fall back to their source maps when the manifest,
+ * the set or the tier is missing.
+ */
+
+/** PBRMaterial flags that make metallicTexture an ORM texture */
+export interface OrmMaterialFlags {
+  useAmbientOcclusionFromMetallicTextureRed?: boolean;
+  useRoughnessFromMetallicTextureGreen?: boolean;
+  useMetallnessFromMetallicTextureBlue?: boolean;
+  useRoughnessFromMetallicTextureAlpha?: boolean;
+}
+
+/** One quality tier of a texture set */
+export interface TextureTier {
+  color?: string;
+  normal?: string;
+  orm?: string;
+  displacement?: string;
+  size: number;
+  bytes: number;
+  gpuBytes: number;
+}
+
+export interface TextureManifest {
+  version: number;
+  tiers: Record<string, number>;
+  ormMaterialFlags: OrmMaterialFlags;
+  sets: Record<string, { path: string; size: number; maps: string[]; tiers: Record<string, TextureTier> }>;
+}
+
+/** Texture URLs of one set at the configured tier */
+export interface ResolvedTextureSet {
+  color?: string;
+  normal?: string;
+  orm?: string;
+  ormMaterialFlags: OrmMaterialFlags;
+}
+
+let manifestPromise: Promise<TextureManifest | null> | null = null;
+
+/**
+ * Fetch the texture manifest once per page
+ *
+ * @returns The manifest, or null when it is missing or unreadable
+ */
+export function loadTextureManifest(): Promise<TextureManifest | null> {
+  if (!manifestPromise) {
+    const url = VIEWER_CONFIG.materials.textureManifestUrl;
+    manifestPromise = fetch(url)
+      .then(response => (response.ok ? response.json() as Promise<TextureManifest> : null))
+      .catch(() => null)
+      .then(manifest => {
+        if (!manifest) {
+          console.warn(`⚠️ No texture manifest at ${url}, using source textures (run: npm run textures)`);
+        }
+        return manifest;
+      });
+  }
+  return manifestPromise;
+}
+
+/**
+ * Texture URLs of a set at the configured quality tier
+ *
+ * @param setName - Texture set name, e.g. 'Bricks051'
+ * @param tier - Quality tier (default: VIEWER_CONFIG.materials.textureTier)
+ * @returns Resolved URLs, or null when the manifest has no such set or tier
+ */
+export async function resolveTextureSet(
+  setName: string,
+  tier: string = VIEWER_CONFIG.materials.textureTier
+): Promise<ResolvedTextureSet | null> {
+  const manifest = await loadTextureManifest();
+  const urls = manifest?.sets[setName]?.tiers[tier];
+  if (!manifest || !urls) {
+    return null;
+  }
+
+  return {
+    color: urls.color,
+    normal: urls.normal,
+    orm: urls.orm,
+    ormMaterialFlags: manifest.ormMaterialFlags,
+  };
+}
+
+/**
+ * Resolve a texture set and hand it to a material once available
+ *
+ * The callback is skipped if the material was disposed in the meantime.
+ *
+ * @param material - Material the textures are for
+ * @param setName - Texture set name
+ * @param apply - Receives the resolved set, or null to use source textures
+ */
+export function withTextureSet(
+  material: PBRMaterial,
+  setName: string,
+  apply: (set: ResolvedTextureSet | null) => void
+): void {
+  let disposed = false;
+  material.onDisposeObservable.addOnce(() => {
+    disposed = true;
+  });
+
+  resolveTextureSet(setName).then(set => {
+    if (!disposed) {
+      apply(set);
+    }
+  });
+}
+
+/**
+ * Trilinear, Y-inverted material texture with load logging
+ *
+ * @param url - Texture URL
+ * @param scene - The Babylon scene
+ * @param label - Name used in the log messages
+ */
+export function createMaterialTexture(url: string, scene: Scene, label: string): Texture {
+  return new Texture(
+    url,
+    scene,
+    false, // noMipmap
+    true,  // invertY
+    Texture.TRILINEAR_SAMPLINGMODE,
+    () => console.log(`✓ ${label} texture loaded`),
+    (message) => console.error(`✗ ${label} texture failed:`, message)
+  );
+}
+
+/**
+ * Use a packed ORM texture as the material's metallic texture
+ *
+ * @param material - Target material
+ * @param texture - ORM texture
+ * @param flags - Channel flags from the manifest
+ */
+export function applyOrmTexture(material: PBRMaterial, texture: Texture, flags: OrmMaterialFlags): void {
+  material.metallicTexture = texture;
+  material.useAmbientOcclusionFromMetallicTextureRed = flags.useAmbientOcclusionFromMetallicTextureRed ?? true;
+  material.useRoughnessFromMetallicTextureGreen = flags.useRoughnessFromMetallicTextureGreen ?? true;
+  material.useMetallnessFromMetallicTextureBlue = flags.useMetallnessFromMetallicTextureBlue ?? true;
+  material.useRoughnessFromMetallicTextureAlpha = flags.useRoughnessFromMetallicTextureAlpha ?? false;
+}